@@ -0,0 +1,36 @@
+"""add event_outbox for EventBus async dispatch
+
+Revision ID: add_event_outbox
+Revises: add_name_en_cp
+Create Date: 2026-10-19 00:28:00
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import JSONB
+
+revision = 'add_event_outbox'
+down_revision = 'add_name_en_cp'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'event_outbox',
+        sa.Column('id', sa.String(32), primary_key=True, comment='Event.id'),
+        sa.Column('event_type', sa.String(100), nullable=False),
+        sa.Column('payload', JSONB, nullable=False, server_default='{}'),
+        sa.Column('source', sa.String(50), nullable=True),
+        sa.Column('status', sa.String(20), nullable=False, server_default='pending', comment='pending, done, failed'),
+        sa.Column('attempts', sa.Integer, nullable=False, server_default='1'),
+        sa.Column('last_error', sa.Text, nullable=True),
+        sa.Column('created_at', sa.DateTime, nullable=False),
+        sa.Column('claimed_at', sa.DateTime, nullable=True),
+        sa.Column('processed_at', sa.DateTime, nullable=True),
+    )
+    op.create_index('idx_event_outbox_status_claimed', 'event_outbox', ['status', 'claimed_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('idx_event_outbox_status_claimed', table_name='event_outbox')
+    op.drop_table('event_outbox')
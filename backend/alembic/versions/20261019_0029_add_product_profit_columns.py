@@ -0,0 +1,43 @@
+"""add generated profit columns + ranking indexes to products
+
+Revision ID: add_product_profit_cols
+Revises: add_event_outbox
+Create Date: 2026-10-19 00:29:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = 'add_product_profit_cols'
+down_revision = 'add_event_outbox'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('products', sa.Column(
+        'profit_amount', sa.Numeric(11, 2),
+        sa.Computed('price - cost', persisted=True),
+        comment='利潤額 = price - cost',
+    ))
+    op.add_column('products', sa.Column(
+        'profit_margin', sa.Numeric(),  # 不限精度，極低成本時不溢出
+        sa.Computed('CASE WHEN cost > 0 THEN ROUND((price - cost) * 100.0 / cost, 4) END', persisted=True),
+        comment='利潤率（%）= (price - cost) / cost * 100',
+    ))
+    op.create_index(
+        'idx_products_profit_margin', 'products',
+        [sa.text('profit_margin DESC'), sa.text('id DESC')],
+        postgresql_where=sa.text('price > 0 AND cost > 0'),
+    )
+    op.create_index(
+        'idx_products_profit_amount', 'products',
+        [sa.text('profit_amount DESC'), sa.text('id DESC')],
+        postgresql_where=sa.text('price > 0 AND cost > 0'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('idx_products_profit_amount', table_name='products')
+    op.drop_index('idx_products_profit_margin', table_name='products')
+    op.drop_column('products', 'profit_margin')
+    op.drop_column('products', 'profit_amount')
@@ -0,0 +1,37 @@
+"""add products.search_text generated column for trigram search
+
+Revision ID: add_product_search_text
+Revises: add_product_profit_cols
+Create Date: 2026-10-19 00:30:00
+
+trigram GIN 索引依賴 pg_trgm，與 idx_cp_name_trgm 一樣在 run_migrations 中建立。
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = 'add_product_search_text'
+down_revision = 'add_product_profit_cols'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('products', sa.Column(
+        'search_text', sa.Text,
+        sa.Computed(
+            "lower(coalesce(sku, '') || ' ' || coalesce(name, '') || ' ' || coalesce(name_zh, '')"
+            " || ' ' || coalesce(name_en, '') || ' ' || coalesce(name_ja, ''))",
+            persisted=True,
+        ),
+        comment='sku + 多語言品名（小寫），trigram 索引',
+    ))
+    op.create_index(
+        'idx_products_created_id', 'products',
+        [sa.text('created_at DESC'), sa.text('id DESC')],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('idx_products_created_id', table_name='products')
+    op.execute('DROP INDEX IF EXISTS idx_products_search_trgm')
+    op.drop_column('products', 'search_text')
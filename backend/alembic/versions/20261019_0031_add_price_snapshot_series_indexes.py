@@ -0,0 +1,22 @@
+"""add (product, time) indexes for bucketed price trend queries
+
+Revision ID: add_snapshot_series_idx
+Revises: add_product_search_text
+Create Date: 2026-10-19 00:31:00
+"""
+from alembic import op
+
+revision = 'add_snapshot_series_idx'
+down_revision = 'add_product_search_text'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index('idx_price_snapshots_product_scraped', 'price_snapshots', ['competitor_product_id', 'scraped_at'])
+    op.create_index('idx_own_price_snapshots_product_recorded', 'own_price_snapshots', ['product_id', 'recorded_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('idx_own_price_snapshots_product_recorded', table_name='own_price_snapshots')
+    op.drop_index('idx_price_snapshots_product_scraped', table_name='price_snapshots')
@@ -0,0 +1,34 @@
+"""add dashboard_counters single-row table
+
+Revision ID: add_dashboard_counters
+Revises: add_snapshot_series_idx
+Create Date: 2026-10-19 00:32:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = 'add_dashboard_counters'
+down_revision = 'add_snapshot_series_idx'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'dashboard_counters',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('orders_to_ship', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('unread_messages', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('pending_price_reviews', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('pending_promotion_reviews', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('unread_alerts', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('month_start', sa.DateTime(), nullable=False),
+        sa.Column('monthly_revenue', sa.Numeric(14, 2), nullable=False, server_default='0'),
+        sa.Column('monthly_profit', sa.Numeric(14, 2), nullable=False, server_default='0'),
+        sa.Column('reconciled_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('dashboard_counters')
@@ -0,0 +1,41 @@
+"""add partial unique index on pending promotion proposals
+
+Revision ID: add_promotion_pending_unique
+Revises: add_dashboard_counters
+Create Date: 2026-10-19 00:33:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = 'add_promotion_pending_unique'
+down_revision = 'add_dashboard_counters'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # 歷史重複的待審建議：保留最新一條，其餘標記為 expired
+    op.execute("""
+        UPDATE promotion_proposals SET status = 'expired'
+        WHERE status = 'pending' AND id IN (
+            SELECT id FROM (
+                SELECT id, row_number() OVER (
+                    PARTITION BY product_id ORDER BY created_at DESC, id
+                ) AS rn
+                FROM promotion_proposals
+                WHERE status = 'pending'
+            ) ranked
+            WHERE rn > 1
+        )
+    """)
+    op.create_index(
+        'uq_promotion_proposals_pending_product',
+        'promotion_proposals',
+        ['product_id'],
+        unique=True,
+        postgresql_where=sa.text("status = 'pending'"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('uq_promotion_proposals_pending_product', table_name='promotion_proposals')
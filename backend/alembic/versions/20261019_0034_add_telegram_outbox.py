@@ -0,0 +1,47 @@
+"""add telegram_outbox table
+
+Revision ID: add_telegram_outbox
+Revises: add_promotion_pending_unique
+Create Date: 2026-10-19 00:34:00
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = 'add_telegram_outbox'
+down_revision = 'add_promotion_pending_unique'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'telegram_outbox',
+        sa.Column('id', postgresql.UUID(as_uuid=True), primary_key=True),
+        sa.Column('chat_id', sa.String(64), nullable=False),
+        sa.Column('dedupe_key', sa.String(200), nullable=False),
+        sa.Column('text', sa.Text(), nullable=False),
+        sa.Column('reply_markup', postgresql.JSONB(), nullable=True),
+        sa.Column('parse_mode', sa.String(20), nullable=False, server_default='HTML'),
+        sa.Column('disable_notification', sa.Boolean(), nullable=False, server_default=sa.false()),
+        sa.Column('digestible', sa.Boolean(), nullable=False, server_default=sa.true()),
+        sa.Column('status', sa.String(20), nullable=False, server_default='pending'),
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('available_at', sa.DateTime(), nullable=False),
+        sa.Column('claimed_at', sa.DateTime(), nullable=True),
+        sa.Column('sent_at', sa.DateTime(), nullable=True),
+    )
+    op.create_index(
+        'uq_telegram_outbox_chat_dedupe', 'telegram_outbox', ['chat_id', 'dedupe_key'], unique=True
+    )
+    op.create_index(
+        'idx_telegram_outbox_status_available', 'telegram_outbox', ['status', 'available_at']
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('idx_telegram_outbox_status_available', table_name='telegram_outbox')
+    op.drop_index('uq_telegram_outbox_chat_dedupe', table_name='telegram_outbox')
+    op.drop_table('telegram_outbox')
@@ -0,0 +1,70 @@
+"""add keyword_ranking_daily rollup table
+
+Revision ID: add_keyword_ranking_daily
+Revises: add_telegram_outbox
+Create Date: 2026-10-19 00:35:00
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = 'add_keyword_ranking_daily'
+down_revision = 'add_telegram_outbox'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'keyword_ranking_daily',
+        sa.Column(
+            'keyword_config_id', postgresql.UUID(as_uuid=True),
+            sa.ForeignKey('keyword_configs.id', ondelete='CASCADE'), primary_key=True,
+        ),
+        sa.Column('day', sa.Date(), primary_key=True),
+        sa.Column('source', sa.String(20), primary_key=True),
+        sa.Column(
+            'product_id', postgresql.UUID(as_uuid=True),
+            sa.ForeignKey('products.id', ondelete='SET NULL'), nullable=True,
+        ),
+        sa.Column('best_rank', sa.Integer(), nullable=False),
+        sa.Column('worst_rank', sa.Integer(), nullable=False),
+        sa.Column('rank_sum', sa.Integer(), nullable=False),
+        sa.Column('sample_count', sa.Integer(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+    )
+    op.create_index(
+        'idx_keyword_ranking_daily_day_source', 'keyword_ranking_daily', ['day', 'source']
+    )
+    op.create_index(
+        'idx_keyword_ranking_daily_product_day', 'keyword_ranking_daily', ['product_id', 'day']
+    )
+
+    # 歷史回填（與 backfill_ranking_rollups 同義，可重複執行）
+    for source in ('google', 'hktvmall'):
+        op.execute(f"""
+            INSERT INTO keyword_ranking_daily (
+                keyword_config_id, day, source, product_id,
+                best_rank, worst_rank, rank_sum, sample_count, updated_at
+            )
+            SELECT r.keyword_config_id, date(r.tracked_at), '{source}', c.product_id,
+                   min(r.{source}_rank), max(r.{source}_rank),
+                   sum(r.{source}_rank), count(r.{source}_rank), now()
+            FROM keyword_rankings r
+            JOIN keyword_configs c ON c.id = r.keyword_config_id
+            WHERE r.{source}_rank > 0
+            GROUP BY r.keyword_config_id, date(r.tracked_at), c.product_id
+            ON CONFLICT (keyword_config_id, day, source) DO UPDATE SET
+                product_id = EXCLUDED.product_id,
+                best_rank = EXCLUDED.best_rank,
+                worst_rank = EXCLUDED.worst_rank,
+                rank_sum = EXCLUDED.rank_sum,
+                sample_count = EXCLUDED.sample_count,
+                updated_at = EXCLUDED.updated_at
+        """)
+
+
+def downgrade() -> None:
+    op.drop_index('idx_keyword_ranking_daily_product_day', table_name='keyword_ranking_daily')
+    op.drop_index('idx_keyword_ranking_daily_day_source', table_name='keyword_ranking_daily')
+    op.drop_table('keyword_ranking_daily')
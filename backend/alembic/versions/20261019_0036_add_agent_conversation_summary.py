@@ -0,0 +1,37 @@
+"""add agent conversation rolling summary and message window index
+
+Revision ID: add_agent_conversation_summary
+Revises: add_keyword_ranking_daily
+Create Date: 2026-10-19 00:36:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = 'add_agent_conversation_summary'
+down_revision = 'add_keyword_ranking_daily'
+branch_labels = None
+depends_on = None
+
+
+def _tables() -> set:
+    return set(sa.inspect(op.get_bind()).get_table_names())
+
+
+def upgrade() -> None:
+    # Agent 表由 init_db 的 create_all 建立：全新庫上可能尚未存在
+    tables = _tables()
+    if 'agent_conversations' in tables:
+        op.add_column('agent_conversations', sa.Column('summary', sa.Text(), nullable=True))
+    if 'agent_messages' in tables:
+        op.create_index(
+            'idx_agent_messages_conversation_created', 'agent_messages',
+            ['conversation_id', 'created_at'], if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    tables = _tables()
+    if 'agent_messages' in tables:
+        op.drop_index('idx_agent_messages_conversation_created', table_name='agent_messages', if_exists=True)
+    if 'agent_conversations' in tables:
+        op.drop_column('agent_conversations', 'summary')
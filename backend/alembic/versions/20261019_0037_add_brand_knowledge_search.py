@@ -0,0 +1,53 @@
+"""add brand knowledge full-text search columns and related_products GIN index
+
+Revision ID: add_brand_knowledge_search
+Revises: add_agent_conversation_summary
+Create Date: 2026-10-19 00:37:00
+
+search_text 的 trigram GIN 索引依賴 pg_trgm，與 idx_products_search_trgm 一樣在 run_migrations 中建立。
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = 'add_brand_knowledge_search'
+down_revision = 'add_agent_conversation_summary'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('brand_knowledge', sa.Column(
+        'search_text', sa.Text,
+        sa.Computed(
+            "lower(coalesce(title, '') || ' ' || coalesce(summary, '') || ' ' || coalesce(content, ''))",
+            persisted=True,
+        ),
+        comment='標題 + 摘要 + 內容（小寫），trigram 索引',
+    ))
+    op.add_column('brand_knowledge', sa.Column(
+        'search_vector', postgresql.TSVECTOR,
+        sa.Computed(
+            "setweight(to_tsvector('simple', coalesce(title, '')), 'A')"
+            " || setweight(to_tsvector('simple', coalesce(summary, '')), 'B')"
+            " || setweight(to_tsvector('simple', coalesce(content, '')), 'C')",
+            persisted=True,
+        ),
+        comment='標題(A) / 摘要(B) / 內容(C) 的 simple tsvector',
+    ))
+    op.create_index(
+        'idx_brand_knowledge_search_vector', 'brand_knowledge', ['search_vector'],
+        postgresql_using='gin',
+    )
+    op.create_index(
+        'idx_brand_knowledge_related_products', 'brand_knowledge', ['related_products'],
+        postgresql_using='gin',
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('idx_brand_knowledge_related_products', table_name='brand_knowledge')
+    op.drop_index('idx_brand_knowledge_search_vector', table_name='brand_knowledge')
+    op.execute('DROP INDEX IF EXISTS idx_brand_knowledge_search_trgm')
+    op.drop_column('brand_knowledge', 'search_vector')
+    op.drop_column('brand_knowledge', 'search_text')
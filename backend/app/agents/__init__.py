@@ -7,6 +7,7 @@
 
 import logging
 
+from app.config import get_settings
 from app.agents.events import EventBus
 from app.agents.base import AgentBase
 from app.agents.commander import CommanderAgent
@@ -20,7 +21,11 @@ logger = logging.getLogger(__name__)
 
 # ==================== 全局單例 ====================
 
-event_bus = EventBus()
+_settings = get_settings()
+event_bus = EventBus(
+    queue_size=_settings.event_bus_queue_size,
+    handler_concurrency=_settings.event_bus_handler_concurrency,
+)
 
 _agents: dict[str, AgentBase] = {}
 
@@ -35,6 +40,7 @@ async def startup_agents() -> None:
     每個 Agent 的 startup() 會：
     1. 從 DB 載入啟用狀態
     2. 註冊事件處理器到 EventBus
+    全部訂閱完成後 EventBus 才切換到隊列派發並重放 outbox 中未完成的事件。
     """
     global _agents
 
@@ -60,9 +66,21 @@ async def startup_agents() -> None:
         f"Agent Team 啟動完成: {len(_agents)}/{len(agent_classes)} 個 Agent 就緒"
     )
 
+    # 訂單 / 警報事件 → 失效 AI 助手快速回覆快取
+    from app.services.agent.quick_cache import register_quick_cache_invalidation
+    register_quick_cache_invalidation(event_bus)
+
+    if _settings.event_bus_async:
+        if _settings.event_bus_outbox:
+            from app.agents.outbox import EventOutbox
+            event_bus.set_outbox(EventOutbox())
+        await event_bus.start()
+
 
 async def shutdown_agents() -> None:
-    """關閉所有 Agent"""
+    """關閉所有 Agent（先排空 EventBus 隊列，再取消訂閱）"""
+    await event_bus.stop()
+
     for name, agent in _agents.items():
         try:
             await agent.shutdown()
@@ -95,6 +113,7 @@ def get_team_status() -> dict:
             "event_bus": {
                 "handler_map": {event_type: [handler_names]},
                 "recent_events": [{id, type, source, timestamp}, ...],
+                "metrics": {mode, queue_depth, handlers, ...},
             },
         }
     """
@@ -103,5 +122,6 @@ def get_team_status() -> dict:
         "event_bus": {
             "handler_map": event_bus.get_handler_map(),
             "recent_events": event_bus.get_recent_events(limit=20),
+            "metrics": event_bus.get_metrics(),
         },
     }
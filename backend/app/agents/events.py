@@ -3,17 +3,27 @@
 # =============================================
 # 用途：Agent 間通訊的核心管道
 # 設計：進程內異步事件匯流排，fail-silent + error event 雙保險
+#
+# 兩種派發模式：
+# - inline（預設，未 start() 時）：emit 內逐個 await handler
+# - queued（start() 之後）：emit 只入隊即返回；分派協程批量寫 outbox，
+#   再扇出到每個 handler 自己的有界隊列 + worker 池（並發上限可配）
 # =============================================
 
+import asyncio
 import logging
+import time
 import uuid
 from collections import defaultdict, deque
 from dataclasses import dataclass, field
 from datetime import datetime
-from typing import Any, Callable, Coroutine
+from typing import TYPE_CHECKING, Any, Callable, Coroutine
 
 from app.models.database import utcnow
 
+if TYPE_CHECKING:
+    from app.agents.outbox import EventOutbox
+
 logger = logging.getLogger(__name__)
 
 # 事件處理器類型
@@ -30,7 +40,7 @@ class Event:
     type: str
     payload: dict = field(default_factory=dict)
     source: str = ""
-    id: str = field(default_factory=lambda: uuid.uuid4().hex[:12])
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
     timestamp: datetime = field(default_factory=utcnow)
 
 
@@ -77,6 +87,31 @@ class Events:
     AGENT_ERROR = "agent.error"
 
 
+# =============================================
+# 異步派發內部結構
+# =============================================
+
+@dataclass(slots=True)
+class _Delivery:
+    """單個事件的派發追蹤（所有 handler 完成後回寫 outbox）"""
+    event: Event
+    internal: bool
+    pending: int
+    enqueued_at: float
+    errors: list[str] = field(default_factory=list)
+
+
+@dataclass
+class _HandlerWorker:
+    """單個 handler 的有界隊列 + worker 協程池"""
+    handler: "EventHandler"
+    queue: asyncio.Queue
+    tasks: list[asyncio.Task] = field(default_factory=list)
+    in_flight: int = 0
+    processed: int = 0
+    failed: int = 0
+
+
 # =============================================
 # 事件匯流排
 # =============================================
@@ -89,6 +124,9 @@ class EventBus:
     - fail-silent：單個 handler 失敗不影響其他 handler
     - 失敗時自動發射 agent.error 事件（用於 Commander 監控）
     - 維護最近事件日誌（內存，重啟即清）
+    - start() 後切換為隊列派發：emit 不等待任何 handler，
+      慢 handler 只堵住自己的隊列（背壓指標見 get_metrics()）
+    - 配置 outbox 時事件先落庫，崩潰後由定期掃描重放（at-least-once）
     """
 
     # 合法事件類型白名單（防止注入偽造事件）
@@ -97,10 +135,110 @@ class EventBus:
         if not k.startswith("_") and isinstance(v, str)
     }
 
-    def __init__(self) -> None:
+    # 分派協程每批最多處理的事件數（outbox 批量寫入）
+    DISPATCH_BATCH = 100
+    # outbox 完成標記的刷新間隔（秒）
+    FLUSH_INTERVAL_S = 0.5
+    # outbox 重放掃描間隔 / 視為崩潰的認領超時（秒）
+    REPLAY_INTERVAL_S = 30.0
+    REPLAY_STALE_S = 300.0
+    # outbox 過期記錄清理間隔（秒，由重放掃描順帶執行）
+    PURGE_INTERVAL_S = 3600.0
+
+    def __init__(
+        self,
+        *,
+        queue_size: int = 1000,
+        handler_concurrency: int = 2,
+        outbox: "EventOutbox | None" = None,
+    ) -> None:
         self._handlers: dict[str, list[EventHandler]] = defaultdict(list)
         self._event_log: deque[Event] = deque(maxlen=200)
 
+        # 隊列派發（start() 後啟用）
+        self._queue_size = queue_size
+        self._handler_concurrency = max(1, handler_concurrency)
+        self._outbox = outbox
+        self._queue: asyncio.Queue | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._running = False
+        self._workers: dict[EventHandler, _HandlerWorker] = {}
+        self._tasks: list[asyncio.Task] = []
+        self._background: set[asyncio.Task] = set()
+        self._completed: dict[str, str | None] = {}
+        self._stats = {
+            "enqueued": 0,
+            "dispatched": 0,
+            "completed": 0,
+            "replayed": 0,
+            "spilled": 0,
+            "dropped": 0,
+            "max_queue_depth": 0,
+            "latency_ms_total": 0.0,
+        }
+
+    # ==================== 生命週期（隊列派發） ====================
+
+    @property
+    def is_async(self) -> bool:
+        """是否處於隊列派發模式"""
+        return self._running
+
+    def set_outbox(self, outbox: "EventOutbox | None") -> None:
+        """配置 outbox（須在 start() 之前）"""
+        if self._running:
+            raise RuntimeError("EventBus 運行中不能更換 outbox")
+        self._outbox = outbox
+
+    async def start(self) -> None:
+        """啟動隊列派發（之後的 emit 立即返回）"""
+        if self._running:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(maxsize=self._queue_size)
+        self._running = True
+        self._tasks = [asyncio.create_task(self._dispatch_loop(), name="event_bus.dispatch")]
+        if self._outbox is not None:
+            self._tasks.append(asyncio.create_task(self._flush_loop(), name="event_bus.flush"))
+            self._tasks.append(asyncio.create_task(self._replay_loop(), name="event_bus.replay"))
+        logger.info(
+            f"EventBus: 隊列派發已啟動 (queue={self._queue_size}, "
+            f"concurrency={self._handler_concurrency}, "
+            f"outbox={'on' if self._outbox else 'off'})"
+        )
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """停止隊列派發：盡量排空隊列後取消所有 worker（超時未完成的由 outbox 重放）"""
+        if not self._running:
+            return
+        self._running = False
+
+        try:
+            await asyncio.wait_for(self._drain(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"EventBus: 停止時 {timeout}s 內未排空隊列，剩餘事件留待重放")
+
+        tasks = list(self._tasks)
+        for worker in self._workers.values():
+            tasks.extend(worker.tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        await self._flush_completed()
+        self._tasks.clear()
+        self._workers.clear()
+        self._queue = None
+        self._loop = None
+        logger.info("EventBus: 隊列派發已停止")
+
+    async def _drain(self) -> None:
+        """等待主隊列和所有 handler 隊列處理完"""
+        if self._queue is not None:
+            await self._queue.join()
+        for worker in list(self._workers.values()):
+            await worker.queue.join()
+
     # ==================== 訂閱 / 取消 ====================
 
     def subscribe(self, event_type: str, handler: EventHandler) -> None:
@@ -115,6 +253,16 @@ class EventBus:
             handlers.remove(handler)
             logger.debug(f"EventBus: {handler.__qualname__} 取消訂閱 {event_type}")
 
+        # handler 不再訂閱任何事件 → 處理完已入隊的事件後回收其 worker
+        if handler in self._workers and not any(handler in hs for hs in self._handlers.values()):
+            self._spawn(self._retire_worker(self._workers.pop(handler)))
+
+    async def _retire_worker(self, worker: _HandlerWorker) -> None:
+        await worker.queue.join()
+        for task in worker.tasks:
+            task.cancel()
+        await asyncio.gather(*worker.tasks, return_exceptions=True)
+
     # ==================== 發射事件 ====================
 
     async def emit(
@@ -128,6 +276,8 @@ class EventBus:
         """
         發射事件並通知所有訂閱者
 
+        隊列派發模式下只做校驗 + 入隊，立即返回；否則逐個 await handler。
+
         Args:
             event_type: 事件類型
             payload: 事件負載
@@ -148,39 +298,254 @@ class EventBus:
         # 記錄事件日誌（deque 自動淘汰舊事件）
         self._event_log.append(event)
 
-        handlers = self._handlers.get(event_type, [])
-        if not handlers:
-            logger.debug(f"EventBus: {event_type} 無訂閱者")
+        if self._running and self._in_dispatch_loop():
+            self._enqueue(event, _internal)
             return event
 
-        logger.info(f"EventBus: {event_type} -> {len(handlers)} handler(s)")
+        await self._dispatch_inline(event, _internal)
+        return event
+
+    def _in_dispatch_loop(self) -> bool:
+        """跨 event loop 調用（如獨立線程的任務）無法使用 asyncio.Queue，退回 inline"""
+        try:
+            return asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            return False
+
+    def _enqueue(self, event: Event, internal: bool, replay: bool = False) -> None:
+        """非阻塞入隊；隊列滿時溢出寫 outbox（由重放掃描接手），無 outbox 則丟棄"""
+        try:
+            self._queue.put_nowait((event, internal, replay, time.monotonic()))
+        except asyncio.QueueFull:
+            if self._outbox is not None and not replay:
+                self._stats["spilled"] += 1
+                self._spawn(self._outbox.persist([event], claimed=False))
+                logger.warning(f"EventBus: 隊列已滿，{event.type} ({event.id}) 溢出至 outbox")
+            else:
+                self._stats["dropped"] += 1
+                logger.error(f"EventBus: 隊列已滿，丟棄 {event.type} ({event.id})")
+            return
+
+        self._stats["enqueued"] += 1
+        depth = self._queue.qsize()
+        if depth > self._stats["max_queue_depth"]:
+            self._stats["max_queue_depth"] = depth
+
+    async def _dispatch_inline(self, event: Event, internal: bool) -> None:
+        """同步派發：在調用方協程內逐個 await handler"""
+        handlers = self._handlers.get(event.type, [])
+        if not handlers:
+            logger.debug(f"EventBus: {event.type} 無訂閱者")
+            return
+
+        logger.info(f"EventBus: {event.type} -> {len(handlers)} handler(s)")
 
         for handler in handlers:
             try:
                 await handler(event)
             except Exception as exc:
-                logger.error(
-                    f"EventBus: handler {handler.__qualname__} "
-                    f"處理 {event_type} 失敗: {exc}",
-                    exc_info=True,
+                await self._on_handler_error(handler, event, exc, internal)
+
+    async def _on_handler_error(
+        self,
+        handler: EventHandler,
+        event: Event,
+        exc: Exception,
+        internal: bool,
+    ) -> None:
+        logger.error(
+            f"EventBus: handler {handler.__qualname__} "
+            f"處理 {event.type} 失敗: {exc}",
+            exc_info=True,
+        )
+        # 發射 error 事件（防遞歸，截斷錯誤信息防洩露）
+        if not internal:
+            await self.emit(
+                Events.AGENT_ERROR,
+                payload={
+                    "failed_event": event.type,
+                    "handler": handler.__qualname__,
+                    "error": str(exc)[:200],
+                },
+                source="event_bus",
+                _internal=True,
+            )
+
+    # ==================== 隊列派發內部 ====================
+
+    def _spawn(self, coro) -> None:
+        """啟動背景任務並保留引用（防止被 GC）"""
+        task = asyncio.create_task(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    def _get_worker(self, handler: EventHandler) -> _HandlerWorker:
+        """懶建立 handler 的隊列 + worker 池（start 之後才訂閱的 handler 也適用）"""
+        worker = self._workers.get(handler)
+        if worker is None:
+            worker = _HandlerWorker(
+                handler=handler,
+                queue=asyncio.Queue(maxsize=self._queue_size),
+            )
+            worker.tasks = [
+                asyncio.create_task(
+                    self._handler_loop(worker),
+                    name=f"event_bus.{handler.__qualname__}.{i}",
                 )
-                # 發射 error 事件（防遞歸，截斷錯誤信息防洩露）
-                if not _internal:
-                    await self.emit(
-                        Events.AGENT_ERROR,
-                        payload={
-                            "failed_event": event_type,
-                            "handler": handler.__qualname__,
-                            "error": str(exc)[:200],
-                        },
-                        source="event_bus",
-                        _internal=True,
-                    )
+                for i in range(self._handler_concurrency)
+            ]
+            self._workers[handler] = worker
+        return worker
+
+    async def _dispatch_loop(self) -> None:
+        """分派協程：攢批 → 寫 outbox → 扇出到各 handler 隊列"""
+        while True:
+            items = [await self._queue.get()]
+            while len(items) < self.DISPATCH_BATCH and not self._queue.empty():
+                items.append(self._queue.get_nowait())
 
-        return event
+            try:
+                deliveries = []
+                for event, internal, replay, enqueued_at in items:
+                    handlers = list(self._handlers.get(event.type, []))
+                    if not handlers:
+                        logger.debug(f"EventBus: {event.type} 無訂閱者")
+                        if replay:
+                            self._completed[event.id] = None
+                        continue
+                    deliveries.append((
+                        _Delivery(event, internal, len(handlers), enqueued_at),
+                        handlers,
+                        replay,
+                    ))
+
+                # 只持久化有訂閱者的新事件（重放事件已在表中）
+                new_events = [d.event for d, _, replay in deliveries if not replay]
+                if self._outbox is not None and new_events:
+                    try:
+                        await self._outbox.persist(new_events)
+                    except Exception as exc:
+                        logger.error(f"EventBus: outbox 寫入失敗（事件仍派發）: {exc}")
+
+                for delivery, handlers, _ in deliveries:
+                    logger.info(f"EventBus: {delivery.event.type} -> {len(handlers)} handler(s)")
+                    for handler in handlers:
+                        # handler 隊列滿時在此等待 → 背壓傳回主隊列
+                        await self._get_worker(handler).queue.put(delivery)
+                    self._stats["dispatched"] += 1
+            except Exception as exc:
+                logger.error(f"EventBus: 分派失敗: {exc}", exc_info=True)
+            finally:
+                for _ in items:
+                    self._queue.task_done()
+
+    async def _handler_loop(self, worker: _HandlerWorker) -> None:
+        """handler worker：串行消費自己的隊列（同一 handler 開 N 個即 N 並發）"""
+        while True:
+            delivery: _Delivery = await worker.queue.get()
+            worker.in_flight += 1
+            try:
+                await worker.handler(delivery.event)
+                worker.processed += 1
+            except Exception as exc:
+                worker.failed += 1
+                delivery.errors.append(f"{worker.handler.__qualname__}: {str(exc)[:200]}")
+                try:
+                    await self._on_handler_error(worker.handler, delivery.event, exc, delivery.internal)
+                except Exception:
+                    logger.exception("EventBus: error 事件發射失敗")
+            finally:
+                worker.in_flight -= 1
+                worker.queue.task_done()
+                delivery.pending -= 1
+                if delivery.pending == 0:
+                    self._complete(delivery)
+
+    def _complete(self, delivery: _Delivery) -> None:
+        self._stats["completed"] += 1
+        self._stats["latency_ms_total"] += (time.monotonic() - delivery.enqueued_at) * 1000
+        if self._outbox is not None:
+            self._completed[delivery.event.id] = "; ".join(delivery.errors) or None
+
+    async def _flush_completed(self) -> None:
+        """把已完成事件批量回寫 outbox"""
+        if self._outbox is None or not self._completed:
+            return
+        results, self._completed = self._completed, {}
+        try:
+            await self._outbox.mark_processed(results)
+        except Exception as exc:
+            # 未能標記的事件會在超時後被重放（at-least-once）
+            logger.error(f"EventBus: outbox 標記失敗 ({len(results)} 個事件): {exc}")
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.FLUSH_INTERVAL_S)
+            await self._flush_completed()
+
+    async def replay_pending(self, stale_after_seconds: float | None = None) -> int:
+        """從 outbox 接手未完成事件並重新入隊，返回重放數"""
+        if self._outbox is None or not self._running:
+            return 0
+        stale = self.REPLAY_STALE_S if stale_after_seconds is None else stale_after_seconds
+        try:
+            events = await self._outbox.claim_stale(stale, limit=self.DISPATCH_BATCH)
+        except Exception as exc:
+            logger.error(f"EventBus: outbox 重放掃描失敗: {exc}")
+            return 0
+        for event in events:
+            self._event_log.append(event)
+            self._enqueue(event, internal=False, replay=True)
+        self._stats["replayed"] += len(events)
+        return len(events)
+
+    async def purge_outbox(self) -> int:
+        """清理 outbox 中保留期外的已完成記錄，返回刪除數"""
+        if self._outbox is None:
+            return 0
+        try:
+            return await self._outbox.purge()
+        except Exception as exc:
+            logger.error(f"EventBus: outbox 清理失敗: {exc}")
+            return 0
+
+    async def _replay_loop(self) -> None:
+        last_purge = float("-inf")
+        while True:
+            await self.replay_pending()
+            if time.monotonic() - last_purge >= self.PURGE_INTERVAL_S:
+                last_purge = time.monotonic()
+                await self.purge_outbox()
+            await asyncio.sleep(self.REPLAY_INTERVAL_S)
 
     # ==================== 查詢 ====================
 
+    def get_metrics(self) -> dict:
+        """派發 / 背壓指標（Dashboard API 用）"""
+        completed = self._stats["completed"]
+        return {
+            "mode": "queued" if self._running else "inline",
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "queue_capacity": self._queue_size,
+            "max_queue_depth": self._stats["max_queue_depth"],
+            "enqueued": self._stats["enqueued"],
+            "dispatched": self._stats["dispatched"],
+            "completed": completed,
+            "replayed": self._stats["replayed"],
+            "spilled": self._stats["spilled"],
+            "dropped": self._stats["dropped"],
+            "avg_latency_ms": round(self._stats["latency_ms_total"] / completed, 2) if completed else 0.0,
+            "handlers": {
+                worker.handler.__qualname__: {
+                    "queue_depth": worker.queue.qsize(),
+                    "in_flight": worker.in_flight,
+                    "processed": worker.processed,
+                    "failed": worker.failed,
+                }
+                for worker in self._workers.values()
+            },
+        }
+
     def get_recent_events(self, limit: int = 50) -> list[dict]:
         """獲取最近事件（Dashboard API 用）"""
         from itertools import islice
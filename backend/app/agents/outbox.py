@@ -0,0 +1,171 @@
+# =============================================
+# 事件 Outbox（EventBus 持久化層）
+# =============================================
+# 用途：異步派發模式下把事件寫入 event_outbox 表，處理完成後標記 done，
+#       進程崩潰 / 重啟後由 EventBus 定期掃描並重放仍為 pending 的事件；
+#       保留期外的 done / failed 記錄由同一掃描定期清理
+# 設計：批量寫入、批量標記；所有方法失敗只記錄日誌，不影響派發本身
+# =============================================
+
+import json
+import logging
+from datetime import timedelta
+from typing import Callable, Iterable
+
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.agents.events import Event
+from app.config import get_settings
+from app.models.database import async_session_maker, utcnow
+from app.models.system import EventOutbox as EventOutboxRow
+
+logger = logging.getLogger(__name__)
+
+
+def _jsonable(payload: dict) -> dict:
+    """事件 payload 可能含 Decimal / UUID / datetime，統一轉成 JSON 安全的結構"""
+    return json.loads(json.dumps(payload, default=str, ensure_ascii=False))
+
+
+class EventOutbox:
+    """
+    event_outbox 表的讀寫封裝
+
+    狀態流轉：
+    - persist()        → pending（claimed_at = 現在，表示本進程正在派發）
+    - persist(claimed=False) → pending（claimed_at 為空，等下一次 claim_stale 接手）
+    - mark_processed() → done / failed
+    - claim_stale()    → 接手超時未完成的 pending 事件（attempts + 1）
+    - purge()          → 刪除保留期外的 done / failed 記錄
+    """
+
+    # 超過此次數仍未成功的事件標記為 failed（死信），不再重放
+    MAX_ATTEMPTS = 5
+
+    def __init__(
+        self,
+        session_factory: Callable[[], AsyncSession] = async_session_maker,
+    ) -> None:
+        self._session_factory = session_factory
+
+    async def persist(self, events: Iterable[Event], *, claimed: bool = True) -> int:
+        """批量寫入新事件（單條 INSERT），返回寫入數"""
+        now = utcnow()
+        rows = [
+            {
+                "id": event.id,
+                "event_type": event.type,
+                "payload": _jsonable(event.payload),
+                "source": event.source or None,
+                "status": "pending",
+                "attempts": 1,
+                "created_at": event.timestamp,
+                "claimed_at": now if claimed else None,
+            }
+            for event in events
+        ]
+        if not rows:
+            return 0
+
+        async with self._session_factory() as session:
+            await session.execute(insert(EventOutboxRow), rows)
+            await session.commit()
+        return len(rows)
+
+    async def mark_processed(self, results: dict[str, str | None]) -> None:
+        """
+        批量標記處理結果
+
+        Args:
+            results: {event_id: None（成功）或錯誤摘要（有 handler 失敗）}
+        """
+        if not results:
+            return
+
+        now = utcnow()
+        done_ids = [eid for eid, error in results.items() if error is None]
+        failed = {eid: error for eid, error in results.items() if error is not None}
+
+        async with self._session_factory() as session:
+            if done_ids:
+                await session.execute(
+                    update(EventOutboxRow)
+                    .where(EventOutboxRow.id.in_(done_ids))
+                    .values(status="done", processed_at=now, last_error=None)
+                )
+            # handler 已在派發時 fail-silent 處理過，這裡只記錄，不重試
+            for event_id, error in failed.items():
+                await session.execute(
+                    update(EventOutboxRow)
+                    .where(EventOutboxRow.id == event_id)
+                    .values(status="failed", processed_at=now, last_error=error[:500])
+                )
+            await session.commit()
+
+    async def claim_stale(
+        self,
+        stale_after_seconds: float,
+        limit: int = 100,
+    ) -> list[Event]:
+        """
+        接手超時未完成的 pending 事件
+
+        claimed_at 為空（溢出寫入）或早於 stale_after_seconds 之前（派發進程已崩潰）
+        的事件會被重新認領；Postgres 上用 FOR UPDATE SKIP LOCKED 避免多 worker 重複認領。
+        """
+        now = utcnow()
+        cutoff = now - timedelta(seconds=stale_after_seconds)
+
+        async with self._session_factory() as session:
+            result = await session.execute(
+                select(EventOutboxRow)
+                .where(
+                    EventOutboxRow.status == "pending",
+                    (EventOutboxRow.claimed_at.is_(None))
+                    | (EventOutboxRow.claimed_at < cutoff),
+                )
+                .order_by(EventOutboxRow.created_at)
+                .limit(limit)
+                .with_for_update(skip_locked=True)
+            )
+            rows = list(result.scalars().all())
+
+            events: list[Event] = []
+            for row in rows:
+                if row.attempts >= self.MAX_ATTEMPTS:
+                    row.status = "failed"
+                    row.processed_at = now
+                    row.last_error = f"超過最大重放次數 ({self.MAX_ATTEMPTS})"
+                    continue
+                row.attempts += 1
+                row.claimed_at = now
+                events.append(Event(
+                    type=row.event_type,
+                    payload=row.payload or {},
+                    source=row.source or "",
+                    id=row.id,
+                    timestamp=row.created_at,
+                ))
+
+            await session.commit()
+
+        if events:
+            logger.info(f"EventOutbox: 接手 {len(events)} 個未完成事件")
+        return events
+
+    async def purge(self) -> int:
+        """清理保留期外（按 created_at）的已完成 / 死信記錄，返回刪除數"""
+        cutoff = utcnow() - timedelta(days=get_settings().event_bus_outbox_retention_days)
+        async with self._session_factory() as session:
+            result = await session.execute(
+                delete(EventOutboxRow).where(
+                    EventOutboxRow.status.in_(["done", "failed"]),
+                    EventOutboxRow.created_at < cutoff,
+                )
+            )
+            await session.commit()
+
+        if result.rowcount:
+            logger.info(f"EventOutbox: 清理 {result.rowcount} 條過期記錄")
+        return result.rowcount
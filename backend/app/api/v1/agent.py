@@ -5,6 +5,7 @@
 
 from typing import Optional, List, Dict, Any
 from fastapi import APIRouter, Depends, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel, Field
 import json
@@ -166,6 +167,75 @@ async def clarify(
     )
 
 
+# =============================================
+# SSE 串流（報告逐段推送）
+# =============================================
+
+def _sse(event: str, data: dict) -> str:
+    """格式化 SSE 事件"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def _agent_event_stream(db: AsyncSession, responses) -> StreamingResponse:
+    """
+    逐個推送 Agent 響應：thinking / report_section / report_delta，最後一個事件為最終響應；
+    處理失敗時推送 stream_error（對應 REST 版的 500 detail）
+
+    依賴注入的 session 在響應開始前已退出依賴，串流結束時在這裡關閉
+    """
+    async def event_stream():
+        try:
+            async for response in responses:
+                yield _sse(response.type.value, response.to_dict())
+        except Exception as e:
+            import logging
+            logging.error(f"Chat stream error: {e}")
+            yield _sse("stream_error", {"detail": f"聊天處理錯誤: {str(e)}"})
+        finally:
+            await db.close()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "X-Accel-Buffering": "no",
+        },
+    )
+
+
+@router.post("/chat/stream")
+async def chat_stream(
+    message: ChatMessage,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    發送聊天訊息（SSE 串流版）
+
+    事件名即響應類型；報告的各段落（report_section）完成即推送，
+    AI 洞察逐段以 report_delta 推送，最後是完整的 report 事件
+    """
+    agent = await get_agent_service(db)
+    return _agent_event_stream(db, agent.process_message(
+        message=message.content,
+        conversation_id=message.conversation_id
+    ))
+
+
+@router.post("/clarify/stream")
+async def clarify_stream(
+    response: ClarificationResponse,
+    db: AsyncSession = Depends(get_db)
+):
+    """處理澄清問題的回應（SSE 串流版，事件同 /chat/stream）"""
+    agent = await get_agent_service(db)
+    return _agent_event_stream(db, agent.handle_clarification(
+        conversation_id=response.conversation_id,
+        selections=response.selections
+    ))
+
+
 @router.get("/conversations")
 async def get_conversations(
     limit: int = 50,
@@ -12,6 +12,7 @@ from pydantic import BaseModel
 from app.models.database import get_db
 from app.models.competitor import PriceAlert, CompetitorProduct, Competitor
 from app.schemas.competitor import PriceAlertResponse, PriceAlertListResponse
+from app.services.dashboard_counters import apply_counter_deltas
 
 router = APIRouter()
 
@@ -159,12 +160,19 @@ async def batch_mark_read(
     db: AsyncSession = Depends(get_db),
 ):
     """批量標記為已讀"""
+    # 先鎖住其中的未讀警報，計數器增量與實際變化一致；返回值仍為命中的警報數
+    unread = (await db.execute(
+        select(PriceAlert.id)
+        .where(PriceAlert.id.in_(request.ids), PriceAlert.is_read == False)
+        .with_for_update()
+    )).scalars().all()
     stmt = (
         update(PriceAlert)
         .where(PriceAlert.id.in_(request.ids))
         .values(is_read=True)
     )
     result = await db.execute(stmt)
+    await apply_counter_deltas(db, unread_alerts=-len(unread))
 
     return {"updated": result.rowcount}
 
@@ -180,5 +188,6 @@ async def mark_all_read(
         .values(is_read=True)
     )
     result = await db.execute(stmt)
+    await apply_counter_deltas(db, unread_alerts=-result.rowcount)
 
     return {"updated": result.rowcount}
@@ -58,6 +58,47 @@ async def update_catalog(
     return {"status": "ok", "result": result}
 
 
+# =============================================
+# 惠康分類爬取（後台任務）
+# =============================================
+
+@router.post("/wellcome/crawl")
+async def start_wellcome_crawl(
+    category_main: str = Query("", description="GoGoJap 大分類（空 = 全部重點分類）"),
+    category_sub: str = Query("", description="GoGoJap 細分類"),
+    max_pages: int = Query(3, ge=1, le=10, description="每個分類最多翻頁數"),
+):
+    """
+    啟動惠康分類爬取後台任務，立即返回 task_id
+
+    已有爬取任務在跑時返回該任務；用 GET /wellcome/crawl/{task_id} 輪詢進度
+    """
+    from app.services.wellcome_strategy import WellcomeSearchStrategy
+    task_id = await WellcomeSearchStrategy().start_crawl_job(
+        category_main, category_sub, max_pages=max_pages,
+    )
+    return {"task_id": task_id}
+
+
+@router.get("/wellcome/crawl/{task_id}")
+async def wellcome_crawl_progress(
+    task_id: str,
+    db: AsyncSession = Depends(get_db),
+):
+    """查詢惠康分類爬取進度"""
+    task = await db.get(PipelineTaskModel, task_id)
+    if not task or task.platform != "wellcome" or task.current_step != "crawl":
+        raise HTTPException(status_code=404, detail="任務不存在或已過期")
+
+    return {
+        "task_id": task.id,
+        "status": task.status,
+        "progress": task.progress,
+        "result": (task.step_results or {}).get("crawl"),
+        "error": (task.step_errors or {}).get("crawl"),
+    }
+
+
 # =============================================
 # 打標
 # =============================================
@@ -21,6 +21,7 @@ from app.models.category import (
     CategoryAnalysisReport
 )
 from app.utils.unit_price import calculate_unit_price
+from app.services.export_service import ExportColumn, csv_response, stream_partitions, xlsx_response
 from app.services.telegram import get_telegram_notifier
 
 logger = logging.getLogger(__name__)
@@ -1450,78 +1451,102 @@ def _save_section_content(section: str, content: List[str], findings: Dict, reco
 # 數據導出 API
 # =============================================
 
-@router.get("/{category_id}/export/csv")
-async def export_products_csv(
-    category_id: UUID,
-    db: AsyncSession = Depends(get_db)
-):
-    """
-    導出類別商品為 CSV 格式
-
-    返回 CSV 文件下載
-    """
-    from fastapi.responses import StreamingResponse
-    import csv
-    import io
-
-    # 獲取類別
-    category = await db.get(CategoryDatabase, category_id)
-    if not category:
-        raise HTTPException(status_code=404, detail="類別不存在")
+CATEGORY_EXPORT_COLUMNS = [
+    ExportColumn('商品名稱', 50),
+    ExportColumn('SKU', 18),
+    ExportColumn('品牌', 18),
+    ExportColumn('價格', 10),
+    ExportColumn('原價', 10),
+    ExportColumn('折扣%', 8),
+    ExportColumn('單位價格', 10),
+    ExportColumn('單位類型', 12),
+    ExportColumn('庫存狀態', 12),
+    ExportColumn('是否有貨', 10),
+    ExportColumn('評分', 8),
+    ExportColumn('評論數', 8),
+    ExportColumn('商品連結', 50),
+    ExportColumn('首次發現', 18),
+    ExportColumn('最後更新', 18),
+]
+
+
+def _fmt_time(value: Optional[datetime]) -> str:
+    return value.strftime('%Y-%m-%d %H:%M') if value else ''
+
+
+def _excel_row(p) -> list:
+    """Excel：數值列保持數字類型"""
+    def num(value) -> Optional[float]:
+        return float(value) if value else None
 
-    # 獲取所有商品
-    result = await db.execute(
-        select(CategoryProduct)
-        .where(CategoryProduct.category_id == category_id)
-        .order_by(CategoryProduct.unit_price.asc().nulls_last())
-    )
-    products = result.scalars().all()
+    return [
+        p.name,
+        p.sku or '',
+        p.brand or '',
+        num(p.price),
+        num(p.original_price),
+        num(p.discount_percent),
+        num(p.unit_price),
+        p.unit_type or '',
+        p.stock_status or '',
+        '是' if p.is_available else '否',
+        num(p.rating),
+        p.review_count or 0,
+        p.url,
+        _fmt_time(p.first_seen_at),
+        _fmt_time(p.last_updated_at),
+    ]
 
-    # 創建 CSV
-    output = io.StringIO()
-    writer = csv.writer(output, quoting=csv.QUOTE_MINIMAL)
 
-    # 表頭
-    writer.writerow([
-        '商品名稱', 'SKU', '品牌', '價格', '原價', '折扣%',
-        '單位價格', '單位類型', '庫存狀態', '是否有貨',
-        '評分', '評論數', '商品連結', '首次發現', '最後更新'
-    ])
+def _csv_row(p) -> list:
+    """CSV：數值原樣輸出（保留小數位），空值留空"""
+    def text(value) -> str:
+        return str(value) if value else ''
 
-    # 數據行
-    for p in products:
-        writer.writerow([
-            p.name,
-            p.sku or '',
-            p.brand or '',
-            str(p.price) if p.price else '',
-            str(p.original_price) if p.original_price else '',
-            str(p.discount_percent) if p.discount_percent else '',
-            str(p.unit_price) if p.unit_price else '',
-            p.unit_type or '',
-            p.stock_status or '',
-            '是' if p.is_available else '否',
-            str(p.rating) if p.rating else '',
-            str(p.review_count) if p.review_count else '',
-            p.url,
-            p.first_seen_at.strftime('%Y-%m-%d %H:%M') if p.first_seen_at else '',
-            p.last_updated_at.strftime('%Y-%m-%d %H:%M') if p.last_updated_at else '',
-        ])
-
-    output.seek(0)
-    filename = f"{category.name}_products_{datetime.now().strftime('%Y%m%d')}.csv"
+    return [
+        p.name,
+        p.sku or '',
+        p.brand or '',
+        text(p.price),
+        text(p.original_price),
+        text(p.discount_percent),
+        text(p.unit_price),
+        p.unit_type or '',
+        p.stock_status or '',
+        '是' if p.is_available else '否',
+        text(p.rating),
+        text(p.review_count),
+        p.url,
+        _fmt_time(p.first_seen_at),
+        _fmt_time(p.last_updated_at),
+    ]
 
-    # 添加 BOM 以支持 Excel 中文顯示
-    bom = '\ufeff'
-    content = bom + output.getvalue()
 
-    return StreamingResponse(
-        iter([content.encode('utf-8')]),
-        media_type="text/csv; charset=utf-8",
-        headers={
-            "Content-Disposition": f"attachment; filename*=UTF-8''{filename}"
-        }
+async def _category_export_rows(category_id: UUID, to_row):
+    """服務端游標分片讀取類別商品（只取導出需要的列）"""
+    stmt = (
+        select(
+            CategoryProduct.name,
+            CategoryProduct.sku,
+            CategoryProduct.brand,
+            CategoryProduct.price,
+            CategoryProduct.original_price,
+            CategoryProduct.discount_percent,
+            CategoryProduct.unit_price,
+            CategoryProduct.unit_type,
+            CategoryProduct.stock_status,
+            CategoryProduct.is_available,
+            CategoryProduct.rating,
+            CategoryProduct.review_count,
+            CategoryProduct.url,
+            CategoryProduct.first_seen_at,
+            CategoryProduct.last_updated_at,
+        )
+        .where(CategoryProduct.category_id == category_id)
+        .order_by(CategoryProduct.unit_price.asc().nulls_last(), CategoryProduct.id)
     )
+    async for chunk in stream_partitions(stmt):
+        yield [to_row(p) for p in chunk]
 
 
 @router.get("/{category_id}/export/excel")
@@ -1532,72 +1557,38 @@ async def export_products_excel(
     """
     導出類別商品為 Excel 格式
 
-    返回 Excel 文件下載
+    返回 Excel 文件下載（服務端游標 + openpyxl write-only 流式寫出，內存與商品數無關）
     """
-    from fastapi.responses import StreamingResponse
-    import pandas as pd
-    import io
-
     # 獲取類別
     category = await db.get(CategoryDatabase, category_id)
     if not category:
         raise HTTPException(status_code=404, detail="類別不存在")
 
-    # 獲取所有商品
-    result = await db.execute(
-        select(CategoryProduct)
-        .where(CategoryProduct.category_id == category_id)
-        .order_by(CategoryProduct.unit_price.asc().nulls_last())
+    filename = f"{category.name}_products_{datetime.now().strftime('%Y%m%d')}.xlsx"
+    return xlsx_response(
+        CATEGORY_EXPORT_COLUMNS,
+        _category_export_rows(category_id, _excel_row),
+        filename,
+        sheet_title='商品列表',
     )
-    products = result.scalars().all()
 
-    # 轉換為 DataFrame
-    data = []
-    for p in products:
-        data.append({
-            '商品名稱': p.name,
-            'SKU': p.sku or '',
-            '品牌': p.brand or '',
-            '價格': float(p.price) if p.price else None,
-            '原價': float(p.original_price) if p.original_price else None,
-            '折扣%': float(p.discount_percent) if p.discount_percent else None,
-            '單位價格': float(p.unit_price) if p.unit_price else None,
-            '單位類型': p.unit_type or '',
-            '庫存狀態': p.stock_status or '',
-            '是否有貨': '是' if p.is_available else '否',
-            '評分': float(p.rating) if p.rating else None,
-            '評論數': p.review_count or 0,
-            '商品連結': p.url,
-            '首次發現': p.first_seen_at.strftime('%Y-%m-%d %H:%M') if p.first_seen_at else '',
-            '最後更新': p.last_updated_at.strftime('%Y-%m-%d %H:%M') if p.last_updated_at else '',
-        })
 
-    df = pd.DataFrame(data)
-
-    # 創建 Excel 文件
-    output = io.BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, sheet_name='商品列表', index=False)
-
-        # 調整列寬
-        worksheet = writer.sheets['商品列表']
-        for idx, col in enumerate(df.columns):
-            max_length = max(
-                df[col].astype(str).map(len).max(),
-                len(col)
-            ) + 2
-            worksheet.column_dimensions[chr(65 + idx)].width = min(max_length, 50)
+@router.get("/{category_id}/export/csv")
+async def export_products_csv(
+    category_id: UUID,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    導出類別商品為 CSV 格式
 
-    output.seek(0)
-    filename = f"{category.name}_products_{datetime.now().strftime('%Y%m%d')}.xlsx"
+    返回 CSV 文件下載（服務端游標分片讀取，逐片寫出）
+    """
+    category = await db.get(CategoryDatabase, category_id)
+    if not category:
+        raise HTTPException(status_code=404, detail="類別不存在")
 
-    return StreamingResponse(
-        output,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={
-            "Content-Disposition": f"attachment; filename*=UTF-8''{filename}"
-        }
-    )
+    filename = f"{category.name}_products_{datetime.now().strftime('%Y%m%d')}.csv"
+    return csv_response(CATEGORY_EXPORT_COLUMNS, _category_export_rows(category_id, _csv_row), filename)
 
 
 @router.get("/{category_id}/products/{product_id}/price-history")
@@ -13,6 +13,8 @@ from sqlalchemy.orm import selectinload
 from app.models.database import get_db
 from app.models.competitor import Competitor, CompetitorProduct, PriceSnapshot, PriceAlert
 from app.connectors.hktv_scraper import HKTVUrlParser
+from app.services.dashboard_counters import apply_counter_deltas
+from app.services.export_service import ExportColumn, csv_response, stream_partitions
 from app.schemas.competitor import (
     CompetitorCreate,
     CompetitorUpdate,
@@ -779,6 +781,7 @@ async def mark_all_alerts_read(
         .values(is_read=True)
     )
     count = result.rowcount
+    await apply_counter_deltas(db, unread_alerts=-count)
     await db.flush()
     return {"message": f"已標記 {count} 條警報為已讀", "count": count}
 
@@ -1309,60 +1312,72 @@ async def get_product_price_history(
 # ═══════════════════════════════════════════════
 # Feature 5: Export CSV
 # ═══════════════════════════════════════════════
-@comparison_router.get("/export")
-async def export_comparison(db: AsyncSession = Depends(get_db)):
-    import csv, io
-    from fastapi.responses import StreamingResponse
-    from sqlalchemy import func as sqlfunc
+COMPARISON_EXPORT_COLUMNS = [
+    ExportColumn(h) for h in
+    ["分類", "商品名", "我哋售價", "最平競品", "最平競品價", "價差%", "排名", "競品總數", "比我平嘅數", "有貨數"]
+]
 
-    our_result = await db.execute(select(Product).where(Product.status == "active").order_by(Product.category_tag, Product.name))
-    our_products = our_result.scalars().all()
-    product_ids = [p.id for p in our_products]
-    if not product_ids:
-        return StreamingResponse(iter([""]), media_type="text/csv")
 
-    comp_stmt = (
-        select(CompetitorProduct, Competitor.name.label("comp_name"), ProductCompetitorMapping.product_id.label("our_product_id"))
-        .join(ProductCompetitorMapping, ProductCompetitorMapping.competitor_product_id == CompetitorProduct.id)
-        .join(Competitor, CompetitorProduct.competitor_id == Competitor.id)
-        .where(ProductCompetitorMapping.product_id.in_(product_ids), CompetitorProduct.is_active == True)
-    )
-    comp_rows = (await db.execute(comp_stmt)).all()
-    all_cp_ids = [r.CompetitorProduct.id for r in comp_rows]
-
-    latest_prices = {}
-    if all_cp_ids:
-        lsq = select(PriceSnapshot.competitor_product_id, sqlfunc.max(PriceSnapshot.scraped_at).label("max_at")).where(PriceSnapshot.competitor_product_id.in_(all_cp_ids)).group_by(PriceSnapshot.competitor_product_id).subquery()
-        pr = await db.execute(select(PriceSnapshot).join(lsq, (PriceSnapshot.competitor_product_id == lsq.c.competitor_product_id) & (PriceSnapshot.scraped_at == lsq.c.max_at)))
-        latest_prices = {ps.competitor_product_id: ps for ps in pr.scalars().all()}
+async def _comparison_export_rows():
+    """
+    自家商品用服務端游標分片讀取；每個分片只查該片商品的競品和最新價
 
+    查詢用第二個 session：游標所在連接在讀完前不執行其他語句
+    """
     from collections import defaultdict
-    pcmap = defaultdict(list)
-    for row in comp_rows:
-        pcmap[row.our_product_id].append(row)
+    from app.models.database import async_session_maker
+
+    stmt = (
+        select(Product)
+        .where(Product.status == "active")
+        .order_by(Product.category_tag, Product.name, Product.id)
+    )
+    async with async_session_maker() as lookup:
+        async for products in stream_partitions(stmt, scalars=True):
+            comp_rows = (await lookup.execute(
+                select(CompetitorProduct.id, Competitor.name.label("comp_name"), ProductCompetitorMapping.product_id.label("our_product_id"))
+                .join(ProductCompetitorMapping, ProductCompetitorMapping.competitor_product_id == CompetitorProduct.id)
+                .join(Competitor, CompetitorProduct.competitor_id == Competitor.id)
+                .where(ProductCompetitorMapping.product_id.in_([p.id for p in products]), CompetitorProduct.is_active == True)
+            )).all()
+
+            latest_prices = {}
+            cp_ids = [r.id for r in comp_rows]
+            if cp_ids:
+                lsq = select(PriceSnapshot.competitor_product_id, func.max(PriceSnapshot.scraped_at).label("max_at")).where(PriceSnapshot.competitor_product_id.in_(cp_ids)).group_by(PriceSnapshot.competitor_product_id).subquery()
+                pr = await lookup.execute(
+                    select(PriceSnapshot.competitor_product_id, PriceSnapshot.price, PriceSnapshot.stock_status)
+                    .join(lsq, (PriceSnapshot.competitor_product_id == lsq.c.competitor_product_id) & (PriceSnapshot.scraped_at == lsq.c.max_at))
+                )
+                latest_prices = {ps.competitor_product_id: ps for ps in pr.all()}
+
+            pcmap = defaultdict(list)
+            for row in comp_rows:
+                pcmap[row.our_product_id].append(row)
+
+            out = []
+            for product in products:
+                comps = []
+                for row in pcmap.get(product.id, []):
+                    latest = latest_prices.get(row.id)
+                    if latest and latest.price:
+                        comps.append({"name": row.comp_name, "price": float(latest.price), "stock": latest.stock_status})
+                comps.sort(key=lambda x: x["price"])
+                our_price = float(product.price) if product.price else None
+                cheapest = comps[0] if comps else None
+                cheapest_price = cheapest["price"] if cheapest else None
+                diff_pct = round((our_price - cheapest_price) / our_price * 100, 1) if our_price and cheapest_price else None
+                rank = sum(1 for c in comps if c["price"] < (our_price or 99999)) + 1 if our_price else None
+                out.append([product.category_tag or "", product.name.replace("GOGOJAP-", ""), f"${our_price:.0f}" if our_price else "", cheapest["name"] if cheapest else "", f"${cheapest_price:.0f}" if cheapest_price else "", f"{diff_pct:+.1f}%" if diff_pct is not None else "", f"{rank}/{len(comps)}" if rank else "", len(comps), sum(1 for c in comps if c["price"] < (our_price or 99999)), sum(1 for c in comps if c.get("stock") == "in_stock")])
+            yield out
 
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(["分類", "商品名", "我哋售價", "最平競品", "最平競品價", "價差%", "排名", "競品總數", "比我平嘅數", "有貨數"])
-    for product in our_products:
-        rows = pcmap.get(product.id, [])
-        comps = []
-        for row in rows:
-            latest = latest_prices.get(row.CompetitorProduct.id)
-            if latest and latest.price:
-                comps.append({"name": row.comp_name, "price": float(latest.price), "stock": latest.stock_status})
-        comps.sort(key=lambda x: x["price"])
-        our_price = float(product.price) if product.price else None
-        cheapest = comps[0] if comps else None
-        cheapest_price = cheapest["price"] if cheapest else None
-        diff_pct = round((our_price - cheapest_price) / our_price * 100, 1) if our_price and cheapest_price else None
-        rank = sum(1 for c in comps if c["price"] < (our_price or 99999)) + 1 if our_price else None
-        writer.writerow([product.category_tag or "", product.name.replace("GOGOJAP-", ""), f"${our_price:.0f}" if our_price else "", cheapest["name"] if cheapest else "", f"${cheapest_price:.0f}" if cheapest_price else "", f"{diff_pct:+.1f}%" if diff_pct is not None else "", f"{rank}/{len(comps)}" if rank else "", len(comps), sum(1 for c in comps if c["price"] < (our_price or 99999)), sum(1 for c in comps if c.get("stock") == "in_stock")])
 
-    output.seek(0)
+@comparison_router.get("/export")
+async def export_comparison():
     from datetime import datetime as dt
+
     fname = f"gogojap_competitors_{dt.now().strftime('%Y%m%d_%H%M')}.csv"
-    return StreamingResponse(iter(["\ufeff" + output.read()]), media_type="text/csv; charset=utf-8", headers={"Content-Disposition": f'attachment; filename="{fname}"'})
+    return csv_response(COMPARISON_EXPORT_COLUMNS, _comparison_export_rows(), fname)
 
 
 # ═══════════════════════════════════════════════
@@ -5,6 +5,7 @@ from typing import List
 
 from app.models.database import get_db
 from app.models.finance import Settlement, SettlementItem
+from app.services.dashboard_counters import apply_counter_deltas, counter_columns, removed_row_deltas
 from app.services.finance_service import FinanceService
 from app.schemas.finance import SettlementResponse, ProfitSummary
 
@@ -40,7 +41,9 @@ async def cleanup_finance_data(
         }
 
     await db.execute(delete(SettlementItem))
-    await db.execute(delete(Settlement))
+    # 批量 DELETE 繞過 flush 鉤子：按 RETURNING 的行扣減本月結算計數
+    result = await db.execute(delete(Settlement).returning(*counter_columns(Settlement)))
+    await apply_counter_deltas(db, **removed_row_deltas(Settlement, result.mappings()))
     await db.commit()
 
     return {"message": "所有結算資料已清除"}
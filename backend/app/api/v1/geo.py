@@ -2,6 +2,7 @@
 # GEO 結構化數據 API
 # =============================================
 
+import asyncio
 from typing import Optional, List
 from uuid import UUID
 from datetime import datetime
@@ -18,11 +19,15 @@ from app.schemas.seo import (
     BatchSchemaRequest,
     AISummaryRequest,
     SchemaValidationRequest,
+    GEOPackageRequest,
+    GEOPackageBatchRequest,
     # GEO 響應
     StructuredDataResponse,
     BatchSchemaResponse,
     SchemaValidationResponse,
     AISummaryResponse,
+    GEOPackageResponse,
+    GEOPackageBatchResponse,
     # 品牌知識
     BrandKnowledgeCreate,
     BrandKnowledgeUpdate,
@@ -31,10 +36,15 @@ from app.schemas.seo import (
     ExpertContentRequest,
 )
 from app.services.geo_service import GEOService
+from app.services.geo_package_service import BatchAlreadyRunning, GEOBatchProgress, GEOPackageService
+from app.tasks.content_tasks import generate_geo_packages_async
 
 
 router = APIRouter()
 
+# 後台批量任務引用（防止任務被垃圾回收）
+_package_batch_tasks: set = set()
+
 
 # =============================================
 # Schema.org 結構化數據生成
@@ -198,6 +208,91 @@ async def batch_generate_schemas(
     )
 
 
+# =============================================
+# GEO/SEO 打包生成
+# =============================================
+
+@router.post("/package", response_model=GEOPackageResponse)
+async def generate_geo_package(
+    request: GEOPackageRequest,
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    打包生成產品的全部 GEO/SEO 產物
+
+    一次 AI 調用生成 SEO 關鍵詞、Meta 內容、AI 摘要和 FAQ，
+    逐部分校驗，只重試不合格的部分。
+    """
+    service = await GEOPackageService.create(db)
+    result = await service.generate_package(request.product_id, max_faqs=request.max_faqs)
+
+    if result.error:
+        raise HTTPException(status_code=404, detail=result.error)
+
+    await db.commit()
+
+    return GEOPackageResponse(
+        product_id=request.product_id,
+        success=result.success,
+        parts=result.parts,
+        failed_parts=result.failed_parts,
+        ai_calls=result.ai_calls,
+        seo_content_id=result.seo_content_id,
+        product_schema_id=result.product_schema_id,
+        faq_schema_id=result.faq_schema_id,
+    )
+
+
+@router.post("/package/batch", response_model=GEOPackageBatchResponse)
+async def start_geo_package_batch(
+    request: GEOPackageBatchRequest,
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    啟動全目錄打包生成（後台執行）
+
+    傳入已有的 batch_id 會從上次中斷的位置續傳；批次仍在執行時返回 409。
+    """
+    try:
+        progress = await GEOPackageService(db, ai_service=None).claim_batch(
+            request.batch_id, request.product_ids
+        )
+    except BatchAlreadyRunning:
+        raise HTTPException(status_code=409, detail="批次正在執行中")
+
+    if progress.status != "completed":
+        task = asyncio.create_task(generate_geo_packages_async(
+            batch_id=progress.batch_id,
+            concurrency=request.concurrency,
+            max_faqs=request.max_faqs,
+            claimed=True,
+        ))
+        _package_batch_tasks.add(task)
+        task.add_done_callback(_package_batch_tasks.discard)
+
+    return _batch_response(progress)
+
+
+@router.get("/package/batch/{batch_id}", response_model=GEOPackageBatchResponse)
+async def get_geo_package_batch(
+    batch_id: str,
+    db: AsyncSession = Depends(get_db),
+):
+    """獲取全目錄打包生成進度"""
+    progress = await GEOPackageService(db, ai_service=None).load_progress(batch_id)
+    if not progress:
+        raise HTTPException(status_code=404, detail="批次不存在")
+
+    return _batch_response(progress)
+
+
+def _batch_response(progress: GEOBatchProgress) -> GEOPackageBatchResponse:
+    return GEOPackageBatchResponse(**{
+        key: value for key, value in progress.to_dict().items()
+        if key in GEOPackageBatchResponse.model_fields
+    })
+
+
 # =============================================
 # AI 搜索引擎優化
 # =============================================
@@ -5,8 +5,8 @@
 import logging
 import uuid
 from pathlib import Path
-from typing import List
-from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, status
+from typing import List, Optional
+from fastapi import APIRouter, Depends, Header, UploadFile, File, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
@@ -29,6 +29,7 @@ from app.models.user import User
 from app.api.deps import get_current_user
 from app.config import get_settings
 from app.tasks.image_generation_tasks import process_image_generation_async
+from app.services.download_proxy import stream_object
 from app.services.storage_service import get_storage
 from sqlalchemy import select, func
 
@@ -548,57 +549,29 @@ async def get_presigned_url(
 @router.get("/download")
 async def download_file(
     file_url: str,
+    range_header: Optional[str] = Header(default=None, alias="Range"),
+    if_none_match: Optional[str] = Header(default=None, alias="If-None-Match"),
     current_user: User = Depends(get_current_user)
 ):
     """
     通過後端代理下載 R2 文件（繞過 CORS）
 
+    按塊流式轉發，支持 Range（206）與 If-None-Match（304）
+
     Args:
         file_url: R2 文件的公開 URL 或相對路徑
 
     Returns:
         文件流響應
     """
-    from fastapi.responses import StreamingResponse
-    import io
-
     storage = get_storage()
+    r2_key = storage.key_from_url(file_url)
+    logger.info(f"Downloading file from R2: {r2_key}")
 
     try:
-        # 從 URL 提取 R2 Key
-        r2_key = file_url
-        if file_url.startswith('http'):
-            if storage.public_url_base in file_url:
-                r2_key = file_url.replace(f"{storage.public_url_base}/", "")
-            else:
-                from urllib.parse import urlparse
-                parsed = urlparse(file_url)
-                r2_key = parsed.path.lstrip('/')
-
-        logger.info(f"Downloading file from R2: {r2_key}")
-
-        # 從 R2 獲取文件
-        response = storage.s3_client.get_object(
-            Bucket=storage.bucket,
-            Key=r2_key
-        )
-
-        # 獲取文件名
-        file_name = r2_key.split('/')[-1]
-
-        # 獲取 Content-Type
-        content_type = response.get('ContentType', 'application/octet-stream')
-
-        # 返回流式響應
-        return StreamingResponse(
-            io.BytesIO(response['Body'].read()),
-            media_type=content_type,
-            headers={
-                "Content-Disposition": f'attachment; filename="{file_name}"',
-                "Access-Control-Expose-Headers": "Content-Disposition"
-            }
-        )
-
+        return await stream_object(storage, r2_key, range_header, if_none_match)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Failed to download file: {e}")
         raise HTTPException(
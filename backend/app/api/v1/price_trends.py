@@ -6,16 +6,20 @@ from datetime import date, datetime, timedelta
 from decimal import Decimal
 from typing import Optional, List, Dict
 from uuid import UUID
-import statistics
 
+import numpy as np
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy import select, func, and_
+from sqlalchemy import select, func, tuple_
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
 
+from app.config import get_settings
+from app.core.exceptions import ValidationError
+from app.core.pagination import count_rows, decode_cursor, encode_cursor
 from app.models.database import get_db
+from app.utils.downsample import lttb_indices
 from app.models.product import Product, ProductCompetitorMapping, OwnPriceSnapshot
 from app.models.competitor import CompetitorProduct, PriceSnapshot, Competitor
+from app.services.product_search import normalize_search, search_condition, search_rank
 from app.schemas.price_trends import (
     ProductListItem,
     ProductListResponse,
@@ -41,70 +45,61 @@ def determine_interval(start_date: date, end_date: date) -> TimeInterval:
         return TimeInterval.WEEK
 
 
+def _valid_prices(points: List[PriceDataPoint]) -> np.ndarray:
+    return np.fromiter((float(p.price) for p in points if p.price is not None), dtype=np.float64)
+
+
+def _pct_change(first: float, last: float) -> Optional[float]:
+    return round((last - first) / first * 100, 1) if first > 0 else None
+
+
 def calculate_summary(
     own_prices: List[PriceDataPoint],
     competitor_prices: Dict[str, List[PriceDataPoint]]
 ) -> TrendSummary:
-    """計算趨勢摘要統計"""
+    """計算趨勢摘要統計（NumPy 向量化）"""
 
     # 獲取有效價格
-    own_valid_prices = [p.price for p in own_prices if p.price is not None]
+    own = _valid_prices(own_prices)
+    series = [arr for arr in map(_valid_prices, competitor_prices.values()) if arr.size]
+    all_competitor = np.concatenate(series) if series else np.empty(0)
 
-    # 所有競爭對手的有效價格
-    all_competitor_prices = []
-    for prices in competitor_prices.values():
-        all_competitor_prices.extend([p.price for p in prices if p.price is not None])
-
-    # 當前價差（使用最新價格）
+    # 當前價差（自家最新價 vs 各競爭對手最新價的平均）
     price_gap_current = None
-    if own_valid_prices and all_competitor_prices:
-        own_latest = float(own_valid_prices[-1])
-        competitor_avg_latest = float(sum(all_competitor_prices[-len(competitor_prices):]) / len(competitor_prices)) if competitor_prices else 0
+    if own.size and series:
+        competitor_avg_latest = float(np.mean([s[-1] for s in series]))
         if competitor_avg_latest > 0:
-            price_gap_current = round((own_latest - competitor_avg_latest) / competitor_avg_latest * 100, 1)
+            price_gap_current = round((own[-1] - competitor_avg_latest) / competitor_avg_latest * 100, 1)
 
     # 平均價差
     price_gap_avg = None
-    if own_valid_prices and all_competitor_prices:
-        own_avg = sum(float(p) for p in own_valid_prices) / len(own_valid_prices)
-        comp_avg = sum(float(p) for p in all_competitor_prices) / len(all_competitor_prices)
+    if own.size and all_competitor.size:
+        comp_avg = float(all_competitor.mean())
         if comp_avg > 0:
-            price_gap_avg = round((own_avg - comp_avg) / comp_avg * 100, 1)
+            price_gap_avg = round((float(own.mean()) - comp_avg) / comp_avg * 100, 1)
 
     # 競爭對手最低價
     lowest_competitor_price = None
-    if all_competitor_prices:
-        lowest_competitor_price = min(all_competitor_prices)
+    if all_competitor.size:
+        lowest_competitor_price = Decimal(f"{all_competitor.min():.2f}")
 
-    # 價格波動率（自家產品）
+    # 價格波動率（自家產品，樣本標準差）
     volatility = None
-    if len(own_valid_prices) > 1:
-        mean_price = sum(float(p) for p in own_valid_prices) / len(own_valid_prices)
+    if own.size > 1:
+        mean_price = float(own.mean())
         if mean_price > 0:
-            std_dev = statistics.stdev(float(p) for p in own_valid_prices)
-            volatility = round(std_dev / mean_price * 100, 1)
+            volatility = round(float(own.std(ddof=1)) / mean_price * 100, 1)
 
     # 自家價格變化
-    own_price_change = None
-    if len(own_valid_prices) >= 2:
-        first_price = float(own_valid_prices[0])
-        last_price = float(own_valid_prices[-1])
-        if first_price > 0:
-            own_price_change = round((last_price - first_price) / first_price * 100, 1)
+    own_price_change = _pct_change(float(own[0]), float(own[-1])) if own.size >= 2 else None
 
     # 競爭對手平均價格變化
     competitor_avg_change = None
-    if competitor_prices:
-        changes = []
-        for prices in competitor_prices.values():
-            valid = [p.price for p in prices if p.price is not None]
-            if len(valid) >= 2:
-                first = float(valid[0])
-                last = float(valid[-1])
-                if first > 0:
-                    changes.append((last - first) / first * 100)
-        if changes:
-            competitor_avg_change = round(sum(changes) / len(changes), 1)
+    multi = [s for s in series if s.size >= 2 and s[0] > 0]
+    if multi:
+        firsts = np.array([s[0] for s in multi])
+        lasts = np.array([s[-1] for s in multi])
+        competitor_avg_change = round(float(((lasts - firsts) / firsts * 100).mean()), 1)
 
     return TrendSummary(
         price_gap_current=price_gap_current,
@@ -116,51 +111,163 @@ def calculate_summary(
     )
 
 
+# =============================================
+# 分桶查詢 + 降採樣
+# =============================================
+
+def bucket_expr(column, interval: TimeInterval, dialect: str):
+    """date_trunc 分桶；SQLite（測試）用 strftime 模擬，週以週一開始"""
+    if dialect == "postgresql":
+        return func.date_trunc(interval.value, column)
+    if interval == TimeInterval.HOUR:
+        return func.strftime("%Y-%m-%d %H:00:00", column)
+    if interval == TimeInterval.DAY:
+        return func.strftime("%Y-%m-%d 00:00:00", column)
+    return func.strftime("%Y-%m-%d 00:00:00", column, "-6 days", "weekday 1")
+
+
+def bucketed_series_query(model, series_col, time_col, conditions, interval: TimeInterval, dialect: str):
+    """
+    多條序列一次分桶：每桶取均價，其餘欄位取桶內最新一筆
+
+    返回列：series_id, bucket, avg_price, last_price, original_price,
+            discount_percent, stock_status, promotion_text
+    """
+    bucket = bucket_expr(time_col, interval, dialect)
+    partition = [series_col, bucket]
+    inner = (
+        select(
+            series_col.label("series_id"),
+            bucket.label("bucket"),
+            func.avg(model.price).over(partition_by=partition).label("avg_price"),
+            model.price.label("last_price"),
+            model.original_price,
+            model.discount_percent,
+            model.stock_status,
+            model.promotion_text,
+            func.row_number().over(partition_by=partition, order_by=time_col.desc()).label("rn"),
+        )
+        .where(*conditions)
+        .subquery()
+    )
+    return (
+        select(inner)
+        .where(inner.c.rn == 1)
+        .order_by(inner.c.series_id, inner.c.bucket)
+    )
+
+
+def _to_point(row) -> PriceDataPoint:
+    bucket = row.bucket
+    if isinstance(bucket, str):
+        bucket = datetime.fromisoformat(bucket)
+    avg_price = None
+    if row.avg_price is not None:
+        avg_price = Decimal(str(row.avg_price)).quantize(Decimal("0.01"))
+    return PriceDataPoint(
+        date=bucket,
+        price=avg_price,
+        original_price=row.original_price,
+        discount_percent=row.discount_percent,
+        stock_status=row.stock_status,
+        promotion_text=row.promotion_text,
+    )
+
+
+def downsample_points(points: List[PriceDataPoint], max_points: int) -> List[PriceDataPoint]:
+    """超出點數預算時用 LTTB 降採樣（只保留有價格的點）"""
+    if len(points) <= max_points:
+        return points
+    valid = [p for p in points if p.price is not None]
+    indices = lttb_indices(
+        [p.date.timestamp() for p in valid],
+        [float(p.price) for p in valid],
+        max_points,
+    )
+    return [valid[i] for i in indices]
+
+
+# 只傳游標未傳 limit 時的每頁數量
+TREND_PRODUCTS_PAGE_SIZE = 200
+
+
 @router.get("/products", response_model=ProductListResponse)
 async def list_products_with_trends(
     db: AsyncSession = Depends(get_db),
-    search: Optional[str] = None,
+    search: Optional[str] = Query(None, max_length=100),
+    limit: Optional[int] = Query(None, ge=1, le=500, description="每頁數量；不傳且無游標時返回全部"),
+    cursor: Optional[str] = Query(None, max_length=300, description="上一頁返回的 next_cursor"),
 ):
     """
     獲取有價格歷史的產品列表（供下拉選單）
 
-    返回有關聯競爭對手的自家產品列表
+    返回有關聯競爭對手的自家產品列表；有搜索詞時按相關度排序。
+    不傳 limit / cursor 時一次返回全部（前端下拉選單不跟隨游標）；傳了才按 keyset 分頁。
     """
-    # 查詢有競爭對手映射的產品
-    query = (
-        select(
-            Product,
-            func.count(ProductCompetitorMapping.id).label("competitor_count")
-        )
-        .outerjoin(ProductCompetitorMapping, Product.id == ProductCompetitorMapping.product_id)
-        .group_by(Product.id)
-        .having(func.count(ProductCompetitorMapping.id) > 0)
-        .order_by(Product.name)
+    has_mapping = (
+        select(ProductCompetitorMapping.id)
+        .where(ProductCompetitorMapping.product_id == Product.id)
+        .exists()
+    )
+    # 半連接過濾，競爭對手數只對當前頁的行計算
+    competitor_count = (
+        select(func.count(ProductCompetitorMapping.id))
+        .where(ProductCompetitorMapping.product_id == Product.id)
+        .scalar_subquery()
     )
 
-    if search:
-        query = query.where(
-            Product.name.ilike(f"%{search}%") | Product.sku.ilike(f"%{search}%")
-        )
-
-    result = await db.execute(query)
-    rows = result.all()
+    # 下拉選單按名稱升序；有搜索詞時先按相關度分桶（降序）
+    query = select(Product).where(has_mapping)
+    term = normalize_search(search)
+    rank_keys = []
+    if term:
+        query = query.where(search_condition(term))
+        rank_keys.append(search_rank(term))
+
+    total, _ = await count_rows(db, query)
+
+    if cursor:
+        values = decode_cursor(cursor, len(rank_keys) + 2)
+        try:
+            last_name, last_id = str(values[-2]), UUID(values[-1])
+            after = tuple_(Product.name, Product.id) > tuple_(last_name, last_id)
+            if rank_keys:
+                last_rank = int(values[0])
+                after = (rank_keys[0] < last_rank) | ((rank_keys[0] == last_rank) & after)
+        except (ValueError, TypeError):
+            raise ValidationError("無效的分頁游標")
+        query = query.where(after)
+
+    query = query.order_by(*(k.desc() for k in rank_keys), Product.name, Product.id)
+    query = query.add_columns(competitor_count, *rank_keys)
+    if limit is None and cursor is None:
+        rows, has_more = (await db.execute(query)).all(), False
+    else:
+        limit = limit or TREND_PRODUCTS_PAGE_SIZE
+        rows = (await db.execute(query.limit(limit + 1))).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
 
-    products = []
-    for row in rows:
-        product = row[0]
-        competitor_count = row[1]
-        products.append(ProductListItem(
+    products = [
+        ProductListItem(
             id=product.id,
             sku=product.sku,
             name=product.name,
             current_price=product.price,
-            competitor_count=competitor_count,
-        ))
+            competitor_count=count,
+        )
+        for product, count, *_ in rows
+    ]
+
+    next_cursor = None
+    if has_more:
+        last_product, _, *rank = rows[-1]
+        next_cursor = encode_cursor(*rank, last_product.name, last_product.id)
 
     return ProductListResponse(
         products=products,
-        total=len(products),
+        total=total,
+        next_cursor=next_cursor,
     )
 
 
@@ -171,6 +278,7 @@ async def get_product_price_trend(
     start_date: Optional[date] = Query(None, description="開始日期，默認 30 天前"),
     end_date: Optional[date] = Query(None, description="結束日期，默認今天"),
     interval: Optional[TimeInterval] = Query(None, description="聚合粒度，默認自動"),
+    max_points: Optional[int] = Query(None, ge=10, le=5000, description="每條序列最多點數，默認 PRICE_TREND_MAX_POINTS"),
 ):
     """
     獲取單個產品的價格趨勢
@@ -179,6 +287,9 @@ async def get_product_price_trend(
     - 自家產品價格歷史
     - 關聯競爭對手價格歷史
     - 趨勢摘要統計（價差、波動率等）
+
+    價格按 interval 在數據庫分桶（每桶均價），所有競爭對手一條查詢取回；
+    每條序列超出 max_points 時再用 LTTB 降採樣。摘要統計基於降採樣前的分桶數據。
     """
     # 設置默認日期範圍
     if end_date is None:
@@ -189,10 +300,13 @@ async def get_product_price_trend(
     # 自動決定聚合粒度
     if interval is None:
         interval = determine_interval(start_date, end_date)
+    if max_points is None:
+        max_points = get_settings().price_trend_max_points
 
     # 轉換為 datetime
     start_datetime = datetime.combine(start_date, datetime.min.time())
     end_datetime = datetime.combine(end_date, datetime.max.time())
+    dialect = db.bind.dialect.name
 
     # 1. 獲取自家產品信息
     product_result = await db.execute(
@@ -211,105 +325,77 @@ async def get_product_price_trend(
         current_price=product.price,
     )
 
-    # 2. 獲取自家產品價格歷史
-    own_snapshots_result = await db.execute(
-        select(OwnPriceSnapshot)
-        .where(
-            and_(
-                OwnPriceSnapshot.product_id == product_id,
-                OwnPriceSnapshot.recorded_at >= start_datetime,
-                OwnPriceSnapshot.recorded_at <= end_datetime,
-            )
-        )
-        .order_by(OwnPriceSnapshot.recorded_at)
-    )
-    own_snapshots = own_snapshots_result.scalars().all()
-
-    own_prices = [
-        PriceDataPoint(
-            date=s.recorded_at,
-            price=s.price,
-            original_price=s.original_price,
-            discount_percent=s.discount_percent,
-            stock_status=s.stock_status,
-            promotion_text=s.promotion_text,
-        )
-        for s in own_snapshots
-    ]
-
-    # 3. 獲取競爭對手映射
-    mappings_result = await db.execute(
-        select(ProductCompetitorMapping)
-        .options(
-            selectinload(ProductCompetitorMapping.competitor_product)
-            .selectinload(CompetitorProduct.competitor)
-        )
+    # 2. 自家產品價格歷史（分桶）
+    own_rows = (await db.execute(bucketed_series_query(
+        OwnPriceSnapshot,
+        OwnPriceSnapshot.product_id,
+        OwnPriceSnapshot.recorded_at,
+        [
+            OwnPriceSnapshot.product_id == product_id,
+            OwnPriceSnapshot.recorded_at >= start_datetime,
+            OwnPriceSnapshot.recorded_at <= end_datetime,
+        ],
+        interval,
+        dialect,
+    ))).all()
+    own_prices = [_to_point(row) for row in own_rows]
+
+    # 3. 關聯競爭對手信息（一條 JOIN）
+    mapped_ids = (
+        select(ProductCompetitorMapping.competitor_product_id)
         .where(ProductCompetitorMapping.product_id == product_id)
     )
-    mappings = mappings_result.scalars().all()
-
-    # 4. 獲取競爭對手信息和價格歷史
-    competitors_info = []
-    competitor_prices: Dict[str, List[PriceDataPoint]] = {}
-
-    for mapping in mappings:
-        if not mapping.competitor_product:
-            continue
-
-        comp_product = mapping.competitor_product
-        competitor = comp_product.competitor
-
-        # 競爭對手信息
-        comp_info = CompetitorInfo(
+    comp_rows = (await db.execute(
+        select(CompetitorProduct, Competitor.name, Competitor.platform)
+        .outerjoin(Competitor, Competitor.id == CompetitorProduct.competitor_id)
+        .where(CompetitorProduct.id.in_(mapped_ids))
+    )).all()
+
+    competitors: Dict[str, CompetitorInfo] = {
+        str(comp_product.id): CompetitorInfo(
             id=comp_product.id,
-            name=competitor.name if competitor else "Unknown",
-            platform=competitor.platform if competitor else "unknown",
+            name=competitor_name or "Unknown",
+            platform=platform or "unknown",
             product_name=comp_product.name,
             current_price=None,  # 稍後從快照獲取
         )
-
-        # 獲取價格快照
-        snapshots_result = await db.execute(
-            select(PriceSnapshot)
-            .where(
-                and_(
-                    PriceSnapshot.competitor_product_id == comp_product.id,
-                    PriceSnapshot.scraped_at >= start_datetime,
-                    PriceSnapshot.scraped_at <= end_datetime,
-                )
-            )
-            .order_by(PriceSnapshot.scraped_at)
-        )
-        snapshots = snapshots_result.scalars().all()
-
-        if snapshots:
-            comp_info.current_price = snapshots[-1].price
-
-        prices = [
-            PriceDataPoint(
-                date=s.scraped_at,
-                price=s.price,
-                original_price=s.original_price,
-                discount_percent=s.discount_percent,
-                stock_status=s.stock_status,
-                promotion_text=s.promotion_text,
-            )
-            for s in snapshots
-        ]
-
-        competitors_info.append(comp_info)
-        competitor_prices[str(comp_product.id)] = prices
+        for comp_product, competitor_name, platform in comp_rows
+    }
+
+    # 4. 所有競爭對手的價格歷史（一條分桶查詢）
+    competitor_prices: Dict[str, List[PriceDataPoint]] = {key: [] for key in competitors}
+    if competitors:
+        series_rows = (await db.execute(bucketed_series_query(
+            PriceSnapshot,
+            PriceSnapshot.competitor_product_id,
+            PriceSnapshot.scraped_at,
+            [
+                PriceSnapshot.competitor_product_id.in_(mapped_ids),
+                PriceSnapshot.scraped_at >= start_datetime,
+                PriceSnapshot.scraped_at <= end_datetime,
+            ],
+            interval,
+            dialect,
+        ))).all()
+        for row in series_rows:
+            key = str(row.series_id)
+            competitor_prices[key].append(_to_point(row))
+            # 按桶升序，最後一行即區間內最新一筆
+            competitors[key].current_price = row.last_price
 
     # 5. 計算摘要統計
     summary = calculate_summary(own_prices, competitor_prices)
 
-    # 6. 組裝趨勢數據
-    trends = {"own": own_prices}
-    trends.update(competitor_prices)
+    # 6. 組裝趨勢數據（降採樣）
+    trends = {"own": downsample_points(own_prices, max_points)}
+    trends.update({
+        key: downsample_points(points, max_points)
+        for key, points in competitor_prices.items()
+    })
 
     return PriceTrendResponse(
         own_product=own_product,
-        competitors=competitors_info,
+        competitors=list(competitors.values()),
         trends=trends,
         summary=summary,
         start_date=start_date,
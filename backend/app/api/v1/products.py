@@ -18,7 +18,9 @@ from app.schemas.product import (
     ProductResponse,
     ProductListResponse,
 )
-from app.core.exceptions import NotFoundError, DuplicateError
+from app.core.exceptions import NotFoundError, DuplicateError, ValidationError
+from app.core.pagination import encode_cursor, decode_cursor, keyset_after, count_rows
+from app.services.product_search import apply_search, apply_cursor
 from app.agents.hooks import on_product_created, on_product_updated, on_product_deleted
 
 router = APIRouter()
@@ -27,46 +29,45 @@ router = APIRouter()
 @router.get("", response_model=ProductListResponse)
 async def list_products(
     db: AsyncSession = Depends(get_db),
-    page: int = Query(default=1, ge=1, le=1000, description="頁碼（最大 1000）"),
+    page: int = Query(default=1, ge=1, le=1000, description="頁碼（最大 1000，提供 cursor 時忽略）"),
     limit: int = Query(default=20, ge=1, le=100, description="每頁數量（最大 100）"),
     search: Optional[str] = Query(default=None, max_length=100, description="搜索關鍵字（最大 100 字符）"),
     status: Optional[str] = Query(default=None, max_length=50),
     category: Optional[str] = Query(default=None, max_length=100),
+    cursor: Optional[str] = Query(default=None, max_length=300, description="上一頁返回的 next_cursor（keyset 分頁）"),
+    count: Literal["exact", "estimate"] = Query(default="exact", description="總數模式：estimate = 查詢計劃估算"),
 ):
-    """列出所有商品"""
-    query = select(Product)
+    """
+    列出所有商品
 
-    if search:
-        from app.services.agent.tools.sql_helpers import escape_like_pattern
-        safe = escape_like_pattern(search)
-        query = query.where(
-            Product.name.ilike(f"%{safe}%")
-            | Product.sku.ilike(f"%{safe}%")
-            | Product.name_en.ilike(f"%{safe}%")
-            | Product.name_zh.ilike(f"%{safe}%")
-        )
+    有搜索詞時按相關度排序（SKU 完全匹配 > 詞首匹配 > 包含），否則按建立時間倒序。
+    """
+    query = select(Product)
     if status:
         query = query.where(Product.status == status)
     if category:
         query = query.where(Product.category == category)
+    query, keys = apply_search(query, search, [Product.created_at, Product.id])
 
     # 計算總數
-    count_query = select(func.count()).select_from(query.subquery())
-    count_result = await db.execute(count_query)
-    total = count_result.scalar() or 0
+    total, total_is_estimate = await count_rows(db, query, estimate=count == "estimate")
 
     # 分頁
-    query = query.order_by(Product.created_at.desc())
-    query = query.offset((page - 1) * limit).limit(limit)
+    query = apply_cursor(query, keys, cursor).add_columns(*keys).limit(limit + 1)
+    if not cursor:
+        query = query.offset((page - 1) * limit)
 
-    result = await db.execute(query)
-    products = result.scalars().all()
+    rows = (await db.execute(query)).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
 
     return ProductListResponse(
-        data=[ProductResponse.model_validate(p) for p in products],
+        data=[ProductResponse.model_validate(row[0]) for row in rows],
         total=total,
         page=page,
         limit=limit,
+        total_is_estimate=total_is_estimate,
+        next_cursor=encode_cursor(*rows[-1][1:]) if has_more else None,
     )
 
 
@@ -98,71 +99,9 @@ async def create_product(
     return ProductResponse.model_validate(product)
 
 
-@router.get("/{product_id}", response_model=ProductResponse)
-async def get_product(
-    product_id: UUID,
-    db: AsyncSession = Depends(get_db),
-):
-    """獲取單個商品"""
-    result = await db.execute(
-        select(Product).where(Product.id == product_id)
-    )
-    product = result.scalar_one_or_none()
-    if not product:
-        raise NotFoundError(resource="商品")
-
-    return ProductResponse.model_validate(product)
-
-
-@router.patch("/{product_id}", response_model=ProductResponse)
-async def update_product(
-    product_id: UUID,
-    product_in: ProductUpdate,
-    db: AsyncSession = Depends(get_db),
-):
-    """更新商品"""
-    result = await db.execute(
-        select(Product).where(Product.id == product_id)
-    )
-    product = result.scalar_one_or_none()
-    if not product:
-        raise NotFoundError(resource="商品")
-
-    update_data = product_in.model_dump(exclude_unset=True)
-    changed_fields = list(update_data.keys())
-    for field, value in update_data.items():
-        setattr(product, field, value)
-
-    await db.flush()
-    await db.refresh(product)
-
-    # 觸發 Agent 事件：Writer 判斷是否需刷新內容
-    if changed_fields:
-        await on_product_updated(
-            product_id=str(product.id),
-            changed_fields=changed_fields,
-        )
-
-    return ProductResponse.model_validate(product)
-
-
-@router.delete("/{product_id}", status_code=204)
-async def delete_product(
-    product_id: UUID,
-    db: AsyncSession = Depends(get_db),
-):
-    """刪除商品"""
-    result = await db.execute(
-        select(Product).where(Product.id == product_id)
-    )
-    product = result.scalar_one_or_none()
-    if not product:
-        raise NotFoundError(resource="商品")
-
-    await db.delete(product)
-
 # =============================================
 # SKU 利潤排行榜 - P0-4
+# （須在 /{product_id} 之前註冊，否則路徑被當成商品 ID）
 # =============================================
 
 from decimal import Decimal
@@ -192,12 +131,13 @@ class ProductProfitabilityResponse(BaseModel):
     limit: int
     sort_by: str
     avg_profit_margin: Optional[float] = None  # 平均利潤率
+    next_cursor: Optional[str] = None  # 下一頁游標（None = 已到最後一頁）
 
 
 @router.get("/profitability-ranking", response_model=ProductProfitabilityResponse)
 async def get_profitability_ranking(
     db: AsyncSession = Depends(get_db),
-    page: int = Query(default=1, ge=1, le=1000, description="頁碼"),
+    page: int = Query(default=1, ge=1, le=1000, description="頁碼（提供 cursor 時忽略）"),
     limit: int = Query(default=20, ge=1, le=100, description="每頁數量"),
     sort_by: Literal["profit_amount", "profit_margin"] = Query(
         default="profit_margin",
@@ -205,82 +145,81 @@ async def get_profitability_ranking(
     ),
     category: Optional[str] = Query(default=None, description="類別篩選"),
     min_profit_margin: Optional[float] = Query(default=None, ge=-100, le=1000, description="最低利潤率（%）"),
+    cursor: Optional[str] = Query(default=None, max_length=200, description="上一頁返回的 next_cursor（keyset 分頁）"),
 ):
     """
     SKU 利潤排行榜 - 真實數據驅動選品
     
     返回所有商品的利潤數據，支持按利潤額或利潤率排序。
     只顯示有價格和成本數據的商品。
+
+    利潤額 / 利潤率是數據庫生成列，過濾、排序、平均值全部在 SQL 完成；
+    翻頁請帶上 next_cursor，深頁成本與頁碼無關。
     
     **商業用途**：
     - 識別高利潤商品，優先推廣
     - 發現低利潤商品，考慮調價或下架
     - 選品決策：優先引入高利潤率商品
     """
-    # 基礎查詢：只查詢有價格和成本數據的商品
-    query = select(Product).where(
-        Product.price.is_not(None),
-        Product.cost.is_not(None),
+    sort_col = Product.profit_amount if sort_by == "profit_amount" else Product.profit_margin
+
+    # 基礎條件：只統計有價格和成本數據的商品（與部分索引條件一致）
+    conditions = [
         Product.price > 0,
         Product.cost > 0,
-    )
-    
-    # 類別篩選
+    ]
     if category:
-        query = query.where(Product.category == category)
-    
-    # 執行查詢
-    result = await db.execute(query)
-    products = result.scalars().all()
-    
-    # 計算利潤數據
-    profit_data = []
-    for p in products:
-        profit_amount = p.price - p.cost if (p.price and p.cost) else None
-        profit_margin = float((p.price - p.cost) / p.cost * 100) if (p.price and p.cost and p.cost > 0) else None
-        
-        # 利潤率篩選
-        if min_profit_margin is not None and (profit_margin is None or profit_margin < min_profit_margin):
-            continue
-        
-        profit_data.append({
-            "product": p,
-            "profit_amount": profit_amount,
-            "profit_margin": profit_margin,
-        })
-    
-    # 排序
-    if sort_by == "profit_amount":
-        profit_data.sort(key=lambda x: x["profit_amount"] or Decimal("0"), reverse=True)
-    else:  # profit_margin
-        profit_data.sort(key=lambda x: x["profit_margin"] or 0, reverse=True)
-    
-    # 計算平均利潤率
-    valid_margins = [item["profit_margin"] for item in profit_data if item["profit_margin"] is not None]
-    avg_profit_margin = sum(valid_margins) / len(valid_margins) if valid_margins else None
-    
-    # 分頁
-    total = len(profit_data)
-    start = (page - 1) * limit
-    end = start + limit
-    paginated_data = profit_data[start:end]
+        conditions.append(Product.category == category)
+    if min_profit_margin is not None:
+        conditions.append(Product.profit_margin >= min_profit_margin)
+
+    # 總數 + 平均利潤率（單條聚合）
+    stats = (await db.execute(
+        select(func.count(), func.avg(Product.profit_margin)).where(*conditions)
+    )).one()
+    total = stats[0] or 0
+    avg_profit_margin = float(stats[1]) if stats[1] is not None else None
+
+    query = (
+        select(Product)
+        .where(*conditions)
+        .order_by(sort_col.desc(), Product.id.desc())
+        .limit(limit + 1)
+    )
+    if cursor:
+        last_value, last_id = decode_cursor(cursor, 2)
+        try:
+            query = query.where(keyset_after((sort_col, Product.id), (Decimal(last_value), UUID(last_id))))
+        except (ArithmeticError, ValueError, TypeError):
+            raise ValidationError("無效的分頁游標")
+    else:
+        query = query.offset((page - 1) * limit)
+
+    products = list((await db.execute(query)).scalars().all())
+    has_more = len(products) > limit
+    products = products[:limit]
+
+    next_cursor = None
+    if has_more:
+        last = products[-1]
+        next_cursor = encode_cursor(getattr(last, sort_by), last.id)
     
     # 構建響應
-    items = []
-    for item in paginated_data:
-        p = item["product"]
-        items.append(ProductProfitabilityItem(
+    items = [
+        ProductProfitabilityItem(
             id=str(p.id),
             sku=p.sku,
             name=p.name,
             name_zh=p.name_zh,
             price=p.price,
             cost=p.cost,
-            profit_amount=item["profit_amount"],
-            profit_margin=item["profit_margin"],
+            profit_amount=p.profit_amount,
+            profit_margin=float(p.profit_margin) if p.profit_margin is not None else None,
             category=p.category,
             status=p.status,
-        ))
+        )
+        for p in products
+    ]
     
     return ProductProfitabilityResponse(
         data=items,
@@ -289,8 +228,72 @@ async def get_profitability_ranking(
         limit=limit,
         sort_by=sort_by,
         avg_profit_margin=avg_profit_margin,
+        next_cursor=next_cursor,
+    )
+
+
+@router.get("/{product_id}", response_model=ProductResponse)
+async def get_product(
+    product_id: UUID,
+    db: AsyncSession = Depends(get_db),
+):
+    """獲取單個商品"""
+    result = await db.execute(
+        select(Product).where(Product.id == product_id)
+    )
+    product = result.scalar_one_or_none()
+    if not product:
+        raise NotFoundError(resource="商品")
+
+    return ProductResponse.model_validate(product)
+
+
+@router.patch("/{product_id}", response_model=ProductResponse)
+async def update_product(
+    product_id: UUID,
+    product_in: ProductUpdate,
+    db: AsyncSession = Depends(get_db),
+):
+    """更新商品"""
+    result = await db.execute(
+        select(Product).where(Product.id == product_id)
+    )
+    product = result.scalar_one_or_none()
+    if not product:
+        raise NotFoundError(resource="商品")
+
+    update_data = product_in.model_dump(exclude_unset=True)
+    changed_fields = list(update_data.keys())
+    for field, value in update_data.items():
+        setattr(product, field, value)
+
+    await db.flush()
+    await db.refresh(product)
+
+    # 觸發 Agent 事件：Writer 判斷是否需刷新內容
+    if changed_fields:
+        await on_product_updated(
+            product_id=str(product.id),
+            changed_fields=changed_fields,
+        )
+
+    return ProductResponse.model_validate(product)
+
+
+@router.delete("/{product_id}", status_code=204)
+async def delete_product(
+    product_id: UUID,
+    db: AsyncSession = Depends(get_db),
+):
+    """刪除商品"""
+    result = await db.execute(
+        select(Product).where(Product.id == product_id)
     )
+    product = result.scalar_one_or_none()
+    if not product:
+        raise NotFoundError(resource="商品")
 
+    await db.delete(product)
 
 # =============================================
 # 監測優先級管理 - 分級監測策略
@@ -14,11 +14,11 @@
 
 import logging
 from datetime import datetime, timedelta
-from typing import Optional, List
+from typing import Literal, Optional, List
 from uuid import UUID
 
 from fastapi import APIRouter, Depends, HTTPException, Query, BackgroundTasks
-from sqlalchemy import select, func, and_, or_, desc, asc
+from sqlalchemy import select, func, and_, or_, desc
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
@@ -28,6 +28,8 @@ from app.models.seo_ranking import (
     KeywordType, RankingSource, ReportType, AlertSeverity
 )
 from app.models.product import Product
+from app.services.seo_leaderboard import leaderboard_page, leaderboard_summary
+from app.services.seo_ranking_rollup import daily_trends, keyword_at_rank, keyword_overview
 from app.schemas.seo_ranking import (
     # 關鍵詞配置
     KeywordConfigCreate, KeywordConfigUpdate, KeywordConfigResponse,
@@ -388,105 +390,58 @@ async def get_ranking_leaderboard(
     source: RankingSourceEnum = Query(RankingSourceEnum.GOOGLE_HK),
     keyword_type: Optional[KeywordTypeEnum] = Query(None),
     product_id: Optional[UUID] = Query(None),
-    sort_by: str = Query("rank_asc", description="rank_asc, rank_desc, change_asc, change_desc"),
+    sort_by: Literal["rank_asc", "rank_desc", "change_asc", "change_desc"] = Query(
+        "rank_asc", description="rank_asc, rank_desc, change_asc（跌幅最大在前）, change_desc（升幅最大在前）"
+    ),
     limit: int = Query(20, ge=1, le=100),
     include_unranked: bool = Query(False),
+    cursor: Optional[str] = Query(None, max_length=200, description="上一頁返回的 next_cursor（keyset 分頁）"),
     db: AsyncSession = Depends(get_db)
 ):
     """
     獲取排名排行榜
 
-    - 按 Google 或 HKTVmall 排名排序
-    - 顯示排名最好/最差的關鍵詞
-    - 顯示排名變化
+    - 按 Google 或 HKTVmall 排名 / 排名變化排序
+    - 排名變化取自排名歷史：最近一次追蹤相對上一次追蹤（正數表示上升）
+    - 摘要覆蓋完整篩選範圍（不受分頁影響），並按關鍵詞類型分組
     """
-    query = select(KeywordConfig).where(KeywordConfig.is_active == True)
-
-    if product_id:
-        query = query.where(KeywordConfig.product_id == product_id)
-    if keyword_type:
-        query = query.where(KeywordConfig.keyword_type == KeywordType(keyword_type.value))
-
-    # 根據來源選擇排名字段
-    if source == RankingSourceEnum.GOOGLE_HK:
-        rank_field = KeywordConfig.latest_google_rank
-        if not include_unranked:
-            query = query.where(KeywordConfig.latest_google_rank.isnot(None))
-    else:
-        rank_field = KeywordConfig.latest_hktvmall_rank
-        if not include_unranked:
-            query = query.where(KeywordConfig.latest_hktvmall_rank.isnot(None))
-
-    # 排序
-    if sort_by == "rank_asc":
-        query = query.order_by(asc(rank_field).nullslast())
-    elif sort_by == "rank_desc":
-        query = query.order_by(desc(rank_field).nullslast())
-
-    query = query.limit(limit)
-
-    result = await db.execute(query)
-    configs = result.scalars().all()
+    rollup_source = "google" if source == RankingSourceEnum.GOOGLE_HK else "hktvmall"
+    filters = dict(
+        keyword_type=KeywordType(keyword_type.value) if keyword_type else None,
+        product_id=product_id,
+        include_unranked=include_unranked,
+    )
 
-    # 構建排行榜條目
-    entries = []
-    for idx, config in enumerate(configs, 1):
-        if source == RankingSourceEnum.GOOGLE_HK:
-            current_rank = config.latest_google_rank
-            target_rank = config.target_google_rank
-            baseline = config.baseline_google_rank
-        else:
-            current_rank = config.latest_hktvmall_rank
-            target_rank = config.target_hktvmall_rank
-            baseline = config.baseline_hktvmall_rank
-
-        rank_change = None
-        if baseline and current_rank:
-            rank_change = baseline - current_rank  # 正數表示排名上升
-
-        target_gap = None
-        if target_rank and current_rank:
-            target_gap = current_rank - target_rank  # 正數表示還差多少
-
-        entries.append(LeaderboardEntry(
-            rank=idx,
-            keyword_config_id=config.id,
-            keyword=config.keyword,
-            keyword_type=config.keyword_type.value,
-            product_id=config.product_id,
-            current_rank=current_rank,
-            previous_rank=baseline,
-            rank_change=rank_change,
-            target_rank=target_rank,
-            target_gap=target_gap,
-            last_tracked_at=config.latest_tracked_at
-        ))
-
-    # 計算摘要
-    total = len(configs)
-    ranked = len([e for e in entries if e.current_rank is not None])
-    top_10 = len([e for e in entries if e.current_rank and e.current_rank <= 10])
-    top_30 = len([e for e in entries if e.current_rank and e.current_rank <= 30])
-    ranks = [e.current_rank for e in entries if e.current_rank]
-    avg_rank = sum(ranks) / len(ranks) if ranks else None
-
-    improved = len([e for e in entries if e.rank_change and e.rank_change > 0])
-    declined = len([e for e in entries if e.rank_change and e.rank_change < 0])
+    rows, next_cursor = await leaderboard_page(
+        db, rollup_source, sort_by=sort_by, limit=limit, cursor=cursor, **filters
+    )
+    summaries = await leaderboard_summary(db, rollup_source, **filters)
+
+    entries = [
+        LeaderboardEntry(
+            rank=row["position"],
+            keyword_config_id=row["keyword_config_id"],
+            keyword=row["keyword"],
+            keyword_type=row["keyword_type"].value,
+            product_id=row["product_id"],
+            product_name=row["product_name"],
+            current_rank=row["current_rank"],
+            previous_rank=row["previous_rank"],
+            rank_change=row["rank_change"],
+            target_rank=row["target_rank"],
+            target_gap=row["target_gap"],
+            last_tracked_at=row["last_tracked_at"],
+        )
+        for row in rows
+    ]
 
     return RankingLeaderboardResponse(
         source=source.value,
         generated_at=datetime.utcnow(),
         entries=entries,
-        summary=LeaderboardSummary(
-            total_keywords=total,
-            ranked_keywords=ranked,
-            unranked_keywords=total - ranked,
-            top_10_count=top_10,
-            top_30_count=top_30,
-            avg_rank=round(avg_rank, 1) if avg_rank else None,
-            improved_count=improved,
-            declined_count=declined
-        )
+        summary=LeaderboardSummary(**summaries[0]),
+        type_summaries=[LeaderboardSummary(**s) for s in summaries[1:]],
+        next_cursor=next_cursor,
     )
 
 
@@ -772,26 +727,12 @@ async def get_dashboard(
     - 最近警報
     - 最近任務
     """
-    # 1. 概覽指標
-    config_query = select(KeywordConfig)
-    if product_id:
-        config_query = config_query.where(KeywordConfig.product_id == product_id)
+    # 1. 概覽指標（一次 FILTER 聚合，不載入配置行）
+    counts = await keyword_overview(db, product_id)
 
-    config_result = await db.execute(config_query)
-    configs = config_result.scalars().all()
-
-    total_keywords = len(configs)
-    active_keywords = len([c for c in configs if c.is_active])
-    keywords_with_data = len([c for c in configs if c.latest_google_rank or c.latest_hktvmall_rank])
-
-    # 計算變化統計
-    improved = len([c for c in configs if
-                    c.baseline_google_rank and c.latest_google_rank and
-                    c.latest_google_rank < c.baseline_google_rank])
-    declined = len([c for c in configs if
-                    c.baseline_google_rank and c.latest_google_rank and
-                    c.latest_google_rank > c.baseline_google_rank])
-    unchanged = keywords_with_data - improved - declined
+    improved = counts["improved"]
+    declined = counts["declined"]
+    unchanged = counts["with_data"] - improved - declined
 
     # 最後抓取時間
     last_job_query = select(RankingScrapeJob).where(
@@ -802,23 +743,23 @@ async def get_dashboard(
     last_scrape_at = last_job.completed_at if last_job else None
 
     overview = DashboardOverview(
-        total_keywords=total_keywords,
-        active_keywords=active_keywords,
-        keywords_with_data=keywords_with_data,
+        total_keywords=counts["total"],
+        active_keywords=counts["active"],
+        keywords_with_data=counts["with_data"],
         improved_keywords=improved,
         declined_keywords=declined,
         unchanged_keywords=unchanged,
-        seo_health_score=_calculate_health_score(configs),
+        seo_health_score=_calculate_health_score(counts),
         last_scrape_at=last_scrape_at
     )
 
     # 2. Google 排名摘要
-    google_rankings = _build_ranking_summary(configs, "google")
+    google_rankings = await _build_ranking_summary(db, counts, "google", product_id)
 
     # 3. HKTVmall 排名摘要
-    hktvmall_rankings = _build_ranking_summary(configs, "hktvmall")
+    hktvmall_rankings = await _build_ranking_summary(db, counts, "hktvmall", product_id)
 
-    # 4. 排名趨勢（最近 N 天）
+    # 4. 排名趨勢（最近 N 天，讀日匯總表）
     start_date = datetime.utcnow() - timedelta(days=days)
     ranking_trends = await _get_ranking_trends(db, product_id, start_date)
 
@@ -1016,73 +957,52 @@ def _calculate_ranking_summary(rankings: list) -> RankingHistorySummary:
     )
 
 
-def _calculate_health_score(configs: list) -> int:
-    """計算 SEO 健康分數"""
-    if not configs:
+def _calculate_health_score(counts: dict) -> int:
+    """計算 SEO 健康分數（counts 為 keyword_overview 的聚合結果）"""
+    total = counts["total"]
+    if not total:
         return 0
 
     score = 0
     max_score = 100
 
     # 有排名數據的比例（30分）
-    with_data = len([c for c in configs if c.latest_google_rank or c.latest_hktvmall_rank])
-    data_ratio = with_data / len(configs) if configs else 0
-    score += int(data_ratio * 30)
+    score += int(counts["with_data"] / total * 30)
 
     # Google Top 30 比例（35分）
-    google_top_30 = len([c for c in configs if c.latest_google_rank and c.latest_google_rank <= 30])
-    google_ratio = google_top_30 / len(configs) if configs else 0
-    score += int(google_ratio * 35)
+    score += int(counts["google_top_30"] / total * 35)
 
     # HKTVmall Top 30 比例（35分）
-    hktv_top_30 = len([c for c in configs if c.latest_hktvmall_rank and c.latest_hktvmall_rank <= 30])
-    hktv_ratio = hktv_top_30 / len(configs) if configs else 0
-    score += int(hktv_ratio * 35)
+    score += int(counts["hktvmall_top_30"] / total * 35)
 
     return min(score, max_score)
 
 
-def _build_ranking_summary(configs: list, source: str) -> RankingSummaryBySource:
-    """構建按來源的排名摘要"""
-    if source == "google":
-        ranks = [c.latest_google_rank for c in configs if c.latest_google_rank]
-        source_name = "google_hk"
-    else:
-        ranks = [c.latest_hktvmall_rank for c in configs if c.latest_hktvmall_rank]
-        source_name = "hktvmall"
-
-    total = len(configs)
-    ranked = len(ranks)
-    top_10 = len([r for r in ranks if r <= 10])
-    top_30 = len([r for r in ranks if r <= 30])
-    avg = round(sum(ranks) / len(ranks), 1) if ranks else None
+async def _build_ranking_summary(
+    db: AsyncSession,
+    counts: dict,
+    source: str,
+    product_id: Optional[UUID] = None,
+) -> RankingSummaryBySource:
+    """構建按來源的排名摘要（counts 為 keyword_overview 的聚合結果）"""
+    source_name = "google_hk" if source == "google" else "hktvmall"
+    avg = counts[f"{source}_avg_rank"]
 
     best = None
     worst = None
-    if ranks:
-        min_rank = min(ranks)
-        max_rank = max(ranks)
-        best_config = next((c for c in configs if (
-            c.latest_google_rank == min_rank if source == "google"
-            else c.latest_hktvmall_rank == min_rank
-        )), None)
-        worst_config = next((c for c in configs if (
-            c.latest_google_rank == max_rank if source == "google"
-            else c.latest_hktvmall_rank == max_rank
-        )), None)
-
-        if best_config:
-            best = {"keyword": best_config.keyword, "rank": min_rank}
-        if worst_config:
-            worst = {"keyword": worst_config.keyword, "rank": max_rank}
+    if counts[f"{source}_ranked"]:
+        min_rank = counts[f"{source}_best_rank"]
+        max_rank = counts[f"{source}_worst_rank"]
+        best = {"keyword": await keyword_at_rank(db, source, min_rank, product_id), "rank": min_rank}
+        worst = {"keyword": await keyword_at_rank(db, source, max_rank, product_id), "rank": max_rank}
 
     return RankingSummaryBySource(
         source=source_name,
-        total_keywords=total,
-        ranked_keywords=ranked,
-        avg_rank=avg,
-        top_10_count=top_10,
-        top_30_count=top_30,
+        total_keywords=counts["total"],
+        ranked_keywords=counts[f"{source}_ranked"],
+        avg_rank=round(float(avg), 1) if avg is not None else None,
+        top_10_count=counts[f"{source}_top_10"],
+        top_30_count=counts[f"{source}_top_30"],
         best_keyword=best,
         worst_keyword=worst
     )
@@ -1093,7 +1013,6 @@ async def _get_ranking_trends(
     product_id: Optional[UUID],
     start_date: datetime
 ) -> List[RankingTrendPoint]:
-    """獲取排名趨勢數據"""
-    # TODO: 實現按日期聚合的排名趨勢查詢
-    # 這裡返回空列表，實際實現需要查詢 keyword_rankings 表並按日期聚合
-    return []
+    """獲取排名趨勢數據（keyword_ranking_daily 按日聚合）"""
+    points = await daily_trends(db, start_date.date(), product_id)
+    return [RankingTrendPoint(**point) for point in points]
@@ -200,6 +200,15 @@ async def send_custom_message(request: TelegramSendRequest):
         )
 
 
+def _queued_response(result: dict) -> dict:
+    """業務通知只寫入 Outbox，由排程派發：返回入隊狀態而不是「已發送」"""
+    if not result.get("ok"):
+        return {"success": False, "status": "error", "message": result.get("error")}
+    if result.get("queued"):
+        return {"success": True, "status": "queued", "message": "測試通知已加入發送隊列，將由排程派發"}
+    return {"success": True, "status": "duplicate", "message": "相同通知已在隊列中"}
+
+
 @router.post("/notify-test-scrape")
 async def send_test_scrape_notification():
     """
@@ -220,10 +229,7 @@ async def send_test_scrape_notification():
         duration_seconds=45.8
     )
 
-    return {
-        "success": result.get("ok", False),
-        "message": "測試通知已發送" if result.get("ok") else result.get("error")
-    }
+    return _queued_response(result)
 
 
 @router.post("/notify-test-price-change")
@@ -248,10 +254,7 @@ async def send_test_price_change_notification():
         product_url="https://www.hktvmall.com/p/H0000001"
     )
 
-    return {
-        "success": result.get("ok", False),
-        "message": "測試通知已發送" if result.get("ok") else result.get("error")
-    }
+    return _queued_response(result)
 
 
 # =============================================
@@ -54,6 +54,8 @@ class Settings(BaseSettings):
 
     # Redis
     redis_url: str = Field(default="redis://localhost:6379/0", alias="REDIS_URL")
+    # AI 助手快速回覆快取：redis（多 worker 共享，故障時退回本地）/ memory
+    quick_cache_backend: str = Field(default="redis", alias="QUICK_CACHE_BACKEND")
 
     # Firecrawl API
     firecrawl_api_key: str = Field(default="", alias="FIRECRAWL_API_KEY")
@@ -109,6 +111,14 @@ class Settings(BaseSettings):
     hktv_api_base_url: str = Field(default="https://merchant-oapi.shoalter.com/oapi/api", alias="HKTVMALL_API_BASE_URL")
     hktv_store_code: str = Field(default="", alias="HKTVMALL_STORE_CODE")
     hktv_access_token: str = Field(default="", alias="HKTVMALL_ACCESS_TOKEN")
+    # 收件箱 API：HKTVmall 文檔未確認（UNVERIFIED），路徑與增量篩選字段按實際 API 配置
+    # 路徑留空 = 不調用（返回空數據）；篩選字段留空 = 每次全量同步
+    hktv_message_topics_path: str = Field(default="", alias="HKTVMALL_MESSAGE_TOPICS_PATH")
+    hktv_message_messages_path: str = Field(default="", alias="HKTVMALL_MESSAGE_MESSAGES_PATH")
+    hktv_message_since_field: str = Field(default="", alias="HKTVMALL_MESSAGE_SINCE_FIELD")
+    # 收件箱同步：對話列表每頁數量、訊息串並發拉取上限
+    inbox_sync_page_size: int = Field(default=100, alias="INBOX_SYNC_PAGE_SIZE")
+    inbox_sync_concurrency: int = Field(default=8, alias="INBOX_SYNC_CONCURRENCY")
 
     # 通知
     notification_email: str = Field(default="", alias="NOTIFICATION_EMAIL")
@@ -117,6 +127,14 @@ class Settings(BaseSettings):
     telegram_bot_token: str = Field(default="", alias="TELEGRAM_BOT_TOKEN")
     telegram_chat_id: str = Field(default="", alias="TELEGRAM_CHAT_ID")
     telegram_enabled: bool = Field(default=False, alias="TELEGRAM_ENABLED")
+    telegram_api_base_url: str = Field(default="https://api.telegram.org", alias="TELEGRAM_API_BASE_URL")
+    # 通知 Outbox：同一 chat 的通知在窗口內合併為摘要；按 chat / 全局令牌桶限速
+    telegram_digest_window_seconds: int = Field(default=60, alias="TELEGRAM_DIGEST_WINDOW_SECONDS")
+    telegram_rate_per_chat: float = Field(default=1.0, alias="TELEGRAM_RATE_PER_CHAT")  # 條/秒
+    telegram_rate_global: float = Field(default=25.0, alias="TELEGRAM_RATE_GLOBAL")  # 條/秒
+    telegram_max_inline_wait_seconds: float = Field(default=10.0, alias="TELEGRAM_MAX_INLINE_WAIT_SECONDS")
+    telegram_outbox_max_attempts: int = Field(default=8, alias="TELEGRAM_OUTBOX_MAX_ATTEMPTS")
+    telegram_outbox_retention_days: int = Field(default=7, alias="TELEGRAM_OUTBOX_RETENTION_DAYS")
 
     # 爬取設定
     scrape_time: str = Field(default="09:00", alias="SCRAPE_TIME")
@@ -127,11 +145,31 @@ class Settings(BaseSettings):
     hktv_price_cache_ttl: int = Field(default=86400, alias="HKTV_PRICE_CACHE_TTL")  # 價格緩存 24h
     hktv_price_only_wait_ms: int = Field(default=5000, alias="HKTV_PRICE_ONLY_WAIT_MS")  # price-only 模式等待時間
 
+    # 價格趨勢圖：每條序列最多返回的點數（超出時 LTTB 降採樣）
+    price_trend_max_points: int = Field(default=500, alias="PRICE_TREND_MAX_POINTS")
+
+    # GEO/SEO 打包生成：不合格部分的重試次數、全目錄批量的並發產品數
+    geo_package_max_retries: int = Field(default=2, alias="GEO_PACKAGE_MAX_RETRIES")
+    geo_package_concurrency: int = Field(default=3, alias="GEO_PACKAGE_CONCURRENCY")
+
     # AI Agent 模擬模式（用於測試，設為 true 啟用模擬數據）
     agent_mock_mode: bool = Field(default=False, alias="AGENT_MOCK_MODE")
+    # AI Agent 對話：每輪載入的最近訊息數（更早的訊息折疊進滾動摘要）
+    agent_history_window: int = Field(default=20, alias="AGENT_HISTORY_WINDOW")
+    # AI Agent 只讀工具結果快取秒數（0 = 不快取；數據寫入提交後自動失效）
+    agent_tool_cache_ttl: int = Field(default=300, alias="AGENT_TOOL_CACHE_TTL")
 
     # Agent Browser（用於 HKTVmall SPA 搜索頁面的商品 URL 發現）
     agent_browser_enabled: bool = Field(default=True, alias="AGENT_BROWSER_ENABLED")
+    agent_browser_pool_size: int = Field(default=4, alias="AGENT_BROWSER_POOL_SIZE")  # 並發頁面數
+    wellcome_crawl_concurrency: int = Field(default=2, alias="WELLCOME_CRAWL_CONCURRENCY")  # 惠康分類並行爬取數
+
+    # Agent EventBus（隊列派發 + outbox 持久化）
+    event_bus_async: bool = Field(default=True, alias="EVENT_BUS_ASYNC")  # false = 回到 inline 派發
+    event_bus_queue_size: int = Field(default=1000, alias="EVENT_BUS_QUEUE_SIZE")
+    event_bus_handler_concurrency: int = Field(default=2, alias="EVENT_BUS_HANDLER_CONCURRENCY")  # 每 handler 並發數
+    event_bus_outbox: bool = Field(default=True, alias="EVENT_BUS_OUTBOX")
+    event_bus_outbox_retention_days: int = Field(default=7, alias="EVENT_BUS_OUTBOX_RETENTION_DAYS")  # done / failed 記錄保留天數
 
     # Celery（已遷移至 APScheduler，保留配置向後兼容）
     celery_broker_url: str = Field(default="", alias="CELERY_BROKER_URL")
@@ -148,6 +186,8 @@ class Settings(BaseSettings):
 
     # 存儲配置
     use_r2_storage: bool = Field(default=False, alias="USE_R2_STORAGE")
+    # /download 代理同時流式下載數上限（每個佔一個 R2 連接 + 一個線程，boto3 連接池默認 10）
+    r2_download_concurrency: int = Field(default=8, alias="R2_DOWNLOAD_CONCURRENCY")
 
     # CORS 配置
     cors_origins_production: str = Field(
@@ -169,6 +209,18 @@ class Settings(BaseSettings):
         alias="OPENAI_DEFAULT_MODEL"
     )
 
+    # 推廣建議引擎：毛利分級（最低毛利率, 折扣 %, 推薦原因），按門檻由高到低匹配
+    promotion_margin_tiers: list[tuple[float, float, str]] = Field(
+        default=[
+            (0.5, 15.0, "高利潤商品，建議 85 折激發銷量，預計可顯著提升轉化率"),
+            (0.3, 5.0, "利潤空間健康，建議 95 折作為會員回饋或限時優惠"),
+        ],
+        alias="PROMOTION_MARGIN_TIERS"
+    )
+    promotion_commission_rate: float = Field(default=0.15, alias="PROMOTION_COMMISSION_RATE")
+    promotion_shipping_cost: float = Field(default=30.0, alias="PROMOTION_SHIPPING_COST")
+    promotion_default_cost_ratio: float = Field(default=0.6, alias="PROMOTION_DEFAULT_COST_RATIO")
+
     def get_cors_origins(self) -> list[str]:
         """獲取 CORS 允許的來源列表"""
         origins = [o.strip() for o in self.cors_origins_production.split(",") if o.strip()]
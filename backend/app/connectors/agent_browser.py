@@ -17,14 +17,18 @@ agent-browser 的 Go binary 在 Windows 上無法自動啟動 Node daemon（已
 - 持久化：進程在請求間復用（省去 ~5s 啟動時間）
 - 空閒超時：無請求時自動關閉（省資源）
 - 崩潰恢復：偵測斷線後自動重建
-- 請求隔離：每次搜索用獨立的 BrowserContext
+- 頁面池：最多 POOL_SIZE 個頁面並發，BrowserContext 在請求間復用（歸還時清 cookies）
+- 資源攔截：URL 發現不需要圖片 / 字體 / 媒體 / 分析腳本，直接 abort 省帶寬和渲染時間
 """
 
 import time
 import logging
 import asyncio
 import threading
-from typing import List, Optional
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List, Optional
+
+from app.config import get_settings
 
 logger = logging.getLogger(__name__)
 
@@ -63,46 +67,143 @@ class AgentBrowserConnector:
     TOTAL_TIMEOUT_S = 60
     # 瀏覽器空閒超時（5 分鐘無請求則自動關閉）
     BROWSER_IDLE_S = 300
-
-    def __init__(self):
+    # 頁面池並發上限（可由 AGENT_BROWSER_POOL_SIZE 覆蓋）
+    POOL_SIZE = 4
+
+    # 資源攔截：URL 發現只需要 DOM，不需要以下資源
+    BLOCKED_RESOURCE_TYPES = frozenset({"image", "font", "media"})
+    BLOCKED_URL_KEYWORDS = (
+        "google-analytics.com",
+        "googletagmanager.com",
+        "doubleclick.net",
+        "connect.facebook.net",
+        "hotjar.com",
+        "clarity.ms",
+        "criteo.",
+    )
+
+    def __init__(self, pool_size: Optional[int] = None):
         self._pw = None
         self._browser = None
+        # 保護瀏覽器生命週期和 context 池（頁面並發由 _slots 控制）
         self._lock = asyncio.Lock()
         self._last_used = 0.0
+        self._pool_size = max(1, pool_size or self.POOL_SIZE)
+        self._slots = asyncio.Semaphore(self._pool_size)
+        self._idle_contexts: list = []
+        self._active = 0
 
     # =============================================
     # 瀏覽器池管理
     # =============================================
 
     async def _ensure_browser(self):
-        """確保瀏覽器可用（懶啟動 + 空閒超時 + 崩潰恢復）"""
+        """確保瀏覽器可用（懶啟動 + 空閒超時 + 崩潰恢復，由調用方持鎖）"""
+        now = time.monotonic()
+
+        # 空閒超時：回收長時間未用的瀏覽器（仍有頁面在用時不回收）
+        if (self._browser is not None
+                and self._active == 0
+                and self._last_used > 0
+                and now - self._last_used > self.BROWSER_IDLE_S):
+            logger.info("playwright: 空閒超時，關閉瀏覽器")
+            await self._shutdown()
+
+        # 崩潰恢復：進程斷開時重建
+        if self._browser is not None and not self._browser.is_connected():
+            logger.warning("playwright: 瀏覽器斷開，重新啟動")
+            await self._shutdown()
+
+        # 懶啟動
+        if self._browser is None:
+            from playwright.async_api import async_playwright
+            self._pw = await async_playwright().start()
+            self._browser = await self._pw.chromium.launch(headless=True)
+            logger.info("playwright: 瀏覽器已啟動")
+
+        self._last_used = now
+        return self._browser
+
+    async def _block_heavy_resources(self, route):
+        """攔截圖片 / 字體 / 媒體 / 分析腳本（只保留 DOM 渲染所需資源）"""
+        request = route.request
+        if (request.resource_type in self.BLOCKED_RESOURCE_TYPES
+                or any(k in request.url for k in self.BLOCKED_URL_KEYWORDS)):
+            await route.abort()
+        else:
+            await route.continue_()
+
+    async def _checkout_context(self):
+        """從池中取出 BrowserContext（無空閒則新建並安裝資源攔截）"""
+        async with self._lock:
+            browser = await self._ensure_browser()
+            self._active += 1
+            try:
+                if self._idle_contexts:
+                    return self._idle_contexts.pop()
+                context = await browser.new_context()
+                await context.route("**/*", self._block_heavy_resources)
+                return context
+            except Exception:
+                self._active -= 1
+                raise
+
+    async def _checkin_context(self, context, healthy: bool):
+        """歸還 BrowserContext（異常或瀏覽器已重建則直接關閉）"""
+        reusable = False
+        if healthy:
+            try:
+                # 清 cookies → 保持請求間 session 隔離
+                await context.clear_cookies()
+                reusable = True
+            except Exception:
+                pass
+
         async with self._lock:
-            now = time.monotonic()
-
-            # 空閒超時：回收長時間未用的瀏覽器
-            if (self._browser is not None
-                    and self._last_used > 0
-                    and now - self._last_used > self.BROWSER_IDLE_S):
-                logger.info("playwright: 空閒超時，關閉瀏覽器")
-                await self._shutdown()
-
-            # 崩潰恢復：進程斷開時重建
-            if self._browser is not None and not self._browser.is_connected():
-                logger.warning("playwright: 瀏覽器斷開，重新啟動")
-                await self._shutdown()
-
-            # 懶啟動
-            if self._browser is None:
-                from playwright.async_api import async_playwright
-                self._pw = await async_playwright().start()
-                self._browser = await self._pw.chromium.launch(headless=True)
-                logger.info("playwright: 瀏覽器已啟動")
-
-            self._last_used = now
-            return self._browser
+            self._active -= 1
+            self._last_used = time.monotonic()
+            if (reusable
+                    and self._browser is not None
+                    and context.browser is self._browser
+                    and len(self._idle_contexts) < self._pool_size):
+                self._idle_contexts.append(context)
+                return
+
+        try:
+            await context.close()
+        except Exception:
+            pass
+
+    @asynccontextmanager
+    async def _pooled_page(self) -> AsyncIterator:
+        """
+        從頁面池借出一個 page（最多 pool_size 個並發）
+
+        page 用完即關，context 歸還池中復用。
+        """
+        async with self._slots:
+            context = await self._checkout_context()
+            page = None
+            healthy = True
+            try:
+                page = await context.new_page()
+                yield page
+            except BaseException:
+                healthy = False
+                raise
+            finally:
+                if page is not None:
+                    try:
+                        await page.close()
+                    except Exception:
+                        healthy = False
+                await self._checkin_context(context, healthy)
 
     async def _shutdown(self):
         """安全關閉瀏覽器和 Playwright（不加鎖，由調用方持鎖）"""
+        # context 隨瀏覽器一同關閉，只需清空池
+        self._idle_contexts.clear()
+
         if self._browser is not None:
             try:
                 await self._browser.close()
@@ -136,53 +237,44 @@ class AgentBrowserConnector:
 
         logger.info(f"playwright: 開始搜索 {search_url}")
 
-        try:
-            return await asyncio.wait_for(
-                self._do_discover(search_url, max_products),
-                timeout=self.TOTAL_TIMEOUT_S,
-            )
-        except asyncio.TimeoutError:
-            logger.error(
-                f"playwright: 搜索超時 ({self.TOTAL_TIMEOUT_S}s): {search_url}"
-            )
-            raise
-
-    async def _do_discover(self, search_url: str, max_products: int) -> List[str]:
-        """瀏覽器搜索核心邏輯（復用瀏覽器，每次搜索獨立 context）"""
-        browser = await self._ensure_browser()
-
-        # 獨立 context → 隔離 cookies / session state
-        context = await browser.new_context()
-        page = None
-        try:
-            page = await context.new_page()
-
-            # 步驟 1: 打開搜索頁（30s 導航超時）
-            await page.goto(
-                search_url, wait_until="domcontentloaded", timeout=30000
-            )
-
-            # 步驟 2: 等待 JS 渲染（HKTVmall 商品列表是動態加載）
-            await page.wait_for_timeout(self.INITIAL_WAIT_MS)
+        # 超時只計算拿到頁面之後的時間（排隊等池位不算）
+        async with self._pooled_page() as page:
+            try:
+                return await asyncio.wait_for(
+                    self._do_discover(page, search_url, max_products),
+                    timeout=self.TOTAL_TIMEOUT_S,
+                )
+            except asyncio.TimeoutError:
+                logger.error(
+                    f"playwright: 搜索超時 ({self.TOTAL_TIMEOUT_S}s): {search_url}"
+                )
+                raise
+
+    async def _do_discover(
+        self, page, search_url: str, max_products: int
+    ) -> List[str]:
+        """瀏覽器搜索核心邏輯（page 由頁面池提供）"""
+        # 步驟 1: 打開搜索頁（30s 導航超時）
+        await page.goto(
+            search_url, wait_until="domcontentloaded", timeout=30000
+        )
 
-            # 步驟 3: 第一次滾動 + 等待（觸發 lazy load）
-            await page.evaluate(f"window.scrollBy(0, {self.SCROLL_DISTANCE_PX})")
-            await page.wait_for_timeout(self.SCROLL_PAUSE_MS)
+        # 步驟 2: 等待 JS 渲染（HKTVmall 商品列表是動態加載）
+        await page.wait_for_timeout(self.INITIAL_WAIT_MS)
 
-            # 步驟 4: 第二次滾動 + 等待
-            await page.evaluate(f"window.scrollBy(0, {self.SCROLL_DISTANCE_PX})")
-            await page.wait_for_timeout(self.FINAL_WAIT_MS)
+        # 步驟 3: 第一次滾動 + 等待（觸發 lazy load）
+        await page.evaluate(f"window.scrollBy(0, {self.SCROLL_DISTANCE_PX})")
+        await page.wait_for_timeout(self.SCROLL_PAUSE_MS)
 
-            # 步驟 5: 在瀏覽器端直接提取商品 URL
-            urls = await page.evaluate(_JS_EXTRACT_PRODUCT_URLS)
+        # 步驟 4: 第二次滾動 + 等待
+        await page.evaluate(f"window.scrollBy(0, {self.SCROLL_DISTANCE_PX})")
+        await page.wait_for_timeout(self.FINAL_WAIT_MS)
 
-            logger.info(f"playwright: 發現 {len(urls)} 個商品 URL")
-            return urls[:max_products]
+        # 步驟 5: 在瀏覽器端直接提取商品 URL
+        urls = await page.evaluate(_JS_EXTRACT_PRODUCT_URLS)
 
-        finally:
-            if page is not None:
-                await page.close()
-            await context.close()
+        logger.info(f"playwright: 發現 {len(urls)} 個商品 URL")
+        return urls[:max_products]
 
 
     # =============================================
@@ -213,53 +305,42 @@ class AgentBrowserConnector:
 
         logger.info(f"playwright-wellcome: 開始搜索 {search_url}")
 
-        try:
-            return await asyncio.wait_for(
-                self._do_discover_wellcome(search_url, max_products),
-                timeout=self.TOTAL_TIMEOUT_S,
-            )
-        except asyncio.TimeoutError:
-            logger.error(
-                f"playwright-wellcome: 搜索超時 ({self.TOTAL_TIMEOUT_S}s): {search_url}"
-            )
-            raise
+        async with self._pooled_page() as page:
+            try:
+                return await asyncio.wait_for(
+                    self._do_discover_wellcome(page, search_url, max_products),
+                    timeout=self.TOTAL_TIMEOUT_S,
+                )
+            except asyncio.TimeoutError:
+                logger.error(
+                    f"playwright-wellcome: 搜索超時 ({self.TOTAL_TIMEOUT_S}s): {search_url}"
+                )
+                raise
 
     async def _do_discover_wellcome(
-        self, search_url: str, max_products: int
+        self, page, search_url: str, max_products: int
     ) -> List[str]:
-        """惠康瀏覽器搜索核心邏輯"""
-        browser = await self._ensure_browser()
-
-        context = await browser.new_context()
-        page = None
-        try:
-            page = await context.new_page()
-
-            # 步驟 1: 導航到搜索/分類頁
-            await page.goto(
-                search_url, wait_until="domcontentloaded", timeout=30000
-            )
-
-            # 步驟 2: 等待 Nuxt.js hydration（10s，惠康比 HKTVmall 快）
-            await page.wait_for_timeout(10000)
+        """惠康瀏覽器搜索核心邏輯（page 由頁面池提供）"""
+        # 步驟 1: 導航到搜索/分類頁
+        await page.goto(
+            search_url, wait_until="domcontentloaded", timeout=30000
+        )
 
-            # 步驟 3: 滾動觸發 lazy load
-            await page.evaluate(f"window.scrollBy(0, {self.SCROLL_DISTANCE_PX})")
-            await page.wait_for_timeout(self.SCROLL_PAUSE_MS)
+        # 步驟 2: 等待 Nuxt.js hydration（10s，惠康比 HKTVmall 快）
+        await page.wait_for_timeout(10000)
 
-            await page.evaluate(f"window.scrollBy(0, {self.SCROLL_DISTANCE_PX})")
-            await page.wait_for_timeout(self.FINAL_WAIT_MS)
+        # 步驟 3: 滾動觸發 lazy load
+        await page.evaluate(f"window.scrollBy(0, {self.SCROLL_DISTANCE_PX})")
+        await page.wait_for_timeout(self.SCROLL_PAUSE_MS)
 
-            # 步驟 4: 提取產品 URL
-            urls = await page.evaluate(self._JS_EXTRACT_WELLCOME_URLS)
+        await page.evaluate(f"window.scrollBy(0, {self.SCROLL_DISTANCE_PX})")
+        await page.wait_for_timeout(self.FINAL_WAIT_MS)
 
-            logger.info(f"playwright-wellcome: 發現 {len(urls)} 個產品 URL")
-            return urls[:max_products]
+        # 步驟 4: 提取產品 URL
+        urls = await page.evaluate(self._JS_EXTRACT_WELLCOME_URLS)
 
-        finally:
-            if page is not None:
-                await page.close()
-            await context.close()
+        logger.info(f"playwright-wellcome: 發現 {len(urls)} 個產品 URL")
+        return urls[:max_products]
 
 
 # =============================================
@@ -276,5 +357,7 @@ def get_agent_browser_connector() -> AgentBrowserConnector:
     if _connector is None:
         with _connector_lock:
             if _connector is None:
-                _connector = AgentBrowserConnector()
+                _connector = AgentBrowserConnector(
+                    pool_size=get_settings().agent_browser_pool_size,
+                )
     return _connector
@@ -32,6 +32,7 @@ class WellcomeProduct:
     brand: Optional[str] = None
     image_url: Optional[str] = None
     product_id: Optional[str] = None  # 9 位數字
+    score: Optional[float] = None     # 本地索引搜索的 trigram 相關度
 
     def to_dict(self) -> dict:
         return {
@@ -0,0 +1,76 @@
+# =============================================
+# Keyset（游標）分頁工具
+# =============================================
+# 游標是最後一行排序鍵的 base64url(JSON)，對客戶端不透明。
+# 深頁只需從索引上的位置繼續掃描，成本與頁深無關（OFFSET 則需先跳過前面所有行）。
+
+import base64
+import json
+from decimal import Decimal
+from typing import Any, Sequence
+
+from sqlalchemy import Select, func, select, text, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import ColumnElement
+
+from app.core.exceptions import ValidationError
+
+
+def encode_cursor(*values: Any) -> str:
+    """把排序鍵編碼成游標（Decimal / UUID / datetime 轉字串）"""
+    raw = json.dumps([_to_json(v) for v in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> list:
+    """解碼游標；格式錯誤時拋 ValidationError（400）"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise ValidationError("無效的分頁游標")
+    if not isinstance(values, list) or len(values) != size:
+        raise ValidationError("無效的分頁游標")
+    return values
+
+
+def keyset_after(columns: Sequence[ColumnElement], values: Sequence[Any], descending: bool = True):
+    """
+    生成「排在游標之後」的條件
+
+    用行值比較 (a, b) < (x, y)，Postgres 可直接在 (a DESC, b DESC) 複合索引上定位。
+    """
+    left = tuple_(*columns)
+    right = tuple_(*values)
+    return left < right if descending else left > right
+
+
+async def count_rows(db: AsyncSession, query: Select, estimate: bool = False) -> tuple[int, bool]:
+    """
+    統計查詢結果行數，返回 (行數, 是否為估算值)
+
+    estimate=True 時在 Postgres 上讀取 EXPLAIN 的 Plan Rows（不執行查詢，毫秒級），
+    其他數據庫退回精確 count。
+    """
+    count_query = select(func.count()).select_from(query.order_by(None).subquery())
+    if estimate and db.bind.dialect.name == "postgresql":
+        compiled = query.order_by(None).compile(
+            dialect=db.bind.dialect,
+            compile_kwargs={"literal_binds": True},
+        )
+        plan = (await db.execute(text(f"EXPLAIN (FORMAT JSON) {compiled}"))).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"]), True
+
+    return (await db.execute(count_query)).scalar() or 0, False
+
+
+def _to_json(value: Any) -> Any:
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    if isinstance(value, Decimal):
+        return str(value)
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return str(value)
@@ -0,0 +1,43 @@
+# =============================================
+# 共用 Redis 客戶端
+# =============================================
+# 所有需要跨 worker 共享狀態的模塊（限速、快取）共用同一個連接池。
+# 連接是懶建立的：Redis 不可用時只有實際命令會失敗，調用方自行回退。
+
+import threading
+from typing import Optional
+
+import redis.asyncio as redis
+
+from app.config import get_settings
+
+# 限速在每個請求的熱路徑上，超時必須很短，Redis 掛掉時盡快回退本地
+SOCKET_TIMEOUT_S = 0.5
+
+_client: Optional[redis.Redis] = None
+_client_lock = threading.Lock()
+
+
+def get_redis_client() -> redis.Redis:
+    """獲取共用 Redis 客戶端單例（線程安全，懶連接）"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = redis.from_url(
+                    get_settings().redis_url,
+                    socket_connect_timeout=SOCKET_TIMEOUT_S,
+                    socket_timeout=SOCKET_TIMEOUT_S,
+                    health_check_interval=30,
+                )
+    return _client
+
+
+async def close_redis_client() -> None:
+    """關閉連接池（FastAPI shutdown 時用）"""
+    global _client
+    if _client is not None:
+        try:
+            await _client.aclose()
+        finally:
+            _client = None
@@ -3,13 +3,14 @@
 # =============================================
 
 from contextlib import asynccontextmanager
-from collections import defaultdict
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import JSONResponse
+from starlette.datastructures import MutableHeaders
 from starlette.middleware.base import BaseHTTPMiddleware
 from pathlib import Path
+import math
 import time
 import logging
 
@@ -18,30 +19,64 @@ from app.models.database import init_db
 from app.api.v1.router import api_router
 from app.core.logging import setup_logging
 from app.core.exceptions import register_exception_handlers
+from app.core.redis_client import get_redis_client, close_redis_client
+from app.services.rate_limiter import RateLimiterConfig, TokenBucketRateLimiter
 
 logger = logging.getLogger(__name__)
 
 
 # =============================================
-# H-03: 全局限速中間件 (In-Memory)
+# H-03: 全局限速中間件 (Redis 令牌桶)
 # =============================================
-class RateLimitMiddleware(BaseHTTPMiddleware):
+class RateLimitMiddleware:
     """
-    基於滑動窗口的速率限制中間件
+    基於令牌桶的速率限制中間件
 
-    採用簡單的內存存儲，適用於單實例部署。
-    多實例部署需改用 Redis 版本。
+    建立在 TokenBucketRateLimiter（Redis Lua 腳本）之上：
+    - 每個請求一次 EVALSHA 往返（登入端點兩次），開銷與歷史請求量無關
+    - 限額存在 Redis，多 worker / 多實例共享同一個桶
+    - Redis 不可用時回退到有上限的本地 LRU 令牌桶（單進程限制）
+    - 純 ASGI 實現（不經 BaseHTTPMiddleware 的 task group / stream 包裝）
     """
 
-    def __init__(self, app, requests_per_minute: int = 60, login_limit: int = 5):
-        super().__init__(app)
-        self.requests_per_minute = requests_per_minute
-        self.login_limit = login_limit
+    EXEMPT_PATHS = frozenset({"/health", "/docs", "/redoc", "/openapi.json"})
+
+    def __init__(
+        self,
+        app,
+        requests_per_minute: int = 60,
+        login_limit: int = 5,
+        redis_client=None,
+    ):
+        self.app = app
+        settings = get_settings()
+        # 開發環境仍然限速，但限制更寬鬆
+        limit_multiplier = 3 if settings.debug else 1
+
         self.window_seconds = 60
-        # {client_ip: [(timestamp, path), ...]}
-        self._requests: dict = defaultdict(list)
-        self._cleanup_interval = 300  # 5 分鐘清理一次過期記錄
-        self._last_cleanup = time.time()
+        self.requests_per_minute = requests_per_minute * limit_multiplier
+        self.login_limit = login_limit * limit_multiplier
+
+        redis_client = redis_client or get_redis_client()
+        # 桶容量 = 每分鐘限額，令牌以 limit/60 每秒補充（近似 60 秒滑動窗口）
+        self._global_limiter = TokenBucketRateLimiter(
+            redis_client,
+            RateLimiterConfig(
+                requests_per_window=self.requests_per_minute,
+                window_seconds=self.window_seconds,
+                burst_size=self.requests_per_minute,
+            ),
+            key_prefix="rate_limit:api",
+        )
+        self._login_limiter = TokenBucketRateLimiter(
+            redis_client,
+            RateLimiterConfig(
+                requests_per_window=self.login_limit,
+                window_seconds=self.window_seconds,
+                burst_size=self.login_limit,
+            ),
+            key_prefix="rate_limit:login",
+        )
 
     def _get_client_ip(self, request: Request) -> str:
         """獲取客戶端 IP，支持反向代理"""
@@ -53,99 +88,50 @@ class RateLimitMiddleware(BaseHTTPMiddleware):
         # 直連情況
         return request.client.host if request.client else "unknown"
 
-    def _cleanup_old_records(self, now: float) -> None:
-        """清理過期的請求記錄（含記憶體上限保護）"""
-        # 記憶體安全閥：超過 10000 個 IP 時強制清理
-        force_cleanup = len(self._requests) > 10000
-        if not force_cleanup and now - self._last_cleanup < self._cleanup_interval:
-            return
-
-        cutoff = now - self.window_seconds
-        for ip in list(self._requests.keys()):
-            self._requests[ip] = [
-                (ts, path) for ts, path in self._requests[ip]
-                if ts > cutoff
-            ]
-            if not self._requests[ip]:
-                del self._requests[ip]
-
-        # 如果清理後仍超 10000，移除最舊的 IP
-        if len(self._requests) > 10000:
-            sorted_ips = sorted(
-                self._requests.keys(),
-                key=lambda ip: min(ts for ts, _ in self._requests[ip]) if self._requests[ip] else 0
-            )
-            for ip in sorted_ips[:len(self._requests) - 5000]:
-                del self._requests[ip]
-
-        self._last_cleanup = now
-
-    def _count_requests(self, ip: str, now: float, path_filter: str = None) -> int:
-        """計算指定時間窗口內的請求數"""
-        cutoff = now - self.window_seconds
-        requests = self._requests[ip]
-
-        if path_filter:
-            return sum(1 for ts, path in requests if ts > cutoff and path_filter in path)
-        return sum(1 for ts, path in requests if ts > cutoff)
-
-    async def dispatch(self, request: Request, call_next):
-        settings = get_settings()
-
-        # 開發環境可選擇放寬限制
-        if settings.debug:
-            # 開發環境仍然限速，但限制更寬鬆
-            limit_multiplier = 3
-        else:
-            limit_multiplier = 1
+    @staticmethod
+    def _too_many_requests(detail: str, retry_after: float) -> JSONResponse:
+        retry_after_s = max(1, math.ceil(retry_after))
+        return JSONResponse(
+            status_code=429,
+            content={"detail": detail, "retry_after": retry_after_s},
+            headers={"Retry-After": str(retry_after_s)},
+        )
 
-        client_ip = self._get_client_ip(request)
-        now = time.time()
-        path = request.url.path
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
 
-        # 定期清理過期記錄
-        self._cleanup_old_records(now)
+        path = scope["path"]
 
         # 跳過健康檢查和靜態資源
-        if path in ["/health", "/docs", "/redoc", "/openapi.json"] or path.startswith("/static"):
-            return await call_next(request)
+        if path in self.EXEMPT_PATHS or path.startswith("/static"):
+            return await self.app(scope, receive, send)
+
+        client_ip = self._get_client_ip(Request(scope))
 
         # 對登入端點應用更嚴格的限制 (防止暴力破解)
         if "/auth/login" in path or "/auth/google" in path:
-            login_count = self._count_requests(client_ip, now, "/auth/")
-            if login_count >= self.login_limit * limit_multiplier:
-                return JSONResponse(
-                    status_code=429,
-                    content={
-                        "detail": "登入嘗試過於頻繁，請稍後再試",
-                        "retry_after": self.window_seconds
-                    },
-                    headers={"Retry-After": str(self.window_seconds)}
-                )
+            login = await self._login_limiter.check(client_ip)
+            if not login.allowed:
+                response = self._too_many_requests("登入嘗試過於頻繁，請稍後再試", login.retry_after)
+                return await response(scope, receive, send)
 
         # 全局限速檢查
-        total_count = self._count_requests(client_ip, now)
-        if total_count >= self.requests_per_minute * limit_multiplier:
-            return JSONResponse(
-                status_code=429,
-                content={
-                    "detail": "請求過於頻繁，請稍後再試",
-                    "retry_after": self.window_seconds
-                },
-                headers={"Retry-After": str(self.window_seconds)}
-            )
-
-        # 記錄本次請求
-        self._requests[client_ip].append((now, path))
+        result = await self._global_limiter.check(client_ip)
+        if not result.allowed:
+            response = self._too_many_requests("請求過於頻繁，請稍後再試", result.retry_after)
+            return await response(scope, receive, send)
 
         # 添加限速標頭到響應
-        response = await call_next(request)
-        remaining = max(0, self.requests_per_minute * limit_multiplier - total_count - 1)
-        response.headers["X-RateLimit-Limit"] = str(self.requests_per_minute * limit_multiplier)
-        response.headers["X-RateLimit-Remaining"] = str(remaining)
-        response.headers["X-RateLimit-Reset"] = str(int(now + self.window_seconds))
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers["X-RateLimit-Limit"] = str(self.requests_per_minute)
+                headers["X-RateLimit-Remaining"] = str(int(result.remaining))
+                headers["X-RateLimit-Reset"] = str(int(time.time() + self.window_seconds))
+            await send(message)
 
-        return response
+        await self.app(scope, receive, send_with_headers)
 
 
 # =============================================
@@ -180,6 +166,14 @@ async def lifespan(app: FastAPI):
     setup_logging(debug=settings.debug)
     # 啟動時初始化數據庫
     await init_db()
+    # 產品實體詞庫（意圖識別的產品名匹配，之後隨 ORM 寫入增量更新）
+    try:
+        from app.models.database import async_session_maker
+        from app.services.agent.keyword_matcher import load_product_catalog
+        async with async_session_maker() as session:
+            await load_product_catalog(session)
+    except Exception as exc:
+        logger.warning(f"產品實體詞庫載入失敗，僅使用 taxonomy 名稱: {exc}")
     # 啟動 Agent Team（依賴 DB 已初始化）
     from app.agents import startup_agents, shutdown_agents
     from app.scheduler import start_scheduler, stop_scheduler
@@ -190,6 +184,9 @@ async def lifespan(app: FastAPI):
     # 關閉時清理資源
     await stop_scheduler()
     await shutdown_agents()
+    from app.services.telegram import close_telegram_notifier
+    await close_telegram_notifier()
+    await close_redis_client()
 
 
 def create_app() -> FastAPI:
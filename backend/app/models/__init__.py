@@ -9,8 +9,8 @@ from app.models.content import AIContent, PipelineSession
 from app.models.system import ScrapeLog, SyncLog, Settings
 from app.models.scrape_config import ScrapeConfig
 from app.models.import_job import ImportJob, ImportJobItem
-from app.models.analytics import PriceAnalytics, MarketReport
-from app.models.notification import Notification, Webhook
+from app.models.analytics import PriceAnalytics, MarketReport, DashboardCounters
+from app.models.notification import Notification, TelegramOutbox, Webhook
 from app.models.user import User
 from app.models.pricing import PriceProposal
 from app.models.image_generation import (
@@ -30,6 +30,7 @@ from app.models.seo import (
 from app.models.seo_ranking import (
     KeywordConfig,
     KeywordRanking,
+    KeywordRankingDaily,
     SEOReport,
     RankingAlert,
     RankingScrapeJob,
@@ -70,8 +71,10 @@ __all__ = [
     # 分析報告
     "PriceAnalytics",
     "MarketReport",
+    "DashboardCounters",
     # 通知
     "Notification",
+    "TelegramOutbox",
     "Webhook",
     # 智能定價
     "PriceProposal",
@@ -90,6 +93,7 @@ __all__ = [
     # SEO 排名追蹤
     "KeywordConfig",
     "KeywordRanking",
+    "KeywordRankingDaily",
     "SEOReport",
     "RankingAlert",
     "RankingScrapeJob",
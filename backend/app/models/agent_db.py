@@ -2,7 +2,7 @@
 # AI Agent 數據庫模型
 # =============================================
 
-from sqlalchemy import Column, String, Text, DateTime, ForeignKey, JSON
+from sqlalchemy import Column, String, Text, DateTime, ForeignKey, Index, JSON
 from sqlalchemy.orm import relationship
 from sqlalchemy.dialects.postgresql import UUID
 import uuid
@@ -18,6 +18,8 @@ class AgentConversation(Base):
     # 狀態持久化
     slots = Column(JSON, default={})
     current_intent = Column(String(50), nullable=True)
+    # 滾動摘要：已移出載入窗口的較早訊息（每輪只載入最近 N 條）
+    summary = Column(Text, nullable=True)
     
     created_at = Column(DateTime(timezone=True), default=utcnow)
     updated_at = Column(DateTime(timezone=True), default=utcnow, onupdate=utcnow)
@@ -41,3 +43,8 @@ class AgentMessage(Base):
 
     # 關聯
     conversation = relationship("AgentConversation", back_populates="messages")
+
+    __table_args__ = (
+        # 窗口載入：按對話取最近 N 條
+        Index("idx_agent_messages_conversation_created", "conversation_id", "created_at"),
+    )
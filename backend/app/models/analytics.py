@@ -8,7 +8,7 @@ from uuid import UUID
 import uuid
 from decimal import Decimal
 
-from sqlalchemy import Column, String, Integer, Boolean, Text, ForeignKey, Index, Date, UniqueConstraint
+from sqlalchemy import Column, String, Integer, Boolean, Text, ForeignKey, Index, Date, UniqueConstraint, Numeric
 from sqlalchemy.dialects.postgresql import UUID as PGUUID, JSONB
 from sqlalchemy.orm import relationship, Mapped, mapped_column
 
@@ -144,3 +144,30 @@ class MarketReport(Base):
             "expires_at": self.expires_at.isoformat() if self.expires_at else None,
             "created_at": self.created_at.isoformat() if self.created_at else None,
         }
+
+
+class DashboardCounters(Base):
+    """
+    儀表板計數器（分片物化表，id 為 1..COUNTER_SHARDS）
+
+    由寫入路徑在同一事務內對其中一個分片做增量更新（見 app/services/dashboard_counters.py），
+    定時對賬任務按源表重算並把總數寫回 1 號行；儀表板讀取時對各分片求和
+    """
+
+    __tablename__ = "dashboard_counters"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, default=1)
+
+    orders_to_ship: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    unread_messages: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    pending_price_reviews: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    pending_promotion_reviews: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    unread_alerts: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+    # 本月結算（month_start 之後的結算單）；跨月時讀取方觸發重算
+    month_start: Mapped[datetime] = mapped_column(nullable=False)
+    monthly_revenue: Mapped[Decimal] = mapped_column(Numeric(14, 2), nullable=False, default=0)
+    monthly_profit: Mapped[Decimal] = mapped_column(Numeric(14, 2), nullable=False, default=0)
+
+    reconciled_at: Mapped[Optional[datetime]] = mapped_column(nullable=True)
+    updated_at: Mapped[datetime] = mapped_column(default=utcnow, onupdate=utcnow)
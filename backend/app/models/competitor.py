@@ -117,6 +117,8 @@ class PriceSnapshot(Base):
     __table_args__ = (
         Index("idx_price_snapshots_product_id", "competitor_product_id"),
         Index("idx_price_snapshots_scraped_at", "scraped_at"),
+        # 趨勢圖：按商品 + 時間範圍分桶
+        Index("idx_price_snapshots_product_scraped", "competitor_product_id", "scraped_at"),
     )
 
 
@@ -48,6 +48,8 @@ def _prepare_async_url(url: str) -> tuple[str, dict]:
     需要從 URL 中剝離，改用 connect_args 傳入 SSL 上下文。
     """
     async_url = url.replace("postgresql://", "postgresql+asyncpg://")
+    if not async_url.startswith("postgresql"):
+        return async_url, {}
     parsed = urlparse(async_url)
     params = parse_qs(parsed.query)
 
@@ -80,8 +82,7 @@ engine = create_async_engine(
     db_url,
     echo=settings.debug,
     pool_pre_ping=True,
-    pool_size=5,
-    max_overflow=10,
+    **({"pool_size": 5, "max_overflow": 10} if db_url.startswith("postgresql") else {}),
     pool_recycle=120,  # Neon serverless: recycle connections every 2 min
     connect_args=connect_args,
 )
@@ -106,6 +107,11 @@ async def run_migrations(conn):
         infra_statements = [
             "CREATE EXTENSION IF NOT EXISTS pg_trgm;",
             "CREATE INDEX IF NOT EXISTS idx_cp_name_trgm ON competitor_products USING GIN (name gin_trgm_ops);",
+            # 商品搜索（products.search_text 生成列由 Alembic 添加）/ Agent 品類概覽的 ILIKE
+            "CREATE INDEX IF NOT EXISTS idx_products_search_trgm ON products USING GIN (search_text gin_trgm_ops);",
+            "CREATE INDEX IF NOT EXISTS idx_category_products_name_trgm ON category_products USING GIN (name gin_trgm_ops);",
+            # 品牌知識搜索的中日文回退（brand_knowledge.search_text 生成列由 Alembic 添加）
+            "CREATE INDEX IF NOT EXISTS idx_brand_knowledge_search_trgm ON brand_knowledge USING GIN (search_text gin_trgm_ops);",
         ]
         for stmt in infra_statements:
             try:
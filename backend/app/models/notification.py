@@ -11,7 +11,7 @@ from sqlalchemy import Column, String, Integer, Boolean, Text, Index
 from sqlalchemy.dialects.postgresql import UUID as PGUUID, JSONB
 from sqlalchemy.orm import Mapped, mapped_column
 
-from app.models.database import Base
+from app.models.database import Base, utcnow
 from app.core.encryption import encrypt_value, decrypt_value, is_encrypted
 
 
@@ -38,6 +38,43 @@ class ReportSubscriber(Base):
     last_delivered_at: Mapped[Optional[datetime]] = mapped_column(nullable=True)
 
 
+class TelegramOutbox(Base):
+    """
+    Telegram 通知 Outbox（持久化待發消息）
+
+    pending → sent / failed；派發時先租約認領（available_at 推後、attempts + 1），
+    發送成功後標記 sent，進程崩潰時租約到期重新派發（at-least-once）
+    """
+
+    __tablename__ = "telegram_outbox"
+
+    id: Mapped[UUID] = mapped_column(
+        PGUUID(as_uuid=True), primary_key=True, default=uuid.uuid4
+    )
+    chat_id: Mapped[str] = mapped_column(String(64), nullable=False)
+    dedupe_key: Mapped[str] = mapped_column(String(200), nullable=False, comment="同一 chat 內重複入隊只保留一條")
+
+    text: Mapped[str] = mapped_column(Text, nullable=False, comment="HTML 消息內容")
+    reply_markup: Mapped[Optional[Dict]] = mapped_column(JSONB, nullable=True)
+    parse_mode: Mapped[str] = mapped_column(String(20), nullable=False, default="HTML")
+    disable_notification: Mapped[bool] = mapped_column(Boolean, nullable=False, default=False)
+    digestible: Mapped[bool] = mapped_column(Boolean, nullable=False, default=True, comment="是否可合併進摘要")
+
+    status: Mapped[str] = mapped_column(String(20), nullable=False, default="pending", comment="pending, sent, failed")
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    last_error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+
+    created_at: Mapped[datetime] = mapped_column(default=utcnow)
+    available_at: Mapped[datetime] = mapped_column(nullable=False, comment="最早可派發時間（摘要窗口 / 退避 / 租約）")
+    claimed_at: Mapped[Optional[datetime]] = mapped_column(nullable=True)
+    sent_at: Mapped[Optional[datetime]] = mapped_column(nullable=True)
+
+    __table_args__ = (
+        Index("uq_telegram_outbox_chat_dedupe", "chat_id", "dedupe_key", unique=True),
+        Index("idx_telegram_outbox_status_available", "status", "available_at"),
+    )
+
+
 class Notification(Base):
     """系統通知"""
 
@@ -6,7 +6,7 @@ import uuid
 from datetime import datetime
 from decimal import Decimal
 from typing import Optional, List
-from sqlalchemy import String, Text, Boolean, ForeignKey, Numeric, Integer, Index, UniqueConstraint
+from sqlalchemy import String, Text, Boolean, ForeignKey, Numeric, Integer, Index, UniqueConstraint, Computed, text
 from sqlalchemy.dialects.postgresql import UUID, JSONB
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
@@ -26,6 +26,20 @@ class Product(Base):
     brand: Mapped[Optional[str]] = mapped_column(String(255))
     price: Mapped[Optional[Decimal]] = mapped_column(Numeric(10, 2))
     cost: Mapped[Optional[Decimal]] = mapped_column(Numeric(10, 2), comment="成本價")
+
+    # 利潤（數據庫生成列，供利潤排行榜在 SQL 中過濾 / 排序 / keyset 分頁）
+    profit_amount: Mapped[Optional[Decimal]] = mapped_column(
+        Numeric(11, 2),
+        Computed("price - cost", persisted=True),
+        comment="利潤額 = price - cost",
+    )
+    profit_margin: Mapped[Optional[Decimal]] = mapped_column(
+        # 不限精度：成本極低（如 0.01）時利潤率可達 1e10%，定長 NUMERIC 會 numeric field overflow
+        Numeric(),
+        # ROUND 到 4 位小數：游標中的值與庫中存值逐位一致
+        Computed("CASE WHEN cost > 0 THEN ROUND((price - cost) * 100.0 / cost, 4) END", persisted=True),
+        comment="利潤率（%）= (price - cost) / cost * 100",
+    )
     
     # 定價保護欄位
     min_price: Mapped[Optional[Decimal]] = mapped_column(Numeric(10, 2), comment="最低售價 (保護價)")
@@ -55,6 +69,17 @@ class Product(Base):
     name_ja: Mapped[Optional[str]] = mapped_column(String(500), comment="日文品名 - 核心搜索鍵")
     name_en: Mapped[Optional[str]] = mapped_column(String(500), comment="英文品名/規格")
 
+    # 搜索列（數據庫生成列）：sku 在最前，便於判斷 SKU 完全匹配；見 app/services/product_search.py
+    search_text: Mapped[Optional[str]] = mapped_column(
+        Text,
+        Computed(
+            "lower(coalesce(sku, '') || ' ' || coalesce(name, '') || ' ' || coalesce(name_zh, '')"
+            " || ' ' || coalesce(name_en, '') || ' ' || coalesce(name_ja, ''))",
+            persisted=True,
+        ),
+        comment="sku + 多語言品名（小寫），trigram 索引",
+    )
+
     # 分類層級
     category_main: Mapped[Optional[str]] = mapped_column(String(100), comment="大分類: 飛機貨、乾貨、急凍...")
     category_sub: Mapped[Optional[str]] = mapped_column(String(100), comment="小分類: 鮮魚、貝類、蝦蟹...")
@@ -90,6 +115,17 @@ class Product(Base):
         Index("idx_products_category_main", "category_main"),
         Index("idx_products_source", "source"),
         Index("idx_products_category_tag", "category_tag"),
+        # 默認列表的 keyset 分頁（search_text 的 trigram 索引依賴 pg_trgm，見 run_migrations）
+        Index("idx_products_created_id", text("created_at DESC"), text("id DESC")),
+        # 利潤排行榜（部分索引：只含有價格和成本的商品，順序與 keyset 分頁一致）
+        Index(
+            "idx_products_profit_margin", text("profit_margin DESC"), text("id DESC"),
+            postgresql_where=text("price > 0 AND cost > 0"),
+        ),
+        Index(
+            "idx_products_profit_amount", text("profit_amount DESC"), text("id DESC"),
+            postgresql_where=text("price > 0 AND cost > 0"),
+        ),
     )
 
 
@@ -157,6 +193,7 @@ class OwnPriceSnapshot(Base):
     __table_args__ = (
         Index("idx_own_price_snapshots_product_id", "product_id"),
         Index("idx_own_price_snapshots_recorded_at", "recorded_at"),
+        Index("idx_own_price_snapshots_product_recorded", "product_id", "recorded_at"),
     )
 
 
@@ -1,7 +1,7 @@
 import uuid
 from datetime import datetime
 from decimal import Decimal
-from sqlalchemy import String, DateTime, Numeric, ForeignKey, Text
+from sqlalchemy import String, DateTime, Numeric, ForeignKey, Text, Index, text
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
@@ -43,3 +43,14 @@ class PromotionProposal(Base):
     # 關聯
     product = relationship("Product")
 
+    __table_args__ = (
+        # 每個商品最多一條待審建議：批量生成以 ON CONFLICT DO NOTHING 去重
+        Index(
+            "uq_promotion_proposals_pending_product",
+            "product_id",
+            unique=True,
+            postgresql_where=text("status = 'pending'"),
+            sqlite_where=text("status = 'pending'"),
+        ),
+    )
+
@@ -7,7 +7,7 @@ from datetime import datetime
 from decimal import Decimal
 from typing import Optional, List
 
-from sqlalchemy import String, Text, Integer, Boolean, ForeignKey, Index, Numeric
+from sqlalchemy import String, Text, Integer, Boolean, ForeignKey, Index, Numeric, Computed
 from sqlalchemy.dialects.postgresql import UUID, JSONB
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
@@ -308,6 +308,18 @@ class BrandKnowledge(Base):
         comment="搜索關鍵詞"
     )
 
+    # 搜索列（數據庫生成列），見 app/services/knowledge_search.py
+    # - search_text：小寫拼接文本，trigram 索引（中日文查詢）
+    # - search_vector：tsvector 生成列 + GIN 索引，只由 Alembic 建立（SQLite 沒有 to_tsvector，不映射到模型）
+    search_text: Mapped[Optional[str]] = mapped_column(
+        Text,
+        Computed(
+            "lower(coalesce(title, '') || ' ' || coalesce(summary, '') || ' ' || coalesce(content, ''))",
+            persisted=True,
+        ),
+        comment="標題 + 摘要 + 內容（小寫），trigram 索引",
+    )
+
     # =============================================
     # 狀態
     # =============================================
@@ -336,6 +348,8 @@ class BrandKnowledge(Base):
         Index("idx_brand_knowledge_is_active", "is_active"),
         Index("idx_brand_knowledge_is_featured", "is_featured"),
         Index("idx_brand_knowledge_tags", "tags", postgresql_using='gin'),
+        # 按產品查知識：related_products ? '<product_id>'（jsonb_ops 支持 ? 運算符）
+        Index("idx_brand_knowledge_related_products", "related_products", postgresql_using='gin'),
     )
 
 
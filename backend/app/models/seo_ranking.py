@@ -6,17 +6,18 @@
 # 包含：
 #   - KeywordConfig: 關鍵詞配置與追蹤設定
 #   - KeywordRanking: 排名歷史記錄
+#   - KeywordRankingDaily: 排名按日匯總（趨勢圖）
 #   - SEOReport: 優化報告
 #   - RankingAlert: 排名變化警報
 # =============================================
 
 import uuid
-from datetime import datetime
+from datetime import date, datetime
 from decimal import Decimal
 from typing import Optional, List
 from enum import Enum
 
-from sqlalchemy import String, Text, Integer, Boolean, ForeignKey, Index, Numeric, Enum as SQLEnum
+from sqlalchemy import String, Text, Integer, Boolean, Date, ForeignKey, Index, Numeric, Enum as SQLEnum
 from sqlalchemy.dialects.postgresql import UUID, JSONB
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
@@ -389,6 +390,51 @@ class KeywordRanking(Base):
     )
 
 
+# =============================================
+# 關鍵詞排名日匯總表
+# =============================================
+
+class KeywordRankingDaily(Base):
+    """
+    關鍵詞排名按日匯總（每個關鍵詞 × 日期 × 來源一行）
+
+    - track_keyword 寫入排名時在同一事務內增量 upsert
+    - backfill_ranking_rollups 按 keyword_rankings 重算（可重複執行）
+    - 平均排名 = rank_sum / sample_count，保留和與次數才能增量合併
+    """
+    __tablename__ = "keyword_ranking_daily"
+
+    keyword_config_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True),
+        ForeignKey("keyword_configs.id", ondelete="CASCADE"),
+        primary_key=True
+    )
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    source: Mapped[str] = mapped_column(
+        String(20),
+        primary_key=True,
+        comment="google / hktvmall"
+    )
+    product_id: Mapped[Optional[uuid.UUID]] = mapped_column(
+        UUID(as_uuid=True),
+        ForeignKey("products.id", ondelete="SET NULL"),
+        nullable=True,
+        comment="冗餘自 keyword_configs，方便按產品篩選"
+    )
+
+    best_rank: Mapped[int] = mapped_column(Integer, nullable=False)
+    worst_rank: Mapped[int] = mapped_column(Integer, nullable=False)
+    rank_sum: Mapped[int] = mapped_column(Integer, nullable=False)
+    sample_count: Mapped[int] = mapped_column(Integer, nullable=False)
+
+    updated_at: Mapped[datetime] = mapped_column(default=utcnow, onupdate=utcnow)
+
+    __table_args__ = (
+        Index("idx_keyword_ranking_daily_day_source", "day", "source"),
+        Index("idx_keyword_ranking_daily_product_day", "product_id", "day"),
+    )
+
+
 # =============================================
 # SEO 優化報告表
 # =============================================
@@ -72,3 +72,27 @@ class SystemSetting(Base):
     value: Mapped[str] = mapped_column(Text, nullable=False)
     description: Mapped[Optional[str]] = mapped_column(Text)
     updated_at: Mapped[datetime] = mapped_column(default=utcnow, onupdate=utcnow)
+
+
+class EventOutbox(Base):
+    """
+    Agent 事件 Outbox（EventBus 異步派發的持久化記錄）
+
+    pending → done / failed；重啟後仍為 pending 的事件由 EventBus 重放（at-least-once）
+    """
+    __tablename__ = "event_outbox"
+
+    id: Mapped[str] = mapped_column(String(32), primary_key=True, comment="Event.id")
+    event_type: Mapped[str] = mapped_column(String(100), nullable=False)
+    payload: Mapped[dict] = mapped_column(JSONB, nullable=False, default=dict)
+    source: Mapped[Optional[str]] = mapped_column(String(50))
+    status: Mapped[str] = mapped_column(String(20), nullable=False, default="pending", comment="pending, done, failed")
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=1)
+    last_error: Mapped[Optional[str]] = mapped_column(Text)
+    created_at: Mapped[datetime] = mapped_column(default=utcnow, comment="事件發生時間")
+    claimed_at: Mapped[Optional[datetime]] = mapped_column(comment="最近一次被某進程接手派發的時間")
+    processed_at: Mapped[Optional[datetime]] = mapped_column()
+
+    __table_args__ = (
+        Index("idx_event_outbox_status_claimed", "status", "claimed_at"),
+    )
@@ -78,6 +78,15 @@ async def job_track_all_keywords():
     )
 
 
+async def job_backfill_ranking_rollups():
+    """每日重算最近的排名日匯總"""
+    from app.tasks.seo_ranking_tasks import backfill_ranking_rollups_async
+    await _safe_run(
+        "backfill_ranking_rollups",
+        backfill_ranking_rollups_async,
+    )
+
+
 async def job_generate_weekly_reports():
     """每週生成 SEO 報告"""
     from app.tasks.seo_ranking_tasks import generate_weekly_reports_async
@@ -134,6 +143,26 @@ async def job_daily_catalog_sync():
     await _safe_run("daily_catalog_sync", daily_catalog_sync_async)
 
 
+# =============================================
+# 分析數據維護
+# =============================================
+
+async def job_reconcile_dashboard_counters():
+    """儀表板計數器對賬"""
+    from app.tasks.analytics_tasks import reconcile_dashboard_counters_async
+    await _safe_run("reconcile_dashboard_counters", reconcile_dashboard_counters_async)
+
+
+# =============================================
+# 通知派發
+# =============================================
+
+async def job_dispatch_telegram_outbox():
+    """Telegram 通知 Outbox 派發"""
+    from app.tasks.notification_tasks import dispatch_telegram_outbox_async
+    await _safe_run("dispatch_telegram_outbox", dispatch_telegram_outbox_async)
+
+
 # =============================================
 # 排程器生命週期
 # =============================================
@@ -206,6 +235,14 @@ def create_scheduler() -> AsyncIOScheduler:
         name="SEO 排名追蹤",
     )
 
+    # 23:30 — 排名日匯總對賬（最近 2 天）
+    scheduler.add_job(
+        job_backfill_ranking_rollups,
+        CronTrigger(hour=23, minute=30),
+        id="seo-ranking-rollup",
+        name="SEO 排名日匯總對賬",
+    )
+
     # 週一 08:00 — 每週 SEO 報告
     scheduler.add_job(
         job_generate_weekly_reports,
@@ -268,6 +305,26 @@ def create_scheduler() -> AsyncIOScheduler:
         name="每日競品庫同步",
     )
 
+    # ==================== 分析數據維護 ====================
+
+    # 每 15 分鐘 — 儀表板計數器對賬
+    scheduler.add_job(
+        job_reconcile_dashboard_counters,
+        CronTrigger(minute="*/15"),
+        id="reconcile-dashboard-counters",
+        name="儀表板計數器對賬",
+    )
+
+    # ==================== 通知派發 ====================
+
+    # 每 10 秒 — Telegram Outbox 派發（摘要窗口由 TELEGRAM_DIGEST_WINDOW_SECONDS 控制）
+    scheduler.add_job(
+        job_dispatch_telegram_outbox,
+        CronTrigger(second="*/10"),
+        id="dispatch-telegram-outbox",
+        name="Telegram 通知派發",
+    )
+
     return scheduler
 
 
@@ -37,6 +37,7 @@ class ProductListResponse(BaseModel):
     """產品列表響應"""
     products: List[ProductListItem]
     total: int
+    next_cursor: Optional[str] = None  # 下一頁游標（None = 已到最後一頁）
 
 
 # =============================================
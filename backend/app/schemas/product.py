@@ -73,3 +73,5 @@ class ProductListResponse(BaseModel):
     total: int
     page: int
     limit: int
+    total_is_estimate: bool = False  # count=estimate 時 total 為查詢計劃估算值
+    next_cursor: Optional[str] = None  # 下一頁游標（None = 已到最後一頁）
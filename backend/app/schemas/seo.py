@@ -314,6 +314,47 @@ class AISummaryResponse(BaseModel):
     entities: Dict[str, Any] = Field(default_factory=dict)
 
 
+class GEOPackageRequest(BaseModel):
+    """GEO/SEO 打包生成請求（一次 AI 調用生成關鍵詞、SEO、AI 摘要、FAQ）"""
+    product_id: UUID
+    max_faqs: int = Field(default=5, ge=1, le=10)
+
+
+class GEOPackageResponse(BaseModel):
+    """GEO/SEO 打包生成響應"""
+    product_id: UUID
+    success: bool
+    parts: Dict[str, Any] = Field(default_factory=dict)
+    failed_parts: Dict[str, List[str]] = Field(default_factory=dict)
+    ai_calls: int
+    seo_content_id: Optional[UUID] = None
+    product_schema_id: Optional[UUID] = None
+    faq_schema_id: Optional[UUID] = None
+
+
+class GEOPackageBatchRequest(BaseModel):
+    """全目錄打包生成請求（傳入已有 batch_id 即從中斷處續傳）"""
+    batch_id: Optional[str] = None
+    product_ids: Optional[List[UUID]] = Field(
+        default=None,
+        description="要生成的產品，不提供則處理全部產品"
+    )
+    concurrency: Optional[int] = Field(default=None, ge=1, le=20)
+    max_faqs: int = Field(default=5, ge=1, le=10)
+
+
+class GEOPackageBatchResponse(BaseModel):
+    """全目錄打包生成進度"""
+    batch_id: str
+    status: str
+    cursor: Optional[str] = None
+    processed: int = 0
+    succeeded: int = 0
+    failed: Dict[str, str] = Field(default_factory=dict)
+    started_at: Optional[str] = None
+    updated_at: Optional[str] = None
+
+
 # =============================================
 # 品牌知識圖譜
 # =============================================
@@ -310,6 +310,10 @@ class RankingLeaderboardRequest(BaseModel):
         default=False,
         description="是否包含未進入排名的關鍵詞"
     )
+    cursor: Optional[str] = Field(
+        default=None,
+        description="上一頁返回的 next_cursor（keyset 分頁）"
+    )
 
 
 class LeaderboardEntry(BaseModel):
@@ -345,10 +349,16 @@ class RankingLeaderboardResponse(BaseModel):
     generated_at: datetime
     entries: List[LeaderboardEntry]
     summary: "LeaderboardSummary"
+    type_summaries: List["LeaderboardSummary"] = Field(
+        default_factory=list,
+        description="按關鍵詞類型分組的摘要"
+    )
+    next_cursor: Optional[str] = None  # 下一頁游標（None = 已到最後一頁）
 
 
 class LeaderboardSummary(BaseModel):
-    """排行榜摘要"""
+    """排行榜摘要（覆蓋完整篩選範圍）"""
+    keyword_type: Optional[str] = Field(default=None, description="分組摘要的關鍵詞類型，總計為空")
     total_keywords: int
     ranked_keywords: int
     unranked_keywords: int
@@ -5,7 +5,7 @@
 import logging
 import uuid
 from dataclasses import dataclass, field
-from datetime import datetime
+from datetime import datetime, timedelta
 from enum import Enum
 from typing import Any, Dict, List, Optional, AsyncGenerator
 
@@ -13,7 +13,9 @@ logger = logging.getLogger(__name__)
 
 from sqlalchemy import select, desc
 from sqlalchemy.ext.asyncio import AsyncSession
+from app.config import get_settings
 from app.models.agent_db import AgentConversation, AgentMessage as DBAgentMessage
+from app.models.database import utcnow
 
 from .intent_classifier import IntentClassifier, IntentType, IntentResult
 from .slot_manager import SlotManager, AnalysisSlots, SlotStatus, SlotCompleteness
@@ -39,6 +41,8 @@ class ResponseType(Enum):
     MESSAGE = "message"
     CLARIFICATION = "clarification"
     REPORT = "report"
+    REPORT_SECTION = "report_section"  # 報告段落（完成即推送，report.index 為其在報告中的位置）
+    REPORT_DELTA = "report_delta"      # AI 洞察增量文字（追加到報告末尾）
     ERROR = "error"
 
 
@@ -77,6 +81,30 @@ PRODUCT_REQUIRED_INTENTS = {
 }
 
 
+# =============================================
+# 滾動摘要
+# =============================================
+
+# 摘要每條訊息保留的字數 / 摘要總長上限（超出時丟棄最舊的行）
+SUMMARY_LINE_CHARS = 80
+SUMMARY_MAX_CHARS = 2000
+
+_SUMMARY_ROLES = {"user": "用戶", "assistant": "助手"}
+
+
+def fold_summary(summary: Optional[str], messages: List["AgentMessage"]) -> Optional[str]:
+    """把移出窗口的訊息折疊進摘要：每條一行（角色 + 首行內容節選）"""
+    lines = summary.splitlines() if summary else []
+    for m in messages:
+        first_line = next((line.strip() for line in m.content.splitlines() if line.strip()), "")
+        if len(first_line) > SUMMARY_LINE_CHARS:
+            first_line = first_line[:SUMMARY_LINE_CHARS] + "…"
+        lines.append(f"{_SUMMARY_ROLES.get(m.role, m.role)}: {first_line}")
+    while lines and sum(len(line) + 1 for line in lines) > SUMMARY_MAX_CHARS:
+        lines.pop(0)
+    return "\n".join(lines) or None
+
+
 @dataclass
 class AgentMessage:
     """對話訊息"""
@@ -95,6 +123,8 @@ class AgentState:
     current_intent: Optional[IntentType] = None
     pending_clarifications: List[Dict] = field(default_factory=list)
     created_at: datetime = field(default_factory=datetime.utcnow)
+    # 窗口之前的較早訊息摘要
+    summary: Optional[str] = None
     
     def to_dict(self) -> Dict[str, Any]:
         return {
@@ -110,6 +140,7 @@ class AgentState:
             "slots": self.slots.to_dict(),
             "current_intent": self.current_intent.value if self.current_intent else None,
             "pending_clarifications": self.pending_clarifications,
+            "summary": self.summary,
         }
 
 
@@ -156,6 +187,9 @@ class AgentService:
         self.report_generator = ReportGenerator(ai_service)
         # 快取服務
         self.quick_cache = QuickCacheService(db)
+        # 每輪載入的最近訊息數
+        self.history_window = max(5, get_settings().agent_history_window)
+        self._last_message_at: Optional[datetime] = None
 
     async def get_conversations(self, limit: int = 50, offset: int = 0) -> List[Dict[str, Any]]:
         """獲取對話列表"""
@@ -184,46 +218,49 @@ class AgentService:
         # 暫時返回 None 強制調用者處理
         return None
 
-    async def get_state_async(self, conversation_id: str) -> Optional[AgentState]:
-        """異步獲取狀態"""
+    async def get_state_async(
+        self, conversation_id: str, window: Optional[int] = None
+    ) -> Optional[AgentState]:
+        """異步獲取狀態（window=None 載入全部訊息，供對話詳情頁顯示）"""
+        conv = await self._find_conversation(conversation_id)
+        if not conv:
+            return None
+        return await self._load_state(conv, window=window)
+
+    async def _find_conversation(self, conversation_id: Optional[str]) -> Optional[AgentConversation]:
         try:
             uuid_obj = uuid.UUID(conversation_id)
-            query = select(AgentConversation).where(AgentConversation.id == uuid_obj)
-            result = await self.db.execute(query)
-            conv = result.scalar_one_or_none()
-            if not conv:
-                return None
-            return await self._load_state(conv)
-        except ValueError:
+        except (ValueError, TypeError, AttributeError):
             return None
+        query = select(AgentConversation).where(AgentConversation.id == uuid_obj)
+        result = await self.db.execute(query)
+        return result.scalar_one_or_none()
 
     async def _get_or_create_conversation(self, conversation_id: Optional[str]) -> AgentConversation:
         if conversation_id:
-            try:
-                uuid_obj = uuid.UUID(conversation_id)
-                query = select(AgentConversation).where(AgentConversation.id == uuid_obj)
-                result = await self.db.execute(query)
-                conv = result.scalar_one_or_none()
-                if conv:
-                    return conv
-            except (ValueError, TypeError):
-                pass
-        
-        # 創建新對話
+            conv = await self._find_conversation(conversation_id)
+            if conv:
+                return conv
+
+        # 創建新對話（與用戶訊息一起在 _begin_turn 提交）
         conv = AgentConversation(
-            title=datetime.now().strftime("%Y-%m-%d %H:%M")
+            id=uuid.uuid4(),
+            title=datetime.now().strftime("%Y-%m-%d %H:%M"),
+            created_at=utcnow(),
         )
         self.db.add(conv)
-        await self.db.commit()
-        await self.db.refresh(conv)
         return conv
 
-    async def _load_state(self, conv: AgentConversation) -> AgentState:
-        # 加載消息
-        query = select(DBAgentMessage).where(DBAgentMessage.conversation_id == conv.id).order_by(DBAgentMessage.created_at)
-        result = await self.db.execute(query)
-        db_messages = result.scalars().all()
-        
+    async def _load_state(self, conv: AgentConversation, window: Optional[int] = None) -> AgentState:
+        """載入對話狀態：最近 window 條訊息（None = 全部）+ 滾動摘要 + 槽位"""
+        query = select(DBAgentMessage).where(DBAgentMessage.conversation_id == conv.id)
+        if window is None:
+            query = query.order_by(DBAgentMessage.created_at)
+            db_messages = (await self.db.execute(query)).scalars().all()
+        else:
+            query = query.order_by(desc(DBAgentMessage.created_at)).limit(window)
+            db_messages = list(reversed((await self.db.execute(query)).scalars().all()))
+
         messages = [
             AgentMessage(
                 role=m.role,
@@ -233,59 +270,91 @@ class AgentService:
             )
             for m in db_messages
         ]
-        
-        # 恢復 Slots
-        slots = AnalysisSlots()
-        if conv.slots:
-            # 簡單恢復 (假設 slots 結構匹配)
-            slots_dict = conv.slots
-            if "products" in slots_dict: slots.products = slots_dict["products"]
-            if "analysis_dimensions" in slots_dict: slots.analysis_dimensions = slots_dict["analysis_dimensions"]
-            if "time_range" in slots_dict: slots.time_range = slots_dict["time_range"]
-            if "competitors" in slots_dict: slots.competitors = slots_dict["competitors"]
-            # 注意：product_details 是複雜對象，這裡簡化處理可能丟失細節，需要完善 SlotManager 的反序列化
 
         return AgentState(
             conversation_id=str(conv.id),
             messages=messages,
-            slots=slots,
+            slots=AnalysisSlots.from_dict(conv.slots),
             current_intent=IntentType(conv.current_intent) if conv.current_intent else None,
-            created_at=conv.created_at
+            created_at=conv.created_at,
+            summary=conv.summary,
         )
 
-    async def _save_message(self, conversation_id: str, role: str, content: str, type: str = "message", metadata: Dict = None):
-        msg = DBAgentMessage(
-            conversation_id=uuid.UUID(conversation_id),
+    def _add_message(self, state: AgentState, role: str, content: str, type: str = "message", metadata: Dict = None):
+        """暫存一條訊息（本輪結束時與槽位更新一起提交）"""
+        # 同一輪的訊息在同一事務寫入：顯式給出遞增時間戳，保證載入順序
+        created_at = utcnow()
+        if self._last_message_at and created_at <= self._last_message_at:
+            created_at = self._last_message_at + timedelta(microseconds=1)
+        self._last_message_at = created_at
+
+        self.db.add(DBAgentMessage(
+            conversation_id=uuid.UUID(state.conversation_id),
             role=role,
             content=content,
             type=type,
-            meta_data=metadata or {}
-        )
-        self.db.add(msg)
+            meta_data=metadata or {},
+            created_at=created_at,
+        ))
+        state.messages.append(AgentMessage(role=role, content=content, timestamp=created_at, metadata=metadata or {}))
+
+    def _update_conversation_state(self, conv: AgentConversation, state: AgentState):
+        conv.slots = state.slots.to_dict()
+        conv.current_intent = state.current_intent.value if state.current_intent else None
+
+    async def _begin_turn(self, conv: AgentConversation, state: AgentState, message: str):
+        """串流開始前先提交用戶訊息（及新對話）：客戶端斷開或中途出錯時訊息不會丟失"""
+        self._add_message(state, "user", message)
+
+        if not conv.title or conv.title == conv.created_at.strftime("%Y-%m-%d %H:%M"):
+            conv.title = message[:50] + ("..." if len(message) > 50 else "")
         await self.db.commit()
 
-    async def _update_conversation_state(self, conversation_id: str, slots: AnalysisSlots, intent: Optional[IntentType]):
-        query = select(AgentConversation).where(AgentConversation.id == uuid.UUID(conversation_id))
-        result = await self.db.execute(query)
-        conv = result.scalar_one_or_none()
-        if conv:
-            conv.slots = slots.to_dict()
-            conv.current_intent = intent.value if intent else None
+    async def _commit_turn(self, conv: AgentConversation, state: AgentState):
+        """提交助手回覆與槽位；再把移出窗口的訊息折疊進滾動摘要（單獨提交）"""
+        await self.db.commit()
+
+        overflow = len(state.messages) - self.history_window
+        if overflow > 0:
+            conv.summary = fold_summary(conv.summary, state.messages[:overflow])
+            state.messages = state.messages[overflow:]
+            state.summary = conv.summary
             await self.db.commit()
 
+    async def _stream_turn(
+        self, conv: AgentConversation, state: AgentState, turn: AsyncGenerator[AgentResponse, None]
+    ) -> AsyncGenerator[AgentResponse, None]:
+        """轉發一輪回覆；中途中斷（客戶端斷開 / 異常）時丟棄未提交的助手部分"""
+        try:
+            async for response in turn:
+                yield response
+        except BaseException:
+            await turn.aclose()
+            await self.db.rollback()
+            raise
+        await self._commit_turn(conv, state)
+
+    def _classifier_context(self, state: AgentState) -> List[Dict[str, str]]:
+        """意圖識別上下文：滾動摘要 + 最近 5 條訊息"""
+        context = [{"role": m.role, "content": m.content} for m in state.messages[-5:]]
+        if state.summary:
+            context.insert(0, {"role": "summary", "content": state.summary})
+        return context
+
     async def process_message(self, message: str, conversation_id: str = None) -> AsyncGenerator[AgentResponse, None]:
         conv = await self._get_or_create_conversation(conversation_id)
-        conversation_id = str(conv.id)
-        
-        state = await self._load_state(conv)
-        
-        state.messages.append(AgentMessage(role="user", content=message))
-        await self._save_message(conversation_id, "user", message)
-        
-        if not conv.title or conv.title == conv.created_at.strftime("%Y-%m-%d %H:%M"):
-            conv.title = message[:50] + ("..." if len(message) > 50 else "")
-            await self.db.commit()
-        
+        state = await self._load_state(conv, window=self.history_window)
+
+        await self._begin_turn(conv, state, message)
+
+        async for response in self._stream_turn(conv, state, self._process_turn(conv, state, message)):
+            yield response
+
+    async def _process_turn(
+        self, conv: AgentConversation, state: AgentState, message: str
+    ) -> AsyncGenerator[AgentResponse, None]:
+        conversation_id = state.conversation_id
+
         yield AgentResponse(
             type=ResponseType.THINKING,
             content=get_thinking(),
@@ -295,14 +364,14 @@ class AgentService:
         
         intent_result = await self.intent_classifier.classify(
             message=message,
-            context=[{"role": m.role, "content": m.content} for m in state.messages[-5:]],
+            context=self._classifier_context(state),
             use_ai=self.ai_service is not None
         )
         state.current_intent = intent_result.intent
         
         if intent_result.intent == IntentType.GREETING:
             response_content = self._get_greeting_response()
-            await self._save_message(conversation_id, "assistant", response_content, "message")
+            self._add_message(state, "assistant", response_content, "message")
             yield AgentResponse(
                 type=ResponseType.MESSAGE,
                 content=response_content,
@@ -314,7 +383,7 @@ class AgentService:
 
         if intent_result.intent == IntentType.HELP:
             response_content = self._get_help_response()
-            await self._save_message(conversation_id, "assistant", response_content, "message")
+            self._add_message(state, "assistant", response_content, "message")
             yield AgentResponse(
                 type=ResponseType.MESSAGE,
                 content=response_content,
@@ -334,7 +403,7 @@ class AgentService:
 • 「分析和牛價格」
 
 或者話我知你想做咩，我盡量幫你！"""
-            await self._save_message(conversation_id, "assistant", response_content, "message")
+            self._add_message(state, "assistant", response_content, "message")
             yield AgentResponse(
                 type=ResponseType.MESSAGE,
                 content=response_content,
@@ -355,8 +424,8 @@ class AgentService:
                 )
                 if quick_response:
                     logger.debug(f"使用快取回覆: intent={intent_result.intent.value}")
-                    await self._update_conversation_state(conversation_id, state.slots, state.current_intent)
-                    await self._save_message(conversation_id, "assistant", quick_response.message, "message")
+                    self._update_conversation_state(conv, state)
+                    self._add_message(state, "assistant", quick_response.message, "message")
 
                     # 轉換建議格式
                     suggestions = None
@@ -403,8 +472,8 @@ class AgentService:
                 errors=aggregated["errors"]
             )
 
-            await self._update_conversation_state(conversation_id, state.slots, state.current_intent)
-            await self._save_message(conversation_id, "assistant", response_content, "message")
+            self._update_conversation_state(conv, state)
+            self._add_message(state, "assistant", response_content, "message")
 
             # 獲取後續建議
             follow_up = get_follow_up_suggestions(
@@ -445,9 +514,9 @@ class AgentService:
                     "message": "想分析邊啲產品呀？🤔\n\n例如：和牛、三文魚、海膽、日本零食...\n\n直接話我知就得！",
                     "options": []
                 }
-                await self._update_conversation_state(conversation_id, state.slots, state.current_intent)
-                await self._save_message(
-                    conversation_id, "assistant", clarification["message"],
+                self._update_conversation_state(conv, state)
+                self._add_message(
+                    state, "assistant", clarification["message"],
                     "clarification", {"options": []}
                 )
                 yield AgentResponse(
@@ -459,68 +528,31 @@ class AgentService:
                 )
                 return
 
-        yield AgentResponse(
-            type=ResponseType.THINKING,
-            content="查詢緊數據...",
-            conversation_id=conversation_id,
-            state=state
-        )
-        
-        tool_results = await self.tool_executor.execute(
-            intent=state.current_intent,
-            slots=state.slots
-        )
-        
-        aggregated = self.tool_executor.aggregate_results(tool_results)
-        
-        yield AgentResponse(
-            type=ResponseType.THINKING,
-            content="生成緊報告...",
-            conversation_id=conversation_id,
-            state=state
-        )
-        
-        report = await self.report_generator.generate(
-            products=state.slots.products,
-            tool_results=aggregated["data"],
-            include_ai_insights=self.ai_service is not None
-        )
-        
-        await self._update_conversation_state(conversation_id, state.slots, state.current_intent)
-        await self._save_message(
-            conversation_id, "assistant", report.markdown,
-            "report", {"charts": [c.__dict__ for c in report.charts]}
-        )
-
-        # 報告後的建議
-        report_suggestions = get_follow_up_suggestions(
-            state.current_intent.value if state.current_intent else "default",
-            {"products": state.slots.products}
-        )
-
-        yield AgentResponse(
-            type=ResponseType.REPORT,
-            content=report.markdown,
-            conversation_id=conversation_id,
-            report=report.to_dict(),
-            charts=[c.__dict__ for c in report.charts],
-            suggestions=report_suggestions,
-            state=state
-        )
+        async for response in self._report_turn(conv, state):
+            yield response
 
     async def handle_clarification(
         self,
         conversation_id: str,
         selections: Dict[str, Any]
     ) -> AsyncGenerator[AgentResponse, None]:
-        state = await self.get_state_async(conversation_id)
-        if not state:
+        conv = await self._find_conversation(conversation_id)
+        if not conv:
             yield AgentResponse(
                 type=ResponseType.ERROR,
                 content="找不到對話記錄，請重新開始。",
                 conversation_id=conversation_id
             )
             return
+        state = await self._load_state(conv, window=self.history_window)
+
+        async for response in self._stream_turn(conv, state, self._clarification_turn(conv, state, selections)):
+            yield response
+
+    async def _clarification_turn(
+        self, conv: AgentConversation, state: AgentState, selections: Dict[str, Any]
+    ) -> AsyncGenerator[AgentResponse, None]:
+        conversation_id = state.conversation_id
         
         for slot_name, value in selections.items():
             state.slots = self.slot_manager.update_slot(
@@ -537,9 +569,9 @@ class AgentService:
             clarification = self.slot_manager.generate_clarification_message(
                 completeness.clarification_needed
             )
-            await self._update_conversation_state(conversation_id, state.slots, state.current_intent)
-            await self._save_message(
-                conversation_id, "assistant", clarification["message"], 
+            self._update_conversation_state(conv, state)
+            self._add_message(
+                state, "assistant", clarification["message"], 
                 "clarification", {"options": clarification["options"]}
             )
             yield AgentResponse(
@@ -551,6 +583,15 @@ class AgentService:
             )
             return
         
+        async for response in self._report_turn(conv, state):
+            yield response
+
+    async def _report_turn(
+        self, conv: AgentConversation, state: AgentState
+    ) -> AsyncGenerator[AgentResponse, None]:
+        """查詢數據並串流報告：段落完成即推送，AI 洞察逐段推送，最後推送完整報告"""
+        conversation_id = state.conversation_id
+
         yield AgentResponse(
             type=ResponseType.THINKING,
             content="查詢緊數據...",
@@ -572,20 +613,39 @@ class AgentService:
             state=state
         )
         
-        report = await self.report_generator.generate(
+        report = None
+        async for event in self.report_generator.stream(
             products=state.slots.products,
             tool_results=aggregated["data"],
             include_ai_insights=self.ai_service is not None
-        )
+        ):
+            if event.type == "section":
+                yield AgentResponse(
+                    type=ResponseType.REPORT_SECTION,
+                    content=event.section.markdown,
+                    conversation_id=conversation_id,
+                    report=event.section.to_dict(),
+                    charts=[c.__dict__ for c in event.section.charts],
+                    state=state
+                )
+            elif event.type == "insight":
+                yield AgentResponse(
+                    type=ResponseType.REPORT_DELTA,
+                    content=event.delta,
+                    conversation_id=conversation_id,
+                    state=state
+                )
+            else:
+                report = event.report
         
-        await self._update_conversation_state(conversation_id, state.slots, state.current_intent)
-        await self._save_message(
-            conversation_id, "assistant", report.markdown,
+        self._update_conversation_state(conv, state)
+        self._add_message(
+            state, "assistant", report.markdown,
             "report", {"charts": [c.__dict__ for c in report.charts]}
         )
 
         # 報告後的建議
-        clarify_suggestions = get_follow_up_suggestions(
+        report_suggestions = get_follow_up_suggestions(
             state.current_intent.value if state.current_intent else "default",
             {"products": state.slots.products}
         )
@@ -596,7 +656,7 @@ class AgentService:
             conversation_id=conversation_id,
             report=report.to_dict(),
             charts=[c.__dict__ for c in report.charts],
-            suggestions=clarify_suggestions,
+            suggestions=report_suggestions,
             state=state
         )
 
@@ -0,0 +1,180 @@
+# =============================================
+# 快速回覆快取後端
+# =============================================
+# 用途：QuickCacheService 的可插拔存儲，讓多個 worker 共享同一份摘要
+# 設計：
+# - MemoryCacheBackend：進程內字典 + 過期時間（單 worker / 測試）
+# - RedisCacheBackend：共用 Redis 連接池，JSON 值 + SET EX；
+#   Redis 不可用時冷卻 5 秒，期間讀寫本地內存回退（與限速器一致）
+# - SingleFlight：同一進程內同一 Key 的並發未命中只計算一次，其餘等待結果
+
+import asyncio
+import json
+import logging
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+
+import redis.asyncio as redis
+
+from app.config import get_settings
+from app.core.redis_client import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class CacheBackend(ABC):
+    """快取後端接口：值是可 JSON 序列化的 dict"""
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    async def set(self, key: str, value: Dict[str, Any], ttl_seconds: int) -> None:
+        ...
+
+    @abstractmethod
+    async def delete(self, *keys: str) -> None:
+        ...
+
+
+class MemoryCacheBackend(CacheBackend):
+    """進程內快取（過期在讀取時惰性清理）"""
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self._clock = clock
+        self._data: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if self._clock() >= expires_at:
+            self._data.pop(key, None)
+            return None
+        return value
+
+    async def set(self, key: str, value: Dict[str, Any], ttl_seconds: int) -> None:
+        self._data[key] = (self._clock() + ttl_seconds, value)
+
+    async def delete(self, *keys: str) -> None:
+        for key in keys:
+            self._data.pop(key, None)
+
+
+class RedisCacheBackend(CacheBackend):
+    """Redis 共享快取；Redis 故障期間退回本地內存"""
+
+    REDIS_RETRY_INTERVAL_S = 5.0
+
+    def __init__(self, client: Optional[redis.Redis] = None, fallback: Optional[CacheBackend] = None):
+        self.redis = client or get_redis_client()
+        self.fallback = fallback or MemoryCacheBackend()
+        self._redis_retry_at = 0.0
+
+    def _available(self) -> bool:
+        return time.monotonic() >= self._redis_retry_at
+
+    def _mark_down(self, error: Exception) -> None:
+        self._redis_retry_at = time.monotonic() + self.REDIS_RETRY_INTERVAL_S
+        logger.warning(
+            f"Redis 不可用，{self.REDIS_RETRY_INTERVAL_S:.0f}s 內快取使用本地內存: {error}"
+        )
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        if self._available():
+            try:
+                raw = await self.redis.get(key)
+                return json.loads(raw) if raw is not None else None
+            except (redis.RedisError, OSError) as e:
+                self._mark_down(e)
+        return await self.fallback.get(key)
+
+    async def set(self, key: str, value: Dict[str, Any], ttl_seconds: int) -> None:
+        if self._available():
+            try:
+                await self.redis.set(key, json.dumps(value, default=str), ex=max(1, int(ttl_seconds)))
+                return
+            except (redis.RedisError, OSError) as e:
+                self._mark_down(e)
+        await self.fallback.set(key, value, ttl_seconds)
+
+    async def delete(self, *keys: str) -> None:
+        # 回退期間寫入的本地值也要清掉
+        await self.fallback.delete(*keys)
+        if keys and self._available():
+            try:
+                await self.redis.delete(*keys)
+            except (redis.RedisError, OSError) as e:
+                self._mark_down(e)
+
+
+class SingleFlight:
+    """
+    請求合併：同一 Key 同時只有一個計算在跑，並發調用共享其結果或異常
+
+    領頭的調用被取消（如客戶端斷開）時，等待者不跟著取消：第一個醒來的接手重新計算，
+    其餘等它的結果。只在進程內生效；跨 worker 的重複計算由共享快取後的命中吸收
+    """
+
+    def __init__(self) -> None:
+        self._calls: Dict[str, asyncio.Future] = {}
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        while (call := self._calls.get(key)) is not None:
+            try:
+                return await asyncio.shield(call)
+            except asyncio.CancelledError:
+                # 被取消的是領頭者而不是自己：重新檢查，接手計算或等待新的領頭者
+                if call.cancelled() and not asyncio.current_task().cancelling():
+                    continue
+                raise
+
+        call = asyncio.get_running_loop().create_future()
+        self._calls[key] = call
+        try:
+            result = await fn()
+        except BaseException as e:
+            if isinstance(e, asyncio.CancelledError):
+                call.cancel()
+            else:
+                call.set_exception(e)
+                call.exception()  # 沒有等待者時不產生「異常未讀取」警告
+            raise
+        else:
+            call.set_result(result)
+            return result
+        finally:
+            self._calls.pop(key, None)
+
+
+# =============================================
+# 全局單例
+# =============================================
+
+_backend: Optional[CacheBackend] = None
+
+
+def get_cache_backend() -> CacheBackend:
+    """按 QUICK_CACHE_BACKEND（redis / memory）創建共用後端"""
+    global _backend
+    if _backend is None:
+        if get_settings().quick_cache_backend == "memory":
+            _backend = MemoryCacheBackend()
+        else:
+            _backend = RedisCacheBackend()
+    return _backend
+
+
+def set_cache_backend(backend: Optional[CacheBackend]) -> None:
+    """替換共用後端（測試或自定義存儲）；None 表示下次按配置重建"""
+    global _backend
+    _backend = backend
@@ -0,0 +1,45 @@
+# =============================================
+# 表數據版本
+# =============================================
+# 用途：工具結果快取的失效依據——快取鍵帶上工具所讀表的版本號，寫入提交後版本遞增
+# 設計：
+# - 訂閱 committed_writes 的提交後表寫入（ORM / 批量 / text() DML 均覆蓋），回滾不遞增
+# - 未聲明讀取表的工具使用全局版本：任一業務表寫入都會遞增
+#   （對話記錄表每輪都寫，不計入全局版本，否則追問永遠命中不了快取）
+# - 只覆蓋本進程經 Session 的寫入；其他進程的寫入由快取 TTL 兜底
+
+from collections import Counter
+from typing import FrozenSet, Iterable, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.services.committed_writes import on_committed_writes
+
+# 不影響任何工具結果的表
+IGNORED_TABLES = frozenset({"agent_conversations", "agent_messages", "event_outbox", "telegram_outbox"})
+
+_table_versions: Counter = Counter()
+_global_version = 0
+
+
+def data_version(tables: Iterable[str] = ()) -> Tuple[int, ...]:
+    """指定表的版本號（空 = 全局版本）"""
+    tables = tuple(tables)
+    if not tables:
+        return (_global_version,)
+    return tuple(_table_versions[table] for table in tables)
+
+
+def bump(tables: Iterable[str]) -> None:
+    """標記表已變更（提交後由訂閱回調調用；其他途徑的寫入也可手動調用）"""
+    global _global_version
+    tables = set(tables)
+    for table in tables:
+        _table_versions[table] += 1
+    if tables - IGNORED_TABLES:
+        _global_version += 1
+
+
+@on_committed_writes
+def _bump_after_commit(session: Session, tables: FrozenSet[str]) -> None:
+    bump(tables)
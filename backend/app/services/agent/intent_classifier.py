@@ -9,7 +9,7 @@ from dataclasses import dataclass
 from enum import Enum
 from typing import Any, Dict, List, Optional
 
-from .taxonomy import get_all_product_names, normalize_product_name
+from .keyword_matcher import EntityMatcher, KeywordMatcher, get_entity_matcher
 
 logger = logging.getLogger(__name__)
 
@@ -293,15 +293,30 @@ class IntentClassifier:
 }}
 """
     
-    def __init__(self, ai_service=None):
+    # 編譯後的意圖關鍵詞自動機（按類緩存，子類覆寫 INTENT_KEYWORDS 時各自編譯）
+    _keyword_matcher: Optional[KeywordMatcher] = None
+
+    def __init__(self, ai_service=None, entity_matcher: Optional[EntityMatcher] = None):
         """
         初始化意圖識別器
         
         Args:
             ai_service: AI 服務（可選，用於複雜識別）
+            entity_matcher: 產品實體詞庫（默認使用全局共享詞庫）
         """
         self.ai_service = ai_service
-        self.product_names = get_all_product_names()
+        self.entity_matcher = entity_matcher or get_entity_matcher()
+
+    @classmethod
+    def _get_keyword_matcher(cls) -> KeywordMatcher:
+        if cls.__dict__.get("_keyword_matcher") is None:
+            cls._keyword_matcher = KeywordMatcher(cls.INTENT_KEYWORDS)
+        return cls._keyword_matcher
+
+    @property
+    def product_names(self) -> List[str]:
+        """詞庫中的全部產品名稱"""
+        return self.entity_matcher.names
     
     async def classify(
         self,
@@ -346,29 +361,18 @@ class IntentClassifier:
         """
         使用規則識別意圖
         """
-        message_lower = message.lower()
-
         # 提取實體
         entities = self._extract_entities(message)
 
         # Debug logging
         logger.debug(f"輸入: {message}")
         logger.debug(f"提取實體: {entities}")
-        logger.debug(f"產品名稱庫大小: {len(self.product_names)}")
+        logger.debug(f"產品名稱庫大小: {len(self.entity_matcher)}")
         
-        # 計算每個意圖的匹配分數
-        scores = {}
-        matched_keywords = []
-        for intent, keywords in self.INTENT_KEYWORDS.items():
-            score = 0
-            for keyword in keywords:
-                if keyword.lower() in message_lower:
-                    score += 1
-                    matched_keywords.append((intent.value, keyword))
-            if score > 0:
-                scores[intent] = score
-
-        logger.debug(f"匹配關鍵詞: {matched_keywords}")
+        # 計算每個意圖的匹配分數（每個出現的關鍵詞加 1 分）
+        scores, matched_keywords = self._get_keyword_matcher().match(message)
+
+        logger.debug(f"匹配關鍵詞: {[(intent.value, keyword) for intent, keyword in matched_keywords]}")
         logger.debug(f"意圖分數: {[(k.value, v) for k, v in scores.items()]}")
 
         # 如果沒有匹配
@@ -404,17 +408,8 @@ class IntentClassifier:
         )
     
     def _extract_entities(self, message: str) -> List[str]:
-        """提取實體（產品名稱）"""
-        entities = []
-        message_lower = message.lower()
-        
-        for name in self.product_names:
-            if name.lower() in message_lower:
-                normalized = normalize_product_name(name)
-                if normalized not in entities:
-                    entities.append(normalized)
-        
-        return entities
+        """提取實體（產品名稱，最長匹配）"""
+        return self.entity_matcher.extract(message)
     
     async def _classify_by_ai(
         self,
@@ -435,7 +430,12 @@ class IntentClassifier:
         # 格式化上下文
         context_str = ""
         if context:
-            for msg in context[-5:]:  # 最近 5 條
+            # 較早對話的滾動摘要（如有）放最前
+            for msg in context:
+                if msg.get("role") == "summary":
+                    context_str += f"（較早對話摘要）\n{msg.get('content', '')}\n"
+            recent = [msg for msg in context if msg.get("role") != "summary"]
+            for msg in recent[-5:]:  # 最近 5 條
                 role = msg.get("role", "unknown")
                 content = msg.get("content", "")
                 context_str += f"{role}: {content}\n"
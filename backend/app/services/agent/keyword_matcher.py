@@ -0,0 +1,334 @@
+# =============================================
+# 意圖關鍵詞 / 產品實體匹配器（Aho-Corasick）
+# =============================================
+# 用途：IntentClassifier 對每條訊息只掃描一次，不再逐個關鍵詞 / 產品名做 `in` 檢查
+# 設計：
+# - AhoCorasick：不可變自動機，goto + fail + 輸出鏈，匹配耗時與詞庫大小無關
+# - KeywordMatcher：意圖關鍵詞 → 意圖（保留重複），計分與原規則逐一相同
+# - EntityMatcher：產品名稱 → 標準化實體，最長匹配（被更長名稱包含的短名不單獨報告）
+#   詞庫分段：base（上次壓縮時的全集）+ delta（之後新增的名稱）+ 墓碑（已刪除）；
+#   產品增刪只重建小的 delta，累積到一定比例才整體壓縮
+# - 全局產品詞庫：啟動時從 taxonomy + products 表載入，ORM 提交後增量更新
+#   （只覆蓋本進程的寫入；其他 worker 的改動在其重啟 / 重新載入時生效）
+
+import logging
+from collections import Counter
+from itertools import chain
+from typing import Dict, FrozenSet, Generic, Hashable, Iterable, Iterator, List, Optional, Sequence, Tuple, TypeVar
+
+from sqlalchemy import event, inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.models.product import Product
+from app.services.committed_writes import on_committed_writes, stage, staged
+
+from .taxonomy import get_all_product_names, normalize_product_name
+
+logger = logging.getLogger(__name__)
+
+P = TypeVar("P", bound=Hashable)
+
+
+class AhoCorasick(Generic[P]):
+    """
+    多模式子串匹配自動機
+
+    patterns 為 (小寫模式串, 負載)；同一模式可以有多個負載
+    """
+
+    def __init__(self, patterns: Iterable[Tuple[str, P]]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._depth: List[int] = [0]
+        self._payloads: List[Optional[List[P]]] = [None]
+        # 沿 fail 鏈最近的「有輸出」節點，匹配時只需跟這條鏈
+        self._output_link: List[int] = [0]
+        self.pattern_count = 0
+
+        for pattern, payload in patterns:
+            if pattern:
+                self._insert(pattern, payload)
+        self._link()
+
+    def _insert(self, pattern: str, payload: P) -> None:
+        node = 0
+        for char in pattern:
+            nxt = self._goto[node].get(char)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][char] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._depth.append(self._depth[node] + 1)
+                self._payloads.append(None)
+                self._output_link.append(0)
+            node = nxt
+        if self._payloads[node] is None:
+            self._payloads[node] = []
+            self.pattern_count += 1
+        self._payloads[node].append(payload)
+
+    def _link(self) -> None:
+        """BFS 建立 fail 與輸出鏈"""
+        queue = list(self._goto[0].values())
+        head = 0
+        while head < len(queue):
+            node = queue[head]
+            head += 1
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fallback = self._fail[node]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[child] = target if target != child else 0
+                fail = self._fail[child]
+                self._output_link[child] = fail if self._payloads[fail] is not None else self._output_link[fail]
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, int, List[P]]]:
+        """逐個產出 (起始位置, 結束位置, 負載列表)，text 應已轉小寫"""
+        goto, fail, payloads, output_link, depth = (
+            self._goto, self._fail, self._payloads, self._output_link, self._depth,
+        )
+        node = 0
+        for end, char in enumerate(text, 1):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            hit = node if payloads[node] is not None else output_link[node]
+            while hit:
+                yield end - depth[hit], end, payloads[hit]
+                hit = output_link[hit]
+
+    def __len__(self) -> int:
+        return self.pattern_count
+
+
+class KeywordMatcher(Generic[P]):
+    """
+    關鍵詞計分：每個在訊息中出現的關鍵詞為其意圖加 1 分
+
+    與逐個 `keyword.lower() in message.lower()` 的結果相同：
+    同一關鍵詞出現多次只計一次；在同一意圖列表中重複出現則重複計分
+    """
+
+    def __init__(self, keywords: Dict[P, Sequence[str]]):
+        self._order = list(keywords)
+        self._automaton: AhoCorasick[Tuple[P, str]] = AhoCorasick(
+            (keyword.lower(), (label, keyword))
+            for label, words in keywords.items()
+            for keyword in words
+        )
+
+    def match(self, message: str) -> Tuple[Dict[P, int], List[Tuple[P, str]]]:
+        """返回 ({標籤: 分數}（按定義順序）, [(標籤, 命中的關鍵詞)])"""
+        seen = set()
+        hits: List[Tuple[P, str]] = []
+        for _, end, payloads in self._automaton.iter_matches(message.lower()):
+            key = id(payloads)
+            if key not in seen:
+                seen.add(key)
+                hits.extend(payloads)
+        counts = Counter(label for label, _ in hits)
+        # 分數按定義順序排列：max() 同分時取先定義的意圖（與原實現一致）
+        scores = {label: counts[label] for label in self._order if counts[label]}
+        return scores, hits
+
+
+class EntityMatcher:
+    """
+    產品名稱 → 標準化實體的增量詞庫
+
+    實體順序按名稱首次加入詞庫的順序（與原先遍歷 product_names 的順序一致）
+    """
+
+    # delta + 墓碑超過 base 的這個比例（且至少 COMPACT_MIN 個）時整體重建
+    COMPACT_RATIO = 0.125
+    COMPACT_MIN = 1024
+
+    def __init__(self, names: Iterable[str] = ()):
+        self._refs: Counter = Counter()         # 名稱 → 引用數（taxonomy 與多個產品可共用一個名稱）
+        self._order: Dict[str, int] = {}        # 名稱 → 首次加入的序號
+        self._normalized: Dict[str, str] = {}   # 名稱 → 標準化實體
+        self._base_names: set = set()
+        self._delta_names: set = set()
+        self._tombstones: set = set()
+        self._base: AhoCorasick[str] = AhoCorasick(())
+        self._delta: Optional[AhoCorasick[str]] = AhoCorasick(())
+        self.add(names)
+        self.compact()
+
+    def __len__(self) -> int:
+        return len(self._refs)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._refs
+
+    @property
+    def names(self) -> List[str]:
+        return sorted(self._refs, key=self._order.__getitem__)
+
+    def add(self, names: Iterable[str]) -> None:
+        """加入名稱（重複加入只增加引用數）"""
+        for name in names:
+            name = (name or "").strip()
+            if not name:
+                continue
+            self._refs[name] += 1
+            if self._refs[name] > 1:
+                continue
+            self._order.setdefault(name, len(self._order))
+            if name not in self._normalized:
+                self._normalized[name] = normalize_product_name(name)
+            if name in self._tombstones:
+                self._tombstones.discard(name)
+            elif name not in self._base_names:
+                self._delta_names.add(name)
+                self._delta = None
+        self._maybe_compact()
+
+    def remove(self, names: Iterable[str]) -> None:
+        """移除名稱（引用數歸零才真正從匹配中消失）"""
+        for name in names:
+            name = (name or "").strip()
+            if self._refs.get(name, 0) <= 0:
+                continue
+            self._refs[name] -= 1
+            if self._refs[name]:
+                continue
+            del self._refs[name]
+            if name in self._delta_names:
+                self._delta_names.discard(name)
+                self._delta = None
+            else:
+                self._tombstones.add(name)
+        self._maybe_compact()
+
+    def _maybe_compact(self) -> None:
+        pending = len(self._delta_names) + len(self._tombstones)
+        if pending > max(self.COMPACT_MIN, len(self._base_names) * self.COMPACT_RATIO):
+            self.compact()
+
+    def compact(self) -> None:
+        """以當前全集重建 base，清空 delta 與墓碑"""
+        self._base_names = set(self._refs)
+        self._base = AhoCorasick((name.lower(), name) for name in self._base_names)
+        self._delta_names.clear()
+        self._tombstones.clear()
+        self._delta = AhoCorasick(())
+
+    def _segments(self) -> Tuple[AhoCorasick, AhoCorasick]:
+        if self._delta is None:
+            self._delta = AhoCorasick((name.lower(), name) for name in self._delta_names)
+        return self._base, self._delta
+
+    def _spans(self, message: str) -> List[Tuple[int, int, str]]:
+        text = message.lower()
+        spans: List[Tuple[int, int, str]] = []
+        for segment in self._segments():
+            for start, end, names in segment.iter_matches(text):
+                spans.extend((start, end, name) for name in names if name not in self._tombstones)
+        return spans
+
+    @staticmethod
+    def _longest(spans: List[Tuple[int, int, str]]) -> List[Tuple[int, int, str]]:
+        """最長匹配：丟棄完全落在另一個更長命中範圍內的名稱（同一範圍的多個名稱都保留）"""
+        kept: List[Tuple[int, int, str]] = []
+        reach, reach_span = -1, None
+        for start, end, name in sorted(spans, key=lambda s: (s[0], -s[1])):
+            if end <= reach and (start, end) != reach_span:
+                continue
+            kept.append((start, end, name))
+            if end > reach:
+                reach, reach_span = end, (start, end)
+        return kept
+
+    def find(self, message: str) -> List[Tuple[int, int, str]]:
+        """出現在訊息中的名稱，返回 (起始, 結束, 名稱)；已做最長匹配"""
+        return self._longest(self._spans(message))
+
+    def extract(self, message: str) -> List[str]:
+        """
+        訊息中的標準化實體（去重）
+
+        實體取自最長匹配的名稱；排序按命中該實體的任一名稱（含被包含的短名）在詞庫中的最早序號，
+        與原先按詞庫順序逐個檢查的輸出順序相同
+        """
+        spans = self._spans(message)
+        entities = {self._normalized[name] for _, _, name in self._longest(spans)}
+        rank: Dict[str, int] = {}
+        for _, _, name in spans:
+            normalized = self._normalized[name]
+            if normalized in entities:
+                rank[normalized] = min(rank.get(normalized, self._order[name]), self._order[name])
+        return sorted(entities, key=rank.__getitem__)
+
+
+# =============================================
+# 全局產品詞庫
+# =============================================
+
+_catalog: Optional[EntityMatcher] = None
+
+# 產品上參與實體匹配的名稱字段
+CATALOG_FIELDS = ("name", "name_zh")
+_STAGE_KEY = "entity_catalog_changes"
+
+
+def get_entity_matcher() -> EntityMatcher:
+    """共用詞庫（首次調用時以 taxonomy 名稱初始化）"""
+    global _catalog
+    if _catalog is None:
+        _catalog = EntityMatcher(get_all_product_names())
+    return _catalog
+
+
+def set_entity_matcher(matcher: Optional[EntityMatcher]) -> None:
+    """替換共用詞庫（測試用）；None 表示下次重建"""
+    global _catalog
+    _catalog = matcher
+
+
+async def load_product_catalog(db: AsyncSession) -> int:
+    """把 products 表的名稱併入共用詞庫，返回載入的名稱數"""
+    result = await db.execute(select(*(getattr(Product, field) for field in CATALOG_FIELDS)))
+    names = [name for row in result for name in row if name]
+    matcher = get_entity_matcher()
+    matcher.add(names)
+    matcher.compact()
+    logger.info(f"產品實體詞庫已載入: {len(names)} 個產品名稱，詞庫共 {len(matcher)} 個")
+    return len(names)
+
+
+@event.listens_for(Session, "after_flush")
+def _track_product_names(session: Session, flush_context) -> None:
+    """記下本事務中產品名稱的增刪（提交後才套用，回滾則丟棄）"""
+    added, removed = [], []
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if not isinstance(obj, Product):
+            continue
+        state = inspect(obj)
+        # 只讀已載入的值，不在同步鉤子裡觸發延遲加載
+        if obj in session.new:
+            added.extend(state.dict.get(field) for field in CATALOG_FIELDS)
+        elif obj in session.deleted:
+            removed.extend(state.dict.get(field) for field in CATALOG_FIELDS)
+        else:
+            for field in CATALOG_FIELDS:
+                history = state.attrs[field].history
+                added.extend(history.added)
+                removed.extend(history.deleted)
+    if added or removed:
+        changes = stage(session, _STAGE_KEY, lambda: ([], []))
+        changes[0].extend(n for n in added if n)
+        changes[1].extend(n for n in removed if n)
+
+
+@on_committed_writes
+def _apply_product_names(session: Session, tables: FrozenSet[str]) -> None:
+    changes = staged(session, _STAGE_KEY) if Product.__tablename__ in tables else None
+    if changes and _catalog is not None:
+        added, removed = changes
+        _catalog.add(added)
+        _catalog.remove(removed)
@@ -5,17 +5,29 @@
 # 為常用查詢提供預計算/快取的即時回覆
 # 目標：<100ms 回覆時間
 #
+# 存儲走可插拔後端（cache_backend）：預設 Redis，多 worker 共享同一份摘要；
+# 並發未命中經 SingleFlight 合併，同一 Key 只計算一次。
+# 失效由寫入驅動，不等 TTL：
+# - Agent EventBus：訂單同步 / 價格警報 / 競品事件
+# - committed_writes：orders / price_alerts 表的寫入（含批量 UPDATE 與原生 SQL）在提交後失效
+#
 
-import json
+import asyncio
 import logging
 from dataclasses import dataclass
-from datetime import datetime, timedelta
-from typing import Any, Dict, List, Optional
+from datetime import datetime
+from typing import Any, Dict, FrozenSet, List, Optional
 
-from sqlalchemy import select, func, and_
+from sqlalchemy import select, func
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
 
+from app.agents.events import Event, EventBus, Events
+from app.models.competitor import PriceAlert
 from app.models.order import Order
+from app.services.agent.cache_backend import CacheBackend, SingleFlight, get_cache_backend
+from app.services.agent.tools.alert_tools import alert_summary_query
+from app.services.committed_writes import on_committed_writes
 
 logger = logging.getLogger(__name__)
 
@@ -52,10 +64,6 @@ class QuickCacheService:
     - 100-500ms
     """
 
-    # 內存快取（簡易實現，生產環境應用 Redis）
-    _cache: Dict[str, Dict[str, Any]] = {}
-    _cache_ttl: Dict[str, datetime] = {}
-
     # 快取 Key 定義
     CACHE_KEYS = {
         "orders_today": "quick:orders:today",
@@ -100,41 +108,35 @@ class QuickCacheService:
         "products_lowstock": 300, # 5 分鐘
     }
 
-    def __init__(self, db: AsyncSession):
+    def __init__(self, db: AsyncSession, backend: Optional[CacheBackend] = None):
         self.db = db
+        self.backend = backend or get_cache_backend()
 
     # =============================================
     # 快取讀取
     # =============================================
 
-    def _get_cache(self, key: str) -> Optional[Dict[str, Any]]:
-        """讀取快取（檢查 TTL）"""
-        full_key = self.CACHE_KEYS.get(key, key)
-
-        if full_key not in self._cache:
-            return None
-
-        # 檢查 TTL
-        if full_key in self._cache_ttl:
-            if datetime.now() > self._cache_ttl[full_key]:
-                # 過期，刪除快取
-                del self._cache[full_key]
-                del self._cache_ttl[full_key]
-                return None
-
-        return self._cache.get(full_key)
+    async def _get_cache(self, key: str) -> Optional[Dict[str, Any]]:
+        """讀取快取（過期由後端處理）"""
+        return await self.backend.get(self.CACHE_KEYS.get(key, key))
 
-    def _set_cache(self, key: str, data: Dict[str, Any], ttl_seconds: int = None) -> None:
+    async def _set_cache(self, key: str, data: Dict[str, Any], ttl_seconds: int = None) -> None:
         """設置快取"""
-        full_key = self.CACHE_KEYS.get(key, key)
-
-        self._cache[full_key] = data
-
-        # 設置 TTL
         if ttl_seconds is None:
             ttl_seconds = self.CACHE_TTL.get(key, 300)
+        await self.backend.set(self.CACHE_KEYS.get(key, key), data, ttl_seconds)
 
-        self._cache_ttl[full_key] = datetime.now() + timedelta(seconds=ttl_seconds)
+    async def _get_or_refresh(self, key: str) -> Optional[Dict[str, Any]]:
+        """讀取快取；未命中時刷新（並發未命中合併為一次刷新）"""
+        data = await self._get_cache(key)
+        if data:
+            return data
+
+        async def load() -> Optional[Dict[str, Any]]:
+            await self.refresh_cache(key)
+            return await self._get_cache(key)
+
+        return await _single_flight.do(self.CACHE_KEYS.get(key, key), load)
 
     # =============================================
     # 快速回覆入口
@@ -159,25 +161,12 @@ class QuickCacheService:
         if cache_keys is None:
             return None
 
-        # 嘗試讀取快取
+        # 讀取快取，缺失的 Key 各自刷新
         cached_data = {}
-        need_refresh = False
-
         for key in cache_keys:
-            data = self._get_cache(key)
+            data = await self._get_or_refresh(key)
             if data:
                 cached_data[key] = data
-            else:
-                need_refresh = True
-
-        # 如果有缺失，刷新快取
-        if need_refresh:
-            await self._refresh_for_intent(intent)
-            # 重新讀取
-            for key in cache_keys:
-                data = self._get_cache(key)
-                if data:
-                    cached_data[key] = data
 
         # 生成回覆
         if not cached_data:
@@ -189,13 +178,6 @@ class QuickCacheService:
     # 快取刷新
     # =============================================
 
-    async def _refresh_for_intent(self, intent: str) -> None:
-        """根據意圖刷新相關快取"""
-        cache_keys = self.INTENT_CACHE_MAP.get(intent, [])
-
-        for key in cache_keys:
-            await self.refresh_cache(key)
-
     async def refresh_cache(self, key: str) -> None:
         """刷新特定快取"""
         refresh_method = getattr(self, f"_refresh_{key}", None)
@@ -233,12 +215,12 @@ class QuickCacheService:
                 "updated_at": datetime.now().isoformat(),
             }
 
-            self._set_cache("orders_today", data)
+            await self._set_cache("orders_today", data)
 
         except Exception as e:
             logger.warning(f"刷新 orders_today 失敗: {e}")
             # 設置空數據避免重複查詢
-            self._set_cache("orders_today", {
+            await self._set_cache("orders_today", {
                 "count": 0,
                 "revenue": 0,
                 "avg_price": 0,
@@ -271,11 +253,11 @@ class QuickCacheService:
                 "updated_at": datetime.now().isoformat(),
             }
 
-            self._set_cache("orders_pending", data)
+            await self._set_cache("orders_pending", data)
 
         except Exception as e:
             logger.warning(f"刷新 orders_pending 失敗: {e}")
-            self._set_cache("orders_pending", {
+            await self._set_cache("orders_pending", {
                 "pending": 0,
                 "to_ship": 0,
                 "error": str(e),
@@ -285,10 +267,7 @@ class QuickCacheService:
     async def _refresh_finance_today(self) -> None:
         """刷新今日財務數據"""
         # 暫時復用訂單數據
-        today_data = self._get_cache("orders_today")
-        if not today_data:
-            await self._refresh_orders_today()
-            today_data = self._get_cache("orders_today") or {}
+        today_data = await self._get_or_refresh("orders_today") or {}
 
         data = {
             "revenue": today_data.get("revenue", 0),
@@ -296,7 +275,7 @@ class QuickCacheService:
             "updated_at": datetime.now().isoformat(),
         }
 
-        self._set_cache("finance_today", data)
+        await self._set_cache("finance_today", data)
 
     async def _refresh_finance_month(self) -> None:
         """刷新本月財務數據"""
@@ -320,11 +299,11 @@ class QuickCacheService:
                 "updated_at": datetime.now().isoformat(),
             }
 
-            self._set_cache("finance_month", data)
+            await self._set_cache("finance_month", data)
 
         except Exception as e:
             logger.warning(f"刷新 finance_month 失敗: {e}")
-            self._set_cache("finance_month", {
+            await self._set_cache("finance_month", {
                 "revenue": 0,
                 "orders": 0,
                 "avg_order": 0,
@@ -334,7 +313,6 @@ class QuickCacheService:
 
     async def _refresh_alerts_summary(self) -> None:
         """刷新警報摘要"""
-        # 暫時使用 mock 數據（因為 Alert model 可能不存在）
         data = {
             "total": 0,
             "urgent": 0,
@@ -344,33 +322,20 @@ class QuickCacheService:
         }
 
         try:
-            # 嘗試查詢真實數據
-            from app.models.alert import Alert
-
-            result = await self.db.execute(
-                select(func.count(Alert.id)).where(Alert.is_read == False)
-            )
-            total = result.scalar() or 0
-
-            result2 = await self.db.execute(
-                select(func.count(Alert.id)).where(
-                    and_(Alert.is_read == False, Alert.priority == "high")
-                )
-            )
-            urgent = result2.scalar() or 0
-
+            # 與 AlertQueryTool / format_alert_summary 同一口徑：未讀 = 緊急
+            row = (await self.db.execute(alert_summary_query())).one()
             data = {
-                "total": total,
-                "urgent": urgent,
-                "price_alerts": 0,  # TODO: 分類統計
-                "stockout_alerts": 0,
+                "total": row.total,
+                "urgent": row.unread_count,
+                "price_alerts": row.price_drop + row.price_increase,
+                "stockout_alerts": row.out_of_stock,
                 "updated_at": datetime.now().isoformat(),
             }
 
         except Exception as e:
             logger.warning(f"刷新 alerts_summary 失敗: {e}")
 
-        self._set_cache("alerts_summary", data)
+        await self._set_cache("alerts_summary", data)
 
     # =============================================
     # 回覆格式化
@@ -383,6 +348,78 @@ class QuickCacheService:
         return format_quick_response(intent, cached_data)
 
 
+_single_flight = SingleFlight()
+
+
+# =============================================
+# 寫入驅動的失效
+# =============================================
+
+ORDER_CACHE_KEYS = (
+    "orders_today", "orders_pending", "orders_week", "orders_month",
+    "finance_today", "finance_month",
+)
+ALERT_CACHE_KEYS = (
+    "alerts_summary", "alerts_urgent", "competitors_changes", "competitors_stockout",
+)
+
+# Agent 事件 → 受影響的快取
+EVENT_INVALIDATION = {
+    Events.ORDER_SYNCED: ORDER_CACHE_KEYS,
+    Events.DAILY_DATA_READY: ORDER_CACHE_KEYS,
+    Events.PRICE_ALERT_CREATED: ALERT_CACHE_KEYS,
+    Events.COMPETITOR_PRICE_DROP: ALERT_CACHE_KEYS,
+    Events.COMPETITOR_STOCKOUT: ALERT_CACHE_KEYS,
+}
+
+# 提交寫入的表 → 受影響的快取
+TABLE_INVALIDATION = {
+    Order.__tablename__: ORDER_CACHE_KEYS,
+    PriceAlert.__tablename__: ALERT_CACHE_KEYS,
+}
+
+_pending_invalidations: set[asyncio.Task] = set()
+
+
+async def invalidate_quick_cache(*keys: str) -> None:
+    """刪除快取（keys 為 CACHE_KEYS 的短名）"""
+    full_keys = [QuickCacheService.CACHE_KEYS.get(key, key) for key in keys]
+    if full_keys:
+        await get_cache_backend().delete(*full_keys)
+
+
+async def _on_write_event(event: Event) -> None:
+    await invalidate_quick_cache(*EVENT_INVALIDATION.get(event.type, ()))
+
+
+def register_quick_cache_invalidation(bus: EventBus) -> None:
+    """訂閱會令快取過時的 Agent 事件（重複調用不會重複訂閱）"""
+    for event_type in EVENT_INVALIDATION:
+        bus.unsubscribe(event_type, _on_write_event)
+        bus.subscribe(event_type, _on_write_event)
+
+
+@on_committed_writes
+def _invalidate_after_commit(session: Session, tables: FrozenSet[str]) -> None:
+    """寫過快取相關表的事務提交後立即失效（不等 TTL）"""
+    keys = {key for table in tables for key in TABLE_INVALIDATION.get(table, ())}
+    if not keys:
+        return
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return  # 同步上下文（腳本）沒有事件循環，交給 TTL
+    task = loop.create_task(invalidate_quick_cache(*keys))
+    _pending_invalidations.add(task)
+    task.add_done_callback(_pending_invalidations.discard)
+
+
+async def wait_for_invalidations() -> None:
+    """等待已排隊的提交後失效完成（測試 / 關閉時用）"""
+    if _pending_invalidations:
+        await asyncio.gather(*list(_pending_invalidations), return_exceptions=True)
+
+
 # 單例模式（簡化實現）
 _instance: Optional[QuickCacheService] = None
 
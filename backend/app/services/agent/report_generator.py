@@ -3,9 +3,10 @@
 # 將工具執行結果轉換為結構化報告
 # =============================================
 
-from typing import Any, Dict, List, Optional
+from typing import Any, AsyncIterator, Dict, List, Optional
 from dataclasses import dataclass, field
 from datetime import datetime
+import asyncio
 import json
 
 
@@ -62,12 +63,56 @@ class Report:
         }
 
 
+@dataclass
+class ReportSection:
+    """報告段落（由工具結果確定性生成，可獨立渲染）"""
+    key: str
+    index: int  # 在完整報告中的位置
+    markdown: str
+    charts: List[ChartData] = field(default_factory=list)
+    tables: List[TableData] = field(default_factory=list)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "section": self.key,
+            "index": self.index,
+            "markdown": self.markdown,
+            "charts": [c.__dict__ for c in self.charts],
+            "tables": [t.__dict__ for t in self.tables],
+        }
+
+
+@dataclass
+class ReportEvent:
+    """
+    報告生成事件
+
+    - section：一個確定性段落已完成（按完成先後，而非報告順序）
+    - insight：AI 洞察的一段增量文字（報告最後一節）
+    - done：完整報告
+    """
+    type: str
+    section: Optional[ReportSection] = None
+    delta: str = ""
+    report: Optional[Report] = None
+
+
 class ReportGenerator:
     """
     報告生成器
     
     將工具執行結果轉換為 Markdown 報告和圖表數據
     """
+
+    # 段落在報告中的順序（工具名）
+    SECTION_ORDER = [
+        "product_overview",
+        "query_sales",
+        "query_top_products",
+        "price_trend",
+        "top_products",
+        "competitor_compare",
+    ]
     
     def __init__(self, ai_service=None):
         """
@@ -95,85 +140,99 @@ class ReportGenerator:
         Returns:
             報告對象
         """
-        title = f"{', '.join(products)} 市場分析報告"
-        
-        sections = []
-        charts = []
-        tables = []
-        
-        # 生成標題
-        sections.append(f"# {title}")
-        sections.append(f"> 分析日期：{datetime.now().strftime('%Y-%m-%d %H:%M')}\n")
-        sections.append("---\n")
-        
-        # 處理產品概覽
-        if "product_overview" in tool_results:
-            overview_section, overview_table = self._generate_overview_section(
-                tool_results["product_overview"]
-            )
-            sections.append(overview_section)
-            if overview_table:
-                tables.append(overview_table)
-        
-        
-        # 處理銷售數據 (Finance)
-        if "query_sales" in tool_results:
-            sales_section = self._generate_sales_section(
-                tool_results["query_sales"]
-            )
-            sections.append(sales_section)
+        report = None
+        async for event in self.stream(products, tool_results, include_ai_insights):
+            if event.type == "done":
+                report = event.report
+        return report
 
-        # 處理熱門產品 (Finance/Sales)
-        if "query_top_products" in tool_results:
-            top_section, top_chart = self._generate_finance_top_products(
-                tool_results["query_top_products"]
-            )
-            sections.append(top_section)
-            if top_chart:
-                charts.append(top_chart)
+    async def stream(
+        self,
+        products: List[str],
+        tool_results: Dict[str, Any],
+        include_ai_insights: bool = True
+    ) -> AsyncIterator[ReportEvent]:
+        """
+        串流生成報告
 
-# 處理價格趨勢
-        if "price_trend" in tool_results:
-            trend_section, trend_chart = self._generate_trend_section(
-                tool_results["price_trend"]
-            )
-            sections.append(trend_section)
-            if trend_chart:
-                charts.append(trend_chart)
-        
-        # 處理熱門產品
-        if "top_products" in tool_results:
-            top_section, top_tables = self._generate_top_products_section(
-                tool_results["top_products"]
-            )
-            sections.append(top_section)
-            tables.extend(top_tables)
-        
-        # 處理競爭對手比較
-        if "competitor_compare" in tool_results:
-            comp_section, comp_chart = self._generate_competitor_section(
-                tool_results["competitor_compare"]
-            )
-            sections.append(comp_section)
-            if comp_chart:
-                charts.append(comp_chart)
-        
-        # 生成 AI 洞察和建議
+        AI 洞察請求先發出，段落按 SECTION_ORDER 逐個生成、生成即產出（純 Python 格式化，
+        毫秒級，直接在事件循環上執行，不佔線程池）；全部段落產出後再逐段產出 AI 洞察，
+        最後產出完整報告
+        """
+        title = f"{', '.join(products)} 市場分析報告"
+        header = [
+            f"# {title}",
+            f"> 分析日期：{datetime.now().strftime('%Y-%m-%d %H:%M')}\n",
+            "---\n",
+        ]
+        keys = [key for key in self.SECTION_ORDER if key in tool_results]
+
+        insights: Optional[asyncio.Queue] = None
+        insight_task = None
         if include_ai_insights and self.ai_service:
-            insights_section = await self._generate_ai_insights(
-                products, tool_results
+            insights = asyncio.Queue()
+            insight_task = asyncio.create_task(
+                self._pump_ai_insights(products, tool_results, insights)
             )
-            sections.append(insights_section)
-        
-        markdown = "\n".join(sections)
-        
-        return Report(
+            # 讓出一次事件循環：AI 請求在生成段落之前就發出
+            await asyncio.sleep(0)
+
+        sections: List[ReportSection] = []
+        insight_parts: List[str] = []
+
+        try:
+            for index, key in enumerate(keys):
+                section = self._build_section(key, index, tool_results[key])
+                sections.append(section)
+                yield ReportEvent(type="section", section=section)
+
+            if insights is not None:
+                while (delta := await insights.get()) is not None:
+                    insight_parts.append(delta)
+                    yield ReportEvent(type="insight", delta=delta)
+        finally:
+            # 調用方中途停止消費時，不留下後台任務
+            if insight_task:
+                insight_task.cancel()
+
+        markdown_parts = header + [section.markdown for section in sections]
+        if insight_parts:
+            markdown_parts.append("".join(insight_parts))
+
+        report = Report(
             title=title,
-            markdown=markdown,
-            charts=charts,
-            tables=tables,
+            markdown="\n".join(markdown_parts),
+            charts=[chart for section in sections for chart in section.charts],
+            tables=[table for section in sections for table in section.tables],
             summary=self._generate_summary(tool_results)
         )
+        yield ReportEvent(type="done", report=report)
+
+    def _build_section(self, key: str, index: int, data: Dict[str, Any]) -> ReportSection:
+        """生成單個段落"""
+        charts: List[ChartData] = []
+        tables: List[TableData] = []
+
+        if key == "product_overview":
+            markdown, table = self._generate_overview_section(data)
+            tables = [table] if table else []
+        elif key == "query_sales":
+            markdown = self._generate_sales_section(data)
+        elif key == "query_top_products":
+            markdown, chart = self._generate_finance_top_products(data)
+            charts = [chart] if chart else []
+        elif key == "price_trend":
+            markdown, chart = self._generate_trend_section(data)
+            charts = [chart] if chart else []
+        elif key == "top_products":
+            markdown, tables = self._generate_top_products_section(data)
+        elif key == "competitor_compare":
+            markdown, chart = self._generate_competitor_section(data)
+            charts = [chart] if chart else []
+        else:
+            raise ValueError(f"未知報告段落: {key}")
+
+        return ReportSection(key=key, index=index, markdown=markdown, charts=charts, tables=tables)
     
     def _generate_overview_section(
         self,
@@ -467,19 +526,16 @@ class ReportGenerator:
         
         return "\n".join(lines), chart
     
-    async def _generate_ai_insights(
+    def _build_insights_prompt(
         self,
         products: List[str],
         tool_results: Dict[str, Any]
     ) -> str:
-        """使用 AI 生成洞察和建議"""
-        if not self.ai_service:
-            return ""
-        
+        """AI 洞察的提示詞"""
         # 準備數據摘要
         data_summary = json.dumps(tool_results, ensure_ascii=False, default=str)[:3000]
         
-        prompt = f"""基於以下市場數據，為 {', '.join(products)} 生成：
+        return f"""基於以下市場數據，為 {', '.join(products)} 生成：
 1. 3 個關鍵發現
 2. 3 個 Marketing 策略建議
 
@@ -500,12 +556,46 @@ class ReportGenerator:
 2. **策略二標題**：具體行動
 3. **策略三標題**：具體行動
 """
-        
+
+    async def _stream_ai_insights(
+        self,
+        products: List[str],
+        tool_results: Dict[str, Any]
+    ) -> AsyncIterator[str]:
+        """使用 AI 生成洞察和建議（AI 服務不支持串流時一次產出）"""
+        prompt = self._build_insights_prompt(products, tool_results)
+
+        if hasattr(self.ai_service, "stream_ai"):
+            async for delta in self.ai_service.stream_ai(prompt):
+                yield delta
+            return
+
+        response = await self.ai_service.call_ai(prompt)
+        if not response.success:
+            raise RuntimeError(response.error)
+        yield response.content
+
+    async def _pump_ai_insights(
+        self,
+        products: List[str],
+        tool_results: Dict[str, Any],
+        queue: asyncio.Queue
+    ) -> None:
+        """把 AI 洞察逐段放入隊列，以 None 結束；失敗時放入錯誤提示"""
+        started = False
         try:
-            response = await self.ai_service.call_ai(prompt)
-            return "\n---\n\n" + response.content
+            async for delta in self._stream_ai_insights(products, tool_results):
+                if not started:
+                    queue.put_nowait("\n---\n\n")
+                    started = True
+                queue.put_nowait(delta)
         except Exception as e:
-            return f"\n---\n\n## 🎯 AI 洞察\n\n⚠️ 無法生成 AI 洞察: {str(e)}\n"
+            if started:
+                queue.put_nowait(f"\n\n⚠️ AI 洞察生成中斷: {str(e)}\n")
+            else:
+                queue.put_nowait(f"\n---\n\n## 🎯 AI 洞察\n\n⚠️ 無法生成 AI 洞察: {str(e)}\n")
+        finally:
+            queue.put_nowait(None)
     
     def _generate_summary(self, tool_results: Dict[str, Any]) -> str:
         """生成摘要"""
@@ -34,6 +34,28 @@ class ProductDetail:
     price_range: Optional[Tuple[float, float]] = None
     grades: List[str] = field(default_factory=list)
 
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "parts": self.parts,
+            "types": self.types,
+            "origin": self.origin,
+            "brands": self.brands,
+            "price_range": list(self.price_range) if self.price_range else None,
+            "grades": self.grades,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ProductDetail":
+        price_range = data.get("price_range")
+        return cls(
+            parts=list(data.get("parts") or []),
+            types=list(data.get("types") or []),
+            origin=list(data.get("origin") or []),
+            brands=list(data.get("brands") or []),
+            price_range=tuple(price_range) if price_range else None,
+            grades=list(data.get("grades") or []),
+        )
+
 
 @dataclass
 class ScheduleSlots:
@@ -95,22 +117,36 @@ class AnalysisSlots:
     def to_dict(self) -> Dict[str, Any]:
         return {
             "products": self.products,
-            "product_details": {
-                k: {
-                    "parts": v.parts,
-                    "types": v.types,
-                    "origin": v.origin,
-                    "brands": v.brands,
-                    "grades": v.grades,
-                }
-                for k, v in self.product_details.items()
-            },
+            "product_details": {k: v.to_dict() for k, v in self.product_details.items()},
             "time_range": self.time_range,
             "analysis_dimensions": self.analysis_dimensions,
             "include_competitors": self.include_competitors,
+            "competitor_ids": self.competitor_ids,
             "output_format": self.output_format,
         }
 
+    @classmethod
+    def from_dict(cls, data: Optional[Dict[str, Any]]) -> "AnalysisSlots":
+        """從 to_dict() 的結果恢復（缺少的字段用默認值）"""
+        slots = cls()
+        if not data:
+            return slots
+        slots.products = list(data.get("products") or [])
+        slots.product_details = {
+            product: ProductDetail.from_dict(detail or {})
+            for product, detail in (data.get("product_details") or {}).items()
+        }
+        if data.get("time_range"):
+            slots.time_range = data["time_range"]
+        if "analysis_dimensions" in data:
+            slots.analysis_dimensions = list(data["analysis_dimensions"] or [])
+        if "include_competitors" in data:
+            slots.include_competitors = bool(data["include_competitors"])
+        slots.competitor_ids = list(data.get("competitor_ids") or [])
+        if data.get("output_format"):
+            slots.output_format = data["output_format"]
+        return slots
+
 
 @dataclass
 class SlotCompleteness:
@@ -3,12 +3,20 @@
 # 根據意圖和槽位執行相應的工具
 # =============================================
 
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple
 import asyncio
-from dataclasses import dataclass
+import copy
+import json
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
 
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
+from app.config import get_settings
+
+from .cache_backend import SingleFlight
+from .data_version import data_version
 from .intent_classifier import IntentType
 from .slot_manager import AnalysisSlots
 from .tools import (
@@ -49,10 +57,95 @@ from .tools import (
 
 @dataclass
 class ExecutionPlan:
-    """執行計劃"""
+    """
+    執行計劃
+
+    工具之間的依賴構成 DAG：沒有依賴的工具並行執行，其餘在依賴完成後立即開始。
+    順序計劃（parallel=False）即一條依賴鏈。
+    """
     tools: List[str]
     parallel: bool = True
     context: Dict[str, Any] = None
+    # 工具 → 必須先完成的工具（計劃外的工具忽略）
+    dependencies: Dict[str, List[str]] = field(default_factory=dict)
+
+    def __post_init__(self):
+        if not self.parallel:
+            for previous, name in zip(self.tools, self.tools[1:]):
+                deps = self.dependencies.setdefault(name, [])
+                if previous not in deps:
+                    deps.append(previous)
+
+    def topological_order(self) -> List[str]:
+        """按依賴排序（同層保持計劃順序）；有環時拋 ValueError"""
+        planned = set(self.tools)
+        pending = {
+            name: {d for d in self.dependencies.get(name, []) if d in planned and d != name}
+            for name in self.tools
+        }
+        order: List[str] = []
+        while pending:
+            ready = [name for name in self.tools if name in pending and not pending[name]]
+            if not ready:
+                raise ValueError(f"工具依賴存在循環: {sorted(pending)}")
+            for name in ready:
+                del pending[name]
+                order.append(name)
+            for deps in pending.values():
+                deps.difference_update(ready)
+        return order
+
+
+class ToolResultCache:
+    """
+    工具結果快取（進程內 LRU + TTL）
+
+    鍵為 (工具名, 規範化參數, 數據版本)：工具所讀的表有寫入提交後版本遞增，舊條目不再命中
+    """
+
+    def __init__(self, max_entries: int = 512, clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self._clock = clock
+        self._entries: "OrderedDict[Tuple, Tuple[float, ToolResult]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def make_key(name: str, params: Dict[str, Any], version: Tuple[int, ...]) -> Tuple:
+        normalized = json.dumps(
+            {k: v for k, v in params.items() if v is not None},
+            sort_keys=True, ensure_ascii=False, default=str,
+        )
+        return name, normalized, version
+
+    def get(self, key: Tuple) -> Optional[ToolResult]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, result = entry
+        if self._clock() >= expires_at:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        # 返回副本：調用方可能修改 data / metadata
+        hit = copy.deepcopy(result)
+        hit.metadata["cached"] = True
+        return hit
+
+    def set(self, key: Tuple, result: ToolResult, ttl_seconds: float) -> None:
+        self._entries[key] = (self._clock() + ttl_seconds, copy.deepcopy(result))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+# 進程內共享：每個請求都會新建 ToolExecutor
+_tool_cache = ToolResultCache()
+_single_flight = SingleFlight()
 
 
 class ToolExecutor:
@@ -112,9 +205,36 @@ class ToolExecutor:
         IntentType.ORDER_QUERY: ["order_stats"],
         IntentType.INVENTORY_QUERY: ["query_top_products"],
     }
-    
-    def __init__(self, db: AsyncSession):
+
+    # 工具依賴：工具 → 必須先完成的工具
+    TOOL_DEPENDENCIES = {
+        "create_approval_task": ["suggest_price_change"],
+    }
+
+    # 依賴結果綁定到下游參數：工具 → {上游工具: {參數名: 上游 data 的字段}}
+    # 上游失敗時下游不執行
+    UPSTREAM_PARAMS = {
+        "create_approval_task": {
+            "suggest_price_change": {
+                "product_id": "product_id",
+                "proposed_price": "suggested_price",
+                "reason": "reason",
+            },
+        },
+    }
+
+    def __init__(
+        self,
+        db: AsyncSession,
+        session_factory: Optional[async_sessionmaker] = None,
+        cache: Optional[ToolResultCache] = None,
+    ):
         self.db = db
+        # 並行的只讀工具各自從連接池取 session；默認與 db 共用同一個 engine
+        self._session_factory = session_factory
+        self.cache = cache if cache is not None else _tool_cache
+        # 所有使用 self.db 的工具（寫入 + 未隔離的只讀）同一時間只允許一個使用
+        self._db_lock = asyncio.Lock()
 
         # 初始化所有工具
         self.tools: Dict[str, BaseTool] = {
@@ -186,10 +306,16 @@ class ToolExecutor:
             if filtered_tools:
                 tools = filtered_tools
         
+        dependencies = {
+            name: [dep for dep in self.TOOL_DEPENDENCIES.get(name, []) if dep in tools]
+            for name in tools
+        }
+
         return ExecutionPlan(
             tools=tools,
             parallel=True,
-            context={"intent": intent.value, "slots": slots.to_dict()}
+            context={"intent": intent.value, "slots": slots.to_dict()},
+            dependencies={name: deps for name, deps in dependencies.items() if deps},
         )
     
     async def execute(
@@ -205,15 +331,8 @@ class ToolExecutor:
         
         # 準備參數
         base_params = self._prepare_params(slots, intent)
-        
-        if plan.parallel:
-            # 並行執行
-            results = await self._execute_parallel(plan.tools, base_params)
-        else:
-            # 順序執行
-            results = await self._execute_sequential(plan.tools, base_params)
-        
-        return results
+
+        return await self.run_plan(plan, base_params)
     
     def _prepare_params(self, slots: AnalysisSlots, intent: IntentType) -> Dict[str, Any]:
         """準備工具參數"""
@@ -272,63 +391,113 @@ class ToolExecutor:
         
         return params
     
-    async def _execute_parallel(
-        self,
-        tool_names: List[str],
-        params: Dict[str, Any]
-    ) -> Dict[str, ToolResult]:
-        """並行執行工具"""
-        tasks = []
-        
-        for name in tool_names:
-            tool = self.tools.get(name)
-            if tool:
-                # Filter params based on tool requirements
-                tool_params = {}
-                schema = tool.get_schema()
-                required_params = schema.get("parameters", {}).get("required", [])
-                all_param_names = schema.get("parameters", {}).get("properties", {}).keys()
-                
-                for p in all_param_names:
-                    if p in params:
-                        tool_params[p] = params[p]
-                
-                # If specific tool params missing, use defaults or skip (in real system, would ask user)
-                # Hack for now: QuerySalesTool needs metric/period
-                if name == "query_sales":
-                    tool_params.setdefault("metric", "revenue")
-                    tool_params.setdefault("period", "last_30_days")
-                if name == "query_top_products":
-                    tool_params.setdefault("by", "sales")
-                    tool_params.setdefault("limit", 5)
-                
-                # Base params for product tools
-                if "days" in all_param_names:
-                    tool_params["days"] = params["days"]
-                if "products" in all_param_names:
-                    tool_params["products"] = params["products"]
-
-                tasks.append(self._execute_tool(name, tool, tool_params))
-        
-        if not tasks:
+    # =============================================
+    # 計劃執行（DAG）
+    # =============================================
+
+    async def run_plan(self, plan: ExecutionPlan, params: Dict[str, Any]) -> Dict[str, ToolResult]:
+        """
+        按依賴執行計劃中的工具，結果按計劃順序返回
+
+        計劃中有多個只讀數據庫工具時，它們各自使用獨立 session 並行查詢
+        """
+        order = [name for name in plan.topological_order() if name in self.tools]
+        if not order:
             return {}
-        
-        results = await asyncio.gather(*tasks, return_exceptions=True)
-        
-        result_dict = {}
-        for i, name in enumerate(tool_names):
-            if i < len(results):
-                result = results[i]
-                if isinstance(result, Exception):
-                    result_dict[name] = ToolResult(
-                        tool_name=name,
-                        success=False,
-                        error=str(result)
-                    )
-                else:
-                    result_dict[name] = result
-
-        return result_dict
+
+        concurrent_reads = sum(
+            1 for name in order if self.tools[name].cacheable and self.tools[name].requires_db
+        )
+        isolate = concurrent_reads > 1
+
+        tasks: Dict[str, asyncio.Task] = {}
+        for name in order:
+            deps = [d for d in plan.dependencies.get(name, []) if d in self.tools and d in plan.tools]
+            tasks[name] = asyncio.create_task(self._run_node(name, deps, tasks, params, isolate))
+        await asyncio.gather(*tasks.values())
+
+        return {name: tasks[name].result() for name in plan.tools if name in tasks}
+
+    async def _run_node(
+        self,
+        name: str,
+        deps: List[str],
+        tasks: Dict[str, asyncio.Task],
+        params: Dict[str, Any],
+        isolate: bool,
+    ) -> ToolResult:
+        """等待依賴完成後執行一個工具（依賴的結果按 UPSTREAM_PARAMS 綁定到參數）"""
+        upstream = {dep: await tasks[dep] for dep in deps}
+        tool = self.tools[name]
+        tool_params = self._tool_params(tool, params)
+
+        for dep, mapping in self.UPSTREAM_PARAMS.get(name, {}).items():
+            if dep not in upstream:
+                continue
+            result = upstream[dep]
+            if not result.success:
+                return ToolResult(
+                    tool_name=name,
+                    success=False,
+                    error=f"依賴工具 {dep} 執行失敗，未執行"
+                )
+            data = result.data if isinstance(result.data, dict) else {}
+            for param, key in mapping.items():
+                if data.get(key) is not None:
+                    tool_params[param] = data[key]
+
+        if tool.cacheable:
+            return await self._execute_cached(name, tool, tool_params, isolate)
+        async with self._db_lock:
+            return await self._execute_tool(name, tool, tool_params)
+
+    def _tool_params(self, tool: BaseTool, params: Dict[str, Any]) -> Dict[str, Any]:
+        """按工具的參數定義挑選參數，缺少時使用定義中的 default"""
+        tool_params = {}
+        for param_name, definition in tool.parameters.items():
+            if param_name in params:
+                tool_params[param_name] = params[param_name]
+            elif "default" in definition:
+                tool_params[param_name] = definition["default"]
+        return tool_params
+
+    async def _execute_cached(
+        self,
+        name: str,
+        tool: BaseTool,
+        params: Dict[str, Any],
+        isolate: bool,
+    ) -> ToolResult:
+        """只讀工具：按 (工具, 參數, 數據版本) 快取；同一鍵的並發調用只執行一次"""
+        ttl = get_settings().agent_tool_cache_ttl
+        key = self.cache.make_key(name, params, data_version(tool.reads))
+        if ttl > 0:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+
+        async def run() -> ToolResult:
+            if isolate and tool.requires_db:
+                result = await self._execute_isolated(name, tool, params)
+            elif tool.requires_db:
+                # 唯一的只讀工具用 self.db：與同層的寫入工具共用同一把鎖
+                async with self._db_lock:
+                    result = await self._execute_tool(name, tool, params)
+            else:
+                result = await self._execute_tool(name, tool, params)
+            if ttl > 0 and result.success:
+                self.cache.set(key, result, ttl)
+            return result
+
+        result = await _single_flight.do(repr(key), run)
+        return copy.deepcopy(result)
+
+    async def _execute_isolated(self, name: str, tool: BaseTool, params: Dict[str, Any]) -> ToolResult:
+        """在獨立 session 中執行（並行查詢不共用連接）"""
+        if self._session_factory is None:
+            self._session_factory = async_sessionmaker(bind=self.db.bind, expire_on_commit=False)
+        async with self._session_factory() as session:
+            return await self._execute_tool(name, type(tool)(session), params)
 
     async def _execute_tool(
         self,
@@ -346,43 +515,6 @@ class ToolExecutor:
                 error=f"工具執行失敗: {str(e)}"
             )
 
-    async def _execute_sequential(
-        self,
-        tool_names: List[str],
-        params: Dict[str, Any]
-    ) -> Dict[str, ToolResult]:
-        """順序執行工具"""
-        results = {}
-
-        for name in tool_names:
-            tool = self.tools.get(name)
-            if tool:
-                # 與 _execute_parallel 相同的參數處理邏輯
-                tool_params = {}
-                schema = tool.get_schema()
-                all_param_names = schema.get("parameters", {}).get("properties", {}).keys()
-
-                for p in all_param_names:
-                    if p in params:
-                        tool_params[p] = params[p]
-
-                # 工具特定預設值
-                if name == "query_sales":
-                    tool_params.setdefault("metric", "revenue")
-                    tool_params.setdefault("period", "last_30_days")
-                if name == "query_top_products":
-                    tool_params.setdefault("by", "sales")
-                    tool_params.setdefault("limit", 5)
-
-                if "days" in all_param_names:
-                    tool_params["days"] = params.get("days", 30)
-                if "products" in all_param_names:
-                    tool_params["products"] = params.get("products", [])
-
-                results[name] = await self._execute_tool(name, tool, tool_params)
-
-        return results
-
     def aggregate_results(self, results: Dict[str, ToolResult]) -> Dict[str, Any]:
         """聚合工具執行結果"""
         aggregated = {
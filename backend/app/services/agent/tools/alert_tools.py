@@ -7,11 +7,36 @@ from typing import Any, Dict, List, Optional
 from datetime import datetime
 from decimal import Decimal
 
-from sqlalchemy import text
+from sqlalchemy import Select, func, select, text
+
+from app.models.competitor import Competitor, CompetitorProduct, PriceAlert
+from app.services.dashboard_counters import apply_counter_deltas
 
 from .base import BaseTool, ToolResult
 from .sql_helpers import validate_integer
 
+# 警報類型（type_counts 的鍵）
+ALERT_TYPES = ("price_drop", "price_increase", "out_of_stock", "back_in_stock")
+
+
+def alert_summary_query() -> Select:
+    """
+    警報摘要聚合（AlertQueryTool 與快速回覆共用口徑）
+
+    範圍與 AlertQueryTool 相同：關聯到競品商品的全部警報；
+    未讀即待處理的「緊急」警報（format_alert_summary 以 unread_count 作緊急數）
+    """
+    return (
+        select(
+            func.count().label("total"),
+            func.count().filter(PriceAlert.is_read == False).label("unread_count"),  # noqa: E712
+            *(func.count().filter(PriceAlert.alert_type == t).label(t) for t in ALERT_TYPES),
+        )
+        .select_from(PriceAlert)
+        .join(CompetitorProduct, PriceAlert.competitor_product_id == CompetitorProduct.id)
+        .join(Competitor, CompetitorProduct.competitor_id == Competitor.id)
+    )
+
 
 class AlertQueryTool(BaseTool):
     """
@@ -21,6 +46,8 @@ class AlertQueryTool(BaseTool):
     """
 
     name = "alert_query"
+    cacheable = True
+    reads = ("price_alerts", "competitor_products", "competitors")
     description = "查詢價格和庫存警報，支持按類型、已讀狀態篩選"
 
     parameters = {
@@ -109,12 +136,7 @@ class AlertQueryTool(BaseTool):
 
             # 處理數據並分組
             alerts = []
-            type_counts = {
-                "price_drop": 0,
-                "price_increase": 0,
-                "out_of_stock": 0,
-                "back_in_stock": 0
-            }
+            type_counts = dict.fromkeys(ALERT_TYPES, 0)
             unread_count = 0
 
             for row in rows:
@@ -225,6 +247,7 @@ class AlertActionTool(BaseTool):
                     WHERE id = ANY(:alert_ids) AND is_read = false
                 """
                 result = await self.db.execute(text(sql), {"alert_ids": alert_ids})
+                await apply_counter_deltas(self.db, unread_alerts=-result.rowcount)
                 await self.db.commit()
 
                 return ToolResult(
@@ -255,6 +278,7 @@ class AlertActionTool(BaseTool):
                     WHERE {where_clause}
                 """
                 result = await self.db.execute(text(sql), params)
+                await apply_counter_deltas(self.db, unread_alerts=-result.rowcount)
                 await self.db.commit()
 
                 type_msg = f" ({alert_type})" if alert_type else ""
@@ -3,7 +3,7 @@
 # =============================================
 
 from abc import ABC, abstractmethod
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 from dataclasses import dataclass, field
 from datetime import datetime
 
@@ -49,6 +49,12 @@ class BaseTool(ABC):
     
     # 是否需要數據庫連接
     requires_db: bool = True
+
+    # 只讀且結果只取決於參數與數據：可按 (參數, 數據版本) 快取，並行時使用獨立 session
+    cacheable: bool = False
+
+    # 讀取的表（數據版本依據；空 = 任一業務表寫入都視為變更）
+    reads: Tuple[str, ...] = ()
     
     def __init__(self, db: Optional[AsyncSession] = None):
         self.db = db
@@ -21,6 +21,8 @@ class CompetitorCompareTool(BaseTool):
     """
 
     name = "competitor_compare"
+    cacheable = True
+    reads = ("category_products", "competitor_products", "competitors", "price_snapshots")
     description = "比較 HKTVmall 和其他平台（如百佳、惠康）的產品價格"
     parameters = {
         "products": {
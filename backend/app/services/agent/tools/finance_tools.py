@@ -14,17 +14,21 @@ from app.models.order import Order
 
 class QuerySalesTool(BaseTool):
     name = "query_sales"
+    cacheable = True
+    reads = ("settlements",)
     description = "查詢銷售數據，支持按天/週/月聚合，可查詢營收(revenue)或利潤(profit)"
     parameters = {
         "metric": {
             "type": "string",
             "description": "指標類型: revenue (營收) 或 profit (利潤)",
-            "required": True
+            "required": True,
+            "default": "revenue",
         },
         "period": {
             "type": "string",
             "description": "時間範圍: last_7_days, last_30_days, this_month, last_month",
-            "required": True
+            "required": True,
+            "default": "last_30_days",
         }
     }
 
@@ -80,17 +84,21 @@ class QuerySalesTool(BaseTool):
 
 class QueryTopProductsTool(BaseTool):
     name = "query_top_products"
+    cacheable = True
+    reads = ("settlement_items",)
     description = "查詢銷量最高或利潤最高的產品"
     parameters = {
         "by": {
             "type": "string",
             "description": "排序依據: sales (銷量), revenue (營收)",
-            "required": True
+            "required": True,
+            "default": "sales",
         },
         "limit": {
             "type": "int",
             "description": "返回數量，默認 5",
-            "required": False
+            "required": False,
+            "default": 5,
         }
     }
 
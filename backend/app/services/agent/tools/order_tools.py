@@ -21,6 +21,8 @@ class OrderStatsTool(BaseTool):
     """
 
     name = "order_stats"
+    cacheable = True
+    reads = ("orders",)
     description = "統計訂單數據：訂單數量、金額、按狀態分組"
 
     parameters = {
@@ -185,6 +187,8 @@ class OrderSearchTool(BaseTool):
     """
 
     name = "order_search"
+    cacheable = True
+    reads = ("orders", "order_items")
     description = "搜索訂單，支持訂單號、狀態、日期、金額篩選"
 
     parameters = {
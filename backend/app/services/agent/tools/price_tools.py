@@ -25,6 +25,8 @@ class PriceTrendTool(BaseTool):
     """
 
     name = "price_trend"
+    cacheable = True
+    reads = ("category_price_snapshots", "category_products")
     description = "獲取產品價格隨時間變化的趨勢數據"
     parameters = {
         "products": {
@@ -154,6 +156,8 @@ class PriceComparisonTool(BaseTool):
     """
 
     name = "price_comparison"
+    cacheable = True
+    reads = ("category_products",)
     description = "比較多個產品的價格（每 100g 單價等）"
     parameters = {
         "products": {
@@ -25,6 +25,8 @@ class ProductOverviewTool(BaseTool):
     """
 
     name = "product_overview"
+    cacheable = True
+    reads = ("category_products",)
     description = "獲取產品概覽數據，包括 SKU 數量、價格範圍、評分、庫存狀態等統計信息"
     parameters = {
         "products": {
@@ -131,6 +133,8 @@ class ProductSearchTool(BaseTool):
     """
 
     name = "product_search"
+    cacheable = True
+    reads = ("category_products",)
     description = "搜索符合條件的具體產品，返回產品列表"
     parameters = {
         "query": {
@@ -255,6 +259,8 @@ class TopProductsTool(BaseTool):
     """
 
     name = "top_products"
+    cacheable = True
+    reads = ("category_products",)
     description = "獲取熱門產品（按評論數或評分排序）"
     parameters = {
         "products": {
@@ -20,15 +20,16 @@ def escape_like_pattern(value: str) -> str:
     if not value:
         return ""
 
-    # 轉義 LIKE 特殊字符: % _ \
-    escaped = value.replace("\\", "\\\\")
+    # 移除可能的 SQL 注入字符（單引號、雙引號、分號、註釋符號 --）
+    # 先清理再轉義：轉義產生的反斜杠不能再被清理掉，否則 % _ 重新變回通配符；
+    # 單個連字符保留（SKU 如 A5-SIRLOIN）
+    cleaned = re.sub(r"['\";]+|-{2,}", "", value)
+
+    # 轉義 LIKE 特殊字符: % _ \（查詢時配合 ESCAPE '\\'）
+    escaped = cleaned.replace("\\", "\\\\")
     escaped = escaped.replace("%", "\\%")
     escaped = escaped.replace("_", "\\_")
 
-    # 移除可能的 SQL 注入字符
-    # 移除單引號、雙引號、分號、註釋符號等
-    escaped = re.sub(r"['\";\\-]+", "", escaped)
-
     return escaped
 
 
@@ -2,7 +2,7 @@
 # AI 服務 - 支持中轉站 (自定義 Base URL)
 # =============================================
 
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, AsyncIterator
 from dataclasses import dataclass, field
 from enum import Enum
 import httpx
@@ -711,6 +711,57 @@ class AIAnalysisService:
                 error=f"API 調用失敗: {str(e)}"
             )
 
+    async def stream_ai(self, prompt: str, max_tokens: int = 2048) -> AsyncIterator[str]:
+        """
+        調用 AI API（串流版本）
+
+        逐段產出模型輸出的文字；失敗時拋出 RuntimeError（已產出的部分由調用方決定如何處理）
+        """
+        if not self.config.api_key:
+            raise RuntimeError("API Key 未設定")
+
+        model = self.config.insights_model
+
+        try:
+            async with httpx.AsyncClient(timeout=60.0) as client:
+                async with client.stream(
+                    "POST",
+                    f"{self.base_url}/chat/completions",
+                    headers={
+                        "Authorization": f"Bearer {self.config.api_key}",
+                        "Content-Type": "application/json",
+                    },
+                    json={
+                        "model": model,
+                        "messages": [{"role": "user", "content": prompt}],
+                        "max_tokens": max_tokens,
+                        "stream": True,
+                    }
+                ) as response:
+                    if response.status_code != 200:
+                        error_text = (await response.aread()).decode(errors="replace")[:300]
+                        raise RuntimeError(f"API 錯誤 ({response.status_code}): {error_text or 'Unknown error'}")
+
+                    # OpenAI 兼容 SSE：每行 `data: {...}`，以 `data: [DONE]` 結束
+                    async for line in response.aiter_lines():
+                        if not line.startswith("data:"):
+                            continue
+                        payload = line[5:].strip()
+                        if payload == "[DONE]":
+                            break
+                        try:
+                            chunk = json.loads(payload)
+                        except json.JSONDecodeError:
+                            continue
+                        delta = (chunk.get("choices") or [{}])[0].get("delta", {}).get("content")
+                        if delta:
+                            yield delta
+
+        except httpx.ConnectError:
+            raise RuntimeError("無法連接到 API 服務器")
+        except httpx.TimeoutException:
+            raise RuntimeError("API 請求超時（60秒）")
+
     def generate_data_insights(self, data: Dict[str, Any]) -> AIResponse:
         """
         生成數據摘要
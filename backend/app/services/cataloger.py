@@ -5,13 +5,14 @@
 # 只管「對手有什麼」— 不管標籤（Tagger）、不管匹配（Matcher）。
 #
 # HKTVmall 側：Algolia API 按關鍵詞批量搜索
-# 惠康側：Playwright 分類頁 → 提取 URL → HTTP GET JSON-LD
+# 惠康側：Playwright 分類頁（頁面池並發）→ 提取 URL → HTTP GET JSON-LD（管線重疊）
 #
 # 每日更新策略：
 #   新 URL → 新品入庫，needs_matching=True, last_seen_at=now
 #   已有 URL → 更新價格 + last_seen_at，名稱變更則清空標籤
 #   消失的 URL → 不處理（Monitor 模塊判定連續 3 天未見才下架）
 
+import asyncio
 import logging
 from datetime import datetime, timezone
 from decimal import Decimal
@@ -61,6 +62,8 @@ HKTV_HITS_PER_PAGE = 50
 HKTV_MAX_PAGES = 3
 # 惠康每個分類最多拉取頁數
 WELLCOME_MAX_PAGES = 5
+# 惠康 JSON-LD 每批最多抓取 URL 數（邊發現邊抓取）
+WELLCOME_FETCH_BATCH = 25
 # 每個店鋪最多入庫商品數（防止單一店鋪灌水）
 HKTV_MAX_PRODUCTS_PER_STORE = 200
 
@@ -207,11 +210,12 @@ class CatalogService:
         """
         惠康建庫：Playwright 分類頁 → 提取 URL → HTTP GET JSON-LD
 
-        流程：
+        流程（producer / consumer 管線）：
         1. 獲取或創建 Wellcome Competitor 記錄
-        2. 遍歷分類 ID，Playwright 提取分類頁所有產品 URL
-        3. 批量 HTTP GET JSON-LD 取產品詳情
-        4. URL 去重後 upsert 到 competitor_products
+        2. 生產者：所有「分類 × 頁碼」並發交給瀏覽器頁面池，發現的 URL 去重後入隊
+        3. 消費者：從隊列攢批 → batch_fetch_products 取 JSON-LD → upsert
+           （與仍在進行的分類頁發現重疊執行）
+        4. DB 寫入只在消費者協程內進行，session 不會被並發使用
         """
         settings = get_settings()
         if not settings.agent_browser_enabled:
@@ -226,55 +230,74 @@ class CatalogService:
         agent_browser = get_agent_browser_connector()
         http_client = get_wellcome_http_client()
         seen_urls: Set[str] = set()
+        url_queue: asyncio.Queue[Optional[str]] = asyncio.Queue()
+        category_urls: dict[str, int] = {name: 0 for name in WELLCOME_CATEGORIES.values()}
         stats = {"new": 0, "updated": 0, "unchanged": 0, "total_fetched": 0}
 
-        try:
-            for cat_id, cat_name in WELLCOME_CATEGORIES.items():
-                all_urls: list[str] = []
-
-                # 分類頁逐頁爬取產品 URL
-                for page_num in range(1, WELLCOME_MAX_PAGES + 1):
-                    page_url = WELLCOME_CATEGORY_URL.format(
-                        category_id=cat_id, page=page_num,
-                    )
-                    try:
-                        urls = await agent_browser.discover_wellcome_products(
-                            page_url, max_products=50,
-                        )
-                        if not urls:
-                            break
-                        all_urls.extend(urls)
-                        logger.info(
-                            f"惠康建庫: {cat_name} 第{page_num}頁 → {len(urls)} URLs"
-                        )
-                    except Exception as e:
-                        logger.warning(
-                            f"惠康建庫: {cat_name} 第{page_num}頁爬取失敗 - {e}"
-                        )
-                        break
+        async def discover_page(cat_id: str, cat_name: str, page_num: int) -> None:
+            """單個分類頁 URL 發現（失敗只記錄，不影響其他頁）"""
+            page_url = WELLCOME_CATEGORY_URL.format(
+                category_id=cat_id, page=page_num,
+            )
+            try:
+                urls = await agent_browser.discover_wellcome_products(
+                    page_url, max_products=50,
+                )
+            except Exception as e:
+                logger.warning(
+                    f"惠康建庫: {cat_name} 第{page_num}頁爬取失敗 - {e}"
+                )
+                return
 
-                if not all_urls:
-                    logger.info(f"惠康建庫: {cat_name} 無產品 URL")
+            logger.info(
+                f"惠康建庫: {cat_name} 第{page_num}頁 → {len(urls)} URLs"
+            )
+            for url in urls:
+                normalized = normalize_url(url)
+                if normalized in seen_urls:
                     continue
+                seen_urls.add(normalized)
+                category_urls[cat_name] += 1
+                url_queue.put_nowait(url)
+
+        async def discover_all() -> None:
+            """生產者：分類 × 頁碼全部並發（並發度由瀏覽器頁面池限制）"""
+            try:
+                await asyncio.gather(*(
+                    discover_page(cat_id, cat_name, page_num)
+                    for cat_id, cat_name in WELLCOME_CATEGORIES.items()
+                    for page_num in range(1, WELLCOME_MAX_PAGES + 1)
+                ))
+            finally:
+                url_queue.put_nowait(None)  # 結束標記
 
-                # 去重
-                unique_urls = [u for u in all_urls if normalize_url(u) not in seen_urls]
-                for u in unique_urls:
-                    seen_urls.add(normalize_url(u))
+        producer = asyncio.create_task(discover_all())
+        try:
+            finished = False
+            while not finished:
+                # 阻塞等第一個 URL，再把隊列中已有的攢成一批
+                batch = [await url_queue.get()]
+                while len(batch) < WELLCOME_FETCH_BATCH and not url_queue.empty():
+                    batch.append(url_queue.get_nowait())
+
+                if batch[-1] is None:
+                    finished = True
+                    batch.pop()
+                if not batch:
+                    continue
 
-                # 批量取 JSON-LD 詳情
-                products = await http_client.batch_fetch_products(unique_urls)
+                # 批量取 JSON-LD 詳情（期間生產者繼續發現下一批 URL）
+                products = await http_client.batch_fetch_products(batch)
 
                 for product in products:
                     if not product.name:
                         continue
-                    normalized = normalize_url(product.url)
                     stats["total_fetched"] += 1
 
                     action = await CatalogService._upsert_competitor_product(
                         db=db,
                         competitor_id=competitor.id,
-                        url=normalized,
+                        url=normalize_url(product.url),
                         name=product.name,
                         price=product.price,
                         sku=product.product_id,
@@ -282,14 +305,19 @@ class CatalogService:
                     )
                     stats[action] += 1
 
-                logger.info(
-                    f"惠康建庫: {cat_name} → {len(unique_urls)} URLs, "
-                    f"{stats['total_fetched']} 有效商品"
-                )
+            await producer
 
         finally:
+            if not producer.done():
+                producer.cancel()
             await http_client.close()
 
+        for cat_name, count in category_urls.items():
+            if count:
+                logger.info(f"惠康建庫: {cat_name} → {count} URLs")
+            else:
+                logger.info(f"惠康建庫: {cat_name} 無產品 URL")
+
         logger.info(
             f"惠康建庫完成: 去重後 {stats['total_fetched']} 商品, "
             f"新增 {stats['new']}, 更新 {stats['updated']}, "
@@ -0,0 +1,124 @@
+# =============================================
+# 已提交的表寫入
+# =============================================
+# 用途：進程內快取 / 索引（工具結果版本號、快速回覆快取、產品實體詞庫）都要在
+#       「寫入提交後」失效或更新——統一由一組 Session 鉤子記錄本事務寫過哪些表，
+#       提交後通知訂閱者，回滾則丟棄
+# 設計：
+# - ORM 寫入（after_flush）、批量 / Core DML 與 text() 的 INSERT/UPDATE/DELETE（do_orm_execute）
+#   記下受影響的表；text() 支持 schema 限定的表名與 WITH ... INSERT/UPDATE/DELETE
+# - 訂閱者若需表名以外的數據（如 flush 時的屬性歷史），用 stage() 暫存到本事務，
+#   提交時由 staged() 取出，回滾時一併丟棄
+# - 只覆蓋本進程經 Session 的寫入；其他進程的寫入由各快取的 TTL 兜底
+# - 與 dashboard_counters 的 before_flush 不同：那裡要在同一事務內寫計數器，不屬於提交後通知
+
+import logging
+import re
+from itertools import chain
+from typing import Any, Callable, FrozenSet, Iterable, List, Optional
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+CommitListener = Callable[[Session, FrozenSet[str]], None]
+
+# text() 語句：只看以 DML / WITH 開頭的語句，取每個寫入目標（可帶 schema 前綴與引號）
+_TEXT_DML_START = re.compile(r"^\s*(?:WITH|INSERT|UPDATE|DELETE)\b", re.IGNORECASE)
+_TEXT_DML_TARGET = re.compile(
+    r"(?:\b(\w+)\s+)?\b(?:INSERT\s+INTO|UPDATE|DELETE\s+FROM)\s+(?:ONLY\s+)?"
+    r"(?:\"?\w+\"?\s*\.\s*)?\"?(\w+)\"?",
+    re.IGNORECASE,
+)
+# SELECT ... FOR UPDATE / ON CONFLICT DO UPDATE SET 不是寫入目標
+_NOT_DML_PREFIXES = frozenset({"for", "do"})
+
+_TABLES_KEY = "committed_writes_tables"
+_STAGED_KEY = "committed_writes_staged"
+
+_listeners: List[CommitListener] = []
+
+
+def on_committed_writes(listener: CommitListener) -> CommitListener:
+    """
+    訂閱提交後的表寫入（可作裝飾器；重複訂閱只保留一次）
+
+    listener(session, tables) 在 after_commit 中同步調用，tables 為本事務寫過的表名；
+    listener 拋出的異常只記錄日誌，不影響其他訂閱者
+    """
+    if listener not in _listeners:
+        _listeners.append(listener)
+    return listener
+
+
+def text_dml_tables(sql: str) -> List[str]:
+    """原生 SQL 寫入的表名（小寫；非 DML 返回空列表）"""
+    if not _TEXT_DML_START.match(sql):
+        return []
+    return [
+        table.lower()
+        for prefix, table in _TEXT_DML_TARGET.findall(sql)
+        if prefix.lower() not in _NOT_DML_PREFIXES
+    ]
+
+
+def stage(session: Session, key: str, factory: Callable[[], Any]) -> Any:
+    """本事務內訂閱者的暫存數據（首次調用時以 factory() 建立；提交後清空，回滾則丟棄）"""
+    return session.info.setdefault(_STAGED_KEY, {}).setdefault(key, factory())
+
+
+def staged(session: Session, key: str) -> Optional[Any]:
+    """提交回調中取出 stage() 暫存的數據"""
+    return session.info.get(_STAGED_KEY, {}).get(key)
+
+
+def _statement_tables(orm_execute_state) -> Iterable[Optional[str]]:
+    statement = orm_execute_state.statement
+    table = getattr(statement, "table", None)
+    if table is not None:
+        return [getattr(table, "name", None)]
+    if hasattr(statement, "text"):
+        return text_dml_tables(statement.text)
+    return []
+
+
+def _mark(session: Session, tables: Iterable[Optional[str]]) -> None:
+    tables = [t for t in tables if t]
+    if tables:
+        session.info.setdefault(_TABLES_KEY, set()).update(tables)
+
+
+@event.listens_for(Session, "after_flush")
+def _track_flush(session: Session, flush_context) -> None:
+    _mark(session, (
+        table.name
+        for obj in chain(session.new, session.dirty, session.deleted)
+        for table in inspect(obj).mapper.tables
+    ))
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _track_execute(orm_execute_state) -> None:
+    if orm_execute_state.is_select:
+        return
+    _mark(orm_execute_state.session, _statement_tables(orm_execute_state))
+
+
+@event.listens_for(Session, "after_commit")
+def _notify_after_commit(session: Session) -> None:
+    tables = session.info.pop(_TABLES_KEY, None)
+    if tables:
+        tables = frozenset(tables)
+        for listener in list(_listeners):
+            try:
+                listener(session, tables)
+            except Exception as exc:
+                logger.error(f"提交後寫入通知失敗 ({listener.__qualname__}): {exc}")
+    session.info.pop(_STAGED_KEY, None)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_rollback(session: Session) -> None:
+    session.info.pop(_TABLES_KEY, None)
+    session.info.pop(_STAGED_KEY, None)
@@ -0,0 +1,370 @@
+# =============================================
+# 儀表板計數器（增量維護 + 定時對賬）
+# =============================================
+# 用途：get_dashboard_summary 只讀 dashboard_counters 的 COUNTER_SHARDS 行求和，不再逐表 COUNT
+# 設計：
+# - 每個計數器由 CounterSpec 描述：單行貢獻（Python）+ 全表聚合（SQL），兩者必須同義
+# - ORM 寫入：Session before_flush 鉤子比較每個受影響對象的新舊貢獻，
+#   在同一事務內執行一條 UPDATE ... SET col = col + delta
+# - 分片：每個 Session 固定寫其中一行（隨機選取），並發寫入不再爭搶同一行鎖；
+#   一個事務只鎖一個分片，不會因加鎖順序死鎖
+# - 批量 UPDATE / DELETE / 原生 SQL：調用方用 apply_counter_deltas 按 rowcount 或 RETURNING 補增量
+# - 漏網的寫入（其他進程、手工改庫）由 reconcile_dashboard_counters 定時重算修正
+
+import logging
+import random
+from dataclasses import dataclass
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Callable, Dict, Iterable, Mapping, Optional, Union
+
+from sqlalchemy import Row, event, func, inspect, select, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import ColumnElement
+
+from app.models.analytics import DashboardCounters
+from app.models.competitor import PriceAlert
+from app.models.database import utcnow
+from app.models.finance import Settlement
+from app.models.inbox import Conversation
+from app.models.order import Order
+from app.models.pricing import PriceProposal, ProposalStatus
+from app.models.promotion import PromotionProposal
+
+logger = logging.getLogger(__name__)
+
+# 分片行 id 為 1..COUNTER_SHARDS；對賬把總數寫回 1 號行並清零其餘分片
+COUNTER_SHARDS = 8
+COUNTER_ROW_ID = 1
+SHARD_INFO_KEY = "dashboard_counter_shard"
+
+# 視為「待出貨」的訂單狀態
+ORDER_TO_SHIP_STATUSES = ("Pending", "Processing", "To Ship")
+
+Number = Union[int, Decimal]
+
+
+def current_month_start(now: Optional[datetime] = None) -> datetime:
+    """本月一號 00:00（本地時間，與結算單 settlement_date 一致）"""
+    now = now or datetime.now()
+    return now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+@dataclass(frozen=True)
+class CounterSpec:
+    """一個計數器：哪張表、哪些欄位決定歸屬、單行貢獻和全表聚合"""
+    column: str
+    model: type
+    fields: tuple[str, ...]
+    contribution: Callable[[Mapping[str, Any], datetime], Number]
+    aggregate: Callable[[datetime], ColumnElement]
+
+
+def _count_where(model, condition) -> Callable[[datetime], ColumnElement]:
+    return lambda month_start: (
+        select(func.count(model.id)).where(condition).scalar_subquery()
+    )
+
+
+def _monthly_sum(amount_field: str) -> CounterSpec:
+    column = getattr(Settlement, amount_field)
+
+    def contribution(values: Mapping[str, Any], month_start: datetime) -> Decimal:
+        settled = values["settlement_date"]
+        if settled is None or settled < month_start:
+            return Decimal(0)
+        return Decimal(values[amount_field] or 0)
+
+    return CounterSpec(
+        column="monthly_revenue" if amount_field == "total_sales_amount" else "monthly_profit",
+        model=Settlement,
+        fields=("settlement_date", amount_field),
+        contribution=contribution,
+        aggregate=lambda month_start: (
+            select(func.coalesce(func.sum(column), 0))
+            .where(Settlement.settlement_date >= month_start)
+            .scalar_subquery()
+        ),
+    )
+
+
+COUNTER_SPECS: tuple[CounterSpec, ...] = (
+    CounterSpec(
+        column="orders_to_ship",
+        model=Order,
+        fields=("status",),
+        contribution=lambda v, _: int(v["status"] in ORDER_TO_SHIP_STATUSES),
+        aggregate=_count_where(Order, Order.status.in_(ORDER_TO_SHIP_STATUSES)),
+    ),
+    CounterSpec(
+        column="unread_messages",
+        model=Conversation,
+        fields=("status",),
+        contribution=lambda v, _: int(v["status"] == "Open"),
+        aggregate=_count_where(Conversation, Conversation.status == "Open"),
+    ),
+    CounterSpec(
+        column="pending_price_reviews",
+        model=PriceProposal,
+        fields=("status",),
+        contribution=lambda v, _: int(v["status"] == ProposalStatus.PENDING),
+        aggregate=_count_where(PriceProposal, PriceProposal.status == ProposalStatus.PENDING),
+    ),
+    CounterSpec(
+        column="pending_promotion_reviews",
+        model=PromotionProposal,
+        fields=("status",),
+        contribution=lambda v, _: int(v["status"] == "pending"),
+        aggregate=_count_where(PromotionProposal, PromotionProposal.status == "pending"),
+    ),
+    CounterSpec(
+        column="unread_alerts",
+        model=PriceAlert,
+        fields=("is_read",),
+        contribution=lambda v, _: int(v["is_read"] is not None and not v["is_read"]),
+        aggregate=_count_where(PriceAlert, PriceAlert.is_read == False),  # noqa: E712
+    ),
+    _monthly_sum("total_sales_amount"),
+    _monthly_sum("net_settlement_amount"),
+)
+
+_SPECS_BY_MODEL: Dict[type, list[CounterSpec]] = {}
+for _spec in COUNTER_SPECS:
+    _SPECS_BY_MODEL.setdefault(_spec.model, []).append(_spec)
+
+
+# =============================================
+# 增量：ORM flush 鉤子
+# =============================================
+
+def _column_default(model, name: str) -> Any:
+    default = model.__table__.c[name].default
+    return default.arg if default is not None and default.is_scalar else None
+
+
+def _pending_values(obj, fields: tuple[str, ...]) -> dict:
+    """新對象將插入的值；未賦值的欄位取列默認值"""
+    values = {}
+    for name in fields:
+        value = getattr(obj, name)
+        if value is None:
+            value = _column_default(type(obj), name)
+        values[name] = value
+    return values
+
+
+def _previous_values(session: Session, obj, fields: tuple[str, ...]) -> dict:
+    """
+    已持久化對象在本次 flush 之前的值
+
+    未加載的屬性（如 commit 後過期再賦值）history 裡沒有舊值，用 Core 查詢回庫補讀，
+    避免在 flush 中觸發 ORM 懶加載
+    """
+    state = inspect(obj)
+    values, missing = {}, []
+    for name in fields:
+        history = state.attrs[name].history
+        if history.deleted:
+            values[name] = history.deleted[0]
+        elif history.unchanged:
+            values[name] = history.unchanged[0]
+        else:
+            missing.append(name)
+
+    if missing:
+        model = type(obj)
+        row = session.connection().execute(
+            select(*[getattr(model, name) for name in missing]).where(model.id == state.identity[0])
+        ).one_or_none()
+        for name in missing:
+            values[name] = getattr(row, name) if row is not None else None
+    return values
+
+
+def _changed_values(obj, previous: dict) -> dict:
+    """已持久化對象 flush 後的值：有改動取新值，否則沿用舊值"""
+    state = inspect(obj)
+    values = {}
+    for name, value in previous.items():
+        history = state.attrs[name].history
+        values[name] = history.added[0] if history.added else value
+    return values
+
+
+def _collect_deltas(session: Session) -> Dict[str, Number]:
+    month_start = current_month_start()
+    deltas: Dict[str, Number] = {}
+
+    def add(spec: CounterSpec, before: Optional[dict], after: Optional[dict]) -> None:
+        delta = (spec.contribution(after, month_start) if after else 0) - (
+            spec.contribution(before, month_start) if before else 0
+        )
+        if delta:
+            deltas[spec.column] = deltas.get(spec.column, 0) + delta
+
+    for obj in session.new:
+        for spec in _SPECS_BY_MODEL.get(type(obj), ()):
+            add(spec, None, _pending_values(obj, spec.fields))
+
+    for obj in session.dirty:
+        specs = _SPECS_BY_MODEL.get(type(obj))
+        if not specs or not session.is_modified(obj, include_collections=False):
+            continue
+        state = inspect(obj)
+        for spec in specs:
+            if not any(state.attrs[name].history.added for name in spec.fields):
+                continue
+            previous = _previous_values(session, obj, spec.fields)
+            add(spec, previous, _changed_values(obj, previous))
+
+    for obj in session.deleted:
+        for spec in _SPECS_BY_MODEL.get(type(obj), ()):
+            add(spec, _previous_values(session, obj, spec.fields), None)
+
+    return {column: delta for column, delta in deltas.items() if delta}
+
+
+def _session_shard(session: Session) -> int:
+    """本 Session 寫入的分片（首次寫入時隨機選定）"""
+    return session.info.setdefault(SHARD_INFO_KEY, random.randint(1, COUNTER_SHARDS))
+
+
+def _counter_update(deltas: Mapping[str, Number], shard: int):
+    table = DashboardCounters.__table__
+    return (
+        update(table)
+        .where(table.c.id == shard)
+        .values({table.c[column]: table.c[column] + delta for column, delta in deltas.items()})
+        .values(updated_at=utcnow())
+    )
+
+
+@event.listens_for(Session, "before_flush")
+def _apply_flush_deltas(session: Session, flush_context, instances) -> None:
+    """
+    同一事務內把本次 flush 的計數變化寫進 dashboard_counters
+
+    flush 失敗時事務整體回滾，計數器不會與源表分離；
+    分片行尚未建立時 UPDATE 命中 0 行，首次讀取或對賬時按源表建立
+    """
+    if not (session.new or session.dirty or session.deleted):
+        return
+    deltas = _collect_deltas(session)
+    if deltas:
+        session.connection().execute(_counter_update(deltas, _session_shard(session)))
+
+
+async def apply_counter_deltas(db: AsyncSession, **deltas: Number) -> None:
+    """
+    批量 UPDATE / 原生 SQL 繞過 ORM 鉤子時手動補增量
+
+    例：標記全部警報已讀後 apply_counter_deltas(db, unread_alerts=-result.rowcount)
+    """
+    deltas = {column: delta for column, delta in deltas.items() if delta}
+    if deltas:
+        await db.execute(_counter_update(deltas, _session_shard(db.sync_session)))
+
+
+def counter_columns(model: type) -> list:
+    """批量 DELETE ... RETURNING 需要返回的欄位（該表計數器依賴的全部欄位）"""
+    names = dict.fromkeys(name for spec in _SPECS_BY_MODEL.get(model, ()) for name in spec.fields)
+    return [getattr(model, name) for name in names]
+
+
+def removed_row_deltas(model: type, rows: Iterable[Mapping[str, Any]]) -> Dict[str, Number]:
+    """
+    批量刪除的行對計數器的增量（與 flush 鉤子的刪除分支同義）
+
+    例：result = await db.execute(delete(Settlement).returning(*counter_columns(Settlement)))
+        await apply_counter_deltas(db, **removed_row_deltas(Settlement, result.mappings()))
+    """
+    month_start = current_month_start()
+    deltas: Dict[str, Number] = {}
+    for row in rows:
+        for spec in _SPECS_BY_MODEL.get(model, ()):
+            delta = spec.contribution(row, month_start)
+            if delta:
+                deltas[spec.column] = deltas.get(spec.column, 0) - delta
+    return deltas
+
+
+# =============================================
+# 讀取與對賬
+# =============================================
+
+def _locked_shards():
+    return (
+        select(DashboardCounters)
+        .where(DashboardCounters.id.between(1, COUNTER_SHARDS))
+        .order_by(DashboardCounters.id)
+        .with_for_update()
+        .execution_options(populate_existing=True)
+    )
+
+
+def _totals():
+    return select(
+        *[func.sum(getattr(DashboardCounters, spec.column)).label(spec.column) for spec in COUNTER_SPECS],
+        func.min(DashboardCounters.month_start).label("month_start"),
+        func.count(DashboardCounters.id).label("shards"),
+    ).where(DashboardCounters.id.between(1, COUNTER_SHARDS))
+
+
+async def reconcile_dashboard_counters(db: AsyncSession) -> Dict[str, Number]:
+    """
+    按源表重算全部計數器，返回修正前後的差值（無漂移時為空）
+
+    按 id 順序鎖住全部分片再聚合：已寫入增量但未提交的事務持有其分片行鎖，
+    拿到鎖時它們已提交並能被聚合看到；之後的寫入會排在本事務之後疊加增量
+    """
+    month_start = current_month_start()
+    shards = (await db.execute(_locked_shards())).scalars().all()
+
+    base = next((row for row in shards if row.id == COUNTER_ROW_ID), None)
+    same_month = base is not None and base.month_start == month_start
+    if len(shards) < COUNTER_SHARDS:
+        # 並發對賬可能同時建行：ON CONFLICT DO NOTHING 後再鎖定
+        insert = postgresql_insert if db.bind.dialect.name == "postgresql" else sqlite_insert
+        await db.execute(
+            insert(DashboardCounters)
+            .values([
+                {"id": shard, "month_start": month_start, "updated_at": utcnow()}
+                for shard in range(1, COUNTER_SHARDS + 1)
+            ])
+            .on_conflict_do_nothing(index_elements=["id"])
+        )
+        shards = (await db.execute(_locked_shards())).scalars().all()
+
+    actual = (await db.execute(
+        select(*[spec.aggregate(month_start).label(spec.column) for spec in COUNTER_SPECS])
+    )).one()
+
+    drift: Dict[str, Number] = {}
+    for spec in COUNTER_SPECS:
+        value = getattr(actual, spec.column)
+        previous = sum((getattr(row, spec.column) or 0 for row in shards), 0)
+        if same_month and value != previous:
+            drift[spec.column] = value - previous
+        for row in shards:
+            setattr(row, spec.column, value if row.id == COUNTER_ROW_ID else 0)
+
+    for row in shards:
+        row.month_start = month_start
+        row.reconciled_at = utcnow()
+    await db.flush()
+
+    if drift:
+        logger.warning(f"儀表板計數器漂移已修正: {drift}")
+    return drift
+
+
+async def get_dashboard_counters(db: AsyncSession) -> Row:
+    """各分片求和（按計數器欄位名訪問）；分片缺失或已跨月時先重算"""
+    totals = (await db.execute(_totals())).one()
+    if totals.shards < COUNTER_SHARDS or totals.month_start != current_month_start():
+        await reconcile_dashboard_counters(db)
+        totals = (await db.execute(_totals())).one()
+    return totals
@@ -0,0 +1,146 @@
+# =============================================
+# R2 下載代理（流式）
+# =============================================
+# 用途：/download 經後端代理 R2 文件（繞過 CORS），大圖 / ZIP 不在內存中組裝
+# 設計：
+# - boto3 是同步的：get_object 與每次 Body.read 都在線程中執行，不阻塞事件循環
+# - Body 按塊讀出即 yield，內存佔用與文件大小無關
+# - Range / If-None-Match 原樣轉發給 R2，透傳 ETag / Content-Length / Content-Range，
+#   以及 206 / 304 狀態
+# - 並發閘門：同時代理的下載數有上限（每個下載佔一個 R2 連接和一個線程），
+#   超出的請求排隊等待；整個響應傳完、客戶端斷開或響應未開始傳輸即結束時釋放
+
+import asyncio
+from datetime import timezone
+from email.utils import format_datetime
+from typing import AsyncIterator, Optional
+from urllib.parse import quote
+
+from botocore.exceptions import ClientError
+from fastapi import HTTPException, status
+from fastapi.responses import Response, StreamingResponse
+
+from app.config import get_settings
+from app.services.storage_service import StorageService
+
+# 每次從 R2 Body 讀出的塊大小
+DOWNLOAD_CHUNK_BYTES = 256 * 1024
+
+# R2 響應字段 → 透傳的 HTTP 頭
+_PASS_THROUGH_HEADERS = {
+    "ETag": "ETag",
+    "ContentLength": "Content-Length",
+    "ContentRange": "Content-Range",
+    "CacheControl": "Cache-Control",
+}
+
+_download_gate: Optional[asyncio.Semaphore] = None
+
+
+def _gate() -> asyncio.Semaphore:
+    global _download_gate
+    if _download_gate is None:
+        _download_gate = asyncio.Semaphore(max(1, get_settings().r2_download_concurrency))
+    return _download_gate
+
+
+class _R2StreamingResponse(StreamingResponse):
+    """
+    持有 R2 Body 與閘門名額的流式響應
+
+    Body 讀完、客戶端中途斷開、或響應根本沒開始傳輸（發送響應頭前斷開、HEAD、發送時出錯）
+    都會關閉 Body 並歸還名額（只歸還一次）。
+    """
+
+    def __init__(self, body, gate: asyncio.Semaphore, **kwargs):
+        self._body = body
+        self._gate = gate
+        self._released = False
+        super().__init__(self._chunks(), **kwargs)
+
+    def release(self) -> None:
+        if not self._released:
+            self._released = True
+            try:
+                self._body.close()
+            finally:
+                self._gate.release()
+
+    async def _chunks(self) -> AsyncIterator[bytes]:
+        """按塊讀出 R2 Body"""
+        try:
+            while chunk := await asyncio.to_thread(self._body.read, DOWNLOAD_CHUNK_BYTES):
+                yield chunk
+        finally:
+            self.release()
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.release()
+
+
+def _error_response(error: ClientError) -> Response:
+    """R2 的條件 / 範圍錯誤轉成對應的 HTTP 響應，其餘原樣拋出"""
+    code = error.response.get("Error", {}).get("Code")
+    meta = error.response.get("ResponseMetadata", {})
+    http_status = meta.get("HTTPStatusCode")
+
+    if http_status == 304 or code in ("304", "NotModified"):
+        etag = meta.get("HTTPHeaders", {}).get("etag")
+        return Response(status_code=304, headers={"ETag": etag} if etag else None)
+    if http_status == 416 or code == "InvalidRange":
+        raise HTTPException(status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE, detail="請求範圍無效")
+    if http_status == 404 or code in ("NoSuchKey", "404"):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="文件不存在")
+    raise error
+
+
+async def stream_object(
+    storage: StorageService,
+    r2_key: str,
+    range_header: Optional[str] = None,
+    if_none_match: Optional[str] = None,
+) -> Response:
+    """
+    流式代理一個 R2 對象
+
+    Returns:
+        200 / 206 的 StreamingResponse，或 ETag 命中時的 304
+    """
+    gate = _gate()
+    await gate.acquire()
+    try:
+        obj = await asyncio.to_thread(storage.get_object, r2_key, range_header, if_none_match)
+    except ClientError as e:
+        gate.release()
+        return _error_response(e)
+    except BaseException:
+        gate.release()
+        raise
+
+    try:
+        headers = {
+            header: str(obj[field])
+            for field, header in _PASS_THROUGH_HEADERS.items()
+            if obj.get(field) is not None
+        }
+        if obj.get("LastModified"):
+            headers["Last-Modified"] = format_datetime(obj["LastModified"].astimezone(timezone.utc), usegmt=True)
+        headers["Accept-Ranges"] = "bytes"
+        # 中文文件名用 RFC 5987 編碼（HTTP 頭只能是 latin-1）
+        headers["Content-Disposition"] = f"attachment; filename*=UTF-8''{quote(r2_key.split('/')[-1])}"
+        headers["Access-Control-Expose-Headers"] = "Content-Disposition, Content-Range, ETag"
+
+        return _R2StreamingResponse(
+            obj["Body"],
+            gate,
+            status_code=obj.get("ResponseMetadata", {}).get("HTTPStatusCode", 200),
+            media_type=obj.get("ContentType", "application/octet-stream"),
+            headers=headers,
+        )
+    except BaseException:
+        obj["Body"].close()
+        gate.release()
+        raise
@@ -0,0 +1,570 @@
+# =============================================
+# GEO / SEO 打包生成服務
+# =============================================
+# 用途：一次 AI 調用為產品生成全部 GEO/SEO 產物
+#       （SEO 關鍵詞、Meta 內容、AI 摘要、FAQ），取代 SEOService / GEOService 各自調用 AI、各自查產品
+# 設計：
+# - 產品只查一次；一個結構化 JSON prompt 同時要求所有部分
+# - 每部分獨立校驗（FAQ 經 validate_schema 驗證 FAQPage JSON-LD），
+#   只把不合格的部分連同錯誤原因重新請求，已通過的部分不再生成
+# - 全目錄批量：按產品 id 游標分頁，Semaphore 限制並發，每個產品獨立 session 提交；
+#   進度存於 system_settings，中斷後用同一個 batch_id 重跑即從游標續傳
+#   （產品已提交但進度未寫入時中斷，該產品續傳時會再生成一次）
+# - 同一批次只允許一個 runner：續傳前以比較並交換（UPDATE ... WHERE value = 舊值）認領，
+#   只有 paused / failed / 心跳過期的 running 批次可被認領
+
+import asyncio
+import json
+import logging
+import re
+import uuid
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.config import get_settings
+from app.models.product import Product
+from app.models.seo import SEOContent, StructuredData
+from app.models.system import SystemSetting
+from app.services.ai_service import AIAnalysisService, AISettingsService
+from app.services.geo_service import GEOService
+from app.services.seo_service import SEOService
+
+logger = logging.getLogger(__name__)
+
+PACKAGE_PARTS = ("keywords", "seo", "ai_summary", "faqs")
+
+# 批量進度（SystemSetting key 前綴 + batch_id）
+BATCH_KEY_PREFIX = "geo.package.batch."
+
+# running 批次超過此時間沒有寫入進度，視為 runner 已崩潰，可被重新認領
+BATCH_LEASE_SECONDS = 600
+
+# 可被認領續傳的狀態
+RESUMABLE_STATUSES = ("paused", "failed")
+
+PART_FORMATS = {
+    "keywords": """"keywords": {
+        "primary_keyword": "最重要的單一關鍵詞",
+        "secondary_keywords": ["關鍵詞2", "關鍵詞3", "關鍵詞4"],
+        "long_tail_keywords": ["長尾關鍵詞1", "長尾關鍵詞2"]
+    }""",
+    "seo": """"seo": {
+        "meta_title": "SEO 標題（50-60 字符，必須包含主關鍵詞）",
+        "meta_description": "SEO 描述（120-155 字符，包含關鍵詞和行動呼籲）",
+        "long_tail_keywords": ["長尾關鍵詞1", "長尾關鍵詞2"],
+        "improvement_suggestions": ["改進建議1"],
+        "og_title": "Open Graph 標題",
+        "og_description": "Open Graph 描述"
+    }""",
+    "ai_summary": """"ai_summary": {
+        "summary": "直接回答「這是什麼產品」的摘要（100字內）",
+        "facts": ["具體、可驗證的事實1", "事實2"],
+        "entities": {"brand": "品牌名", "origin": "產地", "category": "分類", "key_features": ["特點1"]}
+    }""",
+    "faqs": """"faqs": [
+        {"question": "香港消費者常見問題1", "answer": "簡潔專業的答案1"}
+    ]""",
+}
+
+
+class BatchAlreadyRunning(Exception):
+    """批次已有 runner 在執行"""
+
+
+@dataclass
+class GEOPackageResult:
+    """打包生成結果"""
+    success: bool
+    product_id: Optional[uuid.UUID] = None
+    parts: Dict[str, Any] = field(default_factory=dict)
+    failed_parts: Dict[str, List[str]] = field(default_factory=dict)
+    ai_calls: int = 0
+    seo_content_id: Optional[uuid.UUID] = None
+    product_schema_id: Optional[uuid.UUID] = None
+    faq_schema_id: Optional[uuid.UUID] = None
+    error: Optional[str] = None
+
+
+@dataclass
+class GEOBatchProgress:
+    """全目錄批量進度（JSON 存於 system_settings）"""
+    batch_id: str
+    status: str = "running"
+    cursor: Optional[str] = None
+    processed: int = 0
+    succeeded: int = 0
+    failed: Dict[str, str] = field(default_factory=dict)
+    in_page: List[str] = field(default_factory=list)
+    product_ids: Optional[List[str]] = None
+    started_at: Optional[str] = None
+    updated_at: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "GEOBatchProgress":
+        return cls(**{k: v for k, v in data.items() if k in cls.__dataclass_fields__})
+
+
+class GEOPackageService:
+    """GEO / SEO 打包生成服務"""
+
+    def __init__(
+        self,
+        db: AsyncSession,
+        ai_service: AIAnalysisService,
+        session_factory: Optional[Callable[[], AsyncSession]] = None,
+    ):
+        self.db = db
+        self.ai_service = ai_service
+        self.session_factory = session_factory
+        self.geo = GEOService(db, ai_service)
+        self.seo = SEOService(db, ai_service)
+
+    @classmethod
+    async def create(cls, db: AsyncSession, **kwargs) -> "GEOPackageService":
+        """工廠方法：創建 GEOPackageService 實例"""
+        config = await AISettingsService.get_config(db)
+        ai_service = AIAnalysisService(config)
+        return cls(db, ai_service, **kwargs)
+
+    # =============================================
+    # 單個產品打包生成
+    # =============================================
+
+    async def generate_package(
+        self,
+        product_id: uuid.UUID,
+        max_faqs: int = 5,
+        max_retries: Optional[int] = None,
+    ) -> GEOPackageResult:
+        """
+        一次 AI 調用生成產品的全部 GEO/SEO 產物並保存（只 flush，由調用方提交）
+
+        Args:
+            product_id: 產品 ID
+            max_faqs: FAQ 數量上限
+            max_retries: 不合格部分的最大重試次數（默認 GEO_PACKAGE_MAX_RETRIES）
+        """
+        if max_retries is None:
+            max_retries = get_settings().geo_package_max_retries
+
+        product = await self.db.get(Product, product_id)
+        if not product:
+            return GEOPackageResult(success=False, product_id=product_id, error="產品不存在")
+        product_data = self.geo._product_to_dict(product)
+
+        accepted: Dict[str, Any] = {}
+        errors: Dict[str, List[str]] = {}
+        pending = list(PACKAGE_PARTS)
+        ai_calls = 0
+
+        for _ in range(max_retries + 1):
+            prompt = self._build_prompt(product_data, pending, errors, accepted, max_faqs)
+            response = await self.ai_service.call_ai(prompt, max_tokens=3072)
+            ai_calls += 1
+
+            payload = self._parse_payload(response.content) if response.success else None
+            if payload is None:
+                reason = f"AI 調用失敗: {response.error}" if not response.success else "返回內容不是 JSON 對象"
+                errors = {part: [reason] for part in pending}
+                continue
+
+            errors = {}
+            for part in pending:
+                value = payload.get(part)
+                part_errors = self._validate_part(part, value, max_faqs)
+                if part_errors:
+                    errors[part] = part_errors
+                else:
+                    accepted[part] = value
+
+            pending = [part for part in pending if part not in accepted]
+            if not pending:
+                break
+
+        result = GEOPackageResult(
+            success=not pending,
+            product_id=product_id,
+            parts=accepted,
+            failed_parts={part: errors.get(part, []) for part in pending},
+            ai_calls=ai_calls,
+        )
+        await self._save_package(result, product_data, max_faqs)
+        return result
+
+    def _build_prompt(
+        self,
+        product_data: Dict[str, Any],
+        parts: List[str],
+        errors: Dict[str, List[str]],
+        accepted: Dict[str, Any],
+        max_faqs: int,
+    ) -> str:
+        """構建結構化輸出 prompt（只包含待生成的部分）"""
+        formats = ",\n    ".join(PART_FORMATS[part] for part in parts)
+
+        context = ""
+        if "keywords" in accepted:
+            context = f"\n## 已確定的關鍵詞\n{json.dumps(accepted['keywords'], ensure_ascii=False)}\n"
+
+        feedback = ""
+        if errors:
+            lines = "\n".join(
+                f"- {part}: {'；'.join(part_errors)}"
+                for part, part_errors in errors.items() if part in parts
+            )
+            feedback = f"\n## 上次生成未通過校驗，請修正\n{lines}\n"
+
+        return f"""你是一位專業的 SEO 及 GEO（生成式搜索引擎優化）專家，專門為香港電商平台優化商品頁面。
+請為以下產品一次生成所需的全部內容。
+
+## 產品信息
+- 名稱：{product_data.get('name', '')}
+- 品牌：{product_data.get('brand', '未知')}
+- 分類：{product_data.get('category', '未知')}
+- 描述：{product_data.get('description', '無描述')}
+- 特點：{', '.join(product_data.get('features', []))}
+- 價格：{product_data.get('price', '未定')}
+- 產地：{product_data.get('origin', '未知')}
+{context}{feedback}
+## 生成要求
+1. 關鍵詞和內容要符合香港用戶的搜索習慣，使用繁體中文
+2. meta_title 不超過 70 字符，meta_description 不超過 160 字符
+3. FAQ 最多 {max_faqs} 個，包含購買、配送、品質、儲存等方面
+4. 摘要和事實要具體、可驗證，適合 AI 搜索引擎引用
+
+## 返回格式
+```json
+{{
+    {formats}
+}}
+```
+
+請只返回 JSON，不要其他內容。"""
+
+    def _parse_payload(self, content: str) -> Optional[Dict[str, Any]]:
+        """解析 AI 返回的 JSON 對象"""
+        content = (content or "").strip()
+        if content.startswith("```"):
+            content = re.sub(r'^```(?:json)?\s*', '', content)
+            content = re.sub(r'\s*```$', '', content)
+        try:
+            payload = json.loads(content)
+        except json.JSONDecodeError:
+            return None
+        return payload if isinstance(payload, dict) else None
+
+    def _validate_part(self, part: str, value: Any, max_faqs: int) -> List[str]:
+        """校驗單個部分，返回錯誤列表（空 = 通過）"""
+        if part == "faqs":
+            if not isinstance(value, list):
+                return ["faqs 應該是數組"]
+            if any(
+                not isinstance(faq, dict) or not _text(faq.get("question")) or not _text(faq.get("answer"))
+                for faq in value
+            ):
+                return ["每個 FAQ 都需要非空的 question 和 answer"]
+            return self.geo.validate_schema(self.geo.build_faq_json_ld(value, max_faqs))["errors"]
+
+        if not isinstance(value, dict):
+            return [f"缺少 {part} 對象"]
+
+        errors = []
+        if part == "keywords":
+            if not _text(value.get("primary_keyword")):
+                errors.append("缺少 primary_keyword")
+            for key in ("secondary_keywords", "long_tail_keywords"):
+                if not isinstance(value.get(key, []), list):
+                    errors.append(f"{key} 應該是數組")
+        elif part == "seo":
+            for key, limit in (("meta_title", 70), ("meta_description", 160)):
+                text = value.get(key)
+                if not _text(text):
+                    errors.append(f"缺少 {key}")
+                elif len(text) > limit:
+                    errors.append(f"{key} 超過 {limit} 字符")
+        elif part == "ai_summary":
+            if not _text(value.get("summary")):
+                errors.append("缺少 summary")
+            if not isinstance(value.get("facts", []), list):
+                errors.append("facts 應該是數組")
+            if not isinstance(value.get("entities", {}), dict):
+                errors.append("entities 應該是對象")
+        return errors
+
+    async def _save_package(
+        self,
+        result: GEOPackageResult,
+        product_data: Dict[str, Any],
+        max_faqs: int,
+    ) -> None:
+        """保存通過校驗的產物；Product Schema 不依賴 AI，總是生成（摘要不合格時用產品描述兜底）"""
+        parts = result.parts
+        now = datetime.utcnow()
+
+        if "seo" in parts:
+            seo = parts["seo"]
+            keywords = parts.get("keywords") or self._fallback_keywords(product_data)
+            score_data = self.seo._calculate_seo_score(seo)
+            seo_content = SEOContent(
+                product_id=result.product_id,
+                meta_title=seo["meta_title"],
+                meta_description=seo["meta_description"],
+                primary_keyword=keywords["primary_keyword"],
+                secondary_keywords=keywords.get("secondary_keywords", [])[:4],
+                long_tail_keywords=seo.get("long_tail_keywords") or keywords.get("long_tail_keywords", []),
+                seo_score=score_data["total_score"],
+                score_breakdown=score_data,
+                improvement_suggestions=seo.get("improvement_suggestions", []),
+                language="zh-HK",
+                localized_seo=seo.get("localized", {}),
+                og_title=seo.get("og_title"),
+                og_description=seo.get("og_description"),
+                generation_metadata={
+                    "model": self.ai_service.config.insights_model,
+                    "generated_at": now.isoformat(),
+                    "package": True,
+                    "ai_calls": result.ai_calls,
+                },
+                input_data=product_data,
+            )
+            self.db.add(seo_content)
+            await self.db.flush()
+            result.seo_content_id = seo_content.id
+
+        summary = parts.get("ai_summary") or {
+            "summary": (product_data.get("description") or "")[:100],
+            "facts": [],
+            "entities": {
+                "brand": product_data.get("brand", ""),
+                "category": product_data.get("category", ""),
+            },
+        }
+        json_ld = self.geo.build_product_json_ld(product_data)
+        validation = self.geo.validate_schema(json_ld)
+        product_schema = StructuredData(
+            product_id=result.product_id,
+            schema_type="Product",
+            json_ld=json_ld,
+            ai_summary=summary.get("summary"),
+            ai_facts=summary.get("facts", []),
+            ai_entities=summary.get("entities", {}),
+            is_valid=validation["is_valid"],
+            validation_errors=validation["errors"],
+            last_validated_at=now,
+        )
+        self.db.add(product_schema)
+
+        faq_schema = None
+        if "faqs" in parts:
+            faq_schema = StructuredData(
+                product_id=result.product_id,
+                schema_type="FAQPage",
+                json_ld=self.geo.build_faq_json_ld(parts["faqs"], max_faqs),
+                is_valid=True,
+                validation_errors=[],
+                last_validated_at=now,
+            )
+            self.db.add(faq_schema)
+
+        await self.db.flush()
+        result.product_schema_id = product_schema.id
+        result.faq_schema_id = faq_schema.id if faq_schema else None
+
+    def _fallback_keywords(self, product_data: Dict[str, Any]) -> Dict[str, Any]:
+        """關鍵詞部分不合格時，與 SEOService 一樣從名稱 / 品牌 / 分類取基本關鍵詞"""
+        keywords = [
+            product_data.get(key) for key in ("name", "brand", "category") if product_data.get(key)
+        ]
+        return {
+            "primary_keyword": keywords[0] if keywords else "",
+            "secondary_keywords": keywords[1:],
+            "long_tail_keywords": [],
+        }
+
+    # =============================================
+    # 全目錄批量生成（可續傳）
+    # =============================================
+
+    async def claim_batch(
+        self,
+        batch_id: Optional[str] = None,
+        product_ids: Optional[List[uuid.UUID]] = None,
+    ) -> GEOBatchProgress:
+        """
+        認領批次：新建，或把 paused / failed / 心跳過期的批次原子地切換為 running
+
+        已完成的批次原樣返回（不會重跑）。
+
+        Raises:
+            BatchAlreadyRunning: 批次正由另一個 runner 執行
+        """
+        batch_id = batch_id or str(uuid.uuid4())
+        key = BATCH_KEY_PREFIX + batch_id
+        now = datetime.utcnow()
+
+        current = await self.db.scalar(select(SystemSetting.value).where(SystemSetting.key == key))
+        if current is None:
+            progress = GEOBatchProgress(
+                batch_id=batch_id,
+                product_ids=sorted(str(pid) for pid in product_ids) if product_ids else None,
+                started_at=now.isoformat(),
+                updated_at=now.isoformat(),
+            )
+            self.db.add(SystemSetting(
+                key=key,
+                value=json.dumps(progress.to_dict(), ensure_ascii=False),
+                description="GEO/SEO 打包批量生成進度（游標續傳）",
+            ))
+            try:
+                await self.db.commit()
+            except IntegrityError:
+                await self.db.rollback()
+                raise BatchAlreadyRunning(batch_id)
+            return progress
+
+        progress = GEOBatchProgress.from_dict(json.loads(current))
+        if progress.status == "completed":
+            return progress
+        lease_expired = (
+            progress.updated_at is None
+            or datetime.fromisoformat(progress.updated_at) < now - timedelta(seconds=BATCH_LEASE_SECONDS)
+        )
+        if progress.status not in RESUMABLE_STATUSES and not lease_expired:
+            raise BatchAlreadyRunning(batch_id)
+
+        progress.status = "running"
+        progress.updated_at = now.isoformat()
+        claimed = await self.db.execute(
+            update(SystemSetting)
+            .where(SystemSetting.key == key, SystemSetting.value == current)
+            .values(value=json.dumps(progress.to_dict(), ensure_ascii=False), updated_at=now)
+        )
+        await self.db.commit()
+        if claimed.rowcount != 1:
+            raise BatchAlreadyRunning(batch_id)
+        return progress
+
+    async def run_batch(
+        self,
+        batch_id: Optional[str] = None,
+        product_ids: Optional[List[uuid.UUID]] = None,
+        concurrency: Optional[int] = None,
+        max_faqs: int = 5,
+        claimed: bool = False,
+    ) -> GEOBatchProgress:
+        """
+        批量打包生成（不指定 product_ids = 全部產品）
+
+        傳入已存在的 batch_id 時從上次的游標續傳，已完成的產品不會重新生成。
+        claimed=True 表示調用方已用 claim_batch 認領該批次。
+
+        Raises:
+            BatchAlreadyRunning: 批次正由另一個 runner 執行
+        """
+        concurrency = max(1, concurrency or get_settings().geo_package_concurrency)
+        page_size = concurrency * 10
+        session_factory = self.session_factory or async_sessionmaker(
+            bind=self.db.bind, expire_on_commit=False
+        )
+
+        if claimed:
+            progress = await self.load_progress(batch_id)
+        else:
+            progress = await self.claim_batch(batch_id, product_ids)
+        if progress.status == "completed":
+            return progress
+
+        semaphore = asyncio.Semaphore(concurrency)
+        lock = asyncio.Lock()
+
+        async def run_one(pid: str) -> None:
+            async with semaphore:
+                async with session_factory() as session:
+                    service = GEOPackageService(session, self.ai_service)
+                    try:
+                        result = await service.generate_package(uuid.UUID(pid), max_faqs=max_faqs)
+                        await session.commit()
+                    except Exception as e:
+                        await session.rollback()
+                        logger.error(f"GEO 打包生成失敗 {pid}: {e}")
+                        result = GEOPackageResult(success=False, error=str(e))
+
+            async with lock:
+                progress.processed += 1
+                progress.in_page.append(pid)
+                if result.success:
+                    progress.succeeded += 1
+                else:
+                    progress.failed[pid] = result.error or "、".join(result.failed_parts)
+                await self._save_progress(progress)
+
+        try:
+            while True:
+                page = await self._next_page(progress, page_size)
+                if not page:
+                    break
+                done = set(progress.in_page)
+                await asyncio.gather(*(run_one(pid) for pid in page if pid not in done))
+
+                async with lock:
+                    progress.cursor = page[-1]
+                    progress.in_page = []
+                    await self._save_progress(progress)
+        except BaseException as e:
+            # 釋放批次，讓之後的續傳可以認領（進程直接崩潰時由心跳過期兜底）
+            progress.status = "paused" if isinstance(e, asyncio.CancelledError) else "failed"
+            try:
+                await self.db.rollback()
+                await self._save_progress(progress)
+            except Exception as save_error:
+                logger.error(f"GEO 打包批量 {progress.batch_id} 狀態保存失敗: {save_error}")
+            raise
+
+        progress.status = "completed"
+        await self._save_progress(progress)
+        return progress
+
+    async def _next_page(self, progress: GEOBatchProgress, page_size: int) -> List[str]:
+        """游標之後的下一頁產品 id"""
+        if progress.product_ids is not None:
+            return [
+                pid for pid in progress.product_ids
+                if progress.cursor is None or pid > progress.cursor
+            ][:page_size]
+
+        query = select(Product.id).order_by(Product.id).limit(page_size)
+        if progress.cursor:
+            query = query.where(Product.id > uuid.UUID(progress.cursor))
+        rows = await self.db.execute(query)
+        return [str(pid) for pid in rows.scalars().all()]
+
+    async def load_progress(self, batch_id: str) -> Optional[GEOBatchProgress]:
+        """讀取批量進度"""
+        value = await self.db.scalar(
+            select(SystemSetting.value).where(SystemSetting.key == BATCH_KEY_PREFIX + batch_id)
+        )
+        return GEOBatchProgress.from_dict(json.loads(value)) if value else None
+
+    async def _save_progress(self, progress: GEOBatchProgress) -> None:
+        """寫入並提交批量進度"""
+        progress.updated_at = datetime.utcnow().isoformat()
+        key = BATCH_KEY_PREFIX + progress.batch_id
+        setting = await self.db.get(SystemSetting, key)
+        if setting is None:
+            setting = SystemSetting(key=key, description="GEO/SEO 打包批量生成進度（游標續傳）")
+            self.db.add(setting)
+        setting.value = json.dumps(progress.to_dict(), ensure_ascii=False)
+        await self.db.commit()
+
+
+def _text(value: Any) -> bool:
+    """非空字符串"""
+    return isinstance(value, str) and bool(value.strip())
@@ -14,6 +14,7 @@ from sqlalchemy import select
 
 from app.models.product import Product
 from app.models.seo import StructuredData, BrandKnowledge
+from app.services.knowledge_search import apply_knowledge_search
 from app.services.ai_service import AIAnalysisService, AIConfig, AISettingsService
 
 
@@ -105,7 +106,47 @@ class GEOService:
         else:
             return SchemaGenerationResult(success=False, error="必須提供 product_id 或 product_info")
 
-        # 構建 JSON-LD
+        json_ld = self.build_product_json_ld(product_data, include_offers)
+
+        # 生成 AI 友好摘要
+        ai_summary_result = await self._generate_ai_summary(product_data)
+
+        # 驗證 Schema
+        validation_errors = self._validate_product_schema(json_ld)
+
+        # 保存到數據庫
+        structured_data = StructuredData(
+            product_id=product_id,
+            schema_type="Product",
+            json_ld=json_ld,
+            ai_summary=ai_summary_result.get("summary"),
+            ai_facts=ai_summary_result.get("facts", []),
+            ai_entities=ai_summary_result.get("entities", {}),
+            is_valid=len(validation_errors) == 0,
+            validation_errors=validation_errors,
+            last_validated_at=datetime.utcnow(),
+        )
+
+        self.db.add(structured_data)
+        await self.db.flush()
+
+        return SchemaGenerationResult(
+            success=True,
+            schema_id=structured_data.id,
+            schema_type="Product",
+            json_ld=json_ld,
+            ai_summary=ai_summary_result.get("summary"),
+            ai_facts=ai_summary_result.get("facts", []),
+            is_valid=len(validation_errors) == 0,
+            validation_errors=validation_errors,
+        )
+
+    def build_product_json_ld(
+        self,
+        product_data: Dict[str, Any],
+        include_offers: bool = True,
+    ) -> Dict[str, Any]:
+        """由產品信息構建 Product JSON-LD（不調用 AI）"""
         json_ld = {
             "@context": "https://schema.org",
             "@type": "Product",
@@ -143,38 +184,7 @@ class GEOService:
             if product_data.get("original_price"):
                 json_ld["offers"]["@type"] = "AggregateOffer"
 
-        # 生成 AI 友好摘要
-        ai_summary_result = await self._generate_ai_summary(product_data)
-
-        # 驗證 Schema
-        validation_errors = self._validate_product_schema(json_ld)
-
-        # 保存到數據庫
-        structured_data = StructuredData(
-            product_id=product_id,
-            schema_type="Product",
-            json_ld=json_ld,
-            ai_summary=ai_summary_result.get("summary"),
-            ai_facts=ai_summary_result.get("facts", []),
-            ai_entities=ai_summary_result.get("entities", {}),
-            is_valid=len(validation_errors) == 0,
-            validation_errors=validation_errors,
-            last_validated_at=datetime.utcnow(),
-        )
-
-        self.db.add(structured_data)
-        await self.db.flush()
-
-        return SchemaGenerationResult(
-            success=True,
-            schema_id=structured_data.id,
-            schema_type="Product",
-            json_ld=json_ld,
-            ai_summary=ai_summary_result.get("summary"),
-            ai_facts=ai_summary_result.get("facts", []),
-            is_valid=len(validation_errors) == 0,
-            validation_errors=validation_errors,
-        )
+        return json_ld
 
     # =============================================
     # FAQ Schema 生成
@@ -204,22 +214,7 @@ class GEOService:
         elif not faqs:
             return SchemaGenerationResult(success=False, error="必須提供 faqs 或 product_id")
 
-        # 構建 JSON-LD
-        json_ld = {
-            "@context": "https://schema.org",
-            "@type": "FAQPage",
-            "mainEntity": [
-                {
-                    "@type": "Question",
-                    "name": faq["question"],
-                    "acceptedAnswer": {
-                        "@type": "Answer",
-                        "text": faq["answer"]
-                    }
-                }
-                for faq in faqs[:max_faqs]
-            ]
-        }
+        json_ld = self.build_faq_json_ld(faqs, max_faqs)
 
         # 驗證 Schema
         validation_errors = self._validate_faq_schema(json_ld)
@@ -246,6 +241,24 @@ class GEOService:
             validation_errors=validation_errors,
         )
 
+    def build_faq_json_ld(self, faqs: List[Dict[str, str]], max_faqs: int = 5) -> Dict[str, Any]:
+        """由 FAQ 列表構建 FAQPage JSON-LD"""
+        return {
+            "@context": "https://schema.org",
+            "@type": "FAQPage",
+            "mainEntity": [
+                {
+                    "@type": "Question",
+                    "name": faq["question"],
+                    "acceptedAnswer": {
+                        "@type": "Answer",
+                        "text": faq["answer"]
+                    }
+                }
+                for faq in faqs[:max_faqs]
+            ]
+        }
+
     async def _generate_faqs_with_ai(
         self,
         product_data: Dict[str, Any],
@@ -607,7 +620,7 @@ class GEOService:
         knowledge_type: Optional[str] = None,
         limit: int = 10,
     ) -> List[BrandKnowledge]:
-        """搜索品牌知識"""
+        """搜索品牌知識（全文索引 / 中日文 trigram，見 knowledge_search）"""
         stmt = select(BrandKnowledge).where(
             BrandKnowledge.is_active == True
         )
@@ -615,13 +628,7 @@ class GEOService:
         if knowledge_type:
             stmt = stmt.where(BrandKnowledge.knowledge_type == knowledge_type)
 
-        # 簡單的文本搜索（標題或內容包含關鍵詞）
-        stmt = stmt.where(
-            (BrandKnowledge.title.ilike(f"%{query}%")) |
-            (BrandKnowledge.content.ilike(f"%{query}%"))
-        )
-
-        stmt = stmt.order_by(BrandKnowledge.is_featured.desc(), BrandKnowledge.created_at.desc()).limit(limit)
+        stmt = apply_knowledge_search(stmt, query, self.db.bind.dialect.name).limit(limit)
 
         result = await self.db.execute(stmt)
         return result.scalars().all()
@@ -636,14 +643,18 @@ class GEOService:
 
         stmt = select(BrandKnowledge).where(
             BrandKnowledge.is_active == True
-        )
+        ).order_by(BrandKnowledge.is_featured.desc(), BrandKnowledge.created_at.desc())
 
-        result = await self.db.execute(stmt)
-        all_knowledge = result.scalars().all()
+        if self.db.bind.dialect.name == "postgresql":
+            # related_products ? '<id>'，走 GIN 索引
+            stmt = stmt.where(BrandKnowledge.related_products.has_key(product_id_str))
+            result = await self.db.execute(stmt)
+            return result.scalars().all()
 
-        # 過濾包含該產品的知識
+        # 其他數據庫沒有 JSONB 運算符，在 Python 中過濾
+        result = await self.db.execute(stmt)
         return [
-            k for k in all_knowledge
+            k for k in result.scalars().all()
             if k.related_products and product_id_str in k.related_products
         ]
 
@@ -18,6 +18,12 @@ class HKTVMallMockClient:
         self.store_code = "MOCK_STORE"
         logger.info("Initialized HKTVmall Mock Client")
 
+    async def __aenter__(self) -> "HKTVMallMockClient":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        return None
+
     async def get_product_details(self, sku_codes: Union[str, List[str]]) -> Dict:
         await asyncio.sleep(0.5) # Simulate network latency
         if isinstance(sku_codes, str):
@@ -129,9 +135,14 @@ class HKTVMallMockClient:
             "data": orders
         }
 
-    async def get_conversations(self, page: int = 1, page_size: int = 20):
+    # 模擬數據不支持增量篩選
+    supports_incremental_topics = False
+
+    async def get_conversations(self, page: int = 1, page_size: int = 20, updated_after: str = None):
         """Mock Conversations"""
         await asyncio.sleep(0.5)
+        if page > 1:
+            return {"returnCode": "0000", "data": []}
         return {
             "returnCode": "0000",
             "data": [
@@ -186,10 +197,22 @@ class HKTVMallClient:
         self.base_url = settings.hktv_api_base_url or "https://merchant-oapi.shoalter.com/oapi/api"
         self.access_token = access_token or settings.hktv_access_token
         self.store_code = store_code or settings.hktv_store_code
+        # 由 async with 開啟的共享連接池；未開啟時每次請求獨立建連
+        self._http: Optional[httpx.AsyncClient] = None
         
         if not self.access_token:
             logger.warning("HKTVmall access token is not set. API calls will fail.")
 
+    async def __aenter__(self) -> "HKTVMallClient":
+        """批量調用（如收件箱同步）時共用一個連接池，避免每個請求重新握手"""
+        self._http = httpx.AsyncClient(timeout=30.0)
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
     @property
     def headers(self):
         return {
@@ -202,29 +225,34 @@ class HKTVMallClient:
         """Internal request helper"""
         url = f"{self.base_url}{endpoint}"
         
+        if self._http is not None:
+            return await self._send(self._http, method, url, data, params)
         async with httpx.AsyncClient() as client:
+            return await self._send(client, method, url, data, params)
+
+    async def _send(self, client: httpx.AsyncClient, method: str, url: str, data: Dict, params: Dict) -> Dict:
+        try:
+            response = await client.request(
+                method=method,
+                url=url,
+                headers=self.headers,
+                json=data,
+                params=params,
+                timeout=30.0
+            )
+            response.raise_for_status()
+            return response.json()
+        except httpx.HTTPStatusError as e:
+            logger.error(f"HKTVmall API Error: {e.response.text}")
             try:
-                response = await client.request(
-                    method=method,
-                    url=url,
-                    headers=self.headers,
-                    json=data,
-                    params=params,
-                    timeout=30.0
-                )
-                response.raise_for_status()
-                return response.json()
-            except httpx.HTTPStatusError as e:
-                logger.error(f"HKTVmall API Error: {e.response.text}")
-                try:
-                    err_json = e.response.json()
-                    err_msg = err_json.get('message', e.response.text)
-                except (ValueError, json.JSONDecodeError):
-                    err_msg = e.response.text
-                raise Exception(f"HKTVmall API Error: {e.response.status_code} - {err_msg}")
-            except Exception as e:
-                logger.error(f"HKTVmall Request Failed: {str(e)}")
-                raise
+                err_json = e.response.json()
+                err_msg = err_json.get('message', e.response.text)
+            except (ValueError, json.JSONDecodeError):
+                err_msg = e.response.text
+            raise Exception(f"HKTVmall API Error: {e.response.status_code} - {err_msg}")
+        except Exception as e:
+            logger.error(f"HKTVmall Request Failed: {str(e)}")
+            raise
 
     async def get_product_details(self, sku_codes: Union[str, List[str]]) -> Dict:
         if isinstance(sku_codes, str):
@@ -258,11 +286,35 @@ class HKTVMallClient:
         if status: payload["orderStatus"] = status
         return await self._request("POST", "/order/orders", data=payload)
 
-    async def get_conversations(self, page: int = 1, page_size: int = 20):
-        # Placeholder for real API
-        # Need to verify endpoint in documentation
-        return {"returnCode": "0000", "data": []}
+    # ---------------------------------------------
+    # 收件箱（UNVERIFIED）
+    # ---------------------------------------------
+    # 訊息 API 的路徑、分頁參數與增量篩選字段均未經 HKTVmall 文檔確認，
+    # 路徑與篩選字段來自配置（HKTVMALL_MESSAGE_*）；未配置路徑時與原佔位實現一樣返回空數據
+
+    @property
+    def supports_incremental_topics(self) -> bool:
+        """是否配置了 lastMessageAt 增量篩選字段"""
+        return bool(settings.hktv_message_topics_path and settings.hktv_message_since_field)
+
+    async def get_conversations(self, page: int = 1, page_size: int = 20, updated_after: str = None):
+        """
+        分頁獲取對話（Topic）列表
+
+        updated_after: "%Y-%m-%d %H:%M:%S"，配置了篩選字段時只請求 lastMessageAt >= 該時間的對話
+        """
+        if not settings.hktv_message_topics_path:
+            logger.warning("HKTVMALL_MESSAGE_TOPICS_PATH 未配置（收件箱 API 未確認），返回空列表")
+            return {"returnCode": "0000", "data": []}
+        payload = {"storeCode": self.store_code, "pageNo": page, "pageSize": page_size}
+        if updated_after and settings.hktv_message_since_field:
+            payload[settings.hktv_message_since_field] = updated_after
+        return await self._request("POST", settings.hktv_message_topics_path, data=payload)
 
     async def get_messages(self, topic_id: str):
-        # Placeholder for real API
-        return {"returnCode": "0000", "data": []}
+        if not settings.hktv_message_messages_path:
+            return {"returnCode": "0000", "data": []}
+        return await self._request(
+            "POST", settings.hktv_message_messages_path,
+            data={"storeCode": self.store_code, "topicId": topic_id},
+        )
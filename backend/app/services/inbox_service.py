@@ -2,19 +2,41 @@
 # 客服收件箱服務
 # =============================================
 
+import asyncio
+import uuid
 from datetime import datetime
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, desc
+from sqlalchemy import select, desc, insert, or_
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import selectinload
 
+from app.models.database import utcnow
 from app.models.inbox import Conversation, Message
+from app.models.system import SystemSetting
+from app.services.dashboard_counters import apply_counter_deltas
 from app.services.hktvmall import HKTVMallClient
 from app.config import settings
 import logging
 
 logger = logging.getLogger(__name__)
 
+# 增量同步水位：上次同步見到的最大 lastMessageAt（system_settings 中的字符串）
+WATERMARK_KEY = "inbox.sync.watermark"
+MMS_TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# IN 查詢 / 批量 INSERT 每批行數
+BATCH_SIZE = 1000
+
+
+def _parse_time(value: Optional[str]) -> Optional[datetime]:
+    try:
+        return datetime.strptime(value, MMS_TIME_FORMAT)
+    except (ValueError, TypeError):
+        return None
+
+
 class InboxService:
     def __init__(self, db: AsyncSession) -> None:
         self.db = db
@@ -25,46 +47,217 @@ class InboxService:
             raise RuntimeError("HKTVmall API 尚未配置")
         return HKTVMallClient()
 
-    async def sync_conversations(self):
-        """同步對話列表"""
+    async def sync_conversations(self, full: bool = False) -> int:
+        """
+        增量同步對話列表，返回本次從 MMS 拉取的對話數
+
+        1. 按水位（上次同步見到的最大 lastMessageAt）分頁拉取較新的對話；
+           full=True、未配置篩選字段、或 API 沒有套用篩選時全量
+        2. 一次查詢取出已有對話，只保留新對話或 last_message_at / status 有變化的對話
+        3. 有變化的對話以有界並發預取訊息串
+        4. 批量 INSERT ... ON CONFLICT (hktv_topic_id) DO UPDATE 寫入對話，批量寫入新訊息，
+           與新水位同一事務提交
+        """
         client = self._get_client()
         try:
-            resp = await client.get_conversations()
-            data = resp.get("data", [])
-            
-            for item in data:
-                topic_id = item.get("topicId")
-                
-                # Check existing
-                result = await self.db.execute(select(Conversation).where(Conversation.hktv_topic_id == topic_id))
-                conv = result.scalar_one_or_none()
-                
-                last_msg_at = datetime.now()
-                try:
-                    last_msg_at = datetime.strptime(item.get("lastMessageAt"), "%Y-%m-%d %H:%M:%S")
-                except (ValueError, TypeError) as e:
-                    logger.debug(f"無法解析 lastMessageAt: {item.get('lastMessageAt')}, 使用當前時間")
-
-                if not conv:
-                    conv = Conversation(
-                        hktv_topic_id=topic_id,
-                        customer_name=item.get("customerName"),
-                        subject=item.get("subject"),
-                        status=item.get("status", "open"),
-                        last_message_at=last_msg_at
-                    )
-                    self.db.add(conv)
-                else:
-                    conv.last_message_at = last_msg_at
-                    conv.status = item.get("status", "open")
-            
+            # 未配置增量篩選字段時每次全量（水位只在 API 真正按它篩選時才可信）
+            incremental = client.supports_incremental_topics
+            watermark = await self._get_watermark() if incremental and not full else None
+            async with client:
+                items = await self._fetch_topics(client, watermark)
+                if watermark and self._filter_ignored(items, watermark):
+                    logger.warning("MMS 未按 lastMessageAt 篩選（返回了水位之前的對話），改為全量同步且不推進水位")
+                    incremental = False
+                    watermark = None
+                    items = await self._fetch_topics(client, None)
+                existing = await self._existing_conversations(list(items))
+                rows = self._changed_rows(items, existing)
+                threads = await self._prefetch_threads(client, [row["hktv_topic_id"] for row in rows])
+
+            upserted = await self._upsert_conversations(rows, existing)
+            await self._store_messages({
+                upserted[topic_id]: data for topic_id, data in threads.items() if topic_id in upserted
+            })
+
+            seen = [t for t in (_parse_time(item.get("lastMessageAt")) for item in items.values()) if t]
+            if incremental and seen and (watermark is None or max(seen) > watermark):
+                await self._set_watermark(max(seen))
+
             await self.db.commit()
-            return len(data)
+            logger.info(f"收件箱同步: 拉取 {len(items)} 個對話，寫入 {len(upserted)} 個，預取 {len(threads)} 個訊息串")
+            return len(items)
         except Exception as e:
             await self.db.rollback()
             logger.error(f"Sync conversations failed: {e}", exc_info=True)
             return 0
 
+    async def _get_watermark(self) -> Optional[datetime]:
+        setting = await self.db.get(SystemSetting, WATERMARK_KEY)
+        return _parse_time(setting.value) if setting else None
+
+    async def _set_watermark(self, value: datetime) -> None:
+        setting = await self.db.get(SystemSetting, WATERMARK_KEY)
+        if setting is None:
+            setting = SystemSetting(key=WATERMARK_KEY, description="收件箱增量同步水位（lastMessageAt）")
+            self.db.add(setting)
+        setting.value = value.strftime(MMS_TIME_FORMAT)
+
+    async def _fetch_topics(self, client: HKTVMallClient, watermark: Optional[datetime]) -> Dict[str, dict]:
+        """
+        分頁拉取對話，按 topicId 去重（翻頁期間有新訊息時同一對話可能出現兩次，保留後者）
+
+        水位是閉區間：與水位同一秒的對話會重複拉取，由變化檢測跳過
+        """
+        page_size = settings.inbox_sync_page_size
+        updated_after = watermark.strftime(MMS_TIME_FORMAT) if watermark else None
+        items: Dict[str, dict] = {}
+        page = 1
+        while True:
+            resp = await client.get_conversations(page=page, page_size=page_size, updated_after=updated_after)
+            data = resp.get("data") or []
+            for item in data:
+                if item.get("topicId"):
+                    items[item["topicId"]] = item
+            if len(data) < page_size:
+                return items
+            page += 1
+
+    @staticmethod
+    def _filter_ignored(items: Dict[str, dict], watermark: datetime) -> bool:
+        """增量請求卻返回了水位之前的對話：API 忽略了篩選字段（或語義不同）"""
+        return any(
+            t < watermark for t in (_parse_time(item.get("lastMessageAt")) for item in items.values()) if t
+        )
+
+    async def _existing_conversations(self, topic_ids: List[str]) -> Dict[str, Any]:
+        existing = {}
+        for offset in range(0, len(topic_ids), BATCH_SIZE):
+            result = await self.db.execute(
+                select(
+                    Conversation.id, Conversation.hktv_topic_id,
+                    Conversation.status, Conversation.last_message_at,
+                ).where(Conversation.hktv_topic_id.in_(topic_ids[offset:offset + BATCH_SIZE]))
+            )
+            existing.update({row.hktv_topic_id: row for row in result})
+        return existing
+
+    @staticmethod
+    def _changed_rows(items: Dict[str, dict], existing: Dict[str, Any]) -> List[dict]:
+        """
+        新對話或 last_message_at / status 有變化的對話的寫入值
+
+        lastMessageAt 無法解析時：已有對話沿用庫中時間（不再當作「剛有新訊息」），新對話取當前時間
+        """
+        rows = []
+        for topic_id, item in items.items():
+            current = existing.get(topic_id)
+            last_message_at = _parse_time(item.get("lastMessageAt"))
+            if last_message_at is None:
+                logger.debug(f"無法解析 lastMessageAt: {item.get('lastMessageAt')}")
+                last_message_at = current.last_message_at if current else utcnow()
+            status = item.get("status", "open")
+            if current and current.status == status and current.last_message_at == last_message_at:
+                continue
+            rows.append({
+                "id": current.id if current else uuid.uuid4(),
+                "hktv_topic_id": topic_id,
+                "customer_name": item.get("customerName"),
+                "subject": item.get("subject"),
+                "status": status,
+                "has_unread": False,
+                "last_message_at": last_message_at,
+                "created_at": utcnow(),
+            })
+        return rows
+
+    async def _prefetch_threads(self, client: HKTVMallClient, topic_ids: List[str]) -> Dict[str, list]:
+        """以 inbox_sync_concurrency 為上限並發拉取訊息串；單個失敗只記錄，下次打開對話時再同步"""
+        semaphore = asyncio.Semaphore(settings.inbox_sync_concurrency)
+
+        async def fetch(topic_id: str):
+            async with semaphore:
+                try:
+                    resp = await client.get_messages(topic_id)
+                    return topic_id, resp.get("data") or []
+                except Exception as e:
+                    logger.warning(f"預取訊息串失敗 {topic_id}: {e}")
+                    return topic_id, None
+
+        results = await asyncio.gather(*(fetch(topic_id) for topic_id in topic_ids))
+        return {topic_id: data for topic_id, data in results if data is not None}
+
+    async def _upsert_conversations(self, rows: List[dict], existing: Dict[str, Any]) -> Dict[str, uuid.UUID]:
+        """
+        批量 upsert，返回實際寫入的 {hktv_topic_id: conversation_id}
+
+        DO UPDATE 帶 WHERE：並發同步已寫入相同值時不再重寫該行
+        """
+        dialect_insert = postgresql_insert if self.db.bind.dialect.name == "postgresql" else sqlite_insert
+        upserted: Dict[str, uuid.UUID] = {}
+        open_delta = 0
+        for offset in range(0, len(rows), BATCH_SIZE):
+            stmt = dialect_insert(Conversation).values(rows[offset:offset + BATCH_SIZE])
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["hktv_topic_id"],
+                set_={
+                    "status": stmt.excluded.status,
+                    "last_message_at": stmt.excluded.last_message_at,
+                },
+                where=or_(
+                    Conversation.status.is_distinct_from(stmt.excluded.status),
+                    Conversation.last_message_at.is_distinct_from(stmt.excluded.last_message_at),
+                ),
+            ).returning(Conversation.id, Conversation.hktv_topic_id, Conversation.status)
+            for row in await self.db.execute(stmt):
+                upserted[row.hktv_topic_id] = row.id
+                previous = existing.get(row.hktv_topic_id)
+                open_delta += (row.status == "Open") - (previous is not None and previous.status == "Open")
+
+        # Core upsert 不經過 ORM flush 鉤子，手動補計數器增量
+        await apply_counter_deltas(self.db, unread_messages=open_delta)
+        return upserted
+
+    async def _store_messages(self, threads: Dict[uuid.UUID, list]) -> int:
+        """批量寫入訊息：一次查詢已有的 hktv_message_id，只插入新訊息"""
+        if not threads:
+            return 0
+        known = set()
+        conversation_ids = list(threads)
+        for offset in range(0, len(conversation_ids), BATCH_SIZE):
+            result = await self.db.execute(
+                select(Message.hktv_message_id).where(
+                    Message.conversation_id.in_(conversation_ids[offset:offset + BATCH_SIZE]),
+                    Message.hktv_message_id.is_not(None),
+                )
+            )
+            known.update(result.scalars())
+
+        rows = []
+        for conversation_id, data in threads.items():
+            for item in data:
+                msg_id = item.get("messageId")
+                if msg_id in known:
+                    continue
+                known.add(msg_id)
+                sent_at = _parse_time(item.get("sentAt"))
+                if sent_at is None:
+                    logger.debug(f"無法解析 sentAt: {item.get('sentAt')}, 使用當前時間")
+                    sent_at = datetime.now()
+                rows.append({
+                    "id": uuid.uuid4(),
+                    "conversation_id": conversation_id,
+                    "hktv_message_id": msg_id,
+                    "content": item.get("content"),
+                    "sender_type": item.get("sender"),
+                    "ai_generated": False,
+                    "is_draft": False,
+                    "sent_at": sent_at,
+                })
+
+        for offset in range(0, len(rows), BATCH_SIZE):
+            await self.db.execute(insert(Message).values(rows[offset:offset + BATCH_SIZE]))
+        return len(rows)
+
     async def get_conversations(self):
         """獲取本地對話列表"""
         query = select(Conversation).order_by(desc(Conversation.last_message_at))
@@ -83,27 +276,7 @@ class InboxService:
         client = self._get_client()
         try:
             resp = await client.get_messages(conv.hktv_topic_id)
-            data = resp.get("data", [])
-            
-            for item in data:
-                msg_id = item.get("messageId")
-                # Check exist
-                res = await self.db.execute(select(Message).where(Message.hktv_message_id == msg_id))
-                if not res.scalar_one_or_none():
-                    sent_at = datetime.now()
-                    try:
-                        sent_at = datetime.strptime(item.get("sentAt"), "%Y-%m-%d %H:%M:%S")
-                    except (ValueError, TypeError) as e:
-                        logger.debug(f"無法解析 sentAt: {item.get('sentAt')}, 使用當前時間")
-
-                    msg = Message(
-                        conversation_id=conv.id,
-                        hktv_message_id=msg_id,
-                        content=item.get("content"),
-                        sender_type=item.get("sender"),
-                        sent_at=sent_at
-                    )
-                    self.db.add(msg)
+            await self._store_messages({conv.id: resp.get("data") or []})
             await self.db.commit()
         except Exception as e:
             await self.db.rollback()
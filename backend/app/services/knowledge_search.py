@@ -0,0 +1,69 @@
+# =============================================
+# 品牌知識搜索
+# =============================================
+# brand_knowledge 上兩個數據庫生成列：
+# - search_vector：標題(A) / 摘要(B) / 內容(C) 的 'simple' tsvector，GIN 索引（Alembic 建立，不在 ORM 模型上）
+# - search_text：小寫拼接文本，gin_trgm_ops 索引（見 run_migrations）
+#
+# 英文 / 數字查詢走全文索引：每個詞做前綴匹配（"wag" 命中 "wagyu"），按 ts_rank 排序。
+# 中日文沒有空格分詞，'simple' 會把一整段 CJK 當成一個詞，子串查不到，
+# 所以含 CJK 的查詢改用 trigram（LIKE '%關鍵字%'，≥3 字符時可走索引），按 word_similarity 排序。
+#
+# 非 Postgres（SQLite 測試庫）只用 search_text 的 LIKE，排序與改造前一致。
+
+import re
+from typing import Optional
+
+from sqlalchemy import Select, func, literal_column
+from sqlalchemy.dialects.postgresql import TSVECTOR
+
+from app.models.seo import BrandKnowledge
+from app.services.agent.tools.sql_helpers import escape_like_pattern
+
+# 與 alembic add_brand_knowledge_search 的生成列表達式一致（benchmark 建表時使用）
+SEARCH_VECTOR_EXPRESSION = (
+    "setweight(to_tsvector('simple', coalesce(title, '')), 'A')"
+    " || setweight(to_tsvector('simple', coalesce(summary, '')), 'B')"
+    " || setweight(to_tsvector('simple', coalesce(content, '')), 'C')"
+)
+
+SEARCH_VECTOR = literal_column("brand_knowledge.search_vector", type_=TSVECTOR)
+
+_CJK = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff]")
+_WORD = re.compile(r"[^\W_]+")
+
+
+def normalize_query(query: Optional[str]) -> str:
+    """搜索詞統一小寫、去首尾空白（search_text 也是小寫）"""
+    return (query or "").strip().lower()
+
+
+def prefix_tsquery(term: str) -> str:
+    """把搜索詞轉成前綴匹配的 tsquery 文本（只保留字母數字，可安全傳給 to_tsquery）"""
+    return " & ".join(f"{word}:*" for word in _WORD.findall(term))
+
+
+def uses_fulltext(term: str) -> bool:
+    """是否走 tsvector：有可分詞的詞且不含 CJK"""
+    return bool(_WORD.search(term)) and not _CJK.search(term)
+
+
+def apply_knowledge_search(stmt: Select, query: Optional[str], dialect: str) -> Select:
+    """加上搜索條件和排序（精選 → 相關度 → 新舊）"""
+    term = normalize_query(query)
+    rank = None
+
+    if term and dialect == "postgresql" and uses_fulltext(term):
+        tsquery = func.to_tsquery("simple", prefix_tsquery(term))
+        stmt = stmt.where(SEARCH_VECTOR.op("@@")(tsquery))
+        rank = func.ts_rank(SEARCH_VECTOR, tsquery)
+    elif term:
+        stmt = stmt.where(BrandKnowledge.search_text.like(f"%{escape_like_pattern(term)}%", escape="\\"))
+        if dialect == "postgresql":
+            rank = func.word_similarity(term, BrandKnowledge.search_text)
+
+    order = [BrandKnowledge.is_featured.desc()]
+    if rank is not None:
+        order.append(rank.desc())
+    order.append(BrandKnowledge.created_at.desc())
+    return stmt.order_by(*order)
@@ -15,6 +15,7 @@ from app.models.pricing import PriceProposal, ProposalStatus, AuditLog, Proposal
 from app.models.product import Product, ProductCompetitorMapping
 from app.models.competitor import CompetitorProduct
 from app.services.hktvmall import HKTVMallClient
+from app.services.roi_service import invalidate_trends_cache
 from app.config import settings
 
 logger = logging.getLogger(__name__)
@@ -124,6 +125,8 @@ class PricingService:
             proposal.error_message = str(e)
             
         await self.db.commit()
+        if proposal.status == ProposalStatus.EXECUTED:
+            await invalidate_trends_cache()
         await self.db.refresh(proposal)
         return proposal
 
@@ -0,0 +1,98 @@
+# =============================================
+# 自家商品搜索
+# =============================================
+# products.search_text 是 sku + 多語言品名的小寫拼接（數據庫生成列），
+# Postgres 上有 gin_trgm_ops 索引，LIKE '%關鍵字%' 可走索引（≥3 字符時）。
+# 中日文品名沒有空格分詞，tsvector 切不開，所以統一用 trigram。
+#
+# 排序：相關度分桶（SKU 完全匹配 > 詞首匹配 > 包含）→ 次排序鍵 → id，
+# 全部是確定值，可以直接做 keyset 分頁。
+
+from datetime import datetime
+from typing import Any, Optional, Sequence
+from uuid import UUID
+
+from sqlalchemy import Select, case, literal
+from sqlalchemy.sql import ColumnElement
+
+from app.core.exceptions import ValidationError
+from app.core.pagination import decode_cursor, keyset_after
+from app.models.product import Product
+from app.services.agent.tools.sql_helpers import escape_like_pattern
+
+# 相關度分桶（越大越相關，方便與其他鍵一起 DESC 排序）
+RANK_EXACT_SKU = 2
+RANK_WORD_PREFIX = 1
+RANK_CONTAINS = 0
+
+
+def normalize_search(search: Optional[str]) -> str:
+    """搜索詞統一小寫、去首尾空白（search_text 也是小寫）"""
+    return (search or "").strip().lower()
+
+
+def search_condition(term: str) -> ColumnElement[bool]:
+    """子串匹配條件（Postgres 上由 trigram GIN 索引支持）"""
+    return Product.search_text.like(f"%{escape_like_pattern(term)}%", escape="\\")
+
+
+def search_rank(term: str) -> ColumnElement[int]:
+    """相關度分桶表達式（只在已過濾的行上計算）"""
+    safe = escape_like_pattern(term)
+    return case(
+        # search_text 以 sku 開頭，後接空格
+        (Product.search_text.like(f"{safe} %", escape="\\"), literal(RANK_EXACT_SKU)),
+        (
+            Product.search_text.like(f"{safe}%", escape="\\")
+            | Product.search_text.like(f"% {safe}%", escape="\\"),
+            literal(RANK_WORD_PREFIX),
+        ),
+        else_=literal(RANK_CONTAINS),
+    )
+
+
+def apply_search(
+    query: Select,
+    search: Optional[str],
+    order_keys: Sequence[ColumnElement],
+) -> tuple[Select, list[ColumnElement]]:
+    """
+    加上搜索條件和排序，返回 (查詢, keyset 排序鍵)
+
+    Args:
+        order_keys: 搜索以外的排序鍵（均為 DESC），最後一個必須唯一（通常是 id）
+    """
+    keys = list(order_keys)
+    term = normalize_search(search)
+    if term:
+        query = query.where(search_condition(term))
+        keys.insert(0, search_rank(term))
+    return query.order_by(*(k.desc() for k in keys)), keys
+
+
+def apply_cursor(
+    query: Select,
+    keys: Sequence[ColumnElement],
+    cursor: Optional[str],
+    descending: bool = True,
+) -> Select:
+    """套用 keyset 游標（游標值按排序鍵的類型還原）"""
+    if not cursor:
+        return query
+    raw = decode_cursor(cursor, len(keys))
+    try:
+        values = [_restore(key, value) for key, value in zip(keys, raw)]
+    except (ValueError, TypeError):
+        raise ValidationError("無效的分頁游標")
+    return query.where(keyset_after(keys, values, descending))
+
+
+def _restore(key: ColumnElement, value: Any) -> Any:
+    python_type = key.type.python_type
+    if value is None:
+        raise ValueError("cursor value is null")
+    if python_type is datetime:
+        return datetime.fromisoformat(value)
+    if python_type is UUID:
+        return UUID(value)
+    return python_type(value)
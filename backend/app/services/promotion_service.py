@@ -1,13 +1,74 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, desc
-from typing import List, Optional
+from sqlalchemy import select, desc, func
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from typing import Dict, List, Optional
 from datetime import datetime, timedelta
-from decimal import Decimal
+from decimal import Decimal, ROUND_HALF_UP
 import random
+import uuid
 
+import numpy as np
+
+from app.config import get_settings
+from app.models.database import utcnow
 from app.models.promotion import PromotionProposal
 from app.models.product import Product
 from app.schemas.promotion import PromotionStats
+from app.services.dashboard_counters import apply_counter_deltas
+
+# 每條 INSERT 的行數（14 欄 × 1000 行，低於 asyncpg 32767 個參數上限）
+INSERT_BATCH_SIZE = 1000
+
+
+def _money(value: float) -> Decimal:
+    """浮點先收斂到 6 位小數消除表示誤差，再按四捨五入取到分（與 Numeric(10, 2) 入庫一致）"""
+    return Decimal(str(round(float(value), 6))).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+
+
+def _plan_promotions(prices: np.ndarray, costs: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    向量化的推廣決策
+
+    costs 中 NaN / 0 表示未設定成本，按售價 × promotion_default_cost_ratio 估算；
+    毛利率依 promotion_margin_tiers（門檻由高到低）匹配第一個超過門檻的分級，
+    折後利潤 = 折後價 − 成本 − 佣金 − 運費，虧本的商品不建議
+    """
+    settings = get_settings()
+    tiers = sorted(settings.promotion_margin_tiers, key=lambda t: t[0], reverse=True)
+
+    missing = np.isnan(costs) | (costs == 0)
+    costs = np.where(missing, prices * settings.promotion_default_cost_ratio, costs)
+    margin = (prices - costs) / prices
+
+    tier = np.select(
+        [margin > min_margin for min_margin, _, _ in tiers],
+        np.arange(len(tiers)),
+        default=-1,
+    )
+    matched = tier >= 0
+    discount = np.where(matched, np.array([t[1] for t in tiers] + [0.0])[tier], 0.0)
+
+    discounted_price = prices * (1 - discount / 100)
+    projected_profit = (
+        discounted_price
+        - costs
+        - discounted_price * settings.promotion_commission_rate
+        - settings.promotion_shipping_cost
+    )
+    keep = matched & (projected_profit > 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        projected_margin = np.where(keep, projected_profit / discounted_price * 100, 0.0)
+
+    reasons = np.array([t[2] for t in tiers] + [""], dtype=object)
+    return {
+        "keep": keep,
+        "discount": discount,
+        "discounted_price": discounted_price,
+        "projected_profit": projected_profit,
+        "projected_margin": projected_margin,
+        "reason": reasons[tier],
+    }
 
 class PromotionService:
     def __init__(self, db: AsyncSession):
@@ -29,80 +90,71 @@ class PromotionService:
         return result.scalars().all()
 
     async def generate_suggestions(self) -> int:
-        """AI 分析並生成推廣建議"""
-        # 1. 獲取可售產品
-        query = select(Product).where(Product.status == "Active").limit(50)
-        result = await self.db.execute(query)
-        products = result.scalars().all()
-        
+        """
+        AI 分析並生成推廣建議（全量在售商品，集合式計算）
+
+        1. 一次查詢取出在售且無待審建議的商品（NOT EXISTS 反連接）
+        2. 毛利、折扣分級、折後利潤以 NumPy 向量化計算
+        3. 一條批量 INSERT ... ON CONFLICT DO NOTHING 寫入；
+           依賴 (product_id) WHERE status='pending' 部分唯一索引，並發生成也不會重複
+        """
+        pending = select(PromotionProposal.id).where(
+            PromotionProposal.product_id == Product.id,
+            PromotionProposal.status == "pending",
+        )
+        rows = (await self.db.execute(
+            select(Product.id, Product.name, Product.price, Product.cost).where(
+                func.lower(Product.status) == "active",
+                Product.price > 0,
+                ~pending.exists(),
+            )
+        )).all()
+        if not rows:
+            return 0
+
+        plan = _plan_promotions(
+            np.array([float(r.price) for r in rows]),
+            np.array([float(r.cost) if r.cost else np.nan for r in rows]),
+        )
+
+        now = datetime.now()
+        values = []
+        for i in np.flatnonzero(plan["keep"]):
+            discount = Decimal(str(plan["discount"][i]))
+            values.append({
+                "id": uuid.uuid4(),
+                "product_id": rows[i].id,
+                "promotion_type": "discount_single",
+                "original_price": rows[i].price,
+                "discount_percent": discount,
+                "discounted_price": _money(plan["discounted_price"][i]),
+                "projected_profit": _money(plan["projected_profit"][i]),
+                "projected_margin": _money(plan["projected_margin"][i]),
+                "start_date": now + timedelta(days=1),
+                "end_date": now + timedelta(days=7),
+                "reason": plan["reason"][i],
+                "marketing_copy": f"【限時優惠】{rows[i].name} 激減 {discount}%！立即搶購！",
+                "status": "pending",
+                "created_at": utcnow(),
+            })
+
+        insert = postgresql_insert if self.db.bind.dialect.name == "postgresql" else sqlite_insert
         count = 0
-        for product in products:
-            # 檢查是否已有 pending 建議，避免重複
-            existing = await self.db.execute(
-                select(PromotionProposal).where(
-                    PromotionProposal.product_id == product.id,
-                    PromotionProposal.status == "pending"
+        # 按批切分，避免單條語句超出驅動的綁定參數上限
+        for offset in range(0, len(values), INSERT_BATCH_SIZE):
+            result = await self.db.execute(
+                insert(PromotionProposal)
+                .values(values[offset:offset + INSERT_BATCH_SIZE])
+                .on_conflict_do_nothing(
+                    index_elements=["product_id"],
+                    index_where=PromotionProposal.status == "pending",
                 )
+                .returning(PromotionProposal.id)
             )
-            if existing.scalars().first():
-                continue
-
-            # 2. 簡單的財務分析 (Mock Logic)
-            # 假設：如果沒有設定成本，默認成本為售價的 60%
-            price = product.price or Decimal(0)
-            if price <= 0: continue
-            
-            cost = product.cost
-            if not cost:
-                cost = price * Decimal("0.6")
-            
-            # 估算當前毛利
-            margin = (price - cost) / price
-            
-            # 3. 決策邏輯
-            discount_suggestion = Decimal(0)
-            reason = ""
-            
-            if margin > Decimal("0.5"): # 高利潤 (>50%)
-                discount_suggestion = Decimal("15.0")
-                reason = "高利潤商品，建議 85 折激發銷量，預計可顯著提升轉化率"
-            elif margin > Decimal("0.3"): # 中利潤 (>30%)
-                discount_suggestion = Decimal("5.0")
-                reason = "利潤空間健康，建議 95 折作為會員回饋或限時優惠"
-            else:
-                continue # 利潤太低不建議打折
-                
-            # 4. 計算預期結果
-            discounted_price = price * (Decimal("1") - (discount_suggestion / Decimal("100")))
-            # 假設 HKTVmall 佣金 15% + 運費 $30
-            commission = discounted_price * Decimal("0.15")
-            shipping = Decimal("30.0")
-            
-            projected_profit = discounted_price - cost - commission - shipping
-            
-            if projected_profit <= 0:
-                continue # 打折後會虧本，跳過
-            
-            projected_margin = (projected_profit / discounted_price) * 100
-            
-            # 5. 創建建議
-            proposal = PromotionProposal(
-                product_id=product.id,
-                promotion_type="discount_single",
-                original_price=price,
-                discount_percent=discount_suggestion,
-                discounted_price=discounted_price,
-                projected_profit=projected_profit,
-                projected_margin=projected_margin,
-                start_date=datetime.now() + timedelta(days=1),
-                end_date=datetime.now() + timedelta(days=7),
-                reason=reason,
-                marketing_copy=f"【限時優惠】{product.name} 激減 {discount_suggestion}%！立即搶購！",
-                status="pending"
-            )
-            self.db.add(proposal)
-            count += 1
-            
+            count += len(result.all())
+
+        # Core 批量插入不經過 ORM flush 鉤子，手動補計數器增量
+        await apply_counter_deltas(self.db, pending_promotion_reviews=count)
         await self.db.commit()
         return count
 
@@ -8,12 +8,13 @@ import asyncio
 import time
 import random
 import logging
-from collections import defaultdict
+from collections import OrderedDict
 from dataclasses import dataclass, field
 from typing import Optional
 from threading import Lock
 
 import redis.asyncio as redis
+from redis.exceptions import NoScriptError
 
 logger = logging.getLogger(__name__)
 
@@ -28,6 +29,14 @@ class RateLimiterConfig:
     fail_open: bool = False        # Redis 失敗時是否允許請求（預設為 False，即 fail-closed）
 
 
+@dataclass
+class RateLimitResult:
+    """單次限速檢查結果"""
+    allowed: bool
+    remaining: float
+    retry_after: float = 0.0
+
+
 # =============================================
 # 本地內存令牌桶（Redis 回退用）
 # =============================================
@@ -46,40 +55,34 @@ class LocalRateLimiterFallback:
 
     當 Redis 不可用時的回退方案
     注意：這是單進程限制，不支持分佈式
+
+    桶數量有上限（LRU 淘汰最久未用的桶），每次操作 O(1)，
+    不需要定期全量掃描清理。
     """
 
-    def __init__(self):
-        self._buckets: dict[str, LocalTokenBucket] = {}
-        self._global_lock = Lock()
-        # 定期清理過期的桶（超過 5 分鐘未使用）
-        self._cleanup_interval = 300
-        self._last_cleanup = time.time()
+    MAX_BUCKETS = 10000
 
-    def _cleanup_expired(self) -> None:
-        """清理過期的令牌桶"""
-        now = time.time()
-        if now - self._last_cleanup < self._cleanup_interval:
-            return
+    def __init__(self, max_buckets: int = MAX_BUCKETS):
+        self._buckets: OrderedDict[str, LocalTokenBucket] = OrderedDict()
+        self._global_lock = Lock()
+        self._max_buckets = max_buckets
 
+    def _get_bucket(self, key: str, burst_size: float) -> LocalTokenBucket:
+        """獲取或創建令牌桶（同時刷新 LRU 順序）"""
         with self._global_lock:
-            expired_keys = [
-                key for key, bucket in self._buckets.items()
-                if now - bucket.last_update > self._cleanup_interval
-            ]
-            for key in expired_keys:
-                del self._buckets[key]
-            self._last_cleanup = now
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = LocalTokenBucket(tokens=burst_size, last_update=time.time())
+                self._buckets[key] = bucket
+                # 超出上限時淘汰最久未用的桶（被淘汰的 key 下次以滿桶重新開始）
+                if len(self._buckets) > self._max_buckets:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+            return bucket
 
-    def _get_bucket(self, key: str, burst_size: float) -> LocalTokenBucket:
-        """獲取或創建令牌桶"""
-        if key not in self._buckets:
-            with self._global_lock:
-                if key not in self._buckets:
-                    self._buckets[key] = LocalTokenBucket(
-                        tokens=burst_size,
-                        last_update=time.time()
-                    )
-        return self._buckets[key]
+    def __len__(self) -> int:
+        return len(self._buckets)
 
     def acquire(
         self,
@@ -94,8 +97,6 @@ class LocalRateLimiterFallback:
         Returns:
             (成功與否, 需要等待的時間或剩餘令牌數)
         """
-        self._cleanup_expired()
-
         bucket = self._get_bucket(key, burst_size)
         now = time.time()
 
@@ -152,20 +153,24 @@ class TokenBucketRateLimiter:
     tokens = math.min(burst, tokens + generated)
 
     -- 嘗試消耗令牌
+    -- 返回字串：Redis 會把 Lua number 截斷為整數，小於 1 秒的等待時間會變成 0
     if tokens >= requested then
         tokens = tokens - requested
         redis.call('HMSET', key, 'tokens', tokens, 'last_update', now)
         redis.call('EXPIRE', key, 300) -- 5 分鐘過期
-        return tokens
+        return tostring(tokens)
     else
         -- 令牌不足，返回負數表示需要等待的時間
         local wait_time = (requested - tokens) / rate
         redis.call('HMSET', key, 'tokens', tokens, 'last_update', now)
         redis.call('EXPIRE', key, 300)
-        return -wait_time
+        return tostring(-wait_time)
     end
     """
 
+    # Redis 失敗後改用本地回退的冷卻時間（避免每個請求都等連接超時）
+    REDIS_RETRY_INTERVAL_S = 5.0
+
     def __init__(
         self,
         redis_client: redis.Redis,
@@ -176,6 +181,7 @@ class TokenBucketRateLimiter:
         self.config = config or RateLimiterConfig()
         self.key_prefix = key_prefix
         self._script_sha: Optional[str] = None
+        self._redis_retry_at = 0.0
 
     async def _ensure_script(self) -> str:
         """確保 Lua 腳本已加載"""
@@ -187,6 +193,65 @@ class TokenBucketRateLimiter:
         """生成 Redis key"""
         return f"{self.key_prefix}:{identifier}"
 
+    @property
+    def _rate(self) -> float:
+        return self.config.requests_per_window / self.config.window_seconds
+
+    async def _eval_bucket(self, key: str, tokens: int) -> float:
+        """
+        執行一次原子令牌桶操作（單次 EVALSHA 往返）
+
+        Returns:
+            >= 0: 成功，剩餘令牌數
+            < 0: 失敗，絕對值為需要等待的秒數
+
+        Raises:
+            redis.RedisError: Redis 不可用（處於冷卻期時直接拋出，不發起連接）
+        """
+        if time.monotonic() < self._redis_retry_at:
+            raise redis.ConnectionError("Redis 處於冷卻期")
+
+        args = (key, time.time(), self._rate, self.config.burst_size, tokens)
+        try:
+            sha = await self._ensure_script()
+            try:
+                result = await self.redis.evalsha(sha, 1, *args)
+            except NoScriptError:
+                # Redis 重啟 / 故障轉移 / SCRIPT FLUSH 後腳本快取會清空：
+                # 改用 EVAL 執行（同時把腳本重新載入快取，SHA 不變，下次仍走 EVALSHA）
+                result = await self.redis.eval(self.LUA_SCRIPT, 1, *args)
+        except (redis.RedisError, OSError) as e:
+            self._redis_retry_at = time.monotonic() + self.REDIS_RETRY_INTERVAL_S
+            logger.warning(
+                f"Redis 不可用，{self.REDIS_RETRY_INTERVAL_S:.0f}s 內使用本地回退限制器: {e}"
+            )
+            raise redis.ConnectionError(str(e)) from e
+
+        return float(result)
+
+    async def check(self, identifier: str, tokens: int = 1) -> RateLimitResult:
+        """
+        非阻塞檢查並消耗令牌（供 HTTP 中間件使用）
+
+        Redis 可用時為單次往返；不可用時按 fail_open 放行或改用本地回退限制器。
+        """
+        key = self._get_key(identifier)
+        try:
+            value = await self._eval_bucket(key, tokens)
+        except redis.RedisError:
+            if self.config.fail_open:
+                return RateLimitResult(allowed=True, remaining=self.config.burst_size)
+            success, value = _local_fallback.acquire(
+                key, self._rate, self.config.burst_size, tokens
+            )
+            if success:
+                return RateLimitResult(allowed=True, remaining=value)
+            return RateLimitResult(allowed=False, remaining=0, retry_after=value)
+
+        if value >= 0:
+            return RateLimitResult(allowed=True, remaining=value)
+        return RateLimitResult(allowed=False, remaining=0, retry_after=-value)
+
     async def acquire(
         self,
         identifier: str,
@@ -205,22 +270,11 @@ class TokenBucketRateLimiter:
             是否成功獲取令牌
         """
         key = self._get_key(identifier)
-        rate = self.config.requests_per_window / self.config.window_seconds
+        rate = self._rate
         burst = self.config.burst_size
 
         try:
-            sha = await self._ensure_script()
-            now = time.time()
-
-            result = await self.redis.evalsha(
-                sha,
-                1,
-                key,
-                now,
-                rate,
-                burst,
-                tokens
-            )
+            result = await self._eval_bucket(key, tokens)
 
             if result >= 0:
                 # 成功獲取令牌
@@ -242,8 +296,8 @@ class TokenBucketRateLimiter:
             return await self.acquire(identifier, tokens, wait=False)
 
         except redis.RedisError as e:
-            # Redis 不可用時，使用本地內存回退
-            logger.warning(f"Redis 不可用，使用本地回退限制器: {e}")
+            # Redis 不可用時，使用本地內存回退（冷卻期開始時 _eval_bucket 已記錄 warning）
+            logger.debug(f"Redis 不可用，使用本地回退限制器: {e}")
 
             if self.config.fail_open:
                 # 如果配置為 fail-open，允許請求
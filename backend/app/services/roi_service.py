@@ -3,8 +3,9 @@
 # 計算並展示 GoGoJap 為用戶創造的價值
 # =============================================
 
+import uuid
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, and_, case
+from sqlalchemy import select, func, and_, case, cast, literal, literal_column, union_all, DateTime
 from typing import List, Optional
 from datetime import datetime, timedelta
 from decimal import Decimal
@@ -12,6 +13,7 @@ from decimal import Decimal
 from app.models.pricing import PriceProposal, ProposalStatus
 from app.models.competitor import PriceAlert
 from app.models.order import Order, OrderItem
+from app.services.agent.cache_backend import get_cache_backend
 from app.schemas.roi import (
     ROISummary, ROITrendPoint, ROITrendsResponse,
     PricingProposalImpact, PricingImpactSummary, PricingImpactResponse,
@@ -19,6 +21,81 @@ from app.schemas.roi import (
 )
 
 
+# 風險規避價值 = 監測價值 × 30%
+RISK_AVOIDANCE_RATIO = Decimal("0.3")
+
+# 趨勢結果緩存：存在共享快取後端（cache_backend，預設 Redis），多 worker 共用一份
+# 鍵 = roi:trends:{代號}:{days}:{granularity}；提案執行時換代號，所有 worker 的舊結果一併作廢
+# 窗口隨時間推移、告警持續寫入，TTL 兜底
+TRENDS_CACHE_TTL_SECONDS = 300
+TRENDS_CACHE_PREFIX = "roi:trends"
+_TRENDS_GENERATION_KEY = f"{TRENDS_CACHE_PREFIX}:generation"
+# 代號本身只需比結果活得久；過期後重新生成，效果等同一次失效
+_TRENDS_GENERATION_TTL_SECONDS = 86400
+
+
+async def invalidate_trends_cache() -> str:
+    """提案執行後調用：換新的緩存代號，返回新代號"""
+    generation = uuid.uuid4().hex[:12]
+    await get_cache_backend().set(
+        _TRENDS_GENERATION_KEY, {"generation": generation}, _TRENDS_GENERATION_TTL_SECONDS
+    )
+    return generation
+
+
+async def _trends_cache_key(days: int, granularity: str) -> str:
+    entry = await get_cache_backend().get(_TRENDS_GENERATION_KEY)
+    generation = entry["generation"] if entry else await invalidate_trends_cache()
+    return f"{TRENDS_CACHE_PREFIX}:{generation}:{days}:{granularity}"
+
+
+def _truncate(moment: datetime, granularity: str) -> datetime:
+    """與 Postgres date_trunc 一致的桶起點（週從週一開始）"""
+    moment = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    if granularity == "week":
+        return moment - timedelta(days=moment.weekday())
+    if granularity == "month":
+        return moment.replace(day=1)
+    return moment
+
+
+def _next_bucket(moment: datetime, granularity: str) -> datetime:
+    if granularity == "week":
+        return moment + timedelta(weeks=1)
+    if granularity == "month":
+        return (moment.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return moment + timedelta(days=1)
+
+
+def _bucket(column_, granularity: str, dialect: str):
+    """date_trunc 分桶；SQLite（測試）用 strftime 模擬，輸出 'YYYY-MM-DD 00:00:00'"""
+    if dialect == "postgresql":
+        return func.date_trunc(granularity, column_)
+    if granularity == "week":
+        return func.strftime("%Y-%m-%d 00:00:00", column_, "-6 days", "weekday 1")
+    if granularity == "month":
+        return func.strftime("%Y-%m-01 00:00:00", column_)
+    return func.strftime("%Y-%m-%d 00:00:00", column_)
+
+
+def _bucket_series(start_date: datetime, end_date: datetime, granularity: str, dialect: str):
+    """完整的桶序列（含空桶）：Postgres 用 generate_series，其他方言（測試）用 UNION ALL 常量行"""
+    if dialect == "postgresql":
+        return select(
+            func.generate_series(
+                cast(_truncate(start_date, granularity), DateTime),
+                cast(_truncate(end_date, granularity), DateTime),
+                literal_column(f"interval '1 {granularity}'"),
+            ).label("bucket")
+        ).subquery()
+
+    buckets, current = [], _truncate(start_date, granularity)
+    while current <= end_date:
+        buckets.append(select(literal(current.strftime("%Y-%m-%d 00:00:00")).label("bucket")))
+        current = _next_bucket(current, granularity)
+    return union_all(*buckets).subquery()
+
+
 class ROIService:
     """
     ROI 儀表板核心服務
@@ -72,7 +149,7 @@ class ROIService:
         monitoring_value = await self._calculate_competitor_monitoring_value(start_date, end_date)
 
         # 3. 風險規避價值 (簡化: 監測價值的 30%)
-        risk_avoidance = monitoring_value * Decimal("0.3")
+        risk_avoidance = monitoring_value * RISK_AVOIDANCE_RATIO
 
         # 4. 總價值
         total_value = ai_contribution + monitoring_value + risk_avoidance
@@ -155,48 +232,105 @@ class ROIService:
         days: int = 30,
         granularity: str = "day"
     ) -> ROITrendsResponse:
-        """獲取 ROI 趨勢數據"""
-
-        end_date = datetime.utcnow()
-        start_date = end_date - timedelta(days=days)
-
-        trends: List[ROITrendPoint] = []
-        cumulative_value = Decimal("0")
-
-        # 按天聚合
-        current_date = start_date
-        while current_date <= end_date:
-            day_end = current_date.replace(hour=23, minute=59, second=59)
-
-            # 當日 AI 定價貢獻
-            ai_pricing = await self._calculate_ai_pricing_contribution(current_date, day_end)
+        """
+        獲取 ROI 趨勢數據
 
-            # 當日競品監測價值
-            monitoring = await self._calculate_competitor_monitoring_value(current_date, day_end)
+        一條 SQL 完成：提案 / 告警各按 date_trunc 分桶聚合一次，
+        左連接到完整桶序列（空桶補零），累計值用窗口函數 SUM() OVER 計算。
+        結果按 (days, granularity) 存入共享快取，提案執行時失效
+        """
+        cache_key = await _trends_cache_key(days, granularity)
+        cached = await get_cache_backend().get(cache_key)
+        if cached is not None:
+            return ROITrendsResponse.model_validate(cached)
 
-            # 風險規避
-            risk_avoidance = monitoring * Decimal("0.3")
+        end_date = datetime.utcnow()
+        start_date = _truncate(end_date - timedelta(days=days), granularity)
 
-            # 累計
-            day_total = ai_pricing + monitoring + risk_avoidance
-            cumulative_value += day_total
+        rows = (await self.db.execute(
+            self._trends_query(start_date, end_date, granularity)
+        )).all()
 
+        trends: List[ROITrendPoint] = []
+        for row in rows:
+            monitoring = Decimal(str(row.monitoring))
             trends.append(ROITrendPoint(
-                date=current_date.strftime("%Y-%m-%d"),
-                cumulative_value=cumulative_value,
-                ai_pricing=ai_pricing,
+                date=str(row.bucket)[:10],
+                cumulative_value=Decimal(str(row.cumulative_value)),
+                ai_pricing=Decimal(str(row.ai_pricing)),
                 monitoring=monitoring,
-                risk_avoidance=risk_avoidance
+                risk_avoidance=monitoring * RISK_AVOIDANCE_RATIO
             ))
 
-            current_date += timedelta(days=1)
-
-        return ROITrendsResponse(
+        response = ROITrendsResponse(
             trends=trends,
             start_date=start_date.strftime("%Y-%m-%d"),
             end_date=end_date.strftime("%Y-%m-%d"),
             granularity=granularity
         )
+        await get_cache_backend().set(cache_key, response.model_dump(mode="json"), TRENDS_CACHE_TTL_SECONDS)
+        return response
+
+    def _trends_query(self, start_date: datetime, end_date: datetime, granularity: str):
+        """桶序列 LEFT JOIN 兩個分桶聚合，按桶排序並帶累計值"""
+        dialect = self.db.bind.dialect.name
+
+        ai_bucket = _bucket(PriceProposal.executed_at, granularity, dialect)
+        ai = (
+            select(
+                ai_bucket.label("bucket"),
+                func.sum(
+                    (PriceProposal.final_price - PriceProposal.current_price) * self.DEFAULT_ESTIMATED_QUANTITY
+                ).label("ai_pricing"),
+            )
+            .where(
+                PriceProposal.status == ProposalStatus.EXECUTED,
+                PriceProposal.executed_at >= start_date,
+                PriceProposal.executed_at <= end_date,
+                PriceProposal.final_price > PriceProposal.current_price,
+            )
+            .group_by(ai_bucket)
+            .subquery()
+        )
+
+        # 與 _calculate_competitor_monitoring_value 同一公式，逐桶計算
+        alert_bucket = _bucket(PriceAlert.created_at, granularity, dialect)
+        monitoring = (
+            select(
+                alert_bucket.label("bucket"),
+                (
+                    func.count(PriceAlert.id) * func.avg(func.abs(PriceAlert.change_percent))
+                    / 100 * self.DEFAULT_AVG_ORDER_VALUE
+                ).label("monitoring"),
+            )
+            .where(
+                PriceAlert.created_at >= start_date,
+                PriceAlert.created_at <= end_date,
+                PriceAlert.alert_type.in_(["price_drop", "price_increase"]),
+            )
+            .group_by(alert_bucket)
+            .subquery()
+        )
+
+        series = _bucket_series(start_date, end_date, granularity, dialect)
+        ai_value = func.coalesce(ai.c.ai_pricing, 0)
+        monitoring_value = func.coalesce(monitoring.c.monitoring, 0)
+        bucket_total = ai_value + monitoring_value * (1 + RISK_AVOIDANCE_RATIO)
+
+        return (
+            select(
+                series.c.bucket,
+                ai_value.label("ai_pricing"),
+                monitoring_value.label("monitoring"),
+                func.sum(bucket_total).over(order_by=series.c.bucket).label("cumulative_value"),
+            )
+            .select_from(
+                series
+                .outerjoin(ai, ai.c.bucket == series.c.bucket)
+                .outerjoin(monitoring, monitoring.c.bucket == series.c.bucket)
+            )
+            .order_by(series.c.bucket)
+        )
 
     async def get_pricing_impact(self, limit: int = 10) -> PricingImpactResponse:
         """分析 AI 改價的實際影響"""
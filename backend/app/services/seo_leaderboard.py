@@ -0,0 +1,195 @@
+# =============================================
+# SEO 排名排行榜（排名變化、摘要全部在 SQL 內計算）
+# =============================================
+# - 排名變化：keyword_rankings 歷史上用 lag() 取最近一次追蹤的前一次排名（正數 = 上升）
+# - 摘要：對完整篩選範圍做 GROUPING SETS ((keyword_type), ())，與分頁大小無關
+# - 分頁：keyset 游標（排序鍵, id）；排行位置用 row_number() 在完整範圍上計算，翻頁後連續
+#
+# SQLite（測試）不支持 GROUPING SETS，以兩個分組的 UNION ALL 等價改寫
+
+from typing import List, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import Select, and_, case, func, literal, null, select, tuple_, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.exceptions import ValidationError
+from app.core.pagination import encode_cursor
+from app.models.product import Product
+from app.models.seo_ranking import KeywordConfig, KeywordRanking, KeywordType
+from app.services.product_search import apply_cursor
+from app.services.seo_ranking_rollup import LATEST_RANK, ROLLUP_SOURCES
+
+# 排序模式 → (是否倒序, 空值替代值)；空值一律排最後
+# change_desc：升幅最大在前；change_asc：跌幅最大在前
+SORT_MODES = {
+    "rank_asc": (False, 1_000_000),
+    "rank_desc": (True, -1_000_000),
+    "change_asc": (False, 1_000_000),
+    "change_desc": (True, -1_000_000),
+}
+
+TARGET_RANK = {
+    "google": KeywordConfig.target_google_rank,
+    "hktvmall": KeywordConfig.target_hktvmall_rank,
+}
+
+
+def _previous_ranks(source: str, config_ids: Select):
+    """每個關鍵詞最近一次追蹤記錄上的 lag(排名)，即上一次追蹤的排名"""
+    r = KeywordRanking
+    rank = ROLLUP_SOURCES[source]
+    history = (
+        select(
+            r.keyword_config_id,
+            func.lag(rank).over(
+                partition_by=r.keyword_config_id, order_by=(r.tracked_at, r.id)
+            ).label("previous_rank"),
+            func.row_number().over(
+                partition_by=r.keyword_config_id, order_by=(r.tracked_at.desc(), r.id.desc())
+            ).label("recency"),
+        )
+        .where(r.keyword_config_id.in_(config_ids))
+        .subquery()
+    )
+    return (
+        select(history.c.keyword_config_id, history.c.previous_rank)
+        .where(history.c.recency == 1)
+        .subquery()
+    )
+
+
+def _population(
+    source: str,
+    keyword_type: Optional[KeywordType],
+    product_id: Optional[UUID],
+    include_unranked: bool,
+):
+    """篩選範圍內每個關鍵詞一行：當前 / 上次排名、變化、目標差距"""
+    c = KeywordConfig
+    current = LATEST_RANK[source]
+    target = TARGET_RANK[source]
+
+    filters = [c.is_active == True]  # noqa: E712
+    if product_id:
+        filters.append(c.product_id == product_id)
+    if keyword_type:
+        filters.append(c.keyword_type == keyword_type)
+    if not include_unranked:
+        filters.append(current.isnot(None))
+
+    previous = _previous_ranks(source, select(c.id).where(*filters))
+    previous_rank = previous.c.previous_rank
+    return (
+        select(
+            c.id.label("keyword_config_id"),
+            c.keyword,
+            c.keyword_type,
+            c.product_id,
+            Product.name.label("product_name"),
+            current.label("current_rank"),
+            previous_rank.label("previous_rank"),
+            case((and_(current > 0, previous_rank > 0), previous_rank - current)).label("rank_change"),
+            target.label("target_rank"),
+            case((and_(current > 0, target > 0), current - target)).label("target_gap"),
+            c.latest_tracked_at.label("last_tracked_at"),
+        )
+        .outerjoin(previous, previous.c.keyword_config_id == c.id)
+        .outerjoin(Product, Product.id == c.product_id)
+        .where(*filters)
+        .subquery()
+    )
+
+
+async def leaderboard_page(
+    db: AsyncSession,
+    source: str,
+    sort_by: str = "rank_asc",
+    limit: int = 20,
+    cursor: Optional[str] = None,
+    keyword_type: Optional[KeywordType] = None,
+    product_id: Optional[UUID] = None,
+    include_unranked: bool = False,
+) -> Tuple[List[dict], Optional[str]]:
+    """
+    排行榜一頁，返回 (條目, next_cursor)
+
+    條目的 rank 是在完整篩選範圍上的排行位置
+    """
+    if sort_by not in SORT_MODES:
+        raise ValidationError(f"不支持的排序方式：{sort_by}")
+    descending, null_value = SORT_MODES[sort_by]
+
+    pop = _population(source, keyword_type, product_id, include_unranked)
+    measure = pop.c.current_rank if sort_by.startswith("rank") else pop.c.rank_change
+    sort_key = func.coalesce(measure, null_value)
+    order = (sort_key.desc(), pop.c.keyword_config_id.desc()) if descending \
+        else (sort_key.asc(), pop.c.keyword_config_id.asc())
+
+    ranked = select(
+        pop,
+        sort_key.label("sort_key"),
+        func.row_number().over(order_by=order).label("position"),
+    ).subquery()
+
+    keys = [ranked.c.sort_key, ranked.c.keyword_config_id]
+    query = apply_cursor(select(ranked), keys, cursor, descending)
+    rows = (await db.execute(query.order_by(ranked.c.position).limit(limit + 1))).mappings().all()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = encode_cursor(rows[-1]["sort_key"], rows[-1]["keyword_config_id"]) if has_more else None
+    return [dict(row) for row in rows], next_cursor
+
+
+async def leaderboard_summary(
+    db: AsyncSession,
+    source: str,
+    keyword_type: Optional[KeywordType] = None,
+    product_id: Optional[UUID] = None,
+    include_unranked: bool = False,
+) -> List[dict]:
+    """
+    完整篩選範圍的摘要：GROUPING SETS ((keyword_type), ())
+
+    返回列表第一項是總計（keyword_type 為 None），其後按關鍵詞類型各一項
+    """
+    pop = _population(source, keyword_type, product_id, include_unranked)
+    current, change = pop.c.current_rank, pop.c.rank_change
+    ranked = current > 0
+    measures = [
+        func.count().label("total_keywords"),
+        func.count().filter(ranked).label("ranked_keywords"),
+        func.count().filter(and_(ranked, current <= 10)).label("top_10_count"),
+        func.count().filter(and_(ranked, current <= 30)).label("top_30_count"),
+        func.avg(current).filter(ranked).label("avg_rank"),
+        func.count().filter(change > 0).label("improved_count"),
+        func.count().filter(change < 0).label("declined_count"),
+    ]
+
+    if db.bind.dialect.name == "postgresql":
+        query = select(
+            pop.c.keyword_type, func.grouping(pop.c.keyword_type).label("is_total"), *measures
+        ).group_by(func.grouping_sets(tuple_(pop.c.keyword_type), tuple_()))
+    else:
+        query = union_all(
+            select(pop.c.keyword_type, literal(0).label("is_total"), *measures).group_by(pop.c.keyword_type),
+            select(null().label("keyword_type"), literal(1).label("is_total"), *measures),
+        )
+
+    rows = sorted(
+        (await db.execute(query)).mappings().all(),
+        key=lambda row: (not row["is_total"], str(row["keyword_type"])),
+    )
+    summaries = []
+    for row in rows:
+        summary = {k: v for k, v in row.items() if k != "is_total"}
+        if row["is_total"]:
+            summary["keyword_type"] = None
+        elif isinstance(summary["keyword_type"], KeywordType):
+            summary["keyword_type"] = summary["keyword_type"].value
+        summary["unranked_keywords"] = summary["total_keywords"] - summary["ranked_keywords"]
+        avg = summary["avg_rank"]
+        summary["avg_rank"] = round(float(avg), 1) if avg is not None else None
+        summaries.append(summary)
+    return summaries
@@ -0,0 +1,236 @@
+# =============================================
+# SEO 排名日匯總（趨勢圖 + 儀表板概覽）
+# =============================================
+# keyword_ranking_daily：每個關鍵詞 × 日期（UTC）× 來源一行，存最佳 / 最差 / 排名和 / 次數
+# - 增量：track_keyword 寫入排名時 record_ranking 在同一事務內 upsert 合併
+# - 重算：backfill_ranking_rollups 按 keyword_rankings 聚合後覆蓋寫入，重複執行結果不變
+# - 讀取：趨勢圖按日一次 GROUP BY；概覽計數一次 FILTER 聚合，不再把全部配置載入 Python
+#
+# 一條 keyword_rankings 同時帶 google_rank 和 hktvmall_rank，按兩個來源各拆一行匯總；
+# 排名為 NULL（未進前 100）的樣本不計入
+
+from datetime import date, datetime, time
+from typing import List, Optional
+from uuid import UUID
+
+from sqlalchemy import Date, Float, and_, cast, func, literal, select, union_all
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.database import utcnow
+from app.models.seo_ranking import KeywordConfig, KeywordRanking, KeywordRankingDaily
+
+# 來源 → keyword_rankings 上的排名欄位
+ROLLUP_SOURCES = {
+    "google": KeywordRanking.google_rank,
+    "hktvmall": KeywordRanking.hktvmall_rank,
+}
+
+# 來源 → keyword_configs 上的最新 / 基準排名欄位
+LATEST_RANK = {
+    "google": KeywordConfig.latest_google_rank,
+    "hktvmall": KeywordConfig.latest_hktvmall_rank,
+}
+
+_KEY = ["keyword_config_id", "day", "source"]
+
+
+def _insert(db: AsyncSession):
+    return postgresql_insert if db.bind.dialect.name == "postgresql" else sqlite_insert
+
+
+def _least(db: AsyncSession, a, b):
+    # SQLite 的多參數 min / max 是標量函數
+    return func.least(a, b) if db.bind.dialect.name == "postgresql" else func.min(a, b)
+
+
+def _greatest(db: AsyncSession, a, b):
+    return func.greatest(a, b) if db.bind.dialect.name == "postgresql" else func.max(a, b)
+
+
+# =============================================
+# 寫入
+# =============================================
+
+async def record_ranking(
+    db: AsyncSession,
+    ranking: KeywordRanking,
+    product_id: Optional[UUID] = None,
+) -> None:
+    """
+    把一條排名記錄增量合併進日匯總（與排名記錄同一事務，調用方負責提交）
+
+    tracked_at 尚未 flush 時補上當前時間，保證匯總日期與記錄一致
+    """
+    if ranking.tracked_at is None:
+        ranking.tracked_at = utcnow()
+    day = ranking.tracked_at.date()
+
+    rows = [
+        {
+            "keyword_config_id": ranking.keyword_config_id,
+            "day": day,
+            "source": source,
+            "product_id": product_id,
+            "best_rank": rank,
+            "worst_rank": rank,
+            "rank_sum": rank,
+            "sample_count": 1,
+            "updated_at": utcnow(),
+        }
+        for source, rank in (("google", ranking.google_rank), ("hktvmall", ranking.hktvmall_rank))
+        if rank and rank > 0
+    ]
+    if not rows:
+        return
+
+    table = KeywordRankingDaily.__table__
+    stmt = _insert(db)(table).values(rows)
+    await db.execute(stmt.on_conflict_do_update(
+        index_elements=_KEY,
+        set_={
+            "best_rank": _least(db, table.c.best_rank, stmt.excluded.best_rank),
+            "worst_rank": _greatest(db, table.c.worst_rank, stmt.excluded.worst_rank),
+            "rank_sum": table.c.rank_sum + stmt.excluded.rank_sum,
+            "sample_count": table.c.sample_count + stmt.excluded.sample_count,
+            "product_id": stmt.excluded.product_id,
+            "updated_at": stmt.excluded.updated_at,
+        },
+    ))
+
+
+async def backfill_ranking_rollups(
+    db: AsyncSession,
+    since: Optional[date] = None,
+) -> int:
+    """
+    按 keyword_rankings 重算日匯總（since 之後；不傳則全量），返回寫入行數
+
+    INSERT ... SELECT ... ON CONFLICT DO UPDATE 以重算值覆蓋，可重複執行；
+    調用方負責提交
+    """
+    table = KeywordRankingDaily.__table__
+    now = utcnow()
+    # date(ts) 在 PostgreSQL 與 SQLite 都可用；SQLite 上 CAST(... AS DATE) 會退化成數字
+    day = func.date(KeywordRanking.tracked_at, type_=Date)
+
+    selects = []
+    for source, rank in ROLLUP_SOURCES.items():
+        query = (
+            select(
+                KeywordRanking.keyword_config_id,
+                day,
+                literal(source),
+                KeywordConfig.product_id,
+                func.min(rank),
+                func.max(rank),
+                func.sum(rank),
+                func.count(rank),
+                literal(now),
+            )
+            .join(KeywordConfig, KeywordConfig.id == KeywordRanking.keyword_config_id)
+            .where(rank > 0)
+            .group_by(KeywordRanking.keyword_config_id, day, KeywordConfig.product_id)
+        )
+        if since is not None:
+            query = query.where(KeywordRanking.tracked_at >= datetime.combine(since, time.min))
+        selects.append(query)
+
+    columns = [
+        "keyword_config_id", "day", "source", "product_id",
+        "best_rank", "worst_rank", "rank_sum", "sample_count", "updated_at",
+    ]
+    stmt = _insert(db)(table).from_select(columns, union_all(*selects))
+    result = await db.execute(stmt.on_conflict_do_update(
+        index_elements=_KEY,
+        set_={name: stmt.excluded[name] for name in columns if name not in _KEY},
+    ))
+    return result.rowcount or 0
+
+
+# =============================================
+# 讀取
+# =============================================
+
+async def daily_trends(
+    db: AsyncSession,
+    start_day: date,
+    product_id: Optional[UUID] = None,
+) -> List[dict]:
+    """
+    按日趨勢：各來源關鍵詞日均排名的平均值、當日最佳排名進入前 10 的關鍵詞數
+    """
+    t = KeywordRankingDaily
+    day_avg = cast(t.rank_sum, Float) / t.sample_count
+
+    columns = [t.day]
+    for source in ROLLUP_SOURCES:
+        is_source = t.source == source
+        columns += [
+            func.avg(day_avg).filter(is_source).label(f"{source}_avg_rank"),
+            func.count().filter(and_(is_source, t.best_rank <= 10)).label(f"{source}_top_10_count"),
+        ]
+
+    query = select(*columns).where(t.day >= start_day).group_by(t.day).order_by(t.day)
+    if product_id:
+        query = query.where(t.product_id == product_id)
+
+    trends = []
+    for row in (await db.execute(query)).all():
+        point = {"date": datetime.combine(row.day, time.min)}
+        for source in ROLLUP_SOURCES:
+            avg = getattr(row, f"{source}_avg_rank")
+            point[f"{source}_avg_rank"] = round(float(avg), 1) if avg is not None else None
+            point[f"{source}_top_10_count"] = getattr(row, f"{source}_top_10_count")
+        trends.append(point)
+    return trends
+
+
+async def keyword_overview(db: AsyncSession, product_id: Optional[UUID] = None) -> dict:
+    """
+    儀表板概覽計數：一次 FILTER 聚合 keyword_configs 的最新 / 基準排名快照
+
+    返回 total / active / with_data / improved / declined，以及每個來源的
+    ranked / top_10 / top_30 / avg_rank / best_rank / worst_rank
+    """
+    c = KeywordConfig
+    google, hktvmall = c.latest_google_rank, c.latest_hktvmall_rank
+    has_change = and_(c.baseline_google_rank > 0, google > 0)
+
+    columns = [
+        func.count().label("total"),
+        func.count().filter(c.is_active == True).label("active"),  # noqa: E712
+        func.count().filter((google > 0) | (hktvmall > 0)).label("with_data"),
+        func.count().filter(and_(has_change, google < c.baseline_google_rank)).label("improved"),
+        func.count().filter(and_(has_change, google > c.baseline_google_rank)).label("declined"),
+    ]
+    for source, rank in LATEST_RANK.items():
+        ranked = rank > 0
+        columns += [
+            func.count().filter(ranked).label(f"{source}_ranked"),
+            func.count().filter(and_(ranked, rank <= 10)).label(f"{source}_top_10"),
+            func.count().filter(and_(ranked, rank <= 30)).label(f"{source}_top_30"),
+            func.avg(rank).filter(ranked).label(f"{source}_avg_rank"),
+            func.min(rank).filter(ranked).label(f"{source}_best_rank"),
+            func.max(rank).filter(ranked).label(f"{source}_worst_rank"),
+        ]
+
+    query = select(*columns)
+    if product_id:
+        query = query.where(c.product_id == product_id)
+    return dict((await db.execute(query)).one()._mapping)
+
+
+async def keyword_at_rank(
+    db: AsyncSession,
+    source: str,
+    rank: int,
+    product_id: Optional[UUID] = None,
+) -> Optional[str]:
+    """最新排名等於 rank 的關鍵詞（摘要裡的最佳 / 最差關鍵詞）"""
+    column = LATEST_RANK[source]
+    query = select(KeywordConfig.keyword).where(column == rank).order_by(KeywordConfig.keyword).limit(1)
+    if product_id:
+        query = query.where(KeywordConfig.product_id == product_id)
+    return await db.scalar(query)
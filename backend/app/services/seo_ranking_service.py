@@ -30,6 +30,7 @@ from app.models.seo_ranking import (
     KeywordType, RankingSource, AlertSeverity
 )
 from app.models.product import Product
+from app.services.seo_ranking_rollup import record_ranking
 # Firecrawl 已被 Algolia 取代，保留 stub 以防止 import error
 try:
     from app.connectors.firecrawl import FirecrawlConnector, ScrapeOptions
@@ -721,6 +722,9 @@ class SEORankingService:
 
         self.db.add(ranking)
 
+        # 同一事務內合併進日匯總（趨勢圖）
+        await record_ranking(self.db, ranking, keyword_config.product_id)
+
         # 更新關鍵詞配置的最新排名
         keyword_config.latest_google_rank = ranking.google_rank
         keyword_config.latest_hktvmall_rank = ranking.hktvmall_rank
@@ -225,6 +225,46 @@ class StorageService:
         }
         return content_types.get(ext, 'application/octet-stream')
 
+    def key_from_url(self, file_url: str) -> str:
+        """
+        從公開 URL / 完整 R2 URL 提取 R2 Key（相對路徑原樣返回）
+        """
+        if not file_url.startswith('http'):
+            return file_url
+        if self.public_url_base and self.public_url_base in file_url:
+            return file_url.replace(f"{self.public_url_base}/", "")
+
+        # 嘗試從 URL 路徑提取：移除開頭的斜線和 bucket 名稱
+        from urllib.parse import urlparse
+        path = urlparse(file_url).path.lstrip('/')
+        if path.startswith(self.bucket + '/'):
+            return path[len(self.bucket) + 1:]
+        return path
+
+    def get_object(
+        self,
+        file_path: str,
+        range_header: Optional[str] = None,
+        if_none_match: Optional[str] = None,
+    ) -> dict:
+        """
+        讀取 R2 對象（同步；Body 是尚未讀取的流，調用方負責關閉）
+
+        Range / If-None-Match 原樣轉發給 R2：命中 ETag 時拋出 304 的 ClientError，
+        範圍無效時拋出 InvalidRange（416）
+
+        Args:
+            file_path: R2 Key
+            range_header: HTTP Range 頭（例如 bytes=0-1023）
+            if_none_match: HTTP If-None-Match 頭（ETag）
+        """
+        params = {'Bucket': self.bucket, 'Key': file_path}
+        if range_header:
+            params['Range'] = range_header
+        if if_none_match:
+            params['IfNoneMatch'] = if_none_match
+        return self.s3_client.get_object(**params)
+
     def get_presigned_url(self, file_path: str, expires_in: int = 3600) -> str:
         """
         獲取 R2 文件的預簽名 URL（臨時訪問 URL）
@@ -244,23 +284,7 @@ class StorageService:
             return self.get_public_url(file_path)
 
         try:
-            # 如果是完整 URL，提取 R2 Key
-            r2_key = file_path
-            if file_path.startswith('http'):
-                # 從 URL 提取相對路徑
-                if self.public_url_base in file_path:
-                    r2_key = file_path.replace(f"{self.public_url_base}/", "")
-                else:
-                    # 嘗試從 URL 路徑提取
-                    from urllib.parse import urlparse
-                    parsed = urlparse(file_path)
-                    # 移除開頭的斜線和 bucket 名稱
-                    path = parsed.path.lstrip('/')
-                    if path.startswith(self.bucket + '/'):
-                        r2_key = path[len(self.bucket) + 1:]
-                    else:
-                        r2_key = path
-
+            r2_key = self.key_from_url(file_path)
             logger.info(f"Generating presigned URL for: {r2_key}")
 
             # 生成預簽名 URL
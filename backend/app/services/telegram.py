@@ -8,6 +8,8 @@
 import asyncio
 import json
 import logging
+import re
+import time
 from datetime import datetime
 from typing import Any, Dict, List, Optional
 from decimal import Decimal
@@ -15,15 +17,170 @@ from decimal import Decimal
 import httpx
 
 from app.config import get_settings
+from app.services.rate_limiter import LocalRateLimiterFallback
 
 logger = logging.getLogger(__name__)
 
+# Bot API 單條消息長度上限
+TELEGRAM_MAX_LENGTH = 4096
+
+
+# ==================== HTML 安全切分 ====================
+
+_TAG_RE = re.compile(r"<(/?)([a-zA-Z][\w-]*)[^>]*>")
+
+# 切分粒度由粗到細：空行 → 換行 → 空白（不切入標籤內）→ 單個標籤 / 實體 / 字符
+_SPLIT_LEVELS = (
+    lambda s: re.split(r"(?<=\n\n)", s),
+    lambda s: re.split(r"(?<=\n)", s),
+    lambda s: re.findall(r"(?:<[^>]*>|[^\s<])+\s*|\s+|<", s),
+    lambda s: re.findall(r"<[^>]*>|&#?\w+;|.", s, re.S),
+)
+
+
+def _open_tags_after(stack: List[tuple], piece: str) -> List[tuple]:
+    """追加 piece 後仍未閉合的標籤 [(name, 原始開標籤)]"""
+    stack = list(stack)
+    for match in _TAG_RE.finditer(piece):
+        closing, name = match.group(1), match.group(2).lower()
+        if not closing:
+            stack.append((name, match.group(0)))
+            continue
+        for i in range(len(stack) - 1, -1, -1):
+            if stack[i][0] == name:
+                del stack[i]
+                break
+    return stack
+
+
+def _closing_tags(stack: List[tuple]) -> str:
+    return "".join(f"</{name}>" for name, _ in reversed(stack))
+
+
+def split_html(text: str, limit: int = TELEGRAM_MAX_LENGTH) -> List[str]:
+    """
+    按長度上限切分 HTML 消息
+
+    優先在空行、換行、空白處切分，標籤與實體（&amp; 等）不會被切斷；
+    切點落在 <b>...</b> 等標籤內部時，本塊結尾補閉合標籤、下一塊開頭重開，每塊都是合法 HTML
+    """
+    if len(text) <= limit:
+        return [text]
+
+    chunks: List[str] = []
+    state = {"body": "", "prefix": "", "stack": []}
+
+    def flush() -> None:
+        chunks.append(state["body"] + _closing_tags(state["stack"]))
+        state["prefix"] = "".join(tag for _, tag in state["stack"])
+        state["body"] = state["prefix"]
+
+    def fits(piece: str, stack: List[tuple]) -> bool:
+        return len(state["body"]) + len(piece) + len(_closing_tags(stack)) <= limit
+
+    def feed(piece: str, level: int) -> None:
+        stack = _open_tags_after(state["stack"], piece)
+        if not fits(piece, stack) and state["body"] != state["prefix"]:
+            flush()
+        if fits(piece, stack) or level >= len(_SPLIT_LEVELS):
+            state["body"] += piece
+            state["stack"] = stack
+            return
+        for sub in _SPLIT_LEVELS[level](piece):
+            if sub:
+                feed(sub, level + 1)
+
+    for piece in _SPLIT_LEVELS[0](text):
+        if piece:
+            feed(piece, 1)
+    if state["body"] != state["prefix"]:
+        flush()
+    return [chunk for chunk in chunks if _TAG_RE.sub("", chunk).strip()]
+
+
+# ==================== 限速發送 ====================
+
+class TelegramSender:
+    """
+    Bot API 調用（令牌桶限速）
+
+    每次調用先取全局令牌、再取目標 chat 的令牌（LocalRateLimiterFallback，單進程）；
+    HTTP 429 時按 parameters.retry_after 暫停該 chat：等待不超過 max_inline_wait 則原地重試，
+    否則把 retry_after 帶回結果，由調用方（通知 Outbox）推遲重發；
+    所有調用共用一個 httpx.AsyncClient（連接池 + keep-alive），關閉時調用 aclose()
+    """
+
+    GLOBAL_KEY = "telegram:global"
+
+    def __init__(
+        self,
+        api_url: str,
+        per_chat_rate: Optional[float] = None,
+        global_rate: Optional[float] = None,
+        max_inline_wait: Optional[float] = None,
+    ):
+        settings = get_settings()
+        self.api_url = api_url
+        self.per_chat_rate = per_chat_rate or settings.telegram_rate_per_chat
+        self.global_rate = global_rate or settings.telegram_rate_global
+        self.max_inline_wait = (
+            settings.telegram_max_inline_wait_seconds if max_inline_wait is None else max_inline_wait
+        )
+        self._buckets = LocalRateLimiterFallback()
+        self._paused_until: Dict[str, float] = {}
+        self._client: Optional[httpx.AsyncClient] = None
+        self._client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _http(self) -> httpx.AsyncClient:
+        """共用客戶端；連接綁定事件循環，換了循環（如測試）時重建"""
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client.is_closed or self._client_loop is not loop:
+            self._client = httpx.AsyncClient()
+            self._client_loop = loop
+        return self._client
+
+    async def aclose(self) -> None:
+        """關閉共用客戶端（應用關閉時）"""
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+
+    async def _acquire(self, key: str, rate: float) -> None:
+        while True:
+            paused = self._paused_until.get(key, 0.0) - time.time()
+            if paused > 0:
+                await asyncio.sleep(paused)
+                continue
+            allowed, wait = self._buckets.acquire(key, rate, burst_size=max(1.0, rate))
+            if allowed:
+                return
+            await asyncio.sleep(wait)
+
+    async def call(self, method: str, payload: Dict[str, Any], timeout: float = 30.0) -> dict:
+        """調用 Bot API 方法，返回 JSON 響應（429 超出原地等待上限時附帶 retry_after）"""
+        chat_id = payload.get("chat_id")
+        key = f"telegram:chat:{chat_id}" if chat_id is not None else self.GLOBAL_KEY
+        while True:
+            await self._acquire(self.GLOBAL_KEY, self.global_rate)
+            if chat_id is not None:
+                await self._acquire(key, self.per_chat_rate)
+
+            response = await self._http().post(f"{self.api_url}/{method}", json=payload, timeout=timeout)
+            result = response.json()
+            if response.status_code != 429 and result.get("error_code") != 429:
+                return result
+
+            retry_after = float((result.get("parameters") or {}).get("retry_after", 1))
+            self._paused_until[key] = max(self._paused_until.get(key, 0.0), time.time() + retry_after)
+            logger.warning(f"Telegram 限流 (chat={chat_id})，{retry_after:.0f} 秒後重試")
+            if retry_after > self.max_inline_wait:
+                result["retry_after"] = retry_after
+                return result
+
 
 class TelegramNotifier:
     """Telegram 通知服務"""
 
-    BASE_URL = "https://api.telegram.org/bot{token}"
-
     def __init__(self, bot_token: Optional[str] = None, chat_id: Optional[str] = None):
         settings = get_settings()
         self.bot_token = bot_token or settings.telegram_bot_token
@@ -31,11 +188,12 @@ class TelegramNotifier:
         self.enabled = settings.telegram_enabled and bool(self.bot_token) and bool(self.chat_id)
 
         if self.enabled:
-            self.api_url = self.BASE_URL.format(token=self.bot_token)
+            self.api_url = f"{settings.telegram_api_base_url.rstrip('/')}/bot{self.bot_token}"
             logger.info("Telegram 通知服務已啟用")
         else:
             self.api_url = ""
             logger.info("Telegram 通知服務未啟用（缺少配置）")
+        self.sender = TelegramSender(self.api_url)
 
     # ==================== 核心發送方法 ====================
 
@@ -66,40 +224,24 @@ class TelegramNotifier:
             return {"ok": False, "error": "Telegram 未啟用"}
 
         target_chat = chat_id or self.chat_id
-        url = f"{self.api_url}/sendMessage"
-
-        # 構建 Inline Keyboard
-        inline_keyboard = []
-        for row in buttons:
-            keyboard_row = []
-            for btn in row:
-                keyboard_row.append({
-                    "text": btn.get("text", ""),
-                    "callback_data": btn.get("callback_data", "")
-                })
-            inline_keyboard.append(keyboard_row)
 
         payload = {
             "chat_id": target_chat,
             "text": text,
             "parse_mode": parse_mode,
             "disable_notification": disable_notification,
-            "reply_markup": {
-                "inline_keyboard": inline_keyboard
-            }
+            "reply_markup": self._inline_keyboard(buttons)
         }
 
         try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.post(url, json=payload)
-                result = response.json()
+            result = await self.sender.call("sendMessage", payload)
 
-                if not result.get("ok"):
-                    logger.error(f"Telegram 發送失敗: {result}")
-                else:
-                    logger.info(f"Telegram 消息（帶按鈕）已發送至 {target_chat}")
+            if not result.get("ok"):
+                logger.error(f"Telegram 發送失敗: {result}")
+            else:
+                logger.info(f"Telegram 消息（帶按鈕）已發送至 {target_chat}")
 
-                return result
+            return result
 
         except httpx.TimeoutException:
             logger.error("Telegram API 請求超時")
@@ -172,19 +314,7 @@ class TelegramNotifier:
             "message_id": message_id
         }
 
-        if buttons:
-            inline_keyboard = []
-            for row in buttons:
-                keyboard_row = []
-                for btn in row:
-                    keyboard_row.append({
-                        "text": btn.get("text", ""),
-                        "callback_data": btn.get("callback_data", "")
-                    })
-                inline_keyboard.append(keyboard_row)
-            payload["reply_markup"] = {"inline_keyboard": inline_keyboard}
-        else:
-            payload["reply_markup"] = {"inline_keyboard": []}
+        payload["reply_markup"] = self._inline_keyboard(buttons or [])
 
         try:
             async with httpx.AsyncClient(timeout=10.0) as client:
@@ -218,7 +348,6 @@ class TelegramNotifier:
             return {"ok": False, "error": "Telegram 未啟用"}
 
         target_chat = chat_id or self.chat_id
-        url = f"{self.api_url}/sendMessage"
 
         payload = {
             "chat_id": target_chat,
@@ -228,16 +357,14 @@ class TelegramNotifier:
         }
 
         try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.post(url, json=payload)
-                result = response.json()
+            result = await self.sender.call("sendMessage", payload)
 
-                if not result.get("ok"):
-                    logger.error(f"Telegram 發送失敗: {result}")
-                else:
-                    logger.info(f"Telegram 消息已發送至 {target_chat}")
+            if not result.get("ok"):
+                logger.error(f"Telegram 發送失敗: {result}")
+            else:
+                logger.info(f"Telegram 消息已發送至 {target_chat}")
 
-                return result
+            return result
 
         except httpx.TimeoutException:
             logger.error("Telegram API 請求超時")
@@ -246,6 +373,50 @@ class TelegramNotifier:
             logger.error(f"Telegram 發送異常: {e}")
             return {"ok": False, "error": str(e)}
 
+    async def enqueue(
+        self,
+        text: str,
+        buttons: Optional[List[List[Dict[str, str]]]] = None,
+        chat_id: Optional[str] = None,
+        dedupe_key: Optional[str] = None,
+        digestible: bool = True,
+        parse_mode: str = "HTML",
+        disable_notification: bool = False
+    ) -> dict:
+        """
+        寫入通知 Outbox，由排程派發（摘要合併 + 限速 + 失敗重發）
+
+        Args:
+            text: 消息內容（HTML）
+            buttons: 按鈕配置（同 send_message_with_buttons）
+            chat_id: 指定聊天 ID（覆蓋默認值）
+            dedupe_key: 去重鍵；同一 chat 內重複入隊只保留一條（默認按內容 + 小時生成）
+            digestible: 是否允許與同一 chat 的其他通知合併為摘要
+
+        Returns:
+            {"ok": True, "queued": 是否新入隊}
+        """
+        if not self.enabled:
+            logger.warning("Telegram 未啟用，消息未入隊")
+            return {"ok": False, "error": "Telegram 未啟用"}
+
+        from app.services.telegram_outbox import get_telegram_outbox
+
+        try:
+            queued = await get_telegram_outbox().enqueue(
+                text,
+                chat_id=chat_id or self.chat_id,
+                reply_markup=self._inline_keyboard(buttons) if buttons else None,
+                dedupe_key=dedupe_key,
+                digestible=digestible,
+                parse_mode=parse_mode,
+                disable_notification=disable_notification,
+            )
+        except Exception as e:
+            logger.error(f"Telegram 通知入隊失敗: {e}")
+            return {"ok": False, "error": str(e)}
+        return {"ok": True, "queued": queued}
+
     async def test_connection(self) -> dict:
         """測試 Telegram 連接"""
         if not self.bot_token:
@@ -301,7 +472,7 @@ class TelegramNotifier:
 ⏱ <b>耗時</b>: {duration_str}
 🕐 <b>時間</b>: {now}
 """
-        return await self.send_message(message.strip())
+        return await self.enqueue(message.strip())
 
     async def notify_price_drop(
         self,
@@ -336,7 +507,7 @@ class TelegramNotifier:
         if product_url:
             message += f'\n🔗 <a href="{product_url}">查看產品</a>'
 
-        return await self.send_message(message.strip())
+        return await self.enqueue(message.strip())
 
     async def notify_price_increase(
         self,
@@ -364,7 +535,7 @@ class TelegramNotifier:
         if product_url:
             message += f'\n🔗 <a href="{product_url}">查看產品</a>'
 
-        return await self.send_message(message.strip())
+        return await self.enqueue(message.strip())
 
     async def notify_significant_price_changes(
         self,
@@ -425,7 +596,7 @@ class TelegramNotifier:
             if len(increases) > 5:
                 message += f"  ...及 {len(increases) - 5} 個其他產品\n"
 
-        return await self.send_message(message.strip())
+        return await self.enqueue(message.strip())
 
     async def notify_error(
         self,
@@ -453,7 +624,7 @@ class TelegramNotifier:
         if context:
             message += f"📍 <b>上下文</b>: {self._escape_html(context[:100])}\n"
 
-        return await self.send_message(message.strip())
+        return await self.enqueue(message.strip())
 
     async def notify_daily_summary(
         self,
@@ -482,7 +653,7 @@ class TelegramNotifier:
 📉 <b>價格下降</b>: {price_drops}
 📈 <b>價格上升</b>: {price_increases}
 """
-        return await self.send_message(message.strip())
+        return await self.enqueue(message.strip())
 
     async def send_alert_notification(
         self,
@@ -559,7 +730,12 @@ class TelegramNotifier:
 
         message = "\n".join(message_parts)
 
-        # 決定是否發送帶按鈕的消息
+        # 同一告警只入隊一次（重試觸發的重複通知被去重）
+        alert_id = alert_data.get("alert_id")
+        dedupe_key = f"alert:{alert_id}" if alert_id else None
+
+        # 決定按鈕
+        buttons = None
         if include_action_buttons and not proposal:
             # 只有在沒有自動創建提案時才顯示創建按鈕
             buttons = [
@@ -580,11 +756,6 @@ class TelegramNotifier:
                     }
                 ]
             ]
-            return await self.send_message_with_buttons(
-                text=message,
-                buttons=buttons,
-                chat_id=chat_id
-            )
         elif include_action_buttons and proposal:
             # 有提案時顯示不同按鈕
             buttons = [
@@ -605,16 +776,14 @@ class TelegramNotifier:
                     }
                 ]
             ]
-            return await self.send_message_with_buttons(
-                text=message,
-                buttons=buttons,
-                chat_id=chat_id
-            )
-        else:
-            return await self.send_message(
-                text=message,
-                chat_id=chat_id
-            )
+
+        # 大批量告警（如整類爬取）在 Outbox 中按 chat 合併為摘要，按鈕以 #序號 區分
+        return await self.enqueue(
+            text=message,
+            buttons=buttons,
+            chat_id=chat_id,
+            dedupe_key=dedupe_key
+        )
 
     async def send_scheduled_report(
         self,
@@ -707,6 +876,19 @@ class TelegramNotifier:
 
     # ==================== 輔助方法 ====================
 
+    @staticmethod
+    def _inline_keyboard(buttons: List[List[Dict[str, str]]]) -> Dict[str, Any]:
+        """按鈕配置 → reply_markup"""
+        return {
+            "inline_keyboard": [
+                [
+                    {"text": btn.get("text", ""), "callback_data": btn.get("callback_data", "")}
+                    for btn in row
+                ]
+                for row in buttons
+            ]
+        }
+
     @staticmethod
     def _escape_html(text: str) -> str:
         """轉義 HTML 特殊字符"""
@@ -733,6 +915,12 @@ def get_telegram_notifier() -> TelegramNotifier:
     return _notifier_instance
 
 
+async def close_telegram_notifier() -> None:
+    """關閉通知單例的共用 HTTP 客戶端"""
+    if _notifier_instance is not None:
+        await _notifier_instance.sender.aclose()
+
+
 async def send_telegram_notification(message: str) -> dict:
     """快捷方法：發送 Telegram 通知"""
     notifier = get_telegram_notifier()
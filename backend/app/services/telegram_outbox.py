@@ -0,0 +1,355 @@
+# =============================================
+# Telegram 通知 Outbox
+# =============================================
+# 用途：notify_* / 價格告警不再即時調用 Bot API，而是寫入 telegram_outbox，
+#       由排程派發：同一 chat 在窗口內的通知合併為摘要，按令牌桶限速發送
+# 設計：
+# - 入隊：INSERT ... ON CONFLICT (chat_id, dedupe_key) DO NOTHING，重複通知只保留一條
+# - 窗口：每條通知 available_at = 入隊時間 + 窗口；chat 中最早的一條到期時，
+#         該 chat 所有待發通知一起合併（之後到達的通知開始下一個窗口）
+# - 認領：推後 available_at 作為租約並 attempts + 1，Postgres 上 SKIP LOCKED 避免多 worker 重複認領
+# - 投遞：成功標記 sent；失敗按退避（或 429 的 retry_after）推遲；進程崩潰時租約到期重發
+#         （at-least-once：多塊摘要中途失敗時已發出的塊會重發）
+# =============================================
+
+import asyncio
+import hashlib
+import json
+import logging
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import delete, or_, select, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import get_settings
+from app.models.database import async_session_maker, utcnow
+from app.models.notification import TelegramOutbox as TelegramOutboxRow
+from app.services.telegram import TelegramNotifier, get_telegram_notifier, split_html
+
+logger = logging.getLogger(__name__)
+
+# 認領後的租約時長：超過仍未標記結果視為派發進程已崩潰，重新派發
+LEASE_SECONDS = 300
+
+# 單條摘要最多合併的通知數 / 按鈕數（Bot API inline keyboard 上限 100 個按鈕）
+MAX_DIGEST_ITEMS = 50
+MAX_KEYBOARD_BUTTONS = 100
+
+# 失敗重發退避：30 秒起倍增，最長 1 小時
+RETRY_BASE_SECONDS = 30
+RETRY_MAX_SECONDS = 3600
+
+
+@dataclass
+class OutboxItem:
+    """認領出來的待發通知（脫離 session 的快照）"""
+    id: Any
+    chat_id: str
+    text: str
+    reply_markup: Optional[Dict[str, Any]]
+    parse_mode: str
+    disable_notification: bool
+    digestible: bool
+    attempts: int
+
+
+class DeliveryError(Exception):
+    """Bot API 返回失敗；retry_after 來自 429 響應"""
+
+    def __init__(self, message: str, retry_after: float = 0.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def default_dedupe_key(text: str, reply_markup: Optional[Dict[str, Any]], now: datetime) -> str:
+    """默認去重鍵：內容哈希 + 小時（同一小時內完全相同的通知只發一次）"""
+    digest = hashlib.sha256(
+        (text + json.dumps(reply_markup or {}, sort_keys=True, ensure_ascii=False)).encode()
+    ).hexdigest()[:32]
+    return f"{digest}:{now:%Y%m%d%H}"
+
+
+def _button_count(item: OutboxItem) -> int:
+    rows = (item.reply_markup or {}).get("inline_keyboard", [])
+    return sum(len(row) for row in rows)
+
+
+def build_digests(items: List[OutboxItem]) -> List[List[OutboxItem]]:
+    """
+    同一 chat 的待發通知按時間順序分組
+
+    可合併的 HTML 通知合進同一組，直到達到條數或按鈕數上限；不可合併的單獨成組
+    """
+    groups: List[List[OutboxItem]] = []
+    current: List[OutboxItem] = []
+    buttons = 0
+    for item in items:
+        if not item.digestible or item.parse_mode != "HTML":
+            groups.append([item])
+            continue
+        count = _button_count(item)
+        if current and (len(current) >= MAX_DIGEST_ITEMS or buttons + count > MAX_KEYBOARD_BUTTONS):
+            groups.append(current)
+            current, buttons = [], 0
+        current.append(item)
+        buttons += count
+    if current:
+        groups.append(current)
+    return groups
+
+
+def render_digest(items: List[OutboxItem]) -> tuple[str, Optional[Dict[str, Any]]]:
+    """
+    合併為一條摘要：單條原樣發送；多條加序號，按鈕文字加上對應的 #序號
+    """
+    if len(items) == 1:
+        return items[0].text, items[0].reply_markup
+
+    parts = [f"<b>🔔 通知摘要（{len(items)} 則）</b>"]
+    keyboard = []
+    for n, item in enumerate(items, 1):
+        parts.append(f"<b>#{n}</b>\n{item.text}")
+        for row in (item.reply_markup or {}).get("inline_keyboard", []):
+            keyboard.append([{**button, "text": f"#{n} {button.get('text', '')}"} for button in row])
+    return "\n\n".join(parts), ({"inline_keyboard": keyboard} if keyboard else None)
+
+
+class TelegramOutbox:
+    """telegram_outbox 表的入隊與派發"""
+
+    def __init__(
+        self,
+        session_factory: Optional[Callable[[], AsyncSession]] = None,
+        notifier: Optional[TelegramNotifier] = None,
+    ) -> None:
+        self._session_factory = session_factory
+        self._notifier = notifier
+
+    def _session(self) -> AsyncSession:
+        return (self._session_factory or async_session_maker)()
+
+    async def enqueue(
+        self,
+        text: str,
+        *,
+        chat_id: str,
+        reply_markup: Optional[Dict[str, Any]] = None,
+        dedupe_key: Optional[str] = None,
+        digestible: bool = True,
+        parse_mode: str = "HTML",
+        disable_notification: bool = False,
+    ) -> bool:
+        """寫入一條待發通知；同一 chat 已有相同 dedupe_key 時忽略，返回是否新寫入"""
+        settings = get_settings()
+        now = utcnow()
+        values = {
+            "id": uuid.uuid4(),
+            "chat_id": str(chat_id),
+            "dedupe_key": dedupe_key or default_dedupe_key(text, reply_markup, now),
+            "text": text,
+            "reply_markup": reply_markup,
+            "parse_mode": parse_mode,
+            "disable_notification": disable_notification,
+            "digestible": digestible,
+            "status": "pending",
+            "attempts": 0,
+            "created_at": now,
+            "available_at": now + timedelta(seconds=settings.telegram_digest_window_seconds if digestible else 0),
+        }
+        async with self._session() as session:
+            insert = postgresql_insert if session.bind.dialect.name == "postgresql" else sqlite_insert
+            result = await session.execute(
+                insert(TelegramOutboxRow)
+                .values(values)
+                .on_conflict_do_nothing(index_elements=["chat_id", "dedupe_key"])
+            )
+            await session.commit()
+        return bool(result.rowcount)
+
+    async def dispatch(self, limit: int = 500, now: Optional[datetime] = None) -> Dict[str, int]:
+        """
+        派發到期的通知，返回統計
+
+        sent: 成功的通知數；messages: 實際發出的消息數（摘要分塊後）；
+        retried / failed: 推遲重發 / 超過最大次數放棄的通知數
+        """
+        now = now or utcnow()
+        items = await self._claim(limit, now)
+        stats = {"sent": 0, "messages": 0, "retried": 0, "failed": 0}
+
+        by_chat: Dict[str, List[OutboxItem]] = {}
+        for item in items:
+            by_chat.setdefault(item.chat_id, []).append(item)
+
+        # 各 chat 並行（各自的令牌桶），同一 chat 內按順序發送
+        await asyncio.gather(*(
+            self._dispatch_chat(chat_id, chat_items, stats, now)
+            for chat_id, chat_items in by_chat.items()
+        ))
+
+        await self._purge(now)
+        if items:
+            logger.info(f"Telegram Outbox 派發: {stats}")
+        return stats
+
+    async def _dispatch_chat(
+        self, chat_id: str, items: List[OutboxItem], stats: Dict[str, int], now: datetime
+    ) -> None:
+        groups = build_digests(items)
+        for index, group in enumerate(groups):
+            try:
+                stats["messages"] += await self._deliver(chat_id, group)
+            except Exception as e:
+                retry_after = e.retry_after if isinstance(e, DeliveryError) else 0.0
+                failed = await self._mark_retry(group, str(e), retry_after, now)
+                stats["failed"] += failed
+                stats["retried"] += len(group) - failed
+                logger.warning(f"Telegram Outbox 投遞失敗 (chat={chat_id}, {len(group)} 則): {e}")
+                if retry_after:
+                    # 該 chat 被限流：其餘未嘗試的通知原樣放回，限流結束後再派發
+                    rest = [item for later in groups[index + 1:] for item in later]
+                    await self._release(rest, now + timedelta(seconds=retry_after))
+                    return
+                continue
+            await self._mark_sent(group)
+            stats["sent"] += len(group)
+
+    async def _claim(self, limit: int, now: datetime) -> List[OutboxItem]:
+        """
+        認領有通知到期的 chat 的全部待發通知
+
+        同一 chat 中尚未到期、也未被認領過的通知一併帶上（合併進本次摘要）；
+        已被其他 worker 租約認領或在退避中的通知不動
+        """
+        ready_chats = (
+            select(TelegramOutboxRow.chat_id)
+            .where(TelegramOutboxRow.status == "pending", TelegramOutboxRow.available_at <= now)
+            .distinct()
+        )
+        async with self._session() as session:
+            result = await session.execute(
+                select(TelegramOutboxRow)
+                .where(
+                    TelegramOutboxRow.status == "pending",
+                    TelegramOutboxRow.chat_id.in_(ready_chats),
+                    or_(
+                        TelegramOutboxRow.available_at <= now,
+                        TelegramOutboxRow.claimed_at.is_(None),
+                    ),
+                )
+                .order_by(TelegramOutboxRow.created_at)
+                .limit(limit)
+                .with_for_update(skip_locked=True)
+            )
+            items = []
+            for row in result.scalars().all():
+                row.attempts += 1
+                row.claimed_at = now
+                row.available_at = now + timedelta(seconds=LEASE_SECONDS)
+                items.append(OutboxItem(
+                    id=row.id,
+                    chat_id=row.chat_id,
+                    text=row.text,
+                    reply_markup=row.reply_markup,
+                    parse_mode=row.parse_mode,
+                    disable_notification=row.disable_notification,
+                    digestible=row.digestible,
+                    attempts=row.attempts,
+                ))
+            await session.commit()
+        return items
+
+    async def _deliver(self, chat_id: str, group: List[OutboxItem]) -> int:
+        """發送一組通知（超長時按 HTML 安全邊界分塊，按鈕附在最後一塊），返回消息數"""
+        notifier = self._notifier or get_telegram_notifier()
+        text, reply_markup = render_digest(group)
+        chunks = split_html(text)
+        for index, chunk in enumerate(chunks):
+            payload: Dict[str, Any] = {
+                "chat_id": chat_id,
+                "text": chunk,
+                "parse_mode": group[0].parse_mode,
+                "disable_notification": all(item.disable_notification for item in group),
+            }
+            if reply_markup and index == len(chunks) - 1:
+                payload["reply_markup"] = reply_markup
+            result = await notifier.sender.call("sendMessage", payload)
+            if not result.get("ok"):
+                raise DeliveryError(
+                    result.get("description") or result.get("error") or "發送失敗",
+                    retry_after=float(result.get("retry_after") or 0),
+                )
+        return len(chunks)
+
+    async def _mark_sent(self, group: List[OutboxItem]) -> None:
+        async with self._session() as session:
+            await session.execute(
+                update(TelegramOutboxRow)
+                .where(TelegramOutboxRow.id.in_([item.id for item in group]))
+                .values(status="sent", sent_at=utcnow(), last_error=None)
+            )
+            await session.commit()
+
+    async def _mark_retry(
+        self, group: List[OutboxItem], error: str, retry_after: float, now: datetime
+    ) -> int:
+        """推遲重發（退避與 retry_after 取大者）；超過最大次數標記 failed，返回 failed 數"""
+        max_attempts = get_settings().telegram_outbox_max_attempts
+        failed = 0
+        async with self._session() as session:
+            for item in group:
+                values: Dict[str, Any] = {"last_error": error[:500]}
+                if item.attempts >= max_attempts:
+                    values["status"] = "failed"
+                    failed += 1
+                else:
+                    backoff = min(RETRY_BASE_SECONDS * 2 ** (item.attempts - 1), RETRY_MAX_SECONDS)
+                    values["available_at"] = now + timedelta(seconds=max(backoff, retry_after))
+                await session.execute(
+                    update(TelegramOutboxRow).where(TelegramOutboxRow.id == item.id).values(**values)
+                )
+            await session.commit()
+        return failed
+
+    async def _release(self, items: List[OutboxItem], available_at: datetime) -> None:
+        """放回未嘗試發送的通知（撤銷認領時計入的 attempts）"""
+        if not items:
+            return
+        async with self._session() as session:
+            for item in items:
+                await session.execute(
+                    update(TelegramOutboxRow)
+                    .where(TelegramOutboxRow.id == item.id)
+                    .values(available_at=available_at, attempts=item.attempts - 1)
+                )
+            await session.commit()
+
+    async def _purge(self, now: datetime) -> None:
+        """清理保留期外的已完成記錄（同時釋放其去重鍵）"""
+        cutoff = now - timedelta(days=get_settings().telegram_outbox_retention_days)
+        async with self._session() as session:
+            await session.execute(
+                delete(TelegramOutboxRow).where(
+                    TelegramOutboxRow.status.in_(["sent", "failed"]),
+                    TelegramOutboxRow.created_at < cutoff,
+                )
+            )
+            await session.commit()
+
+
+# ==================== 單例訪問 ====================
+
+_outbox_instance: Optional[TelegramOutbox] = None
+
+
+def get_telegram_outbox() -> TelegramOutbox:
+    """獲取 Telegram Outbox 單例"""
+    global _outbox_instance
+    if _outbox_instance is None:
+        _outbox_instance = TelegramOutbox()
+    return _outbox_instance
@@ -6,15 +6,22 @@
 # 惠康搜索頁返回 HTTP 500，無法使用。
 # 改用「分類瀏覽 + 本地索引」策略：
 # 1. 先查本地索引（已爬取的 competitor_products）
-# 2. 索引為空時，自動爬取對應分類頁填充索引
-# 3. 用簡化關鍵詞 ILIKE 搜索本地索引
+# 2. 索引為空時，在後台並行爬取對應分類頁填充索引（不阻塞匹配請求）
+# 3. 用簡化關鍵詞 ILIKE 搜索本地索引（一次查詢選出最精確且有命中的關鍵詞層級，
+#    按 pg_trgm word_similarity / similarity 排序）
 # =============================================
 
 import re
+import json
+import time
+import uuid
+import asyncio
 import logging
-from typing import List, Optional, Set
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
 
-from sqlalchemy import select, func
+from sqlalchemy import Float, cast, exists, func, literal, select, union_all
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.connectors.wellcome_client import (
@@ -25,6 +32,7 @@ from app.connectors.wellcome_client import (
 )
 from app.connectors.agent_browser import get_agent_browser_connector
 from app.config import get_settings
+from app.models.database import utcnow
 
 logger = logging.getLogger(__name__)
 
@@ -60,6 +68,9 @@ ALL_CATEGORIES = {
     "100015-100183": "海鮮",
 }
 
+# 分類爬取水位（SystemSetting key 前綴 + category_id）
+WATERMARK_KEY_PREFIX = "wellcome.crawl.watermark."
+
 # 日本產地/等級前綴（搜索惠康時應移除）
 _ORIGIN_PATTERNS = [
     r'北海道', r'宮崎', r'鹿兒島', r'青森', r'岩手',
@@ -77,15 +88,17 @@ class WellcomeSearchStrategy:
 
     優先級：
     1. 本地索引（查詢 competitor_products 表，~50ms）
-    2. 自動爬取分類頁填充索引 → 再搜本地索引（~60s，首次）
+    2. 索引不足時後台爬取分類頁填充索引（首次，進度見 PipelineTask）
     """
 
     LOCAL_MIN_RESULTS = 3
     CATEGORY_URL = "https://www.wellcome.com.hk/en/category/{category_id}/{page}.html"
 
-    def __init__(self):
+    def __init__(self, session_factory=None):
         self.http_client = get_wellcome_http_client()
         self.agent_browser = get_agent_browser_connector()
+        # 後台爬取用的 session 工廠（默認 async_session_maker，測試可替換）
+        self._session_factory = session_factory
 
     # =============================================
     # 關鍵詞簡化（適配惠康商品名稱）
@@ -142,49 +155,74 @@ class WellcomeSearchStrategy:
         """
         從本地 competitor_products 表搜索已爬取的惠康商品
 
-        用簡化關鍵詞逐層搜索，精確 → 寬泛
+        簡化關鍵詞按精確 → 寬泛分層，一次查詢完成：
+        - 每層用 EXISTS 探測是否有命中（走 name 的 trigram 索引，命中即停）
+        - 取最精確的有命中層，只返回該層的商品（與逐層查詢、命中即停的語義一致）
+        - 層內按 word_similarity / similarity 降序，分數寫入 WellcomeProduct.score
         """
         from app.models.competitor import Competitor, CompetitorProduct
 
         keywords = self.simplify_keyword(keyword)
-        seen_urls: Set[str] = set()
-        products: List[WellcomeProduct] = []
-
-        for kw in keywords:
-            if len(products) >= limit:
-                break
+        name = CompetitorProduct.name
 
-            search_pattern = f"%{kw}%"
-            stmt = (
-                select(CompetitorProduct)
+        def wellcome_products():
+            return (
+                select(CompetitorProduct.id)
                 .join(Competitor, CompetitorProduct.competitor_id == Competitor.id)
                 .where(
                     Competitor.platform == "wellcome",
                     CompetitorProduct.is_active == True,
-                    CompetitorProduct.name.ilike(search_pattern),
                 )
-                .limit(limit - len(products))
             )
 
-            result = await db.execute(stmt)
-            rows = result.scalars().all()
+        # 有命中的關鍵詞層 → 取層級最小（最精確）的一層
+        tiers = union_all(*[
+            select(literal(i).label("tier"), literal(kw).label("keyword"))
+            .where(exists(wellcome_products().where(name.ilike(f"%{kw}%"))))
+            for i, kw in enumerate(keywords)
+        ]).subquery("tiers")
+        best = (
+            select(tiers.c.tier, tiers.c.keyword)
+            .order_by(tiers.c.tier)
+            .limit(1)
+            .cte("best_tier")
+        )
 
-            for row in rows:
-                if row.url not in seen_urls:
-                    seen_urls.add(row.url)
-                    products.append(WellcomeProduct(
-                        url=row.url,
-                        name=row.name,
-                        price=None,
-                        product_id=extract_product_id(row.url),
-                    ))
+        if db.bind.dialect.name == "postgresql":
+            word_score = func.word_similarity(best.c.keyword, name)
+            score = func.similarity(best.c.keyword, name)
+        else:
+            # 無 pg_trgm 時以關鍵詞佔名稱長度的比例近似（越短越貼近）
+            word_score = score = cast(func.length(best.c.keyword), Float) / func.length(name)
 
-            if products:
-                logger.info(
-                    f"wellcome 本地索引: keyword='{kw}' → {len(rows)} 命中"
-                )
-                break  # 找到結果就不用更寬泛的詞
+        stmt = (
+            wellcome_products()
+            .with_only_columns(
+                CompetitorProduct.url, name, best.c.tier, best.c.keyword,
+                word_score.label("word_score"),
+            )
+            .join(best, name.ilike(literal("%") + best.c.keyword + literal("%")))
+            .order_by(word_score.desc(), score.desc(), name, CompetitorProduct.id)
+            .limit(limit)
+        )
 
+        rows = (await db.execute(stmt)).all()
+        products = [
+            WellcomeProduct(
+                url=row.url,
+                name=row.name,
+                price=None,
+                product_id=extract_product_id(row.url),
+                score=float(row.word_score or 0),
+            )
+            for row in rows
+        ]
+
+        if rows:
+            logger.info(
+                f"wellcome 本地索引: keyword='{rows[0].keyword}' "
+                f"(tier {rows[0].tier}) → {len(rows)} 命中"
+            )
         logger.info(
             f"wellcome 本地索引搜索: original='{keyword}' → "
             f"keywords={keywords} → {len(products)} 商品"
@@ -206,7 +244,7 @@ class WellcomeSearchStrategy:
         根據商品分類，瀏覽對應的惠康分類頁填充本地索引
 
         惠康搜索頁返回 500，用分類瀏覽替代。
-        首次匹配時自動觸發，結果緩存在本地索引。
+        各分類並行爬取、各用獨立 session 並逐頁提交（db 參數保留兼容，不再使用）。
 
         Returns:
             新增的商品數量
@@ -216,37 +254,27 @@ class WellcomeSearchStrategy:
             logger.warning("wellcome 分類瀏覽: agent_browser 已禁用")
             return 0
 
-        # 確定要瀏覽哪些惠康分類
+        result = await self.crawl_categories(
+            self.resolve_categories(category_main, category_sub), max_pages=max_pages
+        )
+        return result["new"]
+
+    @staticmethod
+    def resolve_categories(category_main: str = "", category_sub: str = "") -> Dict[str, str]:
+        """商品分類 → 要瀏覽的惠康分類 {category_id: 名稱}；找不到映射時取全部重點分類"""
         category_ids = set()
         for key in [category_sub, category_main]:
             if key and key in CATEGORY_MAP:
                 category_ids.update(CATEGORY_MAP[key])
 
-        # 找不到映射時，爬取所有重點分類
         if not category_ids:
-            category_ids = set(ALL_CATEGORIES.keys())
             logger.info(
                 f"wellcome 分類瀏覽: 無分類映射 "
                 f"(main='{category_main}', sub='{category_sub}'), "
-                f"爬取全部 {len(category_ids)} 個分類"
+                f"爬取全部 {len(ALL_CATEGORIES)} 個分類"
             )
-
-        total_new = 0
-        for cat_id in category_ids:
-            cat_name = ALL_CATEGORIES.get(cat_id, cat_id)
-            try:
-                count = await self.crawl_category(
-                    db, cat_id, cat_name, max_pages=max_pages
-                )
-                total_new += count
-            except Exception as e:
-                logger.warning(f"wellcome 分類瀏覽失敗: {cat_name} - {e}")
-
-        if total_new > 0:
-            await db.commit()
-
-        logger.info(f"wellcome 分類瀏覽完成: 新增 {total_new} 商品")
-        return total_new
+            return dict(ALL_CATEGORIES)
+        return {cat_id: ALL_CATEGORIES.get(cat_id, cat_id) for cat_id in sorted(category_ids)}
 
     async def ensure_local_index(
         self,
@@ -255,7 +283,9 @@ class WellcomeSearchStrategy:
         category_sub: str = "",
     ) -> int:
         """
-        確保本地索引有惠康數據，沒有就自動爬取
+        確保本地索引有惠康數據，沒有就在後台啟動分類爬取
+
+        不在匹配請求內等待爬取：本次按現有索引匹配，爬取進度見 PipelineTask
 
         Returns:
             本地索引中的惠康商品總數
@@ -275,20 +305,142 @@ class WellcomeSearchStrategy:
         if count >= 10:
             return count
 
-        # 本地索引太少，自動爬取
-        logger.info(
-            f"wellcome 本地索引不足 ({count} 商品)，開始自動爬取分類頁"
-        )
-        new_count = await self.browse_category(
-            db, category_main, category_sub, max_pages=3
-        )
-
-        return count + new_count
+        if get_settings().agent_browser_enabled:
+            task_id = await self.start_crawl_job(category_main, category_sub, max_pages=3)
+            logger.info(
+                f"wellcome 本地索引不足 ({count} 商品)，已在後台爬取分類頁 (task {task_id})"
+            )
+        return count
 
     # =============================================
     # 後台任務：分類頁爬取
     # =============================================
 
+    async def start_crawl_job(
+        self,
+        category_main: str = "",
+        category_sub: str = "",
+        max_pages: int = 3,
+    ) -> str:
+        """
+        啟動後台分類爬取，立即返回 PipelineTask id
+
+        同一時間只跑一個爬取任務：已有任務在跑時直接返回它的 id
+        （檢查與登記在同一把鎖內，並發調用不會在寫入任務記錄期間各自啟動一次爬取）
+        """
+        global _crawl_job
+        from app.models.pipeline_task import PipelineTask
+
+        async with _crawl_job_lock:
+            if _crawl_job is not None and not _crawl_job[1].done():
+                return _crawl_job[0]
+
+            categories = self.resolve_categories(category_main, category_sub)
+            task_id = uuid.uuid4().hex[:8]
+            async with self.session_factory() as session:
+                session.add(PipelineTask(
+                    id=task_id,
+                    platform="wellcome",
+                    status="running",
+                    current_step="crawl",
+                    current_step_number=1,
+                    step_started_at=utcnow(),
+                    step_results={},
+                    step_errors={},
+                    step_durations={},
+                    progress={"current": 0, "total": len(categories), "message": "等待爬取", "categories": {}},
+                ))
+                await session.commit()
+
+            job = asyncio.create_task(self._run_crawl_job(task_id, categories, max_pages))
+            _crawl_job = (task_id, job)
+            return task_id
+
+    async def _run_crawl_job(self, task_id: str, categories: Dict[str, str], max_pages: int) -> None:
+        """後台執行分類爬取，每完成一個分類更新一次進度"""
+        started = time.monotonic()
+        done: Dict[str, dict] = {}
+
+        async def on_category(cat_name: str, stats: dict) -> None:
+            done[cat_name] = stats
+            await self._save_job(task_id, progress={
+                "current": len(done),
+                "total": len(categories),
+                "message": f"{cat_name} 完成",
+                "categories": dict(done),
+            })
+
+        try:
+            result = await self.crawl_categories(categories, max_pages=max_pages, on_category=on_category)
+            await self._save_job(
+                task_id,
+                status="done",
+                step_results={"crawl": result},
+                step_durations={"crawl": round(time.monotonic() - started, 1)},
+            )
+        except Exception as e:
+            logger.error(f"wellcome 分類爬取任務 {task_id} 失敗: {e}", exc_info=True)
+            await self._save_job(task_id, status="error", step_errors={"crawl": str(e)})
+
+    async def _save_job(self, task_id: str, **fields) -> None:
+        """更新任務狀態（獨立 session；寫入失敗不影響爬取）"""
+        from app.models.pipeline_task import PipelineTask
+
+        try:
+            async with self.session_factory() as session:
+                task = await session.get(PipelineTask, task_id)
+                if task:
+                    for key, value in fields.items():
+                        setattr(task, key, value)
+                    task.updated_at = utcnow()
+                    await session.commit()
+        except Exception as e:
+            logger.warning(f"wellcome 爬取任務 {task_id} 進度寫入失敗: {e}")
+
+    async def crawl_categories(
+        self,
+        categories: Dict[str, str],
+        max_pages: int = 5,
+        on_category: Optional[Callable[[str, dict], Awaitable[None]]] = None,
+    ) -> dict:
+        """
+        並行爬取多個惠康分類
+
+        - 分類之間並行，並發數由 wellcome_crawl_concurrency 限制（頁面再受瀏覽器頁面池限制）
+        - 每個分類用獨立 session、逐頁提交，單個分類失敗不影響其他分類
+
+        Returns:
+            {"new": 新增總數, "categories": {名稱: 單分類統計}}
+        """
+        async with self.session_factory() as session:
+            competitor_id = await self._ensure_competitor(session)
+            await session.commit()
+
+        slots = asyncio.Semaphore(max(1, get_settings().wellcome_crawl_concurrency))
+        results: Dict[str, dict] = {}
+
+        async def crawl_one(cat_id: str, cat_name: str) -> None:
+            async with slots:
+                try:
+                    async with self.session_factory() as session:
+                        stats = await self._crawl_category(
+                            session, cat_id, cat_name, max_pages, competitor_id
+                        )
+                except Exception as e:
+                    logger.warning(f"wellcome 分類瀏覽失敗: {cat_name} - {e}")
+                    stats = {"pages": 0, "new": 0, "updated": 0, "stopped_early": False, "error": str(e)}
+            results[cat_name] = stats
+            if on_category:
+                await on_category(cat_name, stats)
+
+        await asyncio.gather(*(
+            crawl_one(cat_id, cat_name or cat_id) for cat_id, cat_name in categories.items()
+        ))
+
+        total_new = sum(stats["new"] for stats in results.values())
+        logger.info(f"wellcome 分類瀏覽完成: {len(results)} 分類，新增 {total_new} 商品")
+        return {"new": total_new, "categories": results}
+
     async def crawl_category(
         self,
         db: AsyncSession,
@@ -297,21 +449,36 @@ class WellcomeSearchStrategy:
         max_pages: int = 5,
     ) -> int:
         """
-        爬取惠康分類頁面，填充本地索引
-
-        流程：
-        1. Playwright 導航分類頁
-        2. 提取所有產品 URL
-        3. 翻頁（最多 max_pages 頁）
-        4. HTTP GET JSON-LD 取詳情
-        5. 寫入 competitor_products 表
+        爬取單個惠康分類頁面，填充本地索引（逐頁提交）
 
         Returns:
-            寫入/更新的商品數量
+            新增的商品數量
         """
-        from app.models.competitor import Competitor, CompetitorProduct
+        competitor_id = await self._ensure_competitor(db)
+        stats = await self._crawl_category(db, category_id, category_name, max_pages, competitor_id)
+        return stats["new"]
+
+    async def _crawl_category(
+        self,
+        db: AsyncSession,
+        category_id: str,
+        category_name: str,
+        max_pages: int,
+        competitor_id: uuid.UUID,
+    ) -> dict:
+        """
+        逐頁爬取：Playwright 提取 URL → HTTP GET JSON-LD → upsert → 提交
+
+        已有水位（之前完整爬過）時為增量刷新：遇到整頁 URL 都已在庫的頁面即停止翻頁；
+        只有完整的一輪（翻到空頁，或增量刷新遇到全已知頁）才推進水位——
+        頁數上限截斷或中途失敗的爬取若建立水位，之後的增量刷新會在已爬過的頁停下，
+        後面的頁永遠補不回來
+        """
+        from app.models.competitor import CompetitorProduct
 
-        all_urls: Set[str] = set()
+        watermark = await self._get_watermark(db, category_id)
+        stats = {"pages": 0, "new": 0, "updated": 0, "stopped_early": False}
+        complete = False
 
         for page_num in range(1, max_pages + 1):
             page_url = self.CATEGORY_URL.format(
@@ -322,73 +489,152 @@ class WellcomeSearchStrategy:
                 urls = await self.agent_browser.discover_wellcome_products(
                     page_url, max_products=50
                 )
-                if not urls:
-                    break  # 空頁 = 已到末頁
-                all_urls.update(urls)
-                logger.info(
-                    f"wellcome 分類爬取: {category_name} "
-                    f"第{page_num}頁 → {len(urls)} URLs"
-                )
             except Exception as e:
                 logger.warning(
                     f"wellcome 分類爬取失敗: {category_name} "
                     f"第{page_num}頁 - {e}"
                 )
                 break
+            if not urls:
+                complete = True  # 空頁 = 已到末頁
+                break
 
-        if not all_urls:
-            return 0
-
-        # 批量取 JSON-LD
-        products = await self.http_client.batch_fetch_products(list(all_urls))
-        valid_products = [p for p in products if p.name]
+            page_urls = list(dict.fromkeys(normalize_url(url) for url in urls))
+            known = set((await db.execute(
+                select(CompetitorProduct.url).where(CompetitorProduct.url.in_(page_urls))
+            )).scalars())
 
-        # 獲取或創建 Wellcome Competitor
-        stmt = select(Competitor).where(
-            Competitor.platform == "wellcome"
-        ).limit(1)
-        result = await db.execute(stmt)
-        competitor = result.scalar_one_or_none()
-
-        if not competitor:
-            competitor = Competitor(
-                name="Wellcome 惠康",
-                platform="wellcome",
-                base_url="https://www.wellcome.com.hk",
-                is_active=True,
-            )
-            db.add(competitor)
-            await db.flush()
+            if watermark is not None and len(known) == len(page_urls):
+                stats["stopped_early"] = complete = True
+                logger.info(
+                    f"wellcome 分類爬取: {category_name} 第{page_num}頁全部已知，停止翻頁"
+                )
+                break
 
-        # 寫入 CompetitorProduct
-        count = 0
-        for p in valid_products:
-            normalized = normalize_url(p.url)
+            products = await self.http_client.batch_fetch_products(urls)
+            rows = {}
+            for p in products:
+                if p.name:
+                    rows[normalize_url(p.url)] = (p.name, p.product_id)
+            inserted = await self._upsert_products(db, competitor_id, rows)
+            await db.commit()
 
-            stmt = select(CompetitorProduct).where(
-                CompetitorProduct.url == normalized
+            # 按實際插入計數：並行分類同時見到同一新 URL 時只有一方算新增
+            stats["pages"] += 1
+            stats["new"] += len(inserted)
+            stats["updated"] += len(rows) - len(inserted)
+            logger.info(
+                f"wellcome 分類爬取: {category_name} "
+                f"第{page_num}頁 → {len(page_urls)} URLs, {len(inserted)} 新商品"
             )
-            result = await db.execute(stmt)
-            existing = result.scalar_one_or_none()
-
-            if existing:
-                existing.name = p.name
-                existing.sku = p.product_id
-            else:
-                cp = CompetitorProduct(
-                    competitor_id=competitor.id,
-                    name=p.name,
-                    url=normalized,
-                    sku=p.product_id,
-                    is_active=True,
-                )
-                db.add(cp)
-                count += 1
 
-        await db.flush()
+        if complete:
+            await self._set_watermark(db, category_id, stats)
+            await db.commit()
 
         logger.info(
             f"wellcome 分類爬取完成: {category_name} → "
-            f"{len(all_urls)} URLs → {count} 新商品"
+            f"{stats['pages']} 頁, {stats['new']} 新商品"
         )
-        return count
+        return stats
+
+    async def _ensure_competitor(self, db: AsyncSession) -> uuid.UUID:
+        """獲取或創建 Wellcome Competitor"""
+        from app.models.competitor import Competitor
+
+        stmt = select(Competitor.id).where(
+            Competitor.platform == "wellcome"
+        ).limit(1)
+        competitor_id = (await db.execute(stmt)).scalar_one_or_none()
+        if competitor_id:
+            return competitor_id
+
+        competitor = Competitor(
+            name="Wellcome 惠康",
+            platform="wellcome",
+            base_url="https://www.wellcome.com.hk",
+            is_active=True,
+        )
+        db.add(competitor)
+        await db.flush()
+        return competitor.id
+
+    @staticmethod
+    async def _upsert_products(
+        db: AsyncSession,
+        competitor_id: uuid.UUID,
+        rows: Dict[str, Tuple[str, Optional[str]]],
+    ) -> Set[str]:
+        """
+        按 URL 批量 upsert（url → (名稱, sku)），返回本次新插入的 URL
+
+        - 多個分類並行時同一商品可能同時出現在兩個分類，ON CONFLICT 保證不會撞唯一鍵
+        - 行按 URL 排序：並行事務按相同順序加鎖，避免互相等待對方已鎖的行而死鎖
+        - 衝突更新不改 created_at，RETURNING 的 created_at 等於本次時間戳即為新插入
+        """
+        from app.models.competitor import CompetitorProduct
+
+        if not rows:
+            return set()
+        now = utcnow()
+        insert = postgresql_insert if db.bind.dialect.name == "postgresql" else sqlite_insert
+        stmt = insert(CompetitorProduct).values([
+            {
+                "id": uuid.uuid4(),
+                "competitor_id": competitor_id,
+                "name": name,
+                "url": url,
+                "sku": sku,
+                "is_active": True,
+                "created_at": now,
+                "updated_at": now,
+            }
+            for url, (name, sku) in sorted(rows.items())
+        ])
+        result = await db.execute(stmt.on_conflict_do_update(
+            index_elements=["url"],
+            set_={"name": stmt.excluded.name, "sku": stmt.excluded.sku, "updated_at": now},
+        ).returning(CompetitorProduct.url, CompetitorProduct.created_at))
+        return {url for url, created_at in result if created_at == now}
+
+    # =============================================
+    # 分類爬取水位
+    # =============================================
+
+    @staticmethod
+    async def _get_watermark(db: AsyncSession, category_id: str) -> Optional[dict]:
+        from app.models.system import SystemSetting
+
+        setting = await db.get(SystemSetting, WATERMARK_KEY_PREFIX + category_id)
+        return json.loads(setting.value) if setting else None
+
+    @staticmethod
+    async def _set_watermark(db: AsyncSession, category_id: str, stats: dict) -> None:
+        """記錄本次完整爬取的時間和頁數；沒爬到任何頁面（空分類）時不建立水位"""
+        from app.models.system import SystemSetting
+
+        key = WATERMARK_KEY_PREFIX + category_id
+        setting = await db.get(SystemSetting, key)
+        if setting is None:
+            if not stats["pages"]:
+                return
+            setting = SystemSetting(key=key, description="惠康分類爬取水位（增量刷新遇到全已知頁即停）")
+            db.add(setting)
+        setting.value = json.dumps({
+            "crawled_at": utcnow().isoformat(),
+            "pages": stats["pages"],
+            "new": stats["new"],
+            "stopped_early": stats["stopped_early"],
+        })
+
+    @property
+    def session_factory(self):
+        if self._session_factory is None:
+            from app.models.database import async_session_maker
+            return async_session_maker
+        return self._session_factory
+
+
+# 進程內正在運行的後台爬取任務 (task_id, asyncio.Task)
+_crawl_job: Optional[Tuple[str, asyncio.Task]] = None
+_crawl_job_lock = asyncio.Lock()
@@ -188,35 +188,19 @@ async def daily_catalog_sync_async() -> dict:
 # ==================== 惠康分類爬取 ====================
 
 async def crawl_wellcome_categories_async() -> dict:
-    """定期爬取惠康重點分類"""
+    """定期爬取惠康重點分類（分類並行、逐頁提交；已有水位的分類只刷新到全已知頁為止）"""
     logger.info("開始惠康分類爬取")
 
-    from app.models.database import async_session_maker
     from app.services.wellcome_strategy import WellcomeSearchStrategy, ALL_CATEGORIES
 
     strategy = WellcomeSearchStrategy()
-    total_new = 0
-
-    async with async_session_maker() as session:
-        try:
-            for cat_id, cat_name in ALL_CATEGORIES.items():
-                try:
-                    count = await strategy.crawl_category(
-                        db=session,
-                        category_id=cat_id,
-                        category_name=cat_name,
-                        max_pages=5,
-                    )
-                    total_new += count
-                    logger.info(f"惠康分類 [{cat_name}]: 新增 {count} 商品")
-                except Exception as e:
-                    logger.error(f"惠康分類 [{cat_name}] 爬取失敗: {e}")
-
-            await session.commit()
-        except Exception as e:
-            logger.error(f"惠康分類爬取事務失敗: {e}")
-            await session.rollback()
-            raise
+    crawl = await strategy.crawl_categories(ALL_CATEGORIES, max_pages=5)
+    total_new = crawl["new"]
+    for cat_name, stats in crawl["categories"].items():
+        if "error" in stats:
+            logger.error(f"惠康分類 [{cat_name}] 爬取失敗: {stats['error']}")
+        else:
+            logger.info(f"惠康分類 [{cat_name}]: 新增 {stats['new']} 商品")
 
     result = {
         "status": "completed",
@@ -0,0 +1,18 @@
+# =============================================
+# 分析數據維護任務（純 async，無 Celery 依賴）
+# =============================================
+
+import logging
+
+from app.models.database import async_session_maker
+from app.services.dashboard_counters import reconcile_dashboard_counters
+
+logger = logging.getLogger(__name__)
+
+
+async def reconcile_dashboard_counters_async() -> dict:
+    """按源表重算儀表板計數器，修正增量維護的漂移"""
+    async with async_session_maker() as db:
+        drift = await reconcile_dashboard_counters(db)
+        await db.commit()
+    return {"drift": {column: str(delta) for column, delta in drift.items()}}
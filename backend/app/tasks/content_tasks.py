@@ -5,7 +5,7 @@
 import asyncio
 import logging
 from uuid import UUID
-from typing import List
+from typing import List, Optional
 
 logger = logging.getLogger(__name__)
 
@@ -116,3 +116,40 @@ async def batch_generate_content_async(
         "total": len(product_ids),
         "tasks_created": len(tasks),
     }
+
+
+async def generate_geo_packages_async(
+    batch_id: str,
+    product_ids: Optional[List[str]] = None,
+    concurrency: Optional[int] = None,
+    max_faqs: int = 5,
+    claimed: bool = False,
+):
+    """
+    全目錄 GEO/SEO 打包生成（可續傳，進度見 GEOPackageService.load_progress）
+
+    Args:
+        batch_id: 批次 ID（已存在時從游標續傳）
+        product_ids: 商品 UUID 列表（None = 全部商品）
+        concurrency: 並發產品數
+        max_faqs: 每個商品的 FAQ 數量上限
+        claimed: 調用方是否已認領該批次（GEOPackageService.claim_batch）
+    """
+    from app.models.database import async_session_maker
+    from app.services.geo_package_service import GEOPackageService
+
+    async with async_session_maker() as db:
+        service = await GEOPackageService.create(db, session_factory=async_session_maker)
+        try:
+            progress = await service.run_batch(
+                batch_id=batch_id,
+                product_ids=[UUID(pid) for pid in product_ids] if product_ids else None,
+                concurrency=concurrency,
+                max_faqs=max_faqs,
+                claimed=claimed,
+            )
+        except Exception as e:
+            logger.error(f"GEO 打包批量 {batch_id} 中斷: {e}", exc_info=True)
+            return {"batch_id": batch_id, "error": str(e)}
+
+    return progress.to_dict()
@@ -0,0 +1,14 @@
+# =============================================
+# 通知派發任務（純 async，無 Celery 依賴）
+# =============================================
+
+import logging
+
+from app.services.telegram_outbox import get_telegram_outbox
+
+logger = logging.getLogger(__name__)
+
+
+async def dispatch_telegram_outbox_async() -> dict:
+    """派發 Telegram Outbox 中到期的通知（摘要合併 + 限速）"""
+    return await get_telegram_outbox().dispatch()
@@ -66,6 +66,24 @@ async def track_single_keyword_async(keyword_config_id: str) -> dict:
         }
 
 
+async def backfill_ranking_rollups_async(days: Optional[int] = 2) -> dict:
+    """
+    按排名記錄重算日匯總（可重複執行）
+
+    每日對最近幾天對賬，修正繞過 track_keyword 寫入的排名；days=None 為全量回填
+    """
+    from app.services.seo_ranking_rollup import backfill_ranking_rollups
+
+    # 匯總按 UTC 日期
+    since = datetime.utcnow().date() - timedelta(days=days) if days is not None else None
+    async with async_session_maker() as db:
+        rows = await backfill_ranking_rollups(db, since=since)
+        await db.commit()
+
+    logger.info(f"排名日匯總重算完成: since={since}, {rows} 行")
+    return {"since": since.isoformat() if since else None, "rows": rows}
+
+
 # =============================================
 # 報告生成
 # =============================================
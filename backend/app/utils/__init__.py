@@ -5,13 +5,17 @@
 from app.utils.unit_price import (
     UnitPriceCalculator,
     UnitInfo,
+    QuantityArrays,
     calculate_unit_price,
     extract_quantity,
+    extract_quantities,
 )
 
 __all__ = [
     'UnitPriceCalculator',
     'UnitInfo',
+    'QuantityArrays',
     'calculate_unit_price',
     'extract_quantity',
+    'extract_quantities',
 ]
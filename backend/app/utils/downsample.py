@@ -0,0 +1,54 @@
+# =============================================
+# 時間序列降採樣（LTTB）
+# =============================================
+# Largest-Triangle-Three-Buckets：保留首尾點，中間每個桶選出與
+# 「上一個選中點 + 下一桶均值點」組成三角形面積最大的點。
+# 比等距抽樣更能保住價格的峰谷（促銷價、缺貨前的跳價）。
+
+from typing import Sequence
+
+import numpy as np
+
+
+def lttb_indices(x: Sequence[float], y: Sequence[float], threshold: int) -> np.ndarray:
+    """
+    返回 LTTB 選中點的下標（升序）
+
+    Args:
+        x: 橫軸（時間戳，需已升序）
+        y: 縱軸（價格）
+        threshold: 最多保留的點數（< 3 或不少於原點數時原樣返回）
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    xs = np.asarray(x, dtype=np.float64)
+    ys = np.asarray(y, dtype=np.float64)
+
+    # 首尾之外的 n - 2 個點分成 threshold - 2 個桶
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    prev = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        # 下一桶的均值點（最後一桶用終點）
+        if i + 2 < len(edges):
+            next_start, next_end = edges[i + 1], edges[i + 2]
+            avg_x = xs[next_start:next_end].mean()
+            avg_y = ys[next_start:next_end].mean()
+        else:
+            avg_x, avg_y = xs[-1], ys[-1]
+
+        # 三角形面積（省略 1/2 常數）
+        area = np.abs(
+            (xs[prev] - avg_x) * (ys[start:end] - ys[prev])
+            - (xs[prev] - xs[start:end]) * (avg_y - ys[prev])
+        )
+        prev = start + int(area.argmax())
+        selected[i + 1] = prev
+
+    return selected
@@ -5,9 +5,34 @@
 
 import re
 from decimal import Decimal, ROUND_HALF_UP
-from typing import Optional, Tuple
+from functools import lru_cache
+from typing import Iterable, NamedTuple, Optional, Tuple
 from dataclasses import dataclass
 
+import numpy as np
+
+# 同名商品重複出現（價格總覽、匹配器掃全量目錄）時的解析結果緩存
+QUANTITY_CACHE_SIZE = 65536
+
+_MULTI_UNITS = r'g|kg|ml|l|克|公斤|毫升|升'
+
+# 單次掃描的合併正則：按優先級排列的四個分支
+# 同一位置先試優先級高的分支；不同位置的候選按優先級取最高、同優先級取最左
+_QUANTITY_PATTERN = re.compile(
+    # 1. 多件裝：500g x 2、500g*2
+    rf'(?P<multi_value>\d+(?:\.\d+)?)\s*(?P<multi_unit>{_MULTI_UNITS})\s*[x×*]\s*(?P<multi_count>\d+)'
+    # 2. 括號件數：500g(2入)、500g（2件）
+    rf'|(?P<pack_value>\d+(?:\.\d+)?)\s*(?P<pack_unit>{_MULTI_UNITS})\s*[（(](?P<pack_count>\d+)[入件個包片)）]'
+    # 3. 重量
+    r'|(?P<weight_value>\d+(?:\.\d+)?)\s*(?P<weight_unit>kg|g|gm|mg|公斤|克|毫克)'
+    # 4. 容量
+    r'|(?P<volume_value>\d+(?:\.\d+)?)\s*(?P<volume_unit>l|ml|L|ML|cc|升|公升|毫升)',
+    re.IGNORECASE,
+)
+_BRANCHES = ('multi', 'pack', 'weight', 'volume')
+# 每個分支最後閉合的組名 -> 優先級
+_BRANCH_RANK = {'multi_count': 0, 'pack_count': 1, 'weight_unit': 2, 'volume_unit': 3}
+
 
 @dataclass
 class UnitInfo:
@@ -81,36 +106,11 @@ class UnitPriceCalculator:
         if not text:
             return None
 
-        # 先處理多件裝格式：500g x 2 或 500g*2
-        multi_patterns = [
-            r'(\d+(?:\.\d+)?)\s*(g|kg|ml|l|克|公斤|毫升|升)\s*[x×*]\s*(\d+)',
-            r'(\d+(?:\.\d+)?)\s*(g|kg|ml|l|克|公斤|毫升|升)\s*[（(](\d+)[入件個包片)）]',
-        ]
-
-        for pattern in multi_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                value = Decimal(match.group(1))
-                unit = match.group(2).lower()
-                count = int(match.group(3))
-                total_value = value * count
-                return cls._create_unit_info(total_value, unit)
-
-        # 標準單個單位格式
-        # 先嘗試匹配帶小數的數字
-        patterns = [
-            r'(\d+(?:\.\d+)?)\s*(kg|g|gm|mg|公斤|克|毫克)',  # 重量
-            r'(\d+(?:\.\d+)?)\s*(l|ml|L|ML|cc|升|公升|毫升)',  # 容量
-        ]
-
-        for pattern in patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                value = Decimal(match.group(1))
-                unit = match.group(2).lower()
-                return cls._create_unit_info(value, unit)
-
-        return None
+        parsed = _parse_quantity(text)
+        if parsed is None:
+            return None
+        value, unit, normalized, unit_type = parsed
+        return UnitInfo(value=value, unit=unit, normalized_value=normalized, unit_type=unit_type)
 
     @classmethod
     def _create_unit_info(cls, value: Decimal, unit: str) -> Optional[UnitInfo]:
@@ -187,6 +187,65 @@ class UnitPriceCalculator:
             return f"HK${unit_price}"
 
 
+# =============================================
+# 單次掃描解析與批量接口
+# =============================================
+
+@lru_cache(maxsize=QUANTITY_CACHE_SIZE)
+def _parse_quantity(text: str) -> Optional[Tuple[Decimal, str, Decimal, str]]:
+    """
+    一次 finditer 掃描全部候選，返回 (value, unit, normalized_value, unit_type)
+
+    優先級與逐條 re.search 一致：多件裝 > 括號件數 > 重量 > 容量，同優先級取最左；
+    結果為不可變元組，可安全緩存
+    """
+    best_rank, best = len(_BRANCHES), None
+    for match in _QUANTITY_PATTERN.finditer(text):
+        rank = _BRANCH_RANK[match.lastgroup]
+        if rank < best_rank:
+            best_rank, best = rank, match
+            if rank == 0:
+                break
+    if best is None:
+        return None
+
+    name = _BRANCHES[best_rank]
+    value = Decimal(best.group(f'{name}_value'))
+    unit = best.group(f'{name}_unit').lower()
+    if best_rank < 2:
+        value *= int(best.group(f'{name}_count'))
+
+    if unit in UnitPriceCalculator.WEIGHT_UNITS:
+        return value, unit, value * UnitPriceCalculator.WEIGHT_UNITS[unit], 'per_100g'
+    if unit in UnitPriceCalculator.VOLUME_UNITS:
+        return value, unit, value * UnitPriceCalculator.VOLUME_UNITS[unit], 'per_100ml'
+    return None
+
+
+class QuantityArrays(NamedTuple):
+    """批量解析結果：按輸入順序的標準化克數 / 毫升數，未識別或不適用處為 NaN"""
+    grams: np.ndarray
+    ml: np.ndarray
+
+
+def extract_quantities(names: Iterable[Optional[str]]) -> QuantityArrays:
+    """
+    批量提取數量（價格總覽、匹配器對整個目錄調用）
+
+    重量商品填 grams、容量商品填 ml；同名商品命中 LRU 緩存
+    """
+    names = list(names)
+    grams = np.full(len(names), np.nan)
+    ml = np.full(len(names), np.nan)
+    for i, name in enumerate(names):
+        parsed = _parse_quantity(name) if name else None
+        if parsed is None:
+            continue
+        target = grams if parsed[3] == 'per_100g' else ml
+        target[i] = float(parsed[2])
+    return QuantityArrays(grams=grams, ml=ml)
+
+
 # =============================================
 # 便捷函數
 # =============================================
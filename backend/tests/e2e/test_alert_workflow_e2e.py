@@ -400,10 +400,10 @@ class TestTelegramNotification:
             notifier.api_url = "https://api.telegram.org/botTEST"
             notifier.chat_id = "123456"
 
-            with patch("httpx.AsyncClient.post") as mock_post:
-                mock_response = MagicMock()
-                mock_response.json.return_value = {"ok": True, "result": {"message_id": 100}}
-                mock_post.return_value = mock_response
+            # 告警通知寫入 Outbox，由排程合併限速派發
+            with patch("app.services.telegram_outbox.get_telegram_outbox") as mock_get_outbox:
+                mock_enqueue = AsyncMock(return_value=True)
+                mock_get_outbox.return_value.enqueue = mock_enqueue
 
                 analysis = {
                     "impact_assessment": "高影響：競爭對手大幅調價",
@@ -416,15 +416,15 @@ class TestTelegramNotification:
                     include_action_buttons=True
                 )
 
-                # 驗證 API 被調用
-                assert mock_post.called
+                # 驗證已入隊
+                assert mock_enqueue.called
+                assert result["ok"] is True
 
-                # 獲取調用參數
-                call_kwargs = mock_post.call_args
-                payload = call_kwargs.kwargs.get("json", {})
+                # 獲取入隊參數
+                payload = mock_enqueue.call_args.kwargs
 
                 # 驗證消息包含按鈕
-                assert "reply_markup" in payload
+                assert payload.get("reply_markup")
                 assert "inline_keyboard" in payload["reply_markup"]
 
     @pytest.mark.asyncio
@@ -438,10 +438,9 @@ class TestTelegramNotification:
             notifier.api_url = "https://api.telegram.org/botTEST"
             notifier.chat_id = "123456"
 
-            with patch("httpx.AsyncClient.post") as mock_post:
-                mock_response = MagicMock()
-                mock_response.json.return_value = {"ok": True, "result": {"message_id": 101}}
-                mock_post.return_value = mock_response
+            with patch("app.services.telegram_outbox.get_telegram_outbox") as mock_get_outbox:
+                mock_enqueue = AsyncMock(return_value=True)
+                mock_get_outbox.return_value.enqueue = mock_enqueue
 
                 proposal = {
                     "id": str(uuid4()),
@@ -454,9 +453,8 @@ class TestTelegramNotification:
                     include_action_buttons=True
                 )
 
-                # 獲取調用參數
-                call_kwargs = mock_post.call_args
-                payload = call_kwargs.kwargs.get("json", {})
+                # 獲取入隊參數
+                payload = mock_enqueue.call_args.kwargs
 
                 # 驗證消息包含批准/拒絕按鈕
                 keyboard = payload.get("reply_markup", {}).get("inline_keyboard", [])
@@ -0,0 +1,161 @@
+"""Agent 對話狀態：窗口載入 + 滾動摘要、用戶訊息先行提交、槽位無損往返"""
+import json
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.models.agent_db import AgentConversation, AgentMessage as DBAgentMessage
+from app.services.agent.agent_service_db import AgentService, ResponseType
+from app.services.agent.intent_classifier import IntentType
+from app.services.agent.slot_manager import AnalysisSlots, ProductDetail
+
+
+def _slots() -> AnalysisSlots:
+    return AnalysisSlots(
+        products=["和牛", "海膽"],
+        product_details={
+            "和牛": ProductDetail(
+                parts=["西冷", "肉眼"], origin=["日本"], brands=["宮崎"],
+                price_range=(200.0, 800.5), grades=["A5"],
+            ),
+            "海膽": ProductDetail(types=["馬糞海膽"]),
+        },
+        time_range="7d",
+        analysis_dimensions=["price_trend"],
+        include_competitors=False,
+        competitor_ids=["c-1", "c-2"],
+        output_format="chart",
+    )
+
+
+async def _seed_history(db: AsyncSession, count: int) -> AgentConversation:
+    conv = AgentConversation(title="舊對話", slots=_slots().to_dict(), current_intent="price_analysis")
+    db.add(conv)
+    await db.flush()
+    start = datetime(2026, 10, 1)
+    db.add_all(
+        DBAgentMessage(
+            conversation_id=conv.id, role="user" if i % 2 == 0 else "assistant",
+            content=f"第 {i} 條訊息\n詳細內容", created_at=start + timedelta(minutes=i),
+        )
+        for i in range(count)
+    )
+    await db.commit()
+    return conv
+
+
+class _Recorder:
+    """記錄 session 的提交次數與發出的 SQL"""
+
+    def __init__(self, db: AsyncSession):
+        self.commits = 0
+        self.statements: list[str] = []
+        self._session, self._engine = db.sync_session, db.bind.sync_engine
+        event.listen(self._session, "after_commit", self._on_commit)
+        event.listen(self._engine, "before_cursor_execute", self._on_execute)
+
+    def _on_commit(self, session):
+        self.commits += 1
+
+    def _on_execute(self, conn, cursor, statement, *args):
+        self.statements.append(statement)
+
+    def close(self):
+        event.remove(self._session, "after_commit", self._on_commit)
+        event.remove(self._engine, "before_cursor_execute", self._on_execute)
+
+
+async def _run(service: AgentService, message: str, conversation_id=None) -> list:
+    return [r async for r in service.process_message(message, conversation_id)]
+
+
+class TestSlotSerialization:
+
+    def test_analysis_slots_round_trip_through_json(self):
+        slots = _slots()
+
+        restored = AnalysisSlots.from_dict(json.loads(json.dumps(slots.to_dict())))
+
+        assert restored == slots
+        assert AnalysisSlots.from_dict(None) == AnalysisSlots()
+
+
+class TestConversationTurns:
+
+    @pytest.mark.asyncio
+    async def test_turn_loads_window_and_folds_summary(self, db_session: AsyncSession, monkeypatch):
+        monkeypatch.setattr(settings, "agent_history_window", 8)
+        conv_id = (await _seed_history(db_session, 40)).id
+        service = AgentService(db_session)
+        recorder = _Recorder(db_session)
+        try:
+            responses = await _run(service, "hello", str(conv_id))
+        finally:
+            recorder.close()
+
+        assert responses[-1].type == ResponseType.MESSAGE
+        # 用戶訊息 → 助手回覆 → 滾動摘要
+        assert recorder.commits == 3
+        message_selects = [s for s in recorder.statements if s.lstrip().startswith("SELECT") and "agent_messages" in s]
+        assert len(message_selects) == 1 and "LIMIT" in message_selects[0]
+
+        state = responses[-1].state
+        assert [m.content for m in state.messages[:6]] == [f"第 {i} 條訊息\n詳細內容" for i in range(34, 40)]
+        assert len(state.messages) == 8 and state.messages[-2].content == "hello"
+        # 兩條新訊息把窗口最舊的兩條擠進摘要
+        assert state.summary == "用戶: 第 32 條訊息\n助手: 第 33 條訊息"
+
+        db_session.expire_all()
+        stored = await db_session.get(AgentConversation, conv_id)
+        assert stored.summary == state.summary
+        assert AnalysisSlots.from_dict(stored.slots) == _slots()
+        total = await db_session.scalar(select(func.count()).where(DBAgentMessage.conversation_id == conv_id))
+        assert total == 42
+
+    @pytest.mark.asyncio
+    async def test_new_conversation_turn_persists_state(self, db_session: AsyncSession):
+        service = AgentService(db_session)
+        recorder = _Recorder(db_session)
+        try:
+            responses = await _run(service, "價格分析")
+        finally:
+            recorder.close()
+
+        assert responses[-1].type == ResponseType.CLARIFICATION
+        assert recorder.commits == 2
+
+        full = await AgentService(db_session).get_state_async(responses[-1].conversation_id)
+        assert [(m.role, m.content) for m in full.messages] == [
+            ("user", "價格分析"), ("assistant", responses[-1].content),
+        ]
+        assert full.current_intent == IntentType.PRODUCT_DETAIL
+        conv = await db_session.get(AgentConversation, uuid.UUID(full.conversation_id))
+        assert conv.title == "價格分析"
+
+    @pytest.mark.asyncio
+    async def test_aborted_stream_keeps_user_message(self, db_session: AsyncSession):
+        """串流中途中斷：用戶訊息（和新對話）已提交，未完成的助手回覆被丟棄"""
+        conv_id = (await _seed_history(db_session, 3)).id
+        stream = AgentService(db_session).process_message("價格分析", str(conv_id))
+        assert (await stream.__anext__()).type == ResponseType.THINKING
+        await stream.aclose()
+
+        stored = (await db_session.execute(
+            select(DBAgentMessage.role, DBAgentMessage.content)
+            .where(DBAgentMessage.conversation_id == conv_id)
+            .order_by(DBAgentMessage.created_at)
+        )).all()
+        assert len(stored) == 4 and tuple(stored[-1]) == ("user", "價格分析")
+
+        # 新對話：WebSocket send_json 拋錯
+        stream = AgentService(db_session).process_message("和牛價格")
+        first = await stream.__anext__()
+        with pytest.raises(ConnectionError):
+            await stream.athrow(ConnectionError("websocket closed"))
+
+        state = await AgentService(db_session).get_state_async(first.conversation_id)
+        assert [(m.role, m.content) for m in state.messages] == [("user", "和牛價格")]
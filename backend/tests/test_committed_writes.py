@@ -0,0 +1,65 @@
+"""提交後表寫入通知：text() DML 目標解析、提交 / 回滾語義"""
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.product import Product
+from app.services import committed_writes
+from app.services.committed_writes import text_dml_tables
+
+
+class TestTextDmlTables:
+
+    @pytest.mark.parametrize("sql, tables", [
+        ("UPDATE products SET price = 1", ["products"]),
+        ("update public.products set price = 1", ["products"]),
+        ('DELETE FROM "public"."Price_Alerts" WHERE id = 1', ["price_alerts"]),
+        ("UPDATE ONLY public.orders SET status = 'x'", ["orders"]),
+        ("WITH stale AS (SELECT id FROM products WHERE price IS NULL) "
+         "UPDATE products SET status = 'inactive' WHERE id IN (SELECT id FROM stale)", ["products"]),
+        ("WITH moved AS (DELETE FROM price_alerts RETURNING *) "
+         "INSERT INTO public.alert_archive SELECT * FROM moved", ["price_alerts", "alert_archive"]),
+        ("INSERT INTO products (sku) VALUES ('a') ON CONFLICT (sku) DO UPDATE SET name = excluded.name", ["products"]),
+        ("SELECT * FROM products FOR UPDATE SKIP LOCKED", []),
+        ("WITH x AS (SELECT 1) SELECT * FROM products FOR UPDATE", []),
+    ])
+    def test_targets(self, sql: str, tables: list[str]):
+        assert text_dml_tables(sql) == tables
+
+
+class TestCommitNotification:
+
+    @pytest.mark.asyncio
+    async def test_listeners_see_committed_tables_only(self, db_session: AsyncSession, monkeypatch):
+        seen: list[frozenset] = []
+        monkeypatch.setattr(committed_writes, "_listeners", [])
+        committed_writes.on_committed_writes(lambda session, tables: seen.append(tables))
+
+        db_session.add(Product(sku="SKU-1", name="和牛"))
+        await db_session.flush()
+        assert seen == []
+        await db_session.commit()
+        assert seen == [frozenset({"products"})]
+
+        await db_session.execute(text("UPDATE main.products SET name = '神戶牛'"))
+        await db_session.rollback()
+        await db_session.commit()
+        assert seen == [frozenset({"products"})]
+
+    @pytest.mark.asyncio
+    async def test_staged_data_is_dropped_on_rollback(self, db_session: AsyncSession, monkeypatch):
+        seen: list = []
+        monkeypatch.setattr(committed_writes, "_listeners", [])
+        committed_writes.on_committed_writes(lambda session, tables: seen.append(committed_writes.staged(session, "k")))
+
+        db_session.add(Product(sku="SKU-1", name="和牛"))
+        await db_session.flush()
+        committed_writes.stage(db_session.sync_session, "k", list).append("rolled back")
+        await db_session.rollback()
+
+        db_session.add(Product(sku="SKU-2", name="和牛"))
+        await db_session.flush()
+        committed_writes.stage(db_session.sync_session, "k", list).append("kept")
+        await db_session.commit()
+
+        assert seen == [["kept"]]
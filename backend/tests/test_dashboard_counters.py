@@ -0,0 +1,255 @@
+"""儀表板計數器：flush 鉤子增量、批量 UPDATE 補增量、對賬修正漂移"""
+import random
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import func, inspect, select, text, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.v1.alerts import MarkReadRequest, batch_mark_read
+from app.models.competitor import PriceAlert
+from app.models.finance import Settlement
+from app.models.inbox import Conversation
+from app.models.order import Order
+from app.models.pricing import PriceProposal
+from app.models.promotion import PromotionProposal
+from app.models.database import utcnow
+from app.models.analytics import DashboardCounters
+from app.services.dashboard_counters import (
+    COUNTER_SHARDS,
+    SHARD_INFO_KEY,
+    apply_counter_deltas,
+    current_month_start,
+    get_dashboard_counters,
+    reconcile_dashboard_counters,
+)
+
+ORDER_STATUSES = ["Pending", "Processing", "To Ship", "Shipped", "Cancelled", None]
+CONVERSATION_STATUSES = ["Open", "open", "closed", None]
+PROPOSAL_STATUSES = ["pending", "approved", "rejected", "executed", None]
+
+
+async def _recompute(db: AsyncSession) -> dict:
+    """不經過 CounterSpec，直接按原儀表板的查詢重算"""
+    month_start = current_month_start()
+
+    async def count(model, condition):
+        return await db.scalar(select(func.count(model.id)).where(condition))
+
+    finance = (await db.execute(
+        select(func.sum(Settlement.total_sales_amount), func.sum(Settlement.net_settlement_amount))
+        .where(Settlement.settlement_date >= month_start)
+    )).one()
+    return {
+        "orders_to_ship": await count(Order, Order.status.in_(["Pending", "Processing", "To Ship"])),
+        "unread_messages": await count(Conversation, Conversation.status == "Open"),
+        "pending_price_reviews": await count(PriceProposal, PriceProposal.status == "pending"),
+        "pending_promotion_reviews": await count(PromotionProposal, PromotionProposal.status == "pending"),
+        "unread_alerts": await count(PriceAlert, PriceAlert.is_read == False),  # noqa: E712
+        "monthly_revenue": Decimal(finance[0] or 0),
+        "monthly_profit": Decimal(finance[1] or 0),
+    }
+
+
+async def _counters(db: AsyncSession) -> dict:
+    row = await get_dashboard_counters(db)
+    return {column: getattr(row, column) for column in (await _recompute(db))}
+
+
+def _promotion(**kwargs) -> PromotionProposal:
+    now = utcnow()
+    return PromotionProposal(
+        product_id=uuid.uuid4(), original_price=Decimal("100"), discount_percent=Decimal("10"),
+        discounted_price=Decimal("90"), projected_profit=Decimal("20"), projected_margin=Decimal("22"),
+        start_date=now, end_date=now + timedelta(days=7), reason="test", **kwargs,
+    )
+
+
+def _new_object(rng: random.Random):
+    kind = rng.randrange(6)
+    status = None
+    if kind == 0:
+        status = rng.choice(ORDER_STATUSES)
+        obj = Order(order_number=uuid.uuid4().hex, order_date=utcnow())
+    elif kind == 1:
+        status = rng.choice(CONVERSATION_STATUSES)
+        obj = Conversation(hktv_topic_id=uuid.uuid4().hex)
+    elif kind == 2:
+        status = rng.choice(PROPOSAL_STATUSES)
+        obj = PriceProposal(product_id=uuid.uuid4())
+    elif kind == 3:
+        status = rng.choice(PROPOSAL_STATUSES)
+        obj = _promotion()
+    elif kind == 4:
+        obj = PriceAlert(competitor_product_id=uuid.uuid4(), alert_type="price_drop")
+        if rng.random() < 0.5:
+            obj.is_read = rng.random() < 0.5
+    else:
+        return Settlement(
+            statement_no=uuid.uuid4().hex[:20],
+            cycle_start=utcnow(),
+            cycle_end=utcnow(),
+            settlement_date=current_month_start() - timedelta(days=rng.choice([-3, -1, 5])),
+            total_sales_amount=Decimal(rng.randrange(100, 5000)),
+            net_settlement_amount=Decimal(rng.randrange(50, 4000)),
+        )
+    if status is not None:
+        obj.status = status
+    return obj
+
+
+def _mutate(obj, rng: random.Random) -> None:
+    if isinstance(obj, Order):
+        obj.status = rng.choice(ORDER_STATUSES[:-1])
+    elif isinstance(obj, Conversation):
+        obj.status = rng.choice(CONVERSATION_STATUSES[:-1])
+    elif isinstance(obj, (PriceProposal, PromotionProposal)):
+        obj.status = rng.choice(PROPOSAL_STATUSES[:-1])
+    elif isinstance(obj, PriceAlert):
+        obj.is_read = rng.random() < 0.5
+    else:
+        obj.net_settlement_amount = Decimal(rng.randrange(50, 4000))
+        if rng.random() < 0.3:
+            obj.settlement_date = current_month_start() - timedelta(days=rng.choice([-2, 2]))
+
+
+class TestDashboardCounters:
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("seed", [1, 7, 42])
+    async def test_counters_match_recompute_after_random_writes(self, db_session: AsyncSession, seed: int):
+        rng = random.Random(seed)
+        await reconcile_dashboard_counters(db_session)
+        await db_session.commit()
+
+        live, committed = [], []
+        for _ in range(300):
+            op = rng.random()
+            if op < 0.4 or not live:
+                obj = _new_object(rng)
+                db_session.add(obj)
+                live.append(obj)
+            elif op < 0.7:
+                obj = rng.choice(live)
+                if inspect(obj).persistent and rng.random() < 0.3:
+                    # 屬性過期後再賦值：history 沒有舊值
+                    db_session.expire(obj)
+                _mutate(obj, rng)
+            elif op < 0.8:
+                obj = live.pop(rng.randrange(len(live)))
+                if inspect(obj).pending:
+                    db_session.expunge(obj)
+                else:
+                    await db_session.delete(obj)
+            elif op < 0.85:
+                result = await db_session.execute(
+                    update(PriceAlert).where(PriceAlert.is_read == False).values(is_read=True)  # noqa: E712
+                )
+                await apply_counter_deltas(db_session, unread_alerts=-result.rowcount)
+                for obj in live:
+                    if isinstance(obj, PriceAlert) and inspect(obj).persistent:
+                        await db_session.refresh(obj)
+            elif op < 0.95:
+                await db_session.commit()
+                committed = list(live)
+            else:
+                await db_session.rollback()
+                live = list(committed)
+            if rng.random() < 0.2:
+                await db_session.flush()
+
+        await db_session.commit()
+
+        assert await _counters(db_session) == await _recompute(db_session)
+
+    @pytest.mark.asyncio
+    async def test_reconcile_fixes_writes_that_bypass_hooks(self, db_session: AsyncSession):
+        db_session.add_all([
+            Order(order_number="A-1", order_date=utcnow()),
+            Order(order_number="A-2", order_date=utcnow(), status="Shipped"),
+            PriceAlert(competitor_product_id=uuid.uuid4(), alert_type="price_drop"),
+        ])
+        await db_session.commit()
+        assert (await _counters(db_session))["orders_to_ship"] == 1
+
+        await db_session.execute(text("UPDATE orders SET status = 'To Ship' WHERE order_number = 'A-2'"))
+        await db_session.execute(text("UPDATE price_alerts SET is_read = 1"))
+        await db_session.commit()
+
+        drift = await reconcile_dashboard_counters(db_session)
+
+        assert drift == {"orders_to_ship": 1, "unread_alerts": -1}
+        assert await _counters(db_session) == await _recompute(db_session)
+
+    @pytest.mark.asyncio
+    async def test_command_center_reads_counters(
+        self, client: AsyncClient, auth_headers: dict, db_session: AsyncSession
+    ):
+        db_session.add_all([
+            PriceProposal(product_id=uuid.uuid4()),
+            _promotion(status="active"),
+            Conversation(hktv_topic_id="T-1", status="Open"),
+        ])
+        await db_session.commit()
+
+        resp = await client.get("/api/v1/command-center", headers=auth_headers)
+
+        assert resp.status_code == 200, resp.text
+        stats = resp.json()["stats"]
+        assert stats["pending_price_reviews"] == 1
+        assert stats["pending_promotion_reviews"] == 0
+        assert stats["unread_messages"] == 1
+
+    @pytest.mark.asyncio
+    async def test_writes_spread_over_shards_and_reads_sum_them(self, db_session: AsyncSession):
+        await reconcile_dashboard_counters(db_session)
+        await db_session.commit()
+
+        for shard in range(1, COUNTER_SHARDS + 1):
+            db_session.info[SHARD_INFO_KEY] = shard
+            db_session.add(Order(order_number=f"S-{shard}", order_date=utcnow()))
+            await db_session.commit()
+
+        rows = (await db_session.execute(
+            select(DashboardCounters.id, DashboardCounters.orders_to_ship).order_by(DashboardCounters.id)
+        )).all()
+        assert rows == [(shard, 1) for shard in range(1, COUNTER_SHARDS + 1)]
+        assert (await get_dashboard_counters(db_session)).orders_to_ship == COUNTER_SHARDS
+
+        # 對賬把總數收回 1 號行，讀取結果不變
+        assert await reconcile_dashboard_counters(db_session) == {}
+        await db_session.commit()
+        base = await db_session.get(DashboardCounters, 1)
+        assert base.orders_to_ship == COUNTER_SHARDS
+        assert (await get_dashboard_counters(db_session)).orders_to_ship == COUNTER_SHARDS
+
+    @pytest.mark.asyncio
+    async def test_bulk_endpoints_keep_counters_in_sync(
+        self, client: AsyncClient, auth_headers: dict, db_session: AsyncSession
+    ):
+        alerts = [PriceAlert(competitor_product_id=uuid.uuid4(), alert_type="price_drop") for _ in range(3)]
+        alerts[0].is_read = True
+        db_session.add_all(alerts)
+        db_session.add(Settlement(
+            statement_no="S-CLEANUP", cycle_start=utcnow(), cycle_end=utcnow(),
+            settlement_date=current_month_start() + timedelta(days=1),
+            total_sales_amount=Decimal("500"), net_settlement_amount=Decimal("400"),
+        ))
+        await db_session.commit()
+        await reconcile_dashboard_counters(db_session)
+        await db_session.commit()
+
+        # app/api/v1/alerts.py 未掛載到路由，直接調用處理函數；返回值為命中數（含已讀）
+        marked = await batch_mark_read(MarkReadRequest(ids=[a.id for a in alerts[:2]]), db_session)
+        assert marked == {"updated": 2}
+
+        resp = await client.delete("/api/v1/finance/cleanup/mock-data?confirm=true", headers=auth_headers)
+        assert resp.status_code == 200
+
+        counters = await _counters(db_session)
+        assert counters["unread_alerts"] == 1 and counters["monthly_revenue"] == 0
+        assert counters == await _recompute(db_session)
+        assert await reconcile_dashboard_counters(db_session) == {}
@@ -0,0 +1,202 @@
+"""R2 下載代理：按塊流式轉發、Range / If-None-Match 透傳、並發閘門、大對象內存上限"""
+import asyncio
+import hashlib
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import boto3
+import pytest
+from boto3.s3.transfer import TransferConfig
+from httpx import AsyncClient
+
+from app.api.deps import get_current_user
+from app.api.v1 import image_generation
+from app.config import settings
+from app.main import app
+from app.services import download_proxy
+from app.services.download_proxy import DOWNLOAD_CHUNK_BYTES, stream_object
+from app.services.storage_service import StorageService
+
+BUCKET = "download-proxy-test"
+URL = "/api/v1/image-generation/download"
+MB = 1024 ** 2
+# 多個分片、遠大於單塊；整讀入內存時 RSS 增長清晰可見，又不用為規模付出測試時間
+LARGE_OBJECT = 64 * MB
+
+
+def _rss_bytes() -> int:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+class PatternReader:
+    """按需生成的大文件（不在內存中持有整個內容）"""
+
+    BLOCK = bytes(range(256)) * 4096  # 1MB
+
+    def __init__(self, size: int):
+        self.size = size
+        self.pos = 0
+
+    def read(self, n: int = -1) -> bytes:
+        n = self.size - self.pos if n is None or n < 0 else min(n, self.size - self.pos)
+        offset = self.pos % len(self.BLOCK)
+        out = (self.BLOCK[offset:] + self.BLOCK * (n // len(self.BLOCK) + 1))[:n]
+        self.pos += n
+        return out
+
+
+@pytest.fixture(scope="module")
+def s3_endpoint():
+    """獨立進程的 moto S3 服務：對象數據不計入測試進程的內存"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = subprocess.Popen(
+        [sys.executable, "-m", "moto.server", "-H", "127.0.0.1", "-p", str(port)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    endpoint = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 30
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            break
+        except OSError:
+            if time.time() > deadline:
+                server.kill()
+                pytest.fail("moto server did not start")
+            time.sleep(0.2)
+    yield endpoint
+    server.terminate()
+    server.wait()
+
+
+@pytest.fixture
+def storage(s3_endpoint, monkeypatch) -> StorageService:
+    service = StorageService.__new__(StorageService)
+    service.use_r2 = True
+    service.s3_client = boto3.client(
+        "s3", endpoint_url=s3_endpoint, region_name="us-east-1",
+        aws_access_key_id="test", aws_secret_access_key="test",
+    )
+    service.bucket = BUCKET
+    service.public_url_base = "https://files.example.com"
+    try:
+        service.s3_client.create_bucket(Bucket=BUCKET)
+    except service.s3_client.exceptions.BucketAlreadyOwnedByYou:
+        pass
+    monkeypatch.setattr(image_generation, "get_storage", lambda: service)
+    monkeypatch.setattr(download_proxy, "_download_gate", None)
+    return service
+
+
+class TestDownloadProxy:
+
+    @pytest.mark.asyncio
+    async def test_range_and_etag_pass_through(self, client: AsyncClient, test_user, storage):
+        # 測試庫是 SQLite：直接注入當前用戶（client fixture 結束時清理 overrides）
+        app.dependency_overrides[get_current_user] = lambda: test_user
+        auth_headers = {}
+        data = bytes(range(256)) * 40
+        storage.s3_client.put_object(Bucket=BUCKET, Key="output/task-1/圖.png", Body=data, ContentType="image/png")
+        url = f"{storage.public_url_base}/output/task-1/圖.png"
+
+        full = await client.get(URL, params={"file_url": url}, headers=auth_headers)
+        assert full.status_code == 200
+        assert full.content == data
+        assert full.headers["content-length"] == str(len(data))
+        assert full.headers["content-type"] == "image/png"
+        assert full.headers["content-disposition"] == "attachment; filename*=UTF-8''%E5%9C%96.png"
+        etag = full.headers["etag"]
+
+        part = await client.get(URL, params={"file_url": url}, headers={**auth_headers, "Range": "bytes=100-355"})
+        assert part.status_code == 206
+        assert part.content == data[100:356]
+        assert part.headers["content-range"] == f"bytes 100-355/{len(data)}"
+        assert part.headers["content-length"] == "256"
+
+        cached = await client.get(url=URL, params={"file_url": url}, headers={**auth_headers, "If-None-Match": etag})
+        assert cached.status_code == 304
+        assert cached.content == b""
+
+        bad_range = await client.get(
+            URL, params={"file_url": url}, headers={**auth_headers, "Range": f"bytes={len(data) + 10}-"}
+        )
+        assert bad_range.status_code == 416
+        missing = await client.get(URL, params={"file_url": "output/none.png"}, headers=auth_headers)
+        assert missing.status_code == 404
+
+    @pytest.mark.asyncio
+    async def test_concurrency_gate_holds_until_body_finishes(self, storage, monkeypatch):
+        monkeypatch.setattr(settings, "r2_download_concurrency", 2)
+        storage.s3_client.put_object(Bucket=BUCKET, Key="gate.bin", Body=b"x" * 1000)
+
+        first = await stream_object(storage, "gate.bin")
+        second = await stream_object(storage, "gate.bin")
+        third = asyncio.create_task(stream_object(storage, "gate.bin"))
+        await asyncio.sleep(0.3)
+        assert not third.done()
+
+        assert b"".join([chunk async for chunk in first.body_iterator]) == b"x" * 1000
+        response = await asyncio.wait_for(third, timeout=5)
+        assert response.status_code == 200
+        for pending in (second, response):
+            await pending.body_iterator.aclose()
+
+    @pytest.mark.asyncio
+    async def test_gate_released_when_stream_never_starts(self, storage, monkeypatch):
+        """客戶端在首個數據塊前斷開：Body 從未被迭代，名額仍要歸還、R2 連接要關閉"""
+        monkeypatch.setattr(settings, "r2_download_concurrency", 1)
+        storage.s3_client.put_object(Bucket=BUCKET, Key="gone.bin", Body=b"x" * 1000)
+
+        response = await stream_object(storage, "gone.bin")
+        body = response._body
+        assert download_proxy._gate().locked()
+
+        async def receive():
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            await asyncio.Event().wait()  # 響應頭一直發不出去
+
+        await asyncio.wait_for(response({"type": "http", "method": "GET"}, receive, send), timeout=5)
+
+        assert not download_proxy._gate().locked()
+        assert body._raw_stream.closed
+        # 名額只歸還一次
+        response.release()
+        assert download_proxy._gate()._value == 1
+
+    @pytest.mark.asyncio
+    @pytest.mark.skipif(not os.path.exists("/proc/self/statm"), reason="需要 /proc 讀取 RSS")
+    async def test_large_object_streams_in_bounded_memory(self, storage):
+        storage.s3_client.upload_fileobj(
+            PatternReader(LARGE_OBJECT), BUCKET, "exports/big.zip",
+            Config=TransferConfig(multipart_chunksize=16 * MB, max_concurrency=1),
+        )
+        expected = hashlib.md5()
+        reader = PatternReader(LARGE_OBJECT)
+        while block := reader.read(8 * MB):
+            expected.update(block)
+
+        response = await stream_object(storage, "exports/big.zip")
+        assert response.headers["content-length"] == str(LARGE_OBJECT)
+
+        digest = hashlib.md5()
+        received = largest = 0
+        peak = baseline = _rss_bytes()
+        async for chunk in response.body_iterator:
+            digest.update(chunk)
+            received += len(chunk)
+            largest = max(largest, len(chunk))
+            peak = max(peak, _rss_bytes())
+
+        assert received == LARGE_OBJECT
+        assert digest.hexdigest() == expected.hexdigest()
+        # 按固定塊大小轉發；整個文件讀入內存會令 RSS 增長約 64MB
+        assert largest <= DOWNLOAD_CHUNK_BYTES
+        assert peak - baseline < 16 * MB
@@ -0,0 +1,258 @@
+"""EventBus 隊列派發：非阻塞 emit、handler 並發上限、outbox 持久化與重放"""
+import asyncio
+import time
+from datetime import timedelta
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.agents.events import Event, EventBus, Events
+from app.agents.outbox import EventOutbox
+from app.config import get_settings
+from app.models.database import utcnow
+from app.models.system import EventOutbox as EventOutboxRow
+
+
+async def _wait_until(predicate, timeout: float = 2.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise AssertionError("等待超時")
+        await asyncio.sleep(0.01)
+
+
+def _outbox(db_session: AsyncSession) -> EventOutbox:
+    """outbox 用獨立 session，但與測試共用同一個內存庫"""
+    return EventOutbox(async_sessionmaker(bind=db_session.bind, expire_on_commit=False))
+
+
+class TestQueuedDispatch:
+
+    @pytest.mark.asyncio
+    async def test_emit_does_not_wait_for_slow_handler(self):
+        bus = EventBus(handler_concurrency=1)
+        done = asyncio.Event()
+
+        async def slow(event: Event):
+            await asyncio.sleep(0.2)
+            done.set()
+
+        bus.subscribe(Events.PRICE_ALERT_CREATED, slow)
+        await bus.start()
+        try:
+            start = time.perf_counter()
+            await bus.emit(Events.PRICE_ALERT_CREATED, {"sku": "A"})
+            elapsed = time.perf_counter() - start
+
+            assert elapsed < 0.01
+            assert not done.is_set()
+            await asyncio.wait_for(done.wait(), timeout=1)
+        finally:
+            await bus.stop()
+
+    @pytest.mark.asyncio
+    async def test_handler_concurrency_is_bounded(self):
+        bus = EventBus(handler_concurrency=3)
+        state = {"in_flight": 0, "max": 0, "done": 0}
+
+        async def handler(event: Event):
+            state["in_flight"] += 1
+            state["max"] = max(state["max"], state["in_flight"])
+            await asyncio.sleep(0.02)
+            state["in_flight"] -= 1
+            state["done"] += 1
+
+        bus.subscribe(Events.PRICE_ALERT_CREATED, handler)
+        await bus.start()
+        try:
+            for i in range(12):
+                await bus.emit(Events.PRICE_ALERT_CREATED, {"i": i})
+            await _wait_until(lambda: state["done"] == 12)
+        finally:
+            await bus.stop()
+
+        assert state["max"] == 3
+        metrics = bus.get_metrics()
+        assert metrics["completed"] == 12
+        assert metrics["queue_depth"] == 0
+
+    @pytest.mark.asyncio
+    async def test_slow_handler_does_not_block_others(self):
+        bus = EventBus(handler_concurrency=1)
+        gate = asyncio.Event()
+        fast_seen: list[str] = []
+
+        async def slow(event: Event):
+            await gate.wait()
+
+        async def fast(event: Event):
+            fast_seen.append(event.payload["sku"])
+
+        bus.subscribe(Events.PRICE_ALERT_CREATED, slow)
+        bus.subscribe(Events.PRICE_ALERT_CREATED, fast)
+        await bus.start()
+        try:
+            for sku in ("A", "B", "C"):
+                await bus.emit(Events.PRICE_ALERT_CREATED, {"sku": sku})
+            await _wait_until(lambda: len(fast_seen) == 3)
+
+            handlers = bus.get_metrics()["handlers"]
+            slow_stats = next(v for k, v in handlers.items() if k.endswith("slow"))
+            assert slow_stats["in_flight"] == 1
+            assert slow_stats["queue_depth"] == 2
+            gate.set()
+        finally:
+            await bus.stop()
+
+    @pytest.mark.asyncio
+    async def test_handler_error_emits_agent_error(self):
+        bus = EventBus()
+        errors: list[Event] = []
+
+        async def broken(event: Event):
+            raise ValueError("boom")
+
+        async def on_error(event: Event):
+            errors.append(event)
+
+        bus.subscribe(Events.PRICE_ALERT_CREATED, broken)
+        bus.subscribe(Events.AGENT_ERROR, on_error)
+        await bus.start()
+        try:
+            await bus.emit(Events.PRICE_ALERT_CREATED)
+            await _wait_until(lambda: errors)
+        finally:
+            await bus.stop()
+
+        assert errors[0].payload["failed_event"] == Events.PRICE_ALERT_CREATED
+        assert "boom" in errors[0].payload["error"]
+
+    @pytest.mark.asyncio
+    async def test_inline_mode_before_start(self):
+        bus = EventBus()
+        seen: list[str] = []
+
+        async def handler(event: Event):
+            seen.append(event.type)
+
+        bus.subscribe(Events.PRICE_ALERT_CREATED, handler)
+        await bus.emit(Events.PRICE_ALERT_CREATED)
+
+        assert seen == [Events.PRICE_ALERT_CREATED]
+        assert bus.get_metrics()["mode"] == "inline"
+
+
+class TestOutbox:
+
+    @pytest.mark.asyncio
+    async def test_events_are_persisted_and_marked(self, db_session: AsyncSession):
+        outbox = _outbox(db_session)
+        bus = EventBus(outbox=outbox)
+
+        async def ok(event: Event):
+            pass
+
+        async def broken(event: Event):
+            raise RuntimeError("bad handler")
+
+        bus.subscribe(Events.PRICE_ALERT_CREATED, ok)
+        bus.subscribe(Events.PRODUCT_CREATED, broken)
+        await bus.start()
+        good = await bus.emit(Events.PRICE_ALERT_CREATED, {"sku": "A"})
+        bad = await bus.emit(Events.PRODUCT_CREATED, {"sku": "B"})
+        # 無訂閱者的事件不落庫
+        await bus.emit(Events.SCRAPE_COMPLETED)
+        await bus.stop()
+
+        rows = {
+            row.id: row
+            for row in (await db_session.execute(select(EventOutboxRow))).scalars()
+        }
+        assert set(rows) == {good.id, bad.id}
+        assert rows[good.id].status == "done"
+        assert rows[good.id].payload == {"sku": "A"}
+        assert rows[bad.id].status == "failed"
+        assert "bad handler" in rows[bad.id].last_error
+
+    @pytest.mark.asyncio
+    async def test_unfinished_events_are_replayed(self, db_session: AsyncSession):
+        """模擬崩潰：事件已落庫但未標記完成，新進程啟動後重放（保留原 id）"""
+        outbox = _outbox(db_session)
+        lost = Event(type=Events.PRICE_ALERT_CREATED, payload={"sku": "lost"})
+        await outbox.persist([lost])
+
+        seen: list[Event] = []
+
+        async def handler(event: Event):
+            seen.append(event)
+
+        bus = EventBus(outbox=outbox)
+        bus.subscribe(Events.PRICE_ALERT_CREATED, handler)
+        await bus.start()
+        try:
+            # 剛被認領的事件不會被重放
+            assert await bus.replay_pending() == 0
+            assert await bus.replay_pending(stale_after_seconds=0) == 1
+            await _wait_until(lambda: seen)
+        finally:
+            await bus.stop()
+
+        assert seen[0].id == lost.id
+        assert seen[0].payload == {"sku": "lost"}
+        row = await db_session.get(EventOutboxRow, lost.id)
+        await db_session.refresh(row)
+        assert row.status == "done"
+        assert row.attempts == 2
+
+    @pytest.mark.asyncio
+    async def test_queue_overflow_spills_to_outbox(self, db_session: AsyncSession):
+        outbox = _outbox(db_session)
+        bus = EventBus(queue_size=2, outbox=outbox)
+
+        async def handler(event: Event):
+            pass
+
+        bus.subscribe(Events.PRICE_ALERT_CREATED, handler)
+        await bus.start()
+        try:
+            # 不讓出事件循環，分派協程來不及消費
+            for i in range(5):
+                await bus.emit(Events.PRICE_ALERT_CREATED, {"i": i})
+            assert bus.get_metrics()["spilled"] == 3
+            await _wait_until(lambda: not bus._background)
+
+            spilled = (await db_session.execute(
+                select(EventOutboxRow).where(EventOutboxRow.claimed_at.is_(None))
+            )).scalars().all()
+            assert len(spilled) == 3
+        finally:
+            await bus.stop()
+
+    @pytest.mark.asyncio
+    async def test_replay_loop_purges_expired_rows(self, db_session: AsyncSession, monkeypatch):
+        monkeypatch.setattr(get_settings(), "event_bus_outbox_retention_days", 7)
+        old = utcnow() - timedelta(days=8)
+        db_session.add_all([
+            EventOutboxRow(id="old-done", event_type=Events.PRICE_ALERT_CREATED, payload={}, status="done", created_at=old),
+            EventOutboxRow(id="old-failed", event_type=Events.PRICE_ALERT_CREATED, payload={}, status="failed", created_at=old),
+            # 未完成的事件無論多舊都保留（仍待重放）
+            EventOutboxRow(id="old-pending", event_type=Events.PRICE_ALERT_CREATED, payload={}, status="pending",
+                           created_at=old, claimed_at=utcnow()),
+            EventOutboxRow(id="recent-done", event_type=Events.PRICE_ALERT_CREATED, payload={}, status="done"),
+        ])
+        await db_session.commit()
+
+        async def ids() -> set[str]:
+            return set((await db_session.execute(select(EventOutboxRow.id))).scalars())
+
+        bus = EventBus(outbox=_outbox(db_session))
+        await bus.start()
+        try:
+            # 重放掃描啟動時即執行一次清理
+            deadline = time.monotonic() + 2.0
+            while await ids() != {"old-pending", "recent-done"}:
+                assert time.monotonic() < deadline, "等待清理超時"
+                await asyncio.sleep(0.01)
+        finally:
+            await bus.stop()
@@ -0,0 +1,141 @@
+"""流式導出：端點經服務端游標分片寫出 CSV、XLSX write-only、類別 / 競品導出端點"""
+import csv
+import io
+import os
+import uuid
+from decimal import Decimal
+
+import pytest
+from httpx import AsyncClient
+from openpyxl import load_workbook
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.api.v1 import categories
+from app.models import database
+from app.models.category import CategoryDatabase, CategoryProduct
+from app.models.competitor import Competitor, CompetitorProduct, PriceSnapshot
+from app.models.product import Product, ProductCompetitorMapping
+from app.services import export_service
+from app.services.export_service import ExportColumn, xlsx_chunks
+
+COLUMNS = [ExportColumn(h) for h in ["名稱", "SKU", "品牌", "價格", "單價", "單位", "庫存", "評分", "評論", "URL"]]
+
+
+def _rss_bytes() -> int:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+async def _synthetic_rows(total: int, chunk: int = 2000):
+    for start in range(0, total, chunk):
+        yield [
+            [f"和牛西冷 {i}", f"SKU-{i:07d}", "GOGOJAP", f"{i % 997}.50", f"{i % 97}.25", "100g",
+             "in_stock", "4.5", i % 300, f"https://example.com/products/{i}"]
+            for i in range(start, min(start + chunk, total))
+        ]
+
+
+@pytest.fixture
+def export_sessions(db_session: AsyncSession, monkeypatch):
+    """導出生成器自己開 session：指向測試庫"""
+    maker = async_sessionmaker(bind=db_session.bind, expire_on_commit=False)
+    monkeypatch.setattr(export_service, "async_session_maker", maker)
+    monkeypatch.setattr(database, "async_session_maker", maker)
+
+
+class TestExportWriters:
+
+    @pytest.mark.asyncio
+    async def test_xlsx_is_valid_workbook(self):
+        data = b"".join([chunk async for chunk in xlsx_chunks(COLUMNS, _synthetic_rows(5000), "商品列表")])
+
+        sheet = load_workbook(io.BytesIO(data), read_only=True)["商品列表"]
+        rows = list(sheet.iter_rows(values_only=True))
+        assert rows[0] == tuple(c.header for c in COLUMNS)
+        assert len(rows) == 5001
+        assert rows[-1][1] == "SKU-0004999"
+
+
+class TestExportEndpoints:
+
+    @pytest.mark.asyncio
+    @pytest.mark.skipif(not os.path.exists("/proc/self/statm"), reason="需要 /proc 讀取 RSS")
+    async def test_category_csv_export_memory_bounded(self, db_session: AsyncSession, export_sessions):
+        """真實導出路徑：端點 → 服務端游標分片 → CSV 編碼，RSS 增長與行數無關"""
+        total = 60_000
+        category = CategoryDatabase(name="大類別")
+        db_session.add(category)
+        await db_session.flush()
+        for start in range(0, total, 10_000):
+            await db_session.execute(insert(CategoryProduct), [
+                {"id": uuid.uuid4(), "category_id": category.id, "name": f"日本A5和牛西冷切片禮盒裝 {i:07d}",
+                 "sku": f"SKU-{i:07d}", "brand": "GOGOJAP", "price": Decimal("388.00"),
+                 "unit_price": Decimal(i % 997), "url": f"https://example.com/products/{i:07d}?ref=category"}
+                for i in range(start, min(start + 10_000, total))
+            ])
+        await db_session.commit()
+
+        response = await categories.export_products_csv(category.id, db_session)
+        written = lines = 0
+        peak = baseline = _rss_bytes()
+        async for data in response.body_iterator:
+            written += len(data)
+            lines += data.count(b"\n")
+            peak = max(peak, _rss_bytes())
+
+        # 輸出約 11MB；一次取回全部行（Row 對象）時 RSS 增長約 50MB
+        assert lines == total + 1
+        assert written > 10 * 1024 * 1024
+        assert peak - baseline < 12 * 1024 * 1024
+
+    @pytest.mark.asyncio
+    async def test_category_exports_sorted_by_unit_price(
+        self, client: AsyncClient, auth_headers: dict, db_session: AsyncSession, export_sessions
+    ):
+        category = CategoryDatabase(name="和牛類")
+        db_session.add(category)
+        await db_session.flush()
+        db_session.add_all(
+            CategoryProduct(category_id=category.id, name=f"商品 {i}", url=f"https://example.com/{i}",
+                            price=Decimal("100"), unit_price=None if i == 0 else Decimal(50 - i))
+            for i in range(5)
+        )
+        await db_session.commit()
+
+        resp = await client.get(f"/api/v1/categories/{category.id}/export/csv", headers=auth_headers)
+        assert resp.status_code == 200
+        assert "filename*=UTF-8''" in resp.headers["content-disposition"]
+        rows = list(csv.reader(io.StringIO(resp.content.decode("utf-8-sig"))))
+        assert [r[0] for r in rows[1:]] == ["商品 4", "商品 3", "商品 2", "商品 1", "商品 0"]
+        assert rows[-1][6] == ""
+
+        resp = await client.get(f"/api/v1/categories/{category.id}/export/excel", headers=auth_headers)
+        sheet = load_workbook(io.BytesIO(resp.content), read_only=True)["商品列表"]
+        assert [r[6] for r in sheet.iter_rows(min_row=2, values_only=True)] == [46, 47, 48, 49, None]
+
+    @pytest.mark.asyncio
+    async def test_comparison_export_uses_latest_price(
+        self, client: AsyncClient, auth_headers: dict, db_session: AsyncSession, export_sessions
+    ):
+        from datetime import datetime, timedelta
+
+        product = Product(sku="EXP-1", name="GOGOJAP-和牛", price=Decimal("200"), category_tag="牛")
+        competitor = Competitor(name="Rival", platform="hktvmall")
+        db_session.add_all([product, competitor])
+        await db_session.flush()
+        cp = CompetitorProduct(competitor_id=competitor.id, name="競品", url="https://example.com/cp")
+        db_session.add(cp)
+        await db_session.flush()
+        db_session.add(ProductCompetitorMapping(product_id=product.id, competitor_product_id=cp.id))
+        now = datetime.utcnow()
+        db_session.add_all([
+            PriceSnapshot(competitor_product_id=cp.id, price=Decimal("150"), scraped_at=now - timedelta(days=1)),
+            PriceSnapshot(competitor_product_id=cp.id, price=Decimal("180"), stock_status="in_stock", scraped_at=now),
+        ])
+        await db_session.commit()
+
+        resp = await client.get("/api/v1/competitors/comparison/export", headers=auth_headers)
+
+        rows = list(csv.reader(io.StringIO(resp.content.decode("utf-8-sig"))))
+        assert rows[1] == ["牛", "和牛", "$200", "Rival", "$180", "+10.0%", "2/1", "1", "1", "1"]
@@ -0,0 +1,216 @@
+"""GEO/SEO 打包生成：一次 AI 調用生成全部產物、只重試不合格部分、可續傳的全目錄批量"""
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import func, select
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.models.product import Product
+from app.models.seo import SEOContent, StructuredData
+from app.models.system import SystemSetting
+from app.services.ai_service import AIResponse
+from app.services.geo_package_service import BatchAlreadyRunning, GEOPackageService
+
+CANNED = {
+    "keywords": {
+        "primary_keyword": "日本和牛",
+        "secondary_keywords": ["A5 和牛", "鹿兒島和牛"],
+        "long_tail_keywords": ["香港 A5 和牛 網購"],
+    },
+    "seo": {
+        "meta_title": "鹿兒島 A5 和牛 | 新鮮空運直送",
+        "meta_description": "精選鹿兒島 A5 和牛，冷鏈直送香港，立即選購享 3 日送達。",
+        "long_tail_keywords": ["香港 A5 和牛 網購"],
+        "og_title": "鹿兒島 A5 和牛",
+        "og_description": "冷鏈直送香港",
+    },
+    "ai_summary": {
+        "summary": "鹿兒島產 A5 級和牛肉眼，油花均勻。",
+        "facts": ["A5 等級", "冷鏈空運"],
+        "entities": {"brand": "GGJ", "origin": "日本鹿兒島"},
+    },
+    "faqs": [
+        {"question": "和牛可以冷藏幾耐？", "answer": "冷藏 3 日內食用最佳。"},
+        {"question": "幾時送到？", "answer": "落單後 3 個工作天內送達。"},
+    ],
+}
+
+
+class StubAIService:
+    """假模型：按 prompt 要求的部分返回預設 JSON，可指定某部分首次返回的內容"""
+
+    def __init__(self, overrides=None, delay: float = 0, on_call=None):
+        self.overrides = dict(overrides or {})
+        self.delay = delay
+        self.on_call = on_call
+        self.prompts = []
+        self.running = 0
+        self.max_running = 0
+        self.config = SimpleNamespace(insights_model="stub-model")
+
+    async def call_ai(self, prompt: str, max_tokens: int = 2048) -> AIResponse:
+        self.prompts.append(prompt)
+        if self.on_call:
+            await self.on_call(len(self.prompts))
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        await asyncio.sleep(self.delay)
+        self.running -= 1
+
+        payload = {}
+        for part, value in CANNED.items():
+            if f'"{part}":' in prompt:
+                payload[part] = self.overrides.pop(part) if part in self.overrides else value
+        return AIResponse(content=f"```json\n{json.dumps(payload, ensure_ascii=False)}\n```", model="stub")
+
+
+async def _products(db: AsyncSession, count: int) -> list:
+    products = [Product(sku=f"SKU-{i}", name=f"和牛 {i}", brand="GGJ", price=100 + i) for i in range(count)]
+    db.add_all(products)
+    await db.commit()
+    return [p.id for p in products]
+
+
+class TestGeneratePackage:
+
+    @pytest.mark.asyncio
+    async def test_single_call_generates_all_artifacts(self, db_session: AsyncSession):
+        [product_id] = await _products(db_session, 1)
+        ai = StubAIService()
+
+        result = await GEOPackageService(db_session, ai).generate_package(product_id)
+        await db_session.commit()
+
+        assert result.success and result.ai_calls == 1 and not result.failed_parts
+        assert set(result.parts) == {"keywords", "seo", "ai_summary", "faqs"}
+
+        seo = await db_session.get(SEOContent, result.seo_content_id)
+        assert seo.primary_keyword == "日本和牛"
+        assert seo.meta_title == CANNED["seo"]["meta_title"] and seo.seo_score > 0
+
+        product_schema = await db_session.get(StructuredData, result.product_schema_id)
+        assert product_schema.ai_summary == CANNED["ai_summary"]["summary"] and product_schema.is_valid
+        faq_schema = await db_session.get(StructuredData, result.faq_schema_id)
+        assert faq_schema.schema_type == "FAQPage" and len(faq_schema.json_ld["mainEntity"]) == 2
+
+    @pytest.mark.asyncio
+    async def test_only_failed_part_is_retried(self, db_session: AsyncSession):
+        [product_id] = await _products(db_session, 1)
+        ai = StubAIService(overrides={"faqs": []})
+
+        result = await GEOPackageService(db_session, ai).generate_package(product_id)
+
+        assert result.success and result.ai_calls == 2
+        retry_prompt = ai.prompts[1]
+        assert '"faqs":' in retry_prompt and "mainEntity 不能為空" in retry_prompt
+        assert not any(f'"{part}":' in retry_prompt for part in ("keywords", "seo", "ai_summary"))
+        assert "日本和牛" in retry_prompt  # 已通過的關鍵詞作為上下文
+        assert result.parts["faqs"] == CANNED["faqs"]
+
+    @pytest.mark.asyncio
+    async def test_part_still_invalid_after_retries_is_reported(self, db_session: AsyncSession):
+        [product_id] = await _products(db_session, 1)
+        ai = StubAIService(overrides={"seo": {"meta_title": ""}})
+
+        result = await GEOPackageService(db_session, ai).generate_package(product_id, max_retries=0)
+
+        assert not result.success and result.ai_calls == 1
+        assert result.failed_parts == {"seo": ["缺少 meta_title", "缺少 meta_description"]}
+        assert result.seo_content_id is None
+        assert result.product_schema_id and result.faq_schema_id
+
+
+class TestPackageBatch:
+
+    @pytest.mark.asyncio
+    async def test_batch_bounds_concurrency(self, db_session: AsyncSession):
+        product_ids = await _products(db_session, 7)
+        ai = StubAIService(delay=0.01)
+        factory = async_sessionmaker(bind=db_session.bind, expire_on_commit=False)
+        service = GEOPackageService(db_session, ai, session_factory=factory)
+
+        progress = await service.run_batch(concurrency=3)
+
+        assert progress.status == "completed"
+        assert progress.processed == progress.succeeded == 7 and not progress.failed
+        assert ai.max_running == 3 and len(ai.prompts) == 7
+        assert progress.cursor == max(str(pid) for pid in product_ids)
+        assert await db_session.scalar(select(func.count(SEOContent.id))) == 7
+
+    @pytest.mark.asyncio
+    async def test_interrupted_batch_resumes_without_redoing_products(self, db_session: AsyncSession):
+        await _products(db_session, 5)
+        factory = async_sessionmaker(bind=db_session.bind, expire_on_commit=False)
+        batch_task = None
+
+        async def crash_on_third(call_number):
+            if call_number == 3:
+                await asyncio.sleep(0.05)  # 等上一個產品的進度寫入完成
+                batch_task.cancel()
+                await asyncio.sleep(0)
+
+        service = GEOPackageService(db_session, StubAIService(on_call=crash_on_third), session_factory=factory)
+        batch_task = asyncio.create_task(service.run_batch(batch_id="nightly", concurrency=1))
+        with pytest.raises(asyncio.CancelledError):
+            await batch_task
+
+        progress = await service.load_progress("nightly")
+        assert progress.status == "paused" and progress.processed == 2 and len(progress.in_page) == 2
+
+        ai = StubAIService()
+        resumed = await GEOPackageService(db_session, ai, session_factory=factory).run_batch(batch_id="nightly")
+
+        assert resumed.status == "completed" and resumed.processed == 5
+        assert len(ai.prompts) == 3
+        generated = await db_session.execute(select(SEOContent.product_id))
+        product_ids = [row[0] for row in generated]
+        assert len(product_ids) == len(set(product_ids)) == 5
+
+    @pytest.mark.asyncio
+    async def test_running_batch_cannot_be_claimed_twice(self, db_session: AsyncSession):
+        service = GEOPackageService(db_session, StubAIService())
+
+        first = await service.claim_batch("weekly")
+        assert first.status == "running"
+        with pytest.raises(BatchAlreadyRunning):
+            await service.claim_batch("weekly")
+        with pytest.raises(BatchAlreadyRunning):
+            await service.run_batch(batch_id="weekly")
+
+        # runner 失敗後釋放，可再認領
+        first.status = "failed"
+        await service._save_progress(first)
+        assert (await service.claim_batch("weekly")).status == "running"
+
+    @pytest.mark.asyncio
+    async def test_stale_running_batch_can_be_reclaimed(self, db_session: AsyncSession):
+        service = GEOPackageService(db_session, StubAIService())
+        progress = await service.claim_batch("crashed")
+        progress.updated_at = "2026-01-01T00:00:00"
+        setting = await db_session.get(SystemSetting, "geo.package.batch.crashed")
+        setting.value = json.dumps(progress.to_dict())
+        await db_session.commit()
+
+        assert (await service.claim_batch("crashed")).status == "running"
+
+
+class TestPackageAPI:
+
+    @pytest.mark.asyncio
+    async def test_missing_product_and_running_batch(self, client: AsyncClient, auth_headers: dict, db_session: AsyncSession):
+        missing = await client.post(
+            "/api/v1/geo/package",
+            json={"product_id": "00000000-0000-0000-0000-000000000001"},
+            headers=auth_headers,
+        )
+        assert missing.status_code == 404
+
+        await GEOPackageService(db_session, StubAIService()).claim_batch("busy")
+        conflict = await client.post("/api/v1/geo/package/batch", json={"batch_id": "busy"}, headers=auth_headers)
+        assert conflict.status_code == 409
+
+        progress = await client.get("/api/v1/geo/package/batch/busy", headers=auth_headers)
+        assert progress.status_code == 200 and progress.json()["status"] == "running"
@@ -0,0 +1,226 @@
+"""收件箱增量同步：本地模擬 MMS 服務（數千個對話），批量 upsert、水位、有界並發預取"""
+import asyncio
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+import uvicorn
+from fastapi import FastAPI, Request
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.models.inbox import Conversation, Message
+from app.models.system import SystemSetting
+from app.services.dashboard_counters import get_dashboard_counters, reconcile_dashboard_counters
+from app.services.inbox_service import WATERMARK_KEY, InboxService
+
+TOPIC_COUNT = 3000
+# 增量場景不需要全量規模，縮小以節省測試時間
+SMALL_TOPIC_COUNT = 600
+BASE_TIME = datetime(2026, 10, 1, 9, 0, 0)
+
+
+def _fmt(value: datetime) -> str:
+    return value.strftime("%Y-%m-%d %H:%M:%S")
+
+
+class MockMMS:
+    """模擬 MMS 收件箱 API：POST /message/topics（分頁 + lastMessageAtFrom）與 /message/messages"""
+
+    def __init__(self, topic_count: int) -> None:
+        self.topic_count = topic_count
+        self.topics = {}
+        self.messages = {}
+        for i in range(topic_count):
+            topic_id = f"T-{i:05d}"
+            self.topics[topic_id] = {
+                "topicId": topic_id,
+                "subject": f"查詢 {i}",
+                "customerName": f"客戶 {i}",
+                "lastMessageAt": _fmt(BASE_TIME + timedelta(seconds=i)),
+                "status": "Open" if i % 3 else "closed",
+            }
+            self.messages[topic_id] = [
+                {"messageId": f"{topic_id}-M{j}", "content": f"訊息 {j}", "sender": "customer",
+                 "sentAt": _fmt(BASE_TIME + timedelta(seconds=i, milliseconds=j))}
+                for j in range(2)
+            ]
+        self.honour_since = True
+        self.topic_requests = []
+        self.message_requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.app = self._build_app()
+
+    def _build_app(self) -> FastAPI:
+        app = FastAPI()
+
+        @app.post("/message/topics")
+        async def topics(request: Request):
+            body = await request.json()
+            self.topic_requests.append(body)
+            since = body.get("lastMessageAtFrom") if self.honour_since else None
+            rows = sorted(
+                (t for t in self.topics.values() if not since or t["lastMessageAt"] >= since),
+                key=lambda t: t["topicId"],
+            )
+            start = (body["pageNo"] - 1) * body["pageSize"]
+            return {"returnCode": "0000", "data": rows[start:start + body["pageSize"]]}
+
+        @app.post("/message/messages")
+        async def messages(request: Request):
+            body = await request.json()
+            self.message_requests.append(body["topicId"])
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            try:
+                await asyncio.sleep(0.002)
+                return {"returnCode": "0000", "data": self.messages[body["topicId"]]}
+            finally:
+                self.in_flight -= 1
+
+        return app
+
+
+@pytest.fixture
+def mms(request, monkeypatch):
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server_state = MockMMS(getattr(request, "param", SMALL_TOPIC_COUNT))
+    config = uvicorn.Config(server_state.app, host="127.0.0.1", port=port, loop="asyncio", log_level="warning")
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    deadline = time.time() + 10
+    while not server.started and time.time() < deadline:
+        time.sleep(0.01)
+
+    monkeypatch.setattr(settings, "hktv_api_base_url", f"http://127.0.0.1:{port}")
+    monkeypatch.setattr(settings, "hktv_access_token", "test-token")
+    monkeypatch.setattr(settings, "hktv_store_code", "H0000001")
+    monkeypatch.setattr(settings, "inbox_sync_page_size", 250)
+    monkeypatch.setattr(settings, "hktv_message_topics_path", "/message/topics")
+    monkeypatch.setattr(settings, "hktv_message_messages_path", "/message/messages")
+    monkeypatch.setattr(settings, "hktv_message_since_field", "lastMessageAtFrom")
+    yield server_state
+
+    server.should_exit = True
+    thread.join(timeout=10)
+
+
+async def _count(db: AsyncSession, model) -> int:
+    return await db.scalar(select(func.count(model.id)))
+
+
+class TestInboxSync:
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("mms", [TOPIC_COUNT], indirect=True)
+    async def test_initial_sync_bulk_loads_topics_and_threads(self, db_session: AsyncSession, mms: MockMMS):
+        await reconcile_dashboard_counters(db_session)
+        await db_session.commit()
+
+        synced = await InboxService(db_session).sync_conversations()
+
+        assert synced == TOPIC_COUNT
+        assert await _count(db_session, Conversation) == TOPIC_COUNT
+        assert await _count(db_session, Message) == TOPIC_COUNT * 2
+        assert len(mms.topic_requests) == TOPIC_COUNT // 250 + 1
+        assert sorted(mms.message_requests) == sorted(mms.topics)
+        assert 1 < mms.max_in_flight <= settings.inbox_sync_concurrency
+
+        watermark = await db_session.get(SystemSetting, WATERMARK_KEY)
+        assert watermark.value == _fmt(BASE_TIME + timedelta(seconds=TOPIC_COUNT - 1))
+        expected_open = sum(1 for t in mms.topics.values() if t["status"] == "Open")
+        assert (await get_dashboard_counters(db_session)).unread_messages == expected_open
+
+    @pytest.mark.asyncio
+    async def test_incremental_sync_only_touches_changed_topics(self, db_session: AsyncSession, mms: MockMMS):
+        service = InboxService(db_session)
+        await service.sync_conversations()
+        await reconcile_dashboard_counters(db_session)
+        await db_session.commit()
+        mms.topic_requests.clear()
+        mms.message_requests.clear()
+
+        later = BASE_TIME + timedelta(hours=1)
+        mms.topics["T-00010"]["lastMessageAt"] = _fmt(later)
+        mms.messages["T-00010"].append(
+            {"messageId": "T-00010-M2", "content": "新訊息", "sender": "customer", "sentAt": _fmt(later)}
+        )
+        mms.topics["T-00011"].update(lastMessageAt=_fmt(later), status="closed")
+        mms.topics["T-99999"] = {
+            "topicId": "T-99999", "subject": "新對話", "customerName": "新客戶",
+            "lastMessageAt": _fmt(later), "status": "Open",
+        }
+        mms.messages["T-99999"] = []
+
+        synced = await service.sync_conversations()
+
+        # 水位之後只有最後一個舊對話（閉區間）與 3 個新變化；前者無變化被跳過
+        assert mms.topic_requests[0]["lastMessageAtFrom"] == _fmt(BASE_TIME + timedelta(seconds=mms.topic_count - 1))
+        assert synced == 4
+        assert sorted(mms.message_requests) == ["T-00010", "T-00011", "T-99999"]
+        assert await _count(db_session, Conversation) == mms.topic_count + 1
+        assert await _count(db_session, Message) == mms.topic_count * 2 + 1
+
+        closed = (await db_session.execute(
+            select(Conversation).where(Conversation.hktv_topic_id == "T-00011")
+        )).scalar_one()
+        assert closed.status == "closed"
+        assert closed.last_message_at == later
+
+        counters = await get_dashboard_counters(db_session)
+        open_count = await db_session.scalar(
+            select(func.count(Conversation.id)).where(Conversation.status == "Open")
+        )
+        assert counters.unread_messages == open_count
+        assert await reconcile_dashboard_counters(db_session) == {}
+
+    @pytest.mark.asyncio
+    async def test_unparseable_time_keeps_stored_value(self, db_session: AsyncSession, mms: MockMMS):
+        service = InboxService(db_session)
+        await service.sync_conversations()
+        mms.message_requests.clear()
+
+        mms.topics["T-00020"]["lastMessageAt"] = "not-a-time"
+        await service.sync_conversations(full=True)
+
+        conv = (await db_session.execute(
+            select(Conversation).where(Conversation.hktv_topic_id == "T-00020")
+        )).scalar_one()
+        assert conv.last_message_at == BASE_TIME + timedelta(seconds=20)
+        assert mms.message_requests == []
+
+    @pytest.mark.asyncio
+    async def test_ignored_filter_falls_back_to_full_scan(self, db_session: AsyncSession, mms: MockMMS):
+        service = InboxService(db_session)
+        await service.sync_conversations()
+        watermark = await service._get_watermark()
+        mms.topic_requests.clear()
+        mms.message_requests.clear()
+
+        mms.honour_since = False
+        later = BASE_TIME + timedelta(hours=1)
+        mms.topics["T-00010"]["lastMessageAt"] = _fmt(later)
+
+        synced = await service.sync_conversations()
+
+        # 第一頁帶篩選但返回了舊對話 → 不帶篩選重新全量拉取，水位不推進
+        assert mms.topic_requests[0]["lastMessageAtFrom"] == _fmt(watermark)
+        assert "lastMessageAtFrom" not in mms.topic_requests[-1]
+        assert synced == mms.topic_count
+        assert mms.message_requests == ["T-00010"]
+        assert await service._get_watermark() == watermark
+
+    @pytest.mark.asyncio
+    async def test_unconfigured_endpoints_are_not_called(self, db_session: AsyncSession, mms: MockMMS, monkeypatch):
+        monkeypatch.setattr(settings, "hktv_message_topics_path", "")
+
+        assert await InboxService(db_session).sync_conversations() == 0
+        assert mms.topic_requests == []
+        assert await InboxService(db_session)._get_watermark() is None
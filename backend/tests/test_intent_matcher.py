@@ -0,0 +1,154 @@
+"""意圖 / 實體匹配器：與原逐詞掃描分類器結果一致、最長匹配、增量重建、產品寫入同步"""
+import random
+import uuid
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.product import Product
+from app.services.agent import keyword_matcher
+from app.services.agent.intent_classifier import IntentClassifier, IntentResult, IntentType
+from app.services.agent.keyword_matcher import AhoCorasick, EntityMatcher
+from app.services.agent.taxonomy import get_all_product_names, normalize_product_name
+
+
+def legacy_classify(message: str, product_names: list[str]) -> IntentResult:
+    """改造前的 _classify_by_rules / _extract_entities（逐個關鍵詞、逐個產品名 `in` 檢查）"""
+    message_lower = message.lower()
+    entities = []
+    for name in product_names:
+        if name.lower() in message_lower:
+            normalized = normalize_product_name(name)
+            if normalized not in entities:
+                entities.append(normalized)
+
+    scores = {}
+    for intent, keywords in IntentClassifier.INTENT_KEYWORDS.items():
+        score = sum(1 for keyword in keywords if keyword.lower() in message_lower)
+        if score > 0:
+            scores[intent] = score
+    if not scores:
+        if entities:
+            return IntentResult(IntentType.MARKET_OVERVIEW, entities, 0.7, "檢測到產品名稱，默認為市場概覽")
+        return IntentResult(IntentType.UNKNOWN, entities, 0.3, "無法識別意圖")
+    best_intent = max(scores, key=scores.get)
+    max_score = scores[best_intent]
+    return IntentResult(best_intent, entities, min(0.5 + max_score * 0.15, 0.95), f"匹配關鍵詞數: {max_score}")
+
+
+def _corpus(size: int = 3000) -> list[str]:
+    rng = random.Random(7)
+    keywords = [k for words in IntentClassifier.INTENT_KEYWORDS.values() for k in words]
+    names = get_all_product_names()
+    filler = ["", " ", "我想", "呢個", "幫我", "今日", "?", "HELLO", "A5", "和", "牛"]
+    messages = keywords + names + [
+        "幫我創建改價任務", "有冇 A5 和牛？", "明治牛奶幾錢", "今日有幾多單未出貨", "暫停排程",
+        "同百佳比邊個平", "WAGYU price trend", "Hello, 我想加入一個競爭對手",
+    ]
+    for _ in range(size):
+        parts = rng.choices(keywords, k=rng.randint(0, 3)) + rng.choices(names, k=rng.randint(0, 2))
+        parts += rng.choices(filler, k=rng.randint(0, 3))
+        rng.shuffle(parts)
+        text = "".join(parts)
+        messages.append(text.upper() if rng.random() < 0.1 else text)
+    return messages
+
+
+@pytest.fixture
+def catalog():
+    matcher = EntityMatcher(get_all_product_names())
+    keyword_matcher.set_entity_matcher(matcher)
+    yield matcher
+    keyword_matcher.set_entity_matcher(None)
+
+
+class TestClassifierParity:
+
+    def test_rules_match_legacy_classifier(self, catalog):
+        classifier = IntentClassifier()
+        names = get_all_product_names()
+
+        for message in _corpus():
+            assert classifier._classify_by_rules(message) == legacy_classify(message, names), message
+
+
+class TestEntityMatcher:
+
+    def test_longest_match_suppresses_nested_names(self):
+        matcher = EntityMatcher(["牛奶", "明治牛奶", "明治"])
+
+        found = [name for _, _, name in matcher.find("明治牛奶同牛奶邊個平")]
+
+        assert found == ["明治牛奶", "牛奶"]
+
+    def test_automaton_finds_every_occurrence(self):
+        rng = random.Random(3)
+        patterns = {"".join(rng.choices("abc", k=rng.randint(1, 4))) for _ in range(40)}
+        automaton = AhoCorasick((p, p) for p in patterns)
+        text = "".join(rng.choices("abcd", k=300))
+
+        found = sorted((start, end, p) for start, end, ps in automaton.iter_matches(text) for p in ps)
+
+        expected = sorted(
+            (i, i + len(p), p) for p in patterns for i in range(len(text)) if text.startswith(p, i)
+        )
+        assert found == expected
+
+    def test_incremental_updates_match_fresh_build(self, monkeypatch):
+        monkeypatch.setattr(EntityMatcher, "COMPACT_MIN", 20)
+        rng = random.Random(11)
+        pool = [f"產品{i}號" for i in range(300)] + ["和牛", "A5和牛", "海膽"]
+        matcher = EntityMatcher(pool[:100])
+        live = {name: 1 for name in pool[:100]}
+        text = "".join(rng.choices(pool, k=200))
+
+        for _ in range(500):
+            name = rng.choice(pool)
+            if rng.random() < 0.5:
+                matcher.add([name])
+                live[name] = live.get(name, 0) + 1
+            elif live.get(name):
+                matcher.remove([name])
+                live[name] -= 1
+            live = {k: v for k, v in live.items() if v}
+
+            assert len(matcher) == len(live)
+        assert sorted(matcher.find(text)) == sorted(EntityMatcher(live).find(text))
+
+
+class TestProductCatalogSync:
+
+    @pytest.mark.asyncio
+    async def test_committed_product_writes_update_catalog(self, db_session: AsyncSession, catalog):
+        classifier = IntentClassifier()
+        product = Product(id=uuid.uuid4(), sku="SKU-1", name="北海道帆立貝刺身", name_zh="帆立貝刺身")
+        product_id = product.id
+        db_session.add(product)
+        await db_session.flush()
+        assert "北海道帆立貝刺身" not in catalog
+        await db_session.commit()
+        assert classifier._extract_entities("北海道帆立貝刺身幾錢") == ["北海道帆立貝刺身"]
+
+        product.name = "宮城帆立貝"
+        await db_session.commit()
+        assert "北海道帆立貝刺身" not in catalog and "宮城帆立貝" in catalog
+
+        db_session.add(Product(sku="SKU-2", name="會回滾的產品"))
+        await db_session.flush()
+        await db_session.rollback()
+        assert "會回滾的產品" not in catalog
+
+        await db_session.delete(await db_session.get(Product, product_id))
+        await db_session.commit()
+        assert "宮城帆立貝" not in catalog and "帆立貝刺身" not in catalog
+
+    @pytest.mark.asyncio
+    async def test_load_product_catalog_merges_existing_products(self, db_session: AsyncSession, catalog):
+        db_session.add_all(Product(sku=f"SKU-{i}", name=f"產品 {i}") for i in range(5))
+        await db_session.commit()
+        keyword_matcher.set_entity_matcher(EntityMatcher(get_all_product_names()))
+
+        assert await keyword_matcher.load_product_catalog(db_session) == 5
+
+        matcher = keyword_matcher.get_entity_matcher()
+        assert "產品 3" in matcher and "和牛" in matcher
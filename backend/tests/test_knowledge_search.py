@@ -0,0 +1,85 @@
+"""品牌知識搜索：tsvector 前綴查詢 / 中日文 trigram 回退、related_products 的 JSONB ? 查詢"""
+import uuid
+from datetime import timedelta
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.database import utcnow
+from app.models.seo import BrandKnowledge
+from app.services.geo_service import GEOService
+from app.services.knowledge_search import apply_knowledge_search, prefix_tsquery, uses_fulltext
+
+PRODUCT_ID = uuid.uuid4()
+
+
+def _postgres_sql(query: str):
+    compiled = apply_knowledge_search(select(BrandKnowledge.id), query, "postgresql").compile(
+        dialect=postgresql.dialect()
+    )
+    return compiled.string, compiled.params
+
+
+@pytest.fixture
+async def knowledge(db_session: AsyncSession) -> list[BrandKnowledge]:
+    now = utcnow()
+    rows = [
+        BrandKnowledge(knowledge_type="faq", title="A5 和牛等級", content="BMS 評分說明",
+                       related_products=[str(PRODUCT_ID)], created_at=now - timedelta(hours=1)),
+        BrandKnowledge(knowledge_type="brand_info", title="Wagyu grading", content="宮崎和牛 A5",
+                       is_featured=True, created_at=now - timedelta(hours=3)),
+        BrandKnowledge(knowledge_type="faq", title="三文魚刺身", content="保存方法 100%_新鮮",
+                       related_products=[str(uuid.uuid4())], created_at=now - timedelta(hours=2)),
+        BrandKnowledge(knowledge_type="faq", title="停用的和牛", content="-", is_active=False,
+                       related_products=[str(PRODUCT_ID)], created_at=now),
+    ]
+    db_session.add_all(rows)
+    await db_session.commit()
+    return rows
+
+
+class TestQueryPlanning:
+
+    def test_latin_queries_use_prefix_tsquery_ranked_by_ts_rank(self):
+        sql, params = _postgres_sql("  Wagyu A5-grade ")
+
+        assert "search_vector @@ to_tsquery" in sql and "ts_rank(brand_knowledge.search_vector" in sql
+        assert "LIKE" not in sql
+        assert params["to_tsquery_2"] == "wagyu:* & a5:* & grade:*"
+
+    def test_cjk_queries_fall_back_to_trigram(self):
+        sql, params = _postgres_sql("和牛 A5")
+
+        assert "search_text LIKE" in sql and "word_similarity" in sql
+        assert "search_vector" not in sql
+        assert params["search_text_1"] == "%和牛 a5%"
+
+    def test_tsquery_text_only_keeps_word_characters(self):
+        assert prefix_tsquery("it's a_b & c|d:*") == "it:* & s:* & a:* & b:* & c:* & d:*"
+        assert not uses_fulltext("%%")
+        assert not uses_fulltext("ホタテ")
+
+
+class TestGEOKnowledgeQueries:
+
+    @pytest.mark.asyncio
+    async def test_search_matches_title_and_content_featured_first(self, db_session: AsyncSession, knowledge):
+        service = GEOService(db_session, ai_service=None)
+
+        found = await service.search_brand_knowledge("和牛")
+        assert [k.title for k in found] == ["Wagyu grading", "A5 和牛等級"]
+
+        assert [k.title for k in await service.search_brand_knowledge("WAGYU")] == ["Wagyu grading"]
+        assert [k.title for k in await service.search_brand_knowledge("100%_")] == ["三文魚刺身"]
+        assert await service.search_brand_knowledge("和牛", knowledge_type="brand_info", limit=1) == [knowledge[1]]
+
+    @pytest.mark.asyncio
+    async def test_product_knowledge_filters_related_products(self, db_session: AsyncSession, knowledge):
+        service = GEOService(db_session, ai_service=None)
+
+        assert await service.get_product_knowledge(PRODUCT_ID) == [knowledge[0]]
+
+        stmt = select(BrandKnowledge.id).where(BrandKnowledge.related_products.has_key(str(PRODUCT_ID)))
+        assert "related_products ? " in str(stmt.compile(dialect=postgresql.dialect()))
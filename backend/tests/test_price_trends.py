@@ -0,0 +1,148 @@
+"""價格趨勢：單查詢分桶、LTTB 降採樣、NumPy 摘要"""
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+import numpy as np
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.v1.price_trends import calculate_summary
+from app.models.competitor import Competitor, CompetitorProduct, PriceSnapshot
+from app.models.product import OwnPriceSnapshot, Product, ProductCompetitorMapping
+from app.schemas.price_trends import PriceDataPoint
+from app.utils.downsample import lttb_indices
+
+DAYS = 10
+
+
+@pytest.fixture
+async def trend_product(db_session: AsyncSession) -> tuple[Product, list[CompetitorProduct]]:
+    product = Product(sku="TREND-1", name="和牛西冷", price=Decimal("300"))
+    competitor = Competitor(name="Rival", platform="hktvmall")
+    db_session.add_all([product, competitor])
+    await db_session.flush()
+
+    comp_products = [
+        CompetitorProduct(competitor_id=competitor.id, name=f"競品 {i}", url=f"https://example.com/{i}")
+        for i in range(3)
+    ]
+    db_session.add_all(comp_products)
+    await db_session.flush()
+
+    start = datetime.combine(date.today() - timedelta(days=DAYS - 1), datetime.min.time())
+    for i, cp in enumerate(comp_products):
+        db_session.add(ProductCompetitorMapping(product_id=product.id, competitor_product_id=cp.id))
+        db_session.add_all(
+            PriceSnapshot(
+                competitor_product_id=cp.id,
+                price=Decimal(200 + i * 10 + h % 24),
+                scraped_at=start + timedelta(hours=h),
+            )
+            for h in range(DAYS * 24)
+        )
+    db_session.add_all(
+        OwnPriceSnapshot(product_id=product.id, price=Decimal("300"), recorded_at=start + timedelta(hours=h))
+        for h in range(0, DAYS * 24, 6)
+    )
+    await db_session.commit()
+    return product, comp_products
+
+
+class TestPriceTrendEndpoint:
+
+    @pytest.mark.asyncio
+    async def test_daily_buckets_in_single_snapshot_query(
+        self, client: AsyncClient, auth_headers: dict, db_session: AsyncSession, trend_product
+    ):
+        product, comp_products = trend_product
+        statements: list[str] = []
+
+        def record(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        engine = db_session.bind.sync_engine
+        event.listen(engine, "before_cursor_execute", record)
+        try:
+            resp = await client.get(
+                f"/api/v1/price-trends/product/{product.id}",
+                params={"start_date": str(date.today() - timedelta(days=DAYS - 1)), "interval": "day"},
+                headers=auth_headers,
+            )
+        finally:
+            event.remove(engine, "before_cursor_execute", record)
+
+        assert resp.status_code == 200, resp.text
+        body = resp.json()
+
+        # 競爭對手數量不影響查詢次數
+        assert sum("FROM price_snapshots" in s for s in statements) == 1
+
+        for i, cp in enumerate(comp_products):
+            series = body["trends"][str(cp.id)]
+            assert len(series) == DAYS
+            # 每日 24 小時價格 200+i*10 .. +23 的均值
+            assert Decimal(series[0]["price"]) == Decimal(200 + i * 10) + Decimal("11.5")
+        assert len(body["trends"]["own"]) == DAYS
+        current = {c["id"]: Decimal(c["current_price"]) for c in body["competitors"]}
+        assert current[str(comp_products[2].id)] == Decimal(220 + 23)
+
+    @pytest.mark.asyncio
+    async def test_hourly_series_capped_by_point_budget(
+        self, client: AsyncClient, auth_headers: dict, trend_product
+    ):
+        product, comp_products = trend_product
+        resp = await client.get(
+            f"/api/v1/price-trends/product/{product.id}",
+            params={
+                "start_date": str(date.today() - timedelta(days=DAYS - 1)),
+                "interval": "hour",
+                "max_points": 50,
+            },
+            headers=auth_headers,
+        )
+        series = resp.json()["trends"][str(comp_products[0].id)]
+
+        assert len(series) == 50
+        # 首尾點保留
+        assert series[0]["date"].endswith("00:00:00")
+        assert Decimal(series[-1]["price"]) == Decimal(223)
+
+
+class TestSummaryAndDownsample:
+
+    def test_summary_matches_reference(self):
+        t0 = datetime(2026, 1, 1)
+        own = [PriceDataPoint(date=t0 + timedelta(days=d), price=Decimal(p)) for d, p in enumerate([100, 110, 90, 120])]
+        comp = {
+            "a": [PriceDataPoint(date=t0, price=Decimal("80")), PriceDataPoint(date=t0, price=Decimal("100"))],
+            "b": [PriceDataPoint(date=t0, price=None), PriceDataPoint(date=t0, price=Decimal("120"))],
+        }
+
+        summary = calculate_summary(own, comp)
+
+        assert summary.price_gap_current == round((120 - 110) / 110 * 100, 1)
+        assert summary.price_gap_avg == round((105 - 100) / 100 * 100, 1)
+        assert summary.lowest_competitor_price == Decimal("80.00")
+        assert summary.volatility == round(float(np.std([100, 110, 90, 120], ddof=1)) / 105 * 100, 1)
+        assert summary.own_price_change == 20.0
+        assert summary.competitor_avg_change == 25.0
+
+    def test_empty_summary(self):
+        summary = calculate_summary([], {})
+
+        assert summary.price_gap_current is None
+        assert summary.volatility is None
+
+    def test_lttb_keeps_spike_and_endpoints(self):
+        x = np.arange(10_000, dtype=float)
+        y = np.sin(x / 300)
+        y[6_543] = 10
+
+        idx = lttb_indices(x, y, 200)
+
+        assert len(idx) == 200
+        assert idx[0] == 0 and idx[-1] == 9_999
+        assert 6_543 in idx
+        assert np.all(np.diff(idx) > 0)
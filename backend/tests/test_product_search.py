@@ -0,0 +1,151 @@
+"""商品搜索：search_text 生成列、相關度排序、keyset 分頁"""
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.v1 import price_trends
+from app.models.database import utcnow
+from app.models.product import Product, ProductCompetitorMapping
+from app.services.agent.tools.sql_helpers import escape_like_pattern
+
+
+@pytest.fixture
+async def catalog(db_session: AsyncSession) -> list[Product]:
+    now = utcnow()
+    products = [
+        Product(sku=f"WG-{i:03d}", name=f"Frozen Item {i}", name_zh=f"急凍貨品 {i}", price=Decimal("10"),
+                created_at=now - timedelta(minutes=i))
+        for i in range(30)
+    ]
+    products += [
+        # 中文品名中間包含「和牛」
+        Product(sku="A5-SIRLOIN", name="A5 Sirloin", name_zh="日本A5和牛西冷", created_at=now - timedelta(hours=2)),
+        # 詞首匹配（英文名以 wagyu 開頭的詞）
+        Product(sku="BEEF-01", name="Premium Wagyu Steak", name_ja="和牛ステーキ", created_at=now - timedelta(hours=3)),
+        # SKU 完全匹配
+        Product(sku="WAGYU", name="Gift Set", created_at=now - timedelta(hours=4)),
+    ]
+    db_session.add_all(products)
+    await db_session.commit()
+    return products
+
+
+async def _collect(client: AsyncClient, headers: dict, params: dict) -> tuple[list[str], int]:
+    skus, cursor, pages = [], None, 0
+    while True:
+        resp = await client.get("/api/v1/products", params={**params, **({"cursor": cursor} if cursor else {})},
+                                headers=headers)
+        assert resp.status_code == 200, resp.text
+        body = resp.json()
+        skus += [p["sku"] for p in body["data"]]
+        pages += 1
+        cursor = body["next_cursor"]
+        if cursor is None:
+            return skus, pages
+
+
+class TestListProductsSearch:
+
+    @pytest.mark.asyncio
+    async def test_keyset_pages_follow_created_at(self, client: AsyncClient, auth_headers: dict, catalog):
+        skus, pages = await _collect(client, auth_headers, {"limit": 7})
+
+        assert pages == 5
+        assert skus == [p.sku for p in sorted(catalog, key=lambda p: p.created_at, reverse=True)]
+
+    @pytest.mark.asyncio
+    async def test_ranked_multilingual_search(self, client: AsyncClient, auth_headers: dict, catalog):
+        skus, _ = await _collect(client, auth_headers, {"search": "Wagyu", "limit": 2})
+
+        # SKU 完全匹配 > 詞首匹配 > 子串；WG-xxx 不含 wagyu
+        assert skus == ["WAGYU", "BEEF-01"]
+
+        resp = await client.get("/api/v1/products", params={"search": "和牛"}, headers=auth_headers)
+        assert {p["sku"] for p in resp.json()["data"]} == {"A5-SIRLOIN", "BEEF-01"}
+
+    @pytest.mark.asyncio
+    async def test_like_wildcards_are_literal(self, client: AsyncClient, auth_headers: dict, catalog):
+        resp = await client.get("/api/v1/products", params={"search": "%"}, headers=auth_headers)
+
+        assert resp.json()["total"] == 0
+
+    @pytest.mark.asyncio
+    async def test_hyphenated_sku_search(self, client: AsyncClient, auth_headers: dict, catalog):
+        resp = await client.get("/api/v1/products", params={"search": "a5-sir"}, headers=auth_headers)
+
+        assert [p["sku"] for p in resp.json()["data"]] == ["A5-SIRLOIN"]
+
+    @pytest.mark.parametrize("value, expected", [
+        ("100%_", "100\\%\\_"),
+        ("a\\b", "a\\\\b"),
+        ("A5-SIRLOIN", "A5-SIRLOIN"),
+        ("x'; drop--", "x drop"),
+    ])
+    def test_escape_like_pattern(self, value: str, expected: str):
+        assert escape_like_pattern(value) == expected
+
+    @pytest.mark.asyncio
+    async def test_estimate_count_falls_back_to_exact(self, client: AsyncClient, auth_headers: dict, catalog):
+        resp = await client.get(
+            "/api/v1/products", params={"search": "急凍", "count": "estimate"}, headers=auth_headers
+        )
+        body = resp.json()
+
+        # SQLite 沒有 EXPLAIN (FORMAT JSON)，退回精確 count
+        assert body["total"] == 30
+        assert body["total_is_estimate"] is False
+
+
+class TestTrendProductsDropdown:
+
+    @pytest.mark.asyncio
+    async def test_paginates_mapped_products_by_name(
+        self, client: AsyncClient, auth_headers: dict, db_session: AsyncSession, catalog
+    ):
+        mapped = catalog[:5] + catalog[-3:]
+        for product in mapped:
+            db_session.add_all(
+                ProductCompetitorMapping(product_id=product.id, competitor_product_id=uuid.uuid4())
+                for _ in range(2)
+            )
+        await db_session.commit()
+
+        names, cursor = [], None
+        while True:
+            params = {"limit": 3, **({"cursor": cursor} if cursor else {})}
+            body = (await client.get("/api/v1/price-trends/products", params=params, headers=auth_headers)).json()
+            assert body["total"] == len(mapped)
+            assert all(item["competitor_count"] == 2 for item in body["products"])
+            names += [item["name"] for item in body["products"]]
+            cursor = body["next_cursor"]
+            if cursor is None:
+                break
+
+        assert names == sorted(p.name for p in mapped)
+
+    @pytest.mark.asyncio
+    async def test_dropdown_call_without_limit_returns_every_mapped_product(
+        self, client: AsyncClient, auth_headers: dict, db_session: AsyncSession, monkeypatch
+    ):
+        monkeypatch.setattr(price_trends, "TREND_PRODUCTS_PAGE_SIZE", 5)
+        products = [Product(sku=f"MAP-{i:03d}", name=f"Mapped {i:03d}", price=Decimal("10")) for i in range(12)]
+        db_session.add_all(products)
+        await db_session.flush()
+        db_session.add_all(
+            ProductCompetitorMapping(product_id=p.id, competitor_product_id=uuid.uuid4()) for p in products
+        )
+        await db_session.commit()
+
+        # 與 frontend getProductsWithTrends 相同：只帶 search（或什麼都不帶），不跟隨游標
+        body = (await client.get("/api/v1/price-trends/products", headers=auth_headers)).json()
+        assert [item["name"] for item in body["products"]] == sorted(p.name for p in products)
+        assert body["total"] == 12 and body["next_cursor"] is None
+
+        body = (await client.get(
+            "/api/v1/price-trends/products", params={"search": "Mapped"}, headers=auth_headers
+        )).json()
+        assert len(body["products"]) == 12 and body["next_cursor"] is None
@@ -0,0 +1,107 @@
+"""SKU 利潤排行榜：SQL 生成列排序 + keyset 分頁"""
+from decimal import Decimal
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.product import Product
+
+URL = "/api/v1/products/profitability-ranking"
+
+
+@pytest.fixture
+async def ranked_products(db_session: AsyncSession) -> list[Product]:
+    products = [
+        Product(sku=f"SKU-{i:03d}", name=f"商品 {i}", price=Decimal(100 + i * 7 % 50), cost=Decimal(50 + i % 5),
+                category="seafood" if i % 2 else "meat")
+        for i in range(25)
+    ]
+    # 無成本 / 零成本的商品不進排行榜
+    products.append(Product(sku="NO-COST", name="無成本", price=Decimal("99")))
+    products.append(Product(sku="ZERO-COST", name="零成本", price=Decimal("99"), cost=Decimal("0")))
+    db_session.add_all(products)
+    await db_session.commit()
+    return products[:25]
+
+
+def _expected(products: list[Product], key: str) -> list[str]:
+    def value(p: Product) -> Decimal:
+        amount = p.price - p.cost
+        return amount if key == "profit_amount" else amount * 100 / p.cost
+    return [p.sku for p in sorted(products, key=lambda p: (value(p), str(p.id)), reverse=True)]
+
+
+class TestProfitabilityRanking:
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("sort_by", ["profit_margin", "profit_amount"])
+    async def test_cursor_pages_cover_ranking(
+        self, client: AsyncClient, auth_headers: dict, ranked_products, sort_by: str
+    ):
+        skus: list[str] = []
+        cursor = None
+        while True:
+            params = {"sort_by": sort_by, "limit": 10}
+            if cursor:
+                params["cursor"] = cursor
+            resp = await client.get(URL, params=params, headers=auth_headers)
+            assert resp.status_code == 200
+            body = resp.json()
+            assert body["total"] == 25
+            skus += [item["sku"] for item in body["data"]]
+            cursor = body["next_cursor"]
+            if cursor is None:
+                break
+
+        assert skus == _expected(ranked_products, sort_by)
+
+    @pytest.mark.asyncio
+    async def test_filters_and_average_in_sql(self, client: AsyncClient, auth_headers: dict, ranked_products):
+        resp = await client.get(
+            URL,
+            params={"category": "seafood", "min_profit_margin": 80, "limit": 100},
+            headers=auth_headers,
+        )
+        body = resp.json()
+
+        expected = [
+            p for p in ranked_products
+            if p.category == "seafood" and (p.price - p.cost) * 100 / p.cost >= 80
+        ]
+        margins = [float((p.price - p.cost) * 100 / p.cost) for p in expected]
+        assert body["total"] == len(expected)
+        assert [item["sku"] for item in body["data"]] == _expected(expected, "profit_margin")
+        assert body["avg_profit_margin"] == pytest.approx(sum(margins) / len(margins), rel=1e-3)
+        assert body["next_cursor"] is None
+
+    @pytest.mark.asyncio
+    async def test_page_param_still_supported(self, client: AsyncClient, auth_headers: dict, ranked_products):
+        resp = await client.get(URL, params={"page": 3, "limit": 10}, headers=auth_headers)
+
+        assert [item["sku"] for item in resp.json()["data"]] == _expected(ranked_products, "profit_margin")[20:]
+
+    @pytest.mark.asyncio
+    async def test_invalid_cursor_rejected(self, client: AsyncClient, auth_headers: dict, ranked_products):
+        resp = await client.get(URL, params={"cursor": "not-a-cursor"}, headers=auth_headers)
+
+        assert resp.status_code == 400
+
+    @pytest.mark.asyncio
+    async def test_tiny_cost_margin_does_not_overflow(
+        self, client: AsyncClient, auth_headers: dict, db_session: AsyncSession, ranked_products
+    ):
+        # 成本 0.01、售價 1e6 → 利潤率約 1e10%，超出任何定長 NUMERIC；SQLite 不校驗精度，故同時斷言列不限精度
+        assert Product.__table__.c.profit_margin.type.precision is None
+        db_session.add(Product(sku="TINY-COST", name="極低成本", price=Decimal("1000000"), cost=Decimal("0.01")))
+        await db_session.commit()
+
+        resp = await client.get(URL, params={"limit": 1}, headers=auth_headers)
+        body = resp.json()
+        assert resp.status_code == 200
+        assert body["data"][0]["sku"] == "TINY-COST"
+        assert body["data"][0]["profit_margin"] == pytest.approx(9999999900.0)
+
+        # 游標攜帶超大利潤率仍能續頁
+        resp = await client.get(URL, params={"limit": 100, "cursor": body["next_cursor"]}, headers=auth_headers)
+        assert [item["sku"] for item in resp.json()["data"]] == _expected(ranked_products, "profit_margin")
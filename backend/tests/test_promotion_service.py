@@ -0,0 +1,116 @@
+"""推廣建議引擎：全量商品、反連接去重、向量化分級與舊逐行邏輯一致"""
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Optional
+
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.product import Product
+from app.models.promotion import PromotionProposal
+from app.services.dashboard_counters import get_dashboard_counters
+from app.services.promotion_service import PromotionService
+
+
+def _legacy_plan(price: Decimal, cost: Optional[Decimal]):
+    """原逐行 Decimal 邏輯，作為對照"""
+    cost = cost or price * Decimal("0.6")
+    margin = (price - cost) / price
+    if margin > Decimal("0.5"):
+        discount = Decimal("15.0")
+    elif margin > Decimal("0.3"):
+        discount = Decimal("5.0")
+    else:
+        return None
+    discounted = price * (Decimal("1") - discount / Decimal("100"))
+    profit = discounted - cost - discounted * Decimal("0.15") - Decimal("30.0")
+    if profit <= 0:
+        return None
+    return discount, discounted, profit, profit / discounted * 100
+
+
+def _cents(value: Decimal) -> Decimal:
+    return value.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+
+
+def _product(i: int, price: str, cost: Optional[str], status: str = "active") -> Product:
+    return Product(
+        sku=f"PROMO-{i:04d}",
+        name=f"商品 {i}",
+        price=Decimal(price),
+        cost=Decimal(cost) if cost is not None else None,
+        status=status,
+    )
+
+
+class TestGenerateSuggestions:
+
+    @pytest.mark.asyncio
+    async def test_full_catalog_matches_legacy_logic(self, db_session: AsyncSession):
+        products = []
+        for i in range(120):
+            price = str(50 + i * 7)
+            cost = None if i % 4 == 0 else str((50 + i * 7) * (0.2 + (i % 9) * 0.08))[:8]
+            products.append(_product(i, price, cost))
+        products.append(_product(999, "500", "100", status="inactive"))
+        db_session.add_all(products)
+        await db_session.commit()
+
+        count = await PromotionService(db_session).generate_suggestions()
+
+        proposals = {
+            p.product_id: p for p in (await db_session.execute(select(PromotionProposal))).scalars()
+        }
+        expected = {
+            p.id: _legacy_plan(p.price, p.cost) for p in products if p.status == "active"
+        }
+        expected = {k: v for k, v in expected.items() if v is not None}
+
+        assert count == len(expected) > 50
+        assert proposals.keys() == expected.keys()
+        for product_id, (discount, discounted, profit, margin) in expected.items():
+            proposal = proposals[product_id]
+            assert proposal.discount_percent == discount
+            assert proposal.discounted_price == _cents(discounted)
+            assert proposal.projected_profit == _cents(profit)
+            assert proposal.projected_margin == _cents(margin)
+            assert proposal.status == "pending"
+
+    @pytest.mark.asyncio
+    async def test_skips_pending_and_is_idempotent(self, db_session: AsyncSession):
+        first, second = _product(1, "200", "60"), _product(2, "300", "120")
+        db_session.add_all([first, second])
+        await db_session.commit()
+        service = PromotionService(db_session)
+
+        assert await service.generate_suggestions() == 2
+        assert await service.generate_suggestions() == 0
+
+        total = await db_session.scalar(select(func.count(PromotionProposal.id)))
+        assert total == 2
+        assert (await get_dashboard_counters(db_session)).pending_promotion_reviews == 2
+
+        # 批准後不再視為待審，可再次生成
+        proposal = (await db_session.execute(
+            select(PromotionProposal).where(PromotionProposal.product_id == first.id)
+        )).scalar_one()
+        await service.approve_proposal(proposal.id)
+        assert await service.generate_suggestions() == 1
+
+    @pytest.mark.asyncio
+    async def test_tiers_are_configurable(self, db_session: AsyncSession, monkeypatch):
+        from app.config import get_settings
+
+        settings = get_settings()
+        monkeypatch.setattr(settings, "promotion_margin_tiers", [(0.1, 20.0, "自訂分級")])
+        monkeypatch.setattr(settings, "promotion_shipping_cost", 0.0)
+        monkeypatch.setattr(settings, "promotion_commission_rate", 0.0)
+        db_session.add(_product(1, "100", "75"))
+        await db_session.commit()
+
+        assert await PromotionService(db_session).generate_suggestions() == 1
+
+        proposal = (await db_session.execute(select(PromotionProposal))).scalar_one()
+        assert proposal.discount_percent == Decimal("20.0")
+        assert proposal.projected_profit == Decimal("5.00")
+        assert proposal.reason == "自訂分級"
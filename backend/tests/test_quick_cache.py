@@ -0,0 +1,220 @@
+"""快速回覆快取：Redis 共享後端、SingleFlight 合併未命中、事件 / ORM 寫入驅動失效"""
+import asyncio
+
+import fakeredis
+import pytest
+import redis.asyncio as redis
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.agents.events import EventBus, Events
+from app.models.competitor import Competitor, CompetitorProduct, PriceAlert
+from app.services.agent import cache_backend
+from app.services.agent.cache_backend import MemoryCacheBackend, RedisCacheBackend, SingleFlight
+from app.services.agent.quick_cache import (
+    QuickCacheService,
+    register_quick_cache_invalidation,
+    wait_for_invalidations,
+)
+
+
+@pytest.fixture
+def shared_redis() -> fakeredis.FakeServer:
+    """兩個 worker 共用的 Redis；全局後端指向其中一個連接"""
+    server = fakeredis.FakeServer()
+    cache_backend.set_cache_backend(RedisCacheBackend(fakeredis.FakeAsyncRedis(server=server)))
+    yield server
+    cache_backend.set_cache_backend(None)
+
+
+async def _seed_alerts(db: AsyncSession, alert_types: list[str]) -> None:
+    competitor = Competitor(name="Rival", platform="hktvmall")
+    db.add(competitor)
+    await db.flush()
+    product = CompetitorProduct(competitor_id=competitor.id, name="和牛", url="https://example.com/wagyu")
+    db.add(product)
+    await db.flush()
+    db.add_all(
+        PriceAlert(competitor_product_id=product.id, alert_type=t, change_percent=15) for t in alert_types
+    )
+    await db.commit()
+
+
+class TestQuickCacheBackends:
+
+    @pytest.mark.asyncio
+    async def test_workers_share_summaries_through_redis(self, db_session: AsyncSession, shared_redis):
+        await _seed_alerts(db_session, ["price_drop", "out_of_stock", "price_increase"])
+        worker_a = QuickCacheService(db_session)
+        worker_b = QuickCacheService(
+            db_session, backend=RedisCacheBackend(fakeredis.FakeAsyncRedis(server=shared_redis))
+        )
+
+        first = await worker_a.get_quick_response("alert_query")
+        assert first.data["alerts_summary"]["total"] == 3
+        assert first.data["alerts_summary"]["urgent"] == 3
+
+        async def fail():
+            raise AssertionError("worker B should hit the shared cache")
+
+        worker_b._refresh_alerts_summary = fail
+        second = await worker_b.get_quick_response("alert_query")
+        assert second.data["alerts_summary"] == first.data["alerts_summary"]
+
+    @pytest.mark.asyncio
+    async def test_redis_outage_falls_back_to_memory(self):
+        backend = RedisCacheBackend(redis.Redis(host="127.0.0.1", port=1, socket_connect_timeout=0.2))
+
+        await backend.set("quick:orders:today", {"count": 3}, 60)
+
+        assert await backend.get("quick:orders:today") == {"count": 3}
+        await backend.delete("quick:orders:today")
+        assert await backend.get("quick:orders:today") is None
+
+    @pytest.mark.asyncio
+    async def test_memory_backend_expires_entries(self):
+        now = [100.0]
+        backend = MemoryCacheBackend(clock=lambda: now[0])
+        await backend.set("k", {"v": 1}, 30)
+        now[0] += 29
+        assert await backend.get("k") == {"v": 1}
+        now[0] += 1
+        assert await backend.get("k") is None
+
+
+class TestSingleFlight:
+
+    @pytest.mark.asyncio
+    async def test_concurrent_misses_compute_once(self, db_session: AsyncSession, shared_redis):
+        service = QuickCacheService(db_session)
+        calls = {"orders_today": 0, "orders_pending": 0}
+
+        def slow_refresh(key, data):
+            async def refresh():
+                calls[key] += 1
+                await asyncio.sleep(0.05)
+                await service._set_cache(key, data)
+            return refresh
+
+        service._refresh_orders_today = slow_refresh("orders_today", {"count": 7, "revenue": 700.0, "avg_price": 100.0})
+        service._refresh_orders_pending = slow_refresh("orders_pending", {"pending": 2, "to_ship": 1})
+
+        responses = await asyncio.gather(*(service.get_quick_response("order_stats") for _ in range(20)))
+
+        assert calls == {"orders_today": 1, "orders_pending": 1}
+        assert all(r.data["orders_today"]["count"] == 7 for r in responses)
+
+    @pytest.mark.asyncio
+    async def test_failure_is_shared_and_not_cached(self):
+        flight = SingleFlight()
+        attempts = 0
+
+        async def boom():
+            nonlocal attempts
+            attempts += 1
+            await asyncio.sleep(0.01)
+            raise RuntimeError("db down")
+
+        results = await asyncio.gather(*(flight.do("k", boom) for _ in range(5)), return_exceptions=True)
+
+        assert attempts == 1
+        assert all(isinstance(r, RuntimeError) for r in results)
+        assert flight.in_flight == 0
+        assert await flight.do("k", lambda: asyncio.sleep(0, result="ok")) == "ok"
+
+
+    @pytest.mark.asyncio
+    async def test_waiters_take_over_when_leader_is_cancelled(self):
+        flight = SingleFlight()
+        attempts = 0
+
+        async def compute():
+            nonlocal attempts
+            attempts += 1
+            await asyncio.sleep(0.05)
+            return f"result {attempts}"
+
+        leader = asyncio.create_task(flight.do("k", compute))
+        await asyncio.sleep(0)
+        waiters = [asyncio.create_task(flight.do("k", compute)) for _ in range(3)]
+        doomed = asyncio.create_task(flight.do("k", compute))
+        await asyncio.sleep(0.01)
+
+        doomed.cancel()
+        leader.cancel()
+
+        # 領頭者被取消：等待者由其中一個接手重算並共享結果；自己被取消的等待者照常取消
+        assert await asyncio.gather(*waiters) == ["result 2"] * 3
+        assert attempts == 2
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        with pytest.raises(asyncio.CancelledError):
+            await doomed
+        assert flight.in_flight == 0
+
+
+class TestQuickCacheInvalidation:
+
+    @pytest.mark.asyncio
+    async def test_agent_events_invalidate_affected_keys(self, db_session: AsyncSession, shared_redis):
+        bus = EventBus()
+        register_quick_cache_invalidation(bus)
+        register_quick_cache_invalidation(bus)
+        service = QuickCacheService(db_session)
+        await service._set_cache("orders_today", {"count": 1})
+        await service._set_cache("alerts_summary", {"total": 1})
+
+        await bus.emit(Events.ORDER_SYNCED, {"orders": 5})
+
+        assert await service._get_cache("orders_today") is None
+        assert await service._get_cache("alerts_summary") == {"total": 1}
+
+        await bus.emit(Events.PRICE_ALERT_CREATED, {})
+        assert await service._get_cache("alerts_summary") is None
+
+    @pytest.mark.asyncio
+    async def test_orm_writes_invalidate_after_commit(self, db_session: AsyncSession, shared_redis):
+        await _seed_alerts(db_session, ["price_drop"])
+        service = QuickCacheService(db_session)
+        assert (await service.get_quick_response("alert_query")).data["alerts_summary"]["total"] == 1
+        await wait_for_invalidations()
+
+        # 新警報：提交前不失效，提交後立即失效（不等 TTL）
+        product = (await db_session.execute(select(CompetitorProduct))).scalar_one()
+        db_session.add(PriceAlert(competitor_product_id=product.id, alert_type="out_of_stock"))
+        await db_session.flush()
+        assert await service._get_cache("alerts_summary") is not None
+        await db_session.commit()
+        await wait_for_invalidations()
+        assert await service._get_cache("alerts_summary") is None
+        assert (await service.get_quick_response("alert_query")).data["alerts_summary"]["total"] == 2
+
+        # 批量 UPDATE（不經 flush）同樣失效
+        await db_session.execute(update(PriceAlert).values(is_read=True))
+        await db_session.commit()
+        await wait_for_invalidations()
+        assert (await service.get_quick_response("alert_query")).data["alerts_summary"]["urgent"] == 0
+
+        # 回滾的寫入不觸發失效
+        db_session.add(PriceAlert(competitor_product_id=product.id, alert_type="price_drop"))
+        await db_session.flush()
+        await db_session.rollback()
+        await wait_for_invalidations()
+        assert await service._get_cache("alerts_summary") is not None
+
+    @pytest.mark.asyncio
+    async def test_urgent_means_unread_like_alert_tool(self, db_session: AsyncSession):
+        """與完整 Agent 路徑同一口徑：format_alert_summary 以 AlertQueryTool 的 unread_count 作緊急數"""
+        await _seed_alerts(db_session, ["price_drop", "out_of_stock", "price_increase", "back_in_stock"])
+        await db_session.execute(update(PriceAlert).where(PriceAlert.alert_type == "out_of_stock").values(is_read=True))
+        await db_session.commit()
+        cache_backend.set_cache_backend(MemoryCacheBackend())
+        try:
+            summary = (await QuickCacheService(db_session).get_quick_response("alert_query")).data["alerts_summary"]
+        finally:
+            cache_backend.set_cache_backend(None)
+
+        assert summary["total"] == 4
+        assert summary["urgent"] == 3
+        assert summary["price_alerts"] == 2
+        assert summary["stockout_alerts"] == 1
@@ -0,0 +1,170 @@
+"""全局限速中間件：Redis 令牌桶 + 本地 LRU 回退"""
+import fakeredis
+import pytest
+import redis.asyncio as redis
+from fastapi import FastAPI
+from httpx import AsyncClient, ASGITransport
+
+from app.main import RateLimitMiddleware
+from app.services.rate_limiter import (
+    LocalRateLimiterFallback,
+    RateLimiterConfig,
+    TokenBucketRateLimiter,
+)
+
+
+def _build_app(redis_client, requests_per_minute: int = 5, login_limit: int = 2) -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(
+        RateLimitMiddleware,
+        requests_per_minute=requests_per_minute,
+        login_limit=login_limit,
+        redis_client=redis_client,
+    )
+
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    @app.post("/api/v1/auth/login")
+    async def login():
+        return {"ok": True}
+
+    @app.get("/health")
+    async def health():
+        return {"status": "healthy"}
+
+    return app
+
+
+def _client(app: FastAPI) -> AsyncClient:
+    return AsyncClient(transport=ASGITransport(app=app), base_url="http://test")
+
+
+class TestLocalFallback:
+
+    def test_bucket_count_is_bounded(self):
+        fallback = LocalRateLimiterFallback(max_buckets=100)
+        for i in range(1000):
+            fallback.acquire(f"ip:{i}", rate=1.0, burst_size=5)
+        assert len(fallback) == 100
+
+    def test_recently_used_bucket_survives_eviction(self):
+        fallback = LocalRateLimiterFallback(max_buckets=3)
+        for _ in range(5):
+            fallback.acquire("hot", rate=0.001, burst_size=5)
+        for i in range(2):
+            fallback.acquire(f"cold:{i}", rate=0.001, burst_size=5)
+        fallback.acquire("hot", rate=0.001, burst_size=5)
+        fallback.acquire("cold:new", rate=0.001, burst_size=5)
+
+        # hot 桶仍在且已耗盡
+        success, _ = fallback.acquire("hot", rate=0.001, burst_size=5)
+        assert success is False
+
+
+class TestTokenBucketCheck:
+
+    @pytest.mark.asyncio
+    async def test_sub_second_wait_is_reported(self):
+        """Lua 返回字串，小於 1 秒的等待時間不會被截斷為 0 而誤放行"""
+        limiter = TokenBucketRateLimiter(
+            fakeredis.FakeAsyncRedis(),
+            RateLimiterConfig(requests_per_window=120, window_seconds=60, burst_size=1),
+        )
+        first = await limiter.check("ip")
+        second = await limiter.check("ip")
+
+        assert first.allowed is True
+        assert second.allowed is False
+        assert 0 < second.retry_after <= 0.5
+
+    @pytest.mark.asyncio
+    async def test_script_flush_falls_back_to_eval(self):
+        """SCRIPT FLUSH 後 EVALSHA 報 NoScriptError，改用 EVAL 並繼續使用 Redis 計數"""
+        client = fakeredis.FakeAsyncRedis()
+        limiter = TokenBucketRateLimiter(
+            client, RateLimiterConfig(requests_per_window=2, window_seconds=60, burst_size=2),
+        )
+        evals = []
+        original_eval = client.eval
+
+        async def spy_eval(*args):
+            evals.append(args[0])
+            return await original_eval(*args)
+
+        client.eval = spy_eval
+
+        first = await limiter.check("ip")
+        await client.script_flush()
+        second = await limiter.check("ip")
+        third = await limiter.check("ip")
+
+        assert evals == [limiter.LUA_SCRIPT]
+        assert [first.allowed, second.allowed, third.allowed] == [True, True, False]
+        assert limiter._redis_retry_at == 0.0  # 沒有進入本地回退冷卻期
+
+    @pytest.mark.asyncio
+    async def test_falls_back_locally_when_redis_down(self):
+        limiter = TokenBucketRateLimiter(
+            redis.from_url("redis://127.0.0.1:1", socket_connect_timeout=0.1),
+            RateLimiterConfig(requests_per_window=2, window_seconds=60, burst_size=2),
+            key_prefix="test_fallback",
+        )
+        results = [await limiter.check("ip") for _ in range(3)]
+        assert [r.allowed for r in results] == [True, True, False]
+        assert results[-1].retry_after > 0
+
+
+class TestRateLimitMiddleware:
+
+    @pytest.mark.asyncio
+    async def test_rejects_after_limit_with_retry_after(self):
+        app = _build_app(fakeredis.FakeAsyncRedis())
+        async with _client(app) as ac:
+            statuses = [(await ac.get("/ping")).status_code for _ in range(6)]
+            blocked = await ac.get("/ping")
+
+        assert statuses[:5] == [200] * 5
+        assert statuses[5] == 429
+        assert int(blocked.headers["Retry-After"]) >= 1
+
+    @pytest.mark.asyncio
+    async def test_limit_is_shared_between_workers(self):
+        """兩個 app 實例（模擬兩個 worker）共用同一個 Redis 桶"""
+        shared = fakeredis.FakeServer()
+        worker_a = _build_app(fakeredis.FakeAsyncRedis(server=shared))
+        worker_b = _build_app(fakeredis.FakeAsyncRedis(server=shared))
+
+        async with _client(worker_a) as a, _client(worker_b) as b:
+            for _ in range(3):
+                assert (await a.get("/ping")).status_code == 200
+            for _ in range(2):
+                assert (await b.get("/ping")).status_code == 200
+            assert (await b.get("/ping")).status_code == 429
+            assert (await a.get("/ping")).status_code == 429
+
+    @pytest.mark.asyncio
+    async def test_login_has_stricter_limit(self):
+        app = _build_app(fakeredis.FakeAsyncRedis())
+        async with _client(app) as ac:
+            statuses = [(await ac.post("/api/v1/auth/login")).status_code for _ in range(3)]
+
+        assert statuses == [200, 200, 429]
+
+    @pytest.mark.asyncio
+    async def test_health_is_exempt(self):
+        app = _build_app(fakeredis.FakeAsyncRedis(), requests_per_minute=1)
+        async with _client(app) as ac:
+            statuses = [(await ac.get("/health")).status_code for _ in range(5)]
+
+        assert statuses == [200] * 5
+
+    @pytest.mark.asyncio
+    async def test_rate_limit_headers(self):
+        app = _build_app(fakeredis.FakeAsyncRedis())
+        async with _client(app) as ac:
+            resp = await ac.get("/ping")
+
+        assert resp.headers["X-RateLimit-Limit"] == "5"
+        assert resp.headers["X-RateLimit-Remaining"] == "4"
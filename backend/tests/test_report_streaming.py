@@ -0,0 +1,162 @@
+"""報告串流：段落按順序生成即推送，AI 洞察與段落同時開始並逐段推送"""
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.v1 import agent as agent_api
+
+from app.services.agent.agent_service_db import AgentService, ResponseType
+from app.services.agent.report_generator import ReportGenerator
+from app.services.agent.tools.base import ToolResult
+from app.services.ai_service import AIResponse
+
+INSIGHT_TOKENS = ["## 🎯 關鍵發現\n\n", "1. **和牛", "價格上升**", "：需要跟進\n"]
+
+
+class FakeAIService:
+    """假 AI 服務：記錄串流開始時間，逐個 token 產出"""
+
+    def __init__(self, tokens=INSIGHT_TOKENS, delay: float = 0.01, fail_after: int = None):
+        self.tokens = tokens
+        self.delay = delay
+        self.fail_after = fail_after
+        self.prompts = []
+        self.started_at = None
+
+    async def call_ai(self, prompt: str, max_tokens: int = 2048) -> AIResponse:
+        return AIResponse(content="", model="fake", success=False, error="not used")
+
+    async def stream_ai(self, prompt: str, max_tokens: int = 2048):
+        self.prompts.append(prompt)
+        self.started_at = time.perf_counter()
+        for i, token in enumerate(self.tokens):
+            if i == self.fail_after:
+                raise RuntimeError("連接中斷")
+            await asyncio.sleep(self.delay)
+            yield token
+
+
+def _tool_results() -> dict:
+    return {
+        "product_overview": {"success": True, "data": {"results": [
+            {"product_type": "和牛", "sku_count": 4, "avg_price": 300, "min_price": 200, "max_price": 500,
+             "avg_rating": 4.5, "total_reviews": 12, "in_stock_count": 2, "on_sale_count": 1},
+        ]}},
+        "price_trend": {"success": True, "data": {"results": {
+            "和牛": {"change_pct": 5.0, "trend": "up", "data": [
+                {"period": "2026-10-01", "avg_price": 280}, {"period": "2026-10-08", "avg_price": 300},
+            ]},
+        }}},
+        "competitor_compare": {"success": True, "data": {"our_data": [], "competitor_data": []}},
+    }
+
+
+class TestReportStream:
+
+    @pytest.mark.asyncio
+    async def test_sections_emit_in_order_and_insights_overlap(self):
+        ai = FakeAIService()
+        generator = ReportGenerator(ai)
+        built_on = []
+        build = generator._build_section
+
+        def record_thread(*args):
+            built_on.append(threading.get_ident())
+            return build(*args)
+
+        generator._build_section = record_thread
+
+        events, emitted_at = [], []
+        async for event in generator.stream(["和牛"], _tool_results()):
+            events.append(event)
+            emitted_at.append(time.perf_counter())
+
+        sections = [e.section for e in events if e.type == "section"]
+        assert [(s.key, s.index) for s in sections] == [
+            ("product_overview", 0), ("price_trend", 1), ("competitor_compare", 2),
+        ]
+        assert [e.type for e in events] == ["section"] * 3 + ["insight"] * 5 + ["done"]
+        # 段落格式化是純 Python：直接在事件循環線程上生成，不經線程池
+        assert built_on == [threading.get_ident()] * 3
+
+        # AI 請求在第一個段落產出之前已經開始
+        assert ai.started_at < emitted_at[0]
+
+        report = events[-1].report
+        insight = "".join(e.delta for e in events if e.type == "insight")
+        assert insight == "\n---\n\n" + "".join(INSIGHT_TOKENS)
+        assert report.markdown.endswith(insight)
+        positions = [report.markdown.index(s) for s in ("## 📊 產品概覽", "## 📈 價格趨勢", "## ⚔️ 競爭對手比較", "## 🎯")]
+        assert positions == sorted(positions)
+        assert [c.title for c in report.charts] == ["價格趨勢"]
+        assert [t.title for t in report.tables] == ["產品概覽"]
+
+    @pytest.mark.asyncio
+    async def test_generate_returns_full_report_and_reports_stream_failure(self):
+        ai = FakeAIService(fail_after=2)
+
+        report = await ReportGenerator(ai).generate(["和牛"], _tool_results())
+
+        assert "1. **和牛" in report.markdown
+        assert report.markdown.endswith("⚠️ AI 洞察生成中斷: 連接中斷\n")
+        assert len(ai.prompts) == 1 and "和牛" in ai.prompts[0]
+
+
+def _agent(db: AsyncSession) -> AgentService:
+    service = AgentService(db, ai_service=FakeAIService())
+
+    async def execute(intent, slots):
+        return {
+            name: ToolResult(tool_name=name, success=True, data=data)
+            for name, data in _tool_results().items()
+        }
+
+    service.tool_executor.execute = execute
+    return service
+
+
+class TestAgentReportStreaming:
+
+    @pytest.mark.asyncio
+    async def test_process_message_streams_partial_report(self, db_session: AsyncSession):
+        service = _agent(db_session)
+
+        responses = [r async for r in service.process_message("和牛價格趨勢")]
+
+        types = [r.type for r in responses if r.type != ResponseType.THINKING]
+        assert types == [ResponseType.REPORT_SECTION] * 3 + [ResponseType.REPORT_DELTA] * 5 + [ResponseType.REPORT]
+        first_section = next(r for r in responses if r.type == ResponseType.REPORT_SECTION)
+        assert first_section.report["section"] == "product_overview"
+        assert first_section.to_dict()["content"].startswith("## 📊 產品概覽")
+
+        final = responses[-1]
+        deltas = "".join(r.content for r in responses if r.type == ResponseType.REPORT_DELTA)
+        assert final.content.endswith(deltas)
+        assert final.state.messages[-1].content == final.content
+
+    @pytest.mark.asyncio
+    async def test_chat_stream_endpoint_forwards_sections(
+        self, client: AsyncClient, auth_headers: dict, monkeypatch
+    ):
+        async def get_agent_service(db):
+            return _agent(db)
+
+        monkeypatch.setattr(agent_api, "get_agent_service", get_agent_service)
+
+        resp = await client.post("/api/v1/agent/chat/stream", json={"content": "和牛價格趨勢"}, headers=auth_headers)
+
+        assert resp.status_code == 200
+        assert resp.headers["content-type"].startswith("text/event-stream")
+        events = [
+            (block.split("\n")[0].removeprefix("event: "), json.loads(block.split("\n")[1].removeprefix("data: ")))
+            for block in resp.text.strip().split("\n\n")
+        ]
+        names = [name for name, _ in events if name != "thinking"]
+        assert names == ["report_section"] * 3 + ["report_delta"] * 5 + ["report"]
+        assert events[-1][1]["report"]["markdown"] == events[-1][1]["content"]
+        assert all(data["conversation_id"] == events[-1][1]["conversation_id"] for _, data in events)
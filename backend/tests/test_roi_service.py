@@ -3,6 +3,7 @@
 # 測試 ROI 計算邏輯的正確性
 # =============================================
 
+import fakeredis
 import pytest
 import pytest_asyncio
 from datetime import datetime, timedelta
@@ -14,7 +15,19 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from app.models.product import Product
 from app.models.pricing import PriceProposal, ProposalStatus
 from app.models.competitor import Competitor, CompetitorProduct, PriceAlert
-from app.services.roi_service import ROIService
+from sqlalchemy import event
+
+from app.services.agent import cache_backend
+from app.services.agent.cache_backend import MemoryCacheBackend, RedisCacheBackend
+from app.services.roi_service import ROIService, invalidate_trends_cache
+
+
+@pytest.fixture(autouse=True)
+def _isolated_cache_backend():
+    """趨勢緩存走共享快取後端：每個用例一個獨立的內存後端，避免互相污染"""
+    cache_backend.set_cache_backend(MemoryCacheBackend())
+    yield
+    cache_backend.set_cache_backend(None)
 
 
 class TestROIServiceDateRange:
@@ -269,6 +282,137 @@ class TestROITrends:
             assert trend.cumulative_value is not None
 
 
+    @pytest.mark.asyncio
+    async def test_get_trends_single_query_with_window_cumsum(
+        self,
+        db_session: AsyncSession,
+        test_product: Product,
+        test_competitor_product: CompetitorProduct
+    ):
+        """一條 SQL 完成分桶、補零和累計 (90 天不再是 180 次查詢)"""
+        now = datetime.utcnow()
+        db_session.add_all([
+            PriceProposal(
+                product_id=test_product.id, status=ProposalStatus.EXECUTED,
+                current_price=Decimal("100.00"), final_price=Decimal("110.00"),
+                executed_at=now - timedelta(days=3)
+            ),
+            PriceProposal(
+                product_id=test_product.id, status=ProposalStatus.EXECUTED,
+                current_price=Decimal("100.00"), final_price=Decimal("125.00"),
+                executed_at=now - timedelta(days=3, hours=1)
+            ),
+            PriceAlert(
+                competitor_product_id=test_competitor_product.id, alert_type="price_drop",
+                change_percent=Decimal("-25.00"), created_at=now - timedelta(days=1)
+            ),
+        ])
+        await db_session.commit()
+
+        statements: list[str] = []
+        engine = db_session.bind.sync_engine
+
+        def record(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(engine, "before_cursor_execute", record)
+        try:
+            response = await ROIService(db_session).get_trends(days=90)
+        finally:
+            event.remove(engine, "before_cursor_execute", record)
+
+        assert len(statements) == 1
+        assert len(response.trends) == 91
+        by_date = {t.date: t for t in response.trends}
+        # 同一天兩個提案合併：(10 + 25) × 10
+        assert by_date[(now - timedelta(days=3)).strftime("%Y-%m-%d")].ai_pricing == Decimal("350")
+        # 1 個告警 × 25% × 200
+        alert_day = by_date[(now - timedelta(days=1)).strftime("%Y-%m-%d")]
+        assert alert_day.monitoring == Decimal("50")
+        assert alert_day.risk_avoidance == Decimal("15")
+        assert response.trends[-1].cumulative_value == Decimal("415")
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("granularity,expected", [("week", {13, 14}), ("month", {3, 4})])
+    async def test_get_trends_coarser_granularity(
+        self, db_session: AsyncSession, test_product: Product, granularity: str, expected: set
+    ):
+        """週 / 月粒度：桶起點對齊 date_trunc，總額與日粒度一致"""
+        now = datetime.utcnow()
+        db_session.add_all(
+            PriceProposal(
+                product_id=test_product.id, status=ProposalStatus.EXECUTED,
+                current_price=Decimal("100.00"), final_price=Decimal("101.00"),
+                executed_at=now - timedelta(days=d)
+            )
+            for d in (1, 20, 40, 80)
+        )
+        await db_session.commit()
+
+        response = await ROIService(db_session).get_trends(days=90, granularity=granularity)
+
+        assert len(response.trends) in expected
+        first = datetime.strptime(response.trends[0].date, "%Y-%m-%d")
+        assert first.weekday() == 0 if granularity == "week" else first.day == 1
+        assert sum(t.ai_pricing for t in response.trends) == Decimal("40")
+        assert response.trends[-1].cumulative_value == Decimal("40")
+
+    @pytest.mark.asyncio
+    async def test_get_trends_cache_invalidated_on_execution(
+        self, db_session: AsyncSession, test_product: Product
+    ):
+        """結果按 (days, granularity) 緩存；提案執行後失效"""
+        from app.services.pricing_service import PricingService
+
+        service = ROIService(db_session)
+        assert (await service.get_trends(days=7)).trends[-1].cumulative_value == Decimal("0")
+
+        proposal = PriceProposal(
+            product_id=test_product.id, status=ProposalStatus.PENDING,
+            current_price=Decimal("100.00"), proposed_price=Decimal("120.00")
+        )
+        db_session.add(proposal)
+        await db_session.commit()
+        # 未執行：仍返回緩存
+        assert (await service.get_trends(days=7)).trends[-1].cumulative_value == Decimal("0")
+
+        pricing = PricingService(db_session)
+        pricing._execute_hktv_update = lambda *args, **kwargs: _noop()
+        await pricing.approve_proposal(proposal.id)
+
+        assert (await service.get_trends(days=7)).trends[-1].cumulative_value == Decimal("200")
+
+    @pytest.mark.asyncio
+    async def test_get_trends_cache_shared_across_workers(
+        self, db_session: AsyncSession, test_product: Product
+    ):
+        """緩存在共享後端：一個 worker 算好另一個直接命中，任一 worker 失效對全部生效"""
+        server = fakeredis.FakeServer()
+        worker_a = RedisCacheBackend(fakeredis.FakeAsyncRedis(server=server))
+        worker_b = RedisCacheBackend(fakeredis.FakeAsyncRedis(server=server))
+
+        cache_backend.set_cache_backend(worker_a)
+        first = await ROIService(db_session).get_trends(days=7)
+
+        db_session.add(PriceProposal(
+            product_id=test_product.id, status=ProposalStatus.EXECUTED,
+            current_price=Decimal("100.00"), final_price=Decimal("110.00"),
+            executed_at=datetime.utcnow()
+        ))
+        await db_session.commit()
+
+        cache_backend.set_cache_backend(worker_b)
+        assert await ROIService(db_session).get_trends(days=7) == first
+        await invalidate_trends_cache()
+
+        cache_backend.set_cache_backend(worker_a)
+        assert (await ROIService(db_session).get_trends(days=7)).trends[-1].cumulative_value == Decimal("100")
+
+
+async def _noop():
+    return None
+
+
 class TestPricingImpact:
     """測試 AI 改價影響分析"""
 
@@ -0,0 +1,131 @@
+"""SEO 排行榜：lag() 排名變化、完整範圍的分組摘要、keyset 分頁與按變化排序"""
+import random
+from datetime import datetime, timedelta
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.seo_ranking import KeywordConfig, KeywordRanking, KeywordType
+
+URL = "/api/v1/seo-ranking/leaderboard"
+
+
+async def _seed(db: AsyncSession, count: int = 45) -> list[dict]:
+    """每個關鍵詞 0–3 次追蹤；最新排名寫回配置，基準排名故意與歷史無關"""
+    rng = random.Random(42)
+    start = datetime(2026, 10, 1)
+    expected = []
+    for i in range(count):
+        config = KeywordConfig(
+            keyword=f"關鍵詞 {i:02d}", keyword_normalized=f"關鍵詞 {i:02d}",
+            keyword_type=rng.choice(list(KeywordType)),
+            baseline_google_rank=99,
+            target_google_rank=rng.choice([None, 5, 10]),
+        )
+        db.add(config)
+        await db.flush()
+        history = [rng.choice([None, *range(1, 50)]) for _ in range(rng.randint(0, 3))]
+        for day, rank in enumerate(history):
+            db.add(KeywordRanking(
+                keyword_config_id=config.id, keyword=config.keyword,
+                google_rank=rank, tracked_at=start + timedelta(days=day),
+            ))
+        current = history[-1] if history else rng.choice([None, 20])
+        config.latest_google_rank = current
+        previous = history[-2] if len(history) > 1 else None
+        expected.append({
+            "keyword": config.keyword,
+            "keyword_type": config.keyword_type.value,
+            "current_rank": current,
+            "previous_rank": previous,
+            "rank_change": previous - current if previous and current else None,
+            "target_gap": current - config.target_google_rank
+            if current and config.target_google_rank else None,
+        })
+    await db.commit()
+    return expected
+
+
+def _summary(entries: list[dict]) -> dict:
+    ranks = [e["current_rank"] for e in entries if e["current_rank"]]
+    return {
+        "total_keywords": len(entries),
+        "ranked_keywords": len(ranks),
+        "unranked_keywords": len(entries) - len(ranks),
+        "top_10_count": sum(r <= 10 for r in ranks),
+        "top_30_count": sum(r <= 30 for r in ranks),
+        "avg_rank": round(sum(ranks) / len(ranks), 1) if ranks else None,
+        "improved_count": sum(1 for e in entries if (e["rank_change"] or 0) > 0),
+        "declined_count": sum(1 for e in entries if (e["rank_change"] or 0) < 0),
+    }
+
+
+async def _all_pages(client: AsyncClient, headers: dict, **params) -> list[dict]:
+    entries, cursor = [], None
+    while True:
+        query = {**params, **({"cursor": cursor} if cursor else {})}
+        resp = await client.get(URL, params=query, headers=headers)
+        assert resp.status_code == 200, resp.text
+        body = resp.json()
+        entries += body["entries"]
+        cursor = body["next_cursor"]
+        if not cursor:
+            return entries
+
+
+class TestSEOLeaderboard:
+
+    @pytest.mark.asyncio
+    async def test_summary_covers_full_population_not_page(
+        self, client: AsyncClient, auth_headers: dict, db_session: AsyncSession
+    ):
+        expected = await _seed(db_session)
+        ranked = [e for e in expected if e["current_rank"] is not None]
+
+        resp = await client.get(URL, params={"limit": 5}, headers=auth_headers)
+
+        assert resp.status_code == 200, resp.text
+        body = resp.json()
+        assert len(body["entries"]) == 5 and body["next_cursor"]
+        assert body["summary"] == {"keyword_type": None, **_summary(ranked)}
+        assert body["type_summaries"] == [
+            {"keyword_type": t, **_summary([e for e in ranked if e["keyword_type"] == t])}
+            for t in sorted({e["keyword_type"] for e in ranked})
+        ]
+
+        unranked = await client.get(URL, params={"limit": 5, "include_unranked": True}, headers=auth_headers)
+        assert unranked.json()["summary"]["total_keywords"] == len(expected)
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("sort_by, field, reverse", [
+        ("rank_asc", "current_rank", False),
+        ("rank_desc", "current_rank", True),
+        ("change_asc", "rank_change", False),
+        ("change_desc", "rank_change", True),
+    ])
+    async def test_keyset_pages_follow_sort_with_nulls_last(
+        self, client: AsyncClient, auth_headers: dict, db_session: AsyncSession, sort_by, field, reverse
+    ):
+        expected = {e["keyword"]: e for e in await _seed(db_session)}
+
+        entries = await _all_pages(
+            client, auth_headers, sort_by=sort_by, limit=7, include_unranked=True
+        )
+
+        assert len(entries) == len(expected)
+        assert [e["rank"] for e in entries] == list(range(1, len(expected) + 1))
+        for entry in entries:
+            want = expected[entry["keyword"]]
+            assert (entry["current_rank"], entry["previous_rank"], entry["rank_change"], entry["target_gap"]) == (
+                want["current_rank"], want["previous_rank"], want["rank_change"], want["target_gap"]
+            )
+        values = [e[field] for e in entries]
+        present = [v for v in values if v is not None]
+        assert values[:len(present)] == present == sorted(present, reverse=reverse)
+
+    @pytest.mark.asyncio
+    async def test_invalid_cursor_is_rejected(self, client: AsyncClient, auth_headers: dict):
+        resp = await client.get(URL, params={"cursor": "not-a-cursor"}, headers=auth_headers)
+
+        assert resp.status_code == 400
@@ -0,0 +1,214 @@
+"""SEO 排名日匯總：歷史回填精確且冪等、增量與重算一致、儀表板 FILTER 聚合
+
+全年規模的回填耗時見 scripts/bench_seo_ranking_rollup.py
+"""
+import random
+import uuid
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.seo_ranking import KeywordConfig, KeywordRankingDaily
+from app.services import seo_ranking_service
+from app.services.seo_ranking_rollup import backfill_ranking_rollups, daily_trends
+from app.services.seo_ranking_service import SEORankingService
+
+# 覆蓋 30 天趨勢窗口與 7 天增量重算即可；規模測量不在單元測試裡做
+DAYS = 40
+KEYWORDS = 50
+
+
+async def _checksum(db: AsyncSession) -> tuple:
+    t = KeywordRankingDaily
+    return (await db.execute(select(
+        func.count(), func.sum(t.best_rank), func.sum(t.worst_rank),
+        func.sum(t.rank_sum), func.sum(t.sample_count),
+    ))).one()
+
+
+async def _seed_history(db: AsyncSession, rng: np.random.Generator):
+    """
+    每個關鍵詞每天一條排名（約兩成未上榜為 NULL），另有 5% 的關鍵詞日多抓一次
+
+    返回 {source: (day_index, keyword_index, rank)} 的 numpy 樣本
+    """
+    await db.execute(insert(KeywordConfig), [
+        {"id": uuid.uuid4(), "keyword": f"kw {i}", "keyword_normalized": f"kw {i}"}
+        for i in range(KEYWORDS)
+    ])
+    await db.commit()
+    # 取回驅動層的 id 表示，直接批量寫原始行
+    conn = await db.connection()
+    config_ids = [row[0] for row in (await conn.exec_driver_sql(
+        "SELECT id FROM keyword_configs ORDER BY keyword_normalized"
+    )).all()]
+    # 按 keyword_normalized 排序讀回：還原成 關鍵詞序號 → id
+    id_of = dict(zip(sorted(range(KEYWORDS), key=lambda i: f"kw {i}"), config_ids))
+
+    today = datetime.utcnow().date()
+    day_index = np.repeat(np.arange(DAYS), KEYWORDS)
+    kw_index = np.tile(np.arange(KEYWORDS), DAYS)
+    extra = rng.random(day_index.size) < 0.05
+    day_index = np.concatenate([day_index, day_index[extra]])
+    kw_index = np.concatenate([kw_index, kw_index[extra]])
+
+    samples = {}
+    columns = []
+    for source in ("google", "hktvmall"):
+        ranks = rng.integers(1, 101, size=day_index.size)
+        ranked = rng.random(day_index.size) > 0.2
+        samples[source] = (day_index[ranked], kw_index[ranked], ranks[ranked])
+        columns.append(np.where(ranked, ranks, 0))
+
+    day_strings = [f"{today - timedelta(days=DAYS - 1 - d)} 06:00:00.000000" for d in range(DAYS)]
+    rows = [
+        (uuid.uuid4().hex, id_of[k], f"kw {k}", g or None, h or None, day_strings[d], "GOOGLE_HK", 1)
+        for d, k, g, h in zip(day_index.tolist(), kw_index.tolist(), columns[0].tolist(), columns[1].tolist())
+    ]
+    await conn.exec_driver_sql(
+        "INSERT INTO keyword_rankings (id, keyword_config_id, keyword, google_rank, hktvmall_rank,"
+        " tracked_at, source, scrape_success) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        rows,
+    )
+    await db.commit()
+    return today, samples
+
+
+def _expected_trends(samples: dict, first_day: int) -> list:
+    """每天：關鍵詞日均排名的平均、當日最佳排名 <= 10 的關鍵詞數"""
+    expected = {}
+    for source, (days, kws, ranks) in samples.items():
+        keep = days >= first_day
+        key = days[keep] * KEYWORDS + kws[keep]
+        uniq, inverse = np.unique(key, return_inverse=True)
+        sums = np.bincount(inverse, weights=ranks[keep])
+        counts = np.bincount(inverse)
+        best = np.full(uniq.size, 1000)
+        np.minimum.at(best, inverse, ranks[keep])
+        day_of = uniq // KEYWORDS
+        for d in np.unique(day_of):
+            mask = day_of == d
+            point = expected.setdefault(int(d), {})
+            point[f"{source}_avg_rank"] = round(float(np.mean(sums[mask] / counts[mask])), 1)
+            point[f"{source}_top_10_count"] = int(np.sum(best[mask] <= 10))
+    return [expected[d] for d in sorted(expected)]
+
+
+class TestRankingRollup:
+
+    @pytest.mark.asyncio
+    async def test_backfill_history_is_exact_and_idempotent(self, db_session: AsyncSession):
+        rng = np.random.default_rng(41)
+        today, samples = await _seed_history(db_session, rng)
+
+        written = await backfill_ranking_rollups(db_session)
+        await db_session.commit()
+        first = await _checksum(db_session)
+
+        expected_rows = sum(
+            np.unique(days * KEYWORDS + kws).size for days, kws, _ in samples.values()
+        )
+        assert written == first[0] == expected_rows
+        assert first[3] == sum(int(ranks.sum()) for _, _, ranks in samples.values())
+        assert first[4] == sum(ranks.size for _, _, ranks in samples.values())
+
+        # 重跑：覆蓋寫入，結果不變
+        assert await backfill_ranking_rollups(db_session) == written
+        await db_session.commit()
+        assert await _checksum(db_session) == first
+
+        # 只重算最近 7 天也不改變結果
+        await backfill_ranking_rollups(db_session, since=today - timedelta(days=7))
+        await db_session.commit()
+        assert await _checksum(db_session) == first
+
+        trends = await daily_trends(db_session, today - timedelta(days=30))
+        assert len(trends) == 31
+        assert [{k: v for k, v in p.items() if k != "date"} for p in trends] == \
+            _expected_trends(samples, DAYS - 31)
+        assert trends[-1]["date"].date() == today
+
+    @pytest.mark.asyncio
+    async def test_incremental_rollup_matches_backfill(self, db_session: AsyncSession, monkeypatch):
+        rng = random.Random(7)
+
+        class FakeScraper:
+            async def scrape_keyword_ranking(self, keyword, **kwargs):
+                rank = rng.choice([None, 0, *range(1, 60)])
+                return SimpleNamespace(
+                    our_rank=rank, our_page=1, our_url=None, total_results=100,
+                    serp_features=None, scrape_duration_ms=5, error=None,
+                )
+
+        monkeypatch.setattr(seo_ranking_service, "HKTVmallSearchScraper", FakeScraper)
+        monkeypatch.setattr(seo_ranking_service, "GoogleSERPScraper", FakeScraper)
+        configs = [KeywordConfig(keyword=f"和牛 {i}", keyword_normalized=f"和牛 {i}") for i in range(4)]
+        db_session.add_all(configs)
+        await db_session.commit()
+
+        service = SEORankingService(db_session)
+        for _ in range(6):
+            for config in configs:
+                await service.track_keyword(config)
+
+        incremental = await _checksum(db_session)
+        assert incremental[4] > 0
+        await backfill_ranking_rollups(db_session)
+        await db_session.commit()
+        assert await _checksum(db_session) == incremental
+
+
+class TestSEODashboard:
+
+    @pytest.mark.asyncio
+    async def test_overview_counts_come_from_sql_aggregates(
+        self, client: AsyncClient, auth_headers: dict, db_session: AsyncSession
+    ):
+        rng = random.Random(3)
+        configs = []
+        for i in range(80):
+            config = KeywordConfig(
+                keyword=f"關鍵詞 {i:02d}", keyword_normalized=f"關鍵詞 {i:02d}",
+                is_active=rng.random() < 0.8,
+                latest_google_rank=rng.choice([None, *range(1, 60)]),
+                latest_hktvmall_rank=rng.choice([None, *range(1, 60)]),
+                baseline_google_rank=rng.choice([None, *range(1, 60)]),
+            )
+            configs.append(config)
+        db_session.add_all(configs)
+        await db_session.commit()
+
+        resp = await client.get("/api/v1/seo-ranking/dashboard", headers=auth_headers)
+
+        assert resp.status_code == 200, resp.text
+        body = resp.json()
+        overview = body["overview"]
+        with_data = [c for c in configs if c.latest_google_rank or c.latest_hktvmall_rank]
+        changed = [c for c in configs if c.baseline_google_rank and c.latest_google_rank]
+        improved = sum(c.latest_google_rank < c.baseline_google_rank for c in changed)
+        declined = sum(c.latest_google_rank > c.baseline_google_rank for c in changed)
+        google_top_30 = sum(1 for c in configs if c.latest_google_rank and c.latest_google_rank <= 30)
+        hktv_top_30 = sum(1 for c in configs if c.latest_hktvmall_rank and c.latest_hktvmall_rank <= 30)
+        assert overview["total_keywords"] == 80
+        assert overview["active_keywords"] == sum(c.is_active for c in configs)
+        assert overview["keywords_with_data"] == len(with_data)
+        assert (overview["improved_keywords"], overview["declined_keywords"]) == (improved, declined)
+        assert overview["unchanged_keywords"] == len(with_data) - improved - declined
+        assert overview["seo_health_score"] == (
+            int(len(with_data) / 80 * 30) + int(google_top_30 / 80 * 35) + int(hktv_top_30 / 80 * 35)
+        )
+
+        google = body["google_rankings"]
+        ranks = [c.latest_google_rank for c in configs if c.latest_google_rank]
+        assert google["ranked_keywords"] == len(ranks)
+        assert google["avg_rank"] == round(sum(ranks) / len(ranks), 1)
+        assert google["top_10_count"] == sum(r <= 10 for r in ranks)
+        assert google["best_keyword"]["rank"] == min(ranks)
+        best = next(c for c in configs if c.keyword == google["best_keyword"]["keyword"])
+        assert best.latest_google_rank == min(ranks)
+        assert body["ranking_trends"] == []
@@ -0,0 +1,320 @@
+"""Telegram 通知 Outbox：摘要合併、HTML 安全切分、429 retry_after、去重與至少一次投遞（本地模擬 Bot API）"""
+import html
+import re
+import socket
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from html.parser import HTMLParser
+
+import httpx
+import pytest
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+import app.services.telegram as telegram_module
+import app.services.telegram_outbox as outbox_module
+from app.config import settings
+from app.models.database import utcnow
+from app.models.notification import TelegramOutbox as TelegramOutboxRow
+from app.services.telegram import TELEGRAM_MAX_LENGTH, TelegramNotifier, split_html
+from app.services.telegram_outbox import LEASE_SECONDS, TelegramOutbox
+
+CHAT_ID = "1001"
+
+
+class FakeBotAPI:
+    """模擬 Bot API sendMessage：記錄消息，可按需返回 429 / 失敗"""
+
+    def __init__(self) -> None:
+        self.messages = []
+        self.calls = []
+        self.rate_limited = 0
+        self.retry_after = 1
+        self.failures = 0
+        self.app = FastAPI()
+
+        @self.app.post("/botTEST/sendMessage")
+        async def send_message(request: Request):
+            payload = await request.json()
+            self.calls.append((time.monotonic(), payload))
+            if self.rate_limited:
+                self.rate_limited -= 1
+                return JSONResponse(status_code=429, content={
+                    "ok": False, "error_code": 429,
+                    "description": f"Too Many Requests: retry after {self.retry_after}",
+                    "parameters": {"retry_after": self.retry_after},
+                })
+            if self.failures:
+                self.failures -= 1
+                return JSONResponse(status_code=500, content={
+                    "ok": False, "error_code": 500, "description": "Internal Server Error",
+                })
+            if len(payload["text"]) > TELEGRAM_MAX_LENGTH:
+                return JSONResponse(status_code=400, content={
+                    "ok": False, "error_code": 400, "description": "Bad Request: message is too long",
+                })
+            self.messages.append(payload)
+            return {"ok": True, "result": {"message_id": len(self.messages)}}
+
+
+class _TagBalance(HTMLParser):
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=True)
+        self.stack, self.text, self.balanced = [], [], True
+
+    def handle_starttag(self, tag, attrs):
+        self.stack.append(tag)
+
+    def handle_endtag(self, tag):
+        if not self.stack or self.stack.pop() != tag:
+            self.balanced = False
+
+    def handle_data(self, data):
+        self.text.append(data)
+
+
+def _parse(chunk: str) -> _TagBalance:
+    parser = _TagBalance()
+    parser.feed(chunk)
+    parser.close()
+    return parser
+
+
+def _plain(text: str) -> str:
+    return html.unescape(re.sub(r"<[^>]+>", "", text))
+
+
+@pytest.fixture
+def fake_bot(monkeypatch):
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    bot = FakeBotAPI()
+    config = uvicorn.Config(bot.app, host="127.0.0.1", port=port, loop="asyncio", log_level="warning")
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    deadline = time.time() + 10
+    while not server.started and time.time() < deadline:
+        time.sleep(0.01)
+
+    monkeypatch.setattr(settings, "telegram_enabled", True)
+    monkeypatch.setattr(settings, "telegram_bot_token", "TEST")
+    monkeypatch.setattr(settings, "telegram_chat_id", CHAT_ID)
+    monkeypatch.setattr(settings, "telegram_api_base_url", f"http://127.0.0.1:{port}")
+    monkeypatch.setattr(settings, "telegram_rate_per_chat", 50.0)
+    monkeypatch.setattr(settings, "telegram_rate_global", 100.0)
+    monkeypatch.setattr(settings, "telegram_digest_window_seconds", 60)
+    yield bot
+
+    server.should_exit = True
+    thread.join(timeout=10)
+
+
+@pytest.fixture
+def outbox(fake_bot, db_session: AsyncSession, monkeypatch) -> TelegramOutbox:
+    notifier = TelegramNotifier()
+    box = TelegramOutbox(
+        session_factory=async_sessionmaker(bind=db_session.bind, expire_on_commit=False),
+        notifier=notifier,
+    )
+    monkeypatch.setattr(telegram_module, "_notifier_instance", notifier)
+    monkeypatch.setattr(outbox_module, "_outbox_instance", box)
+    return box
+
+
+async def _rows(db: AsyncSession) -> list:
+    db.expire_all()
+    return list((await db.execute(select(TelegramOutboxRow))).scalars())
+
+
+def _alert(alert_id: str, name: str = "測試商品") -> dict:
+    return {
+        "alert_id": alert_id, "product_id": "P-1", "product_name": name,
+        "old_price": 100, "new_price": 80, "change_percent": -20.0,
+    }
+
+
+class TestSplitHtml:
+
+    def test_chunks_are_bounded_balanced_and_lossless(self):
+        paragraphs = []
+        for i in range(60):
+            paragraphs.append(
+                f"<b>商品 {i} &amp; 配件</b>\n"
+                f"<i>說明 <a href=\"https://example.com/p?id={i}&amp;x=1\">連結 {i}</a> "
+                + "長文字 " * 25 + "</i>"
+            )
+        text = "\n\n".join(paragraphs) + "\n<b>" + "無空白長句" * 120 + "</b>"
+
+        chunks = split_html(text, limit=500)
+
+        assert len(chunks) > 10
+        for chunk in chunks:
+            assert len(chunk) <= 500
+            assert _parse(chunk).balanced and not _parse(chunk).stack
+            assert not re.search(r"&[#\w]*$", chunk.split("<")[0])
+        assert "".join(_plain(c) for c in chunks).replace("\n", "").replace(" ", "") == \
+            _plain(text).replace("\n", "").replace(" ", "")
+
+    def test_short_text_is_untouched(self):
+        assert split_html("<b>hi</b>") == ["<b>hi</b>"]
+
+
+class TestTelegramOutbox:
+
+    @pytest.mark.asyncio
+    async def test_burst_is_coalesced_into_split_digests(
+        self, outbox: TelegramOutbox, fake_bot: FakeBotAPI, db_session: AsyncSession
+    ):
+        notifier = telegram_module.get_telegram_notifier()
+        names = [f"大批量商品 {i:03d} " + "描述" * 10 for i in range(150)]
+        for name in names:
+            result = await notifier.notify_price_drop(name, Decimal("120"), Decimal("99"), "零食")
+            assert result == {"ok": True, "queued": True}
+
+        # 窗口未到：不發送
+        assert (await outbox.dispatch())["sent"] == 0
+        assert fake_bot.calls == []
+
+        stats = await outbox.dispatch(now=utcnow() + timedelta(seconds=61))
+
+        assert stats["sent"] == 150
+        assert 3 <= stats["messages"] == len(fake_bot.messages) < 20
+        for message in fake_bot.messages:
+            assert message["chat_id"] == CHAT_ID
+            assert len(message["text"]) <= TELEGRAM_MAX_LENGTH
+            parsed = _parse(message["text"])
+            assert parsed.balanced and not parsed.stack
+        delivered = "".join(_plain(m["text"]) for m in fake_bot.messages)
+        for name in names:
+            assert delivered.count(name[:50]) == 1
+        assert {row.status for row in await _rows(db_session)} == {"sent"}
+
+    @pytest.mark.asyncio
+    async def test_dispatch_reuses_one_http_client(
+        self, outbox: TelegramOutbox, fake_bot: FakeBotAPI, monkeypatch
+    ):
+        created = []
+
+        class CountingClient(httpx.AsyncClient):
+            def __init__(self, *args, **kwargs):
+                created.append(self)
+                super().__init__(*args, **kwargs)
+
+        monkeypatch.setattr(telegram_module.httpx, "AsyncClient", CountingClient)
+        monkeypatch.setattr(settings, "telegram_digest_window_seconds", 0)
+        notifier = telegram_module.get_telegram_notifier()
+        for i in range(3):
+            await notifier.enqueue(f"通知 {i}", digestible=False)
+
+        assert (await outbox.dispatch())["messages"] == 3
+        assert (await notifier.send_message("直接發送")).get("ok")
+        assert len(created) == 1 and len(fake_bot.messages) == 4
+
+        await telegram_module.close_telegram_notifier()
+        assert created[0].is_closed
+
+    @pytest.mark.asyncio
+    async def test_test_notification_endpoint_reports_queued(
+        self, outbox: TelegramOutbox, fake_bot: FakeBotAPI, client, auth_headers: dict
+    ):
+        first = await client.post("/api/v1/telegram/notify-test-scrape", headers=auth_headers)
+        again = await client.post("/api/v1/telegram/notify-test-scrape", headers=auth_headers)
+
+        assert first.status_code == 200
+        assert first.json()["status"] == "queued" and "發送隊列" in first.json()["message"]
+        assert again.json()["status"] == "duplicate"
+        assert fake_bot.calls == []
+
+    @pytest.mark.asyncio
+    async def test_retry_after_is_honoured_inline(
+        self, outbox: TelegramOutbox, fake_bot: FakeBotAPI, monkeypatch
+    ):
+        monkeypatch.setattr(settings, "telegram_digest_window_seconds", 0)
+        fake_bot.rate_limited, fake_bot.retry_after = 1, 1
+        notifier = telegram_module.get_telegram_notifier()
+
+        await notifier.send_alert_notification(_alert("A-1"), include_action_buttons=True)
+        stats = await outbox.dispatch()
+
+        assert stats["sent"] == 1
+        (first, _), (second, payload) = fake_bot.calls
+        assert second - first >= 0.95
+        buttons = [b["text"] for row in payload["reply_markup"]["inline_keyboard"] for b in row]
+        assert "📝 創建改價任務" in buttons
+
+    @pytest.mark.asyncio
+    async def test_long_retry_after_defers_the_chat(
+        self, outbox: TelegramOutbox, fake_bot: FakeBotAPI, db_session: AsyncSession, monkeypatch
+    ):
+        monkeypatch.setattr(settings, "telegram_digest_window_seconds", 0)
+        outbox._notifier.sender.max_inline_wait = 0.5
+        fake_bot.rate_limited, fake_bot.retry_after = 1, 2
+        notifier = telegram_module.get_telegram_notifier()
+        await notifier.enqueue("<b>報告</b>", digestible=False)
+        await notifier.enqueue("<b>另一份報告</b>", digestible=False)
+
+        now = utcnow()
+        stats = await outbox.dispatch(now=now)
+
+        assert stats == {"sent": 0, "messages": 0, "retried": 1, "failed": 0}
+        rows = {row.text: row for row in await _rows(db_session)}
+        assert rows["<b>報告</b>"].available_at >= now + timedelta(seconds=2)
+        # 未嘗試的通知原樣放回，不計入嘗試次數
+        assert rows["<b>另一份報告</b>"].attempts == 0
+
+        stats = await outbox.dispatch(now=now + timedelta(seconds=31))
+        assert stats["sent"] == 2
+        assert [m["text"] for m in fake_bot.messages] == ["<b>報告</b>", "<b>另一份報告</b>"]
+
+    @pytest.mark.asyncio
+    async def test_dedupe_and_at_least_once_delivery(
+        self, outbox: TelegramOutbox, fake_bot: FakeBotAPI, db_session: AsyncSession, monkeypatch
+    ):
+        monkeypatch.setattr(settings, "telegram_digest_window_seconds", 0)
+        notifier = telegram_module.get_telegram_notifier()
+
+        assert (await notifier.send_alert_notification(_alert("A-7")))["queued"] is True
+        assert (await notifier.send_alert_notification(_alert("A-7")))["queued"] is False
+        assert len(await _rows(db_session)) == 1
+
+        # 服務端錯誤：保留待發並退避
+        fake_bot.failures = 1
+        now = utcnow()
+        assert (await outbox.dispatch(now=now))["retried"] == 1
+        (row,) = await _rows(db_session)
+        assert (row.status, row.attempts) == ("pending", 1)
+
+        # 模擬派發進程在認領後崩潰：租約到期前不重發，到期後重新認領
+        claimed = await outbox._claim(limit=10, now=now + timedelta(seconds=60))
+        assert len(claimed) == 1
+        assert (await outbox.dispatch(now=now + timedelta(seconds=120)))["sent"] == 0
+
+        later = now + timedelta(seconds=60 + LEASE_SECONDS + 1)
+        assert (await outbox.dispatch(now=later))["sent"] == 1
+        (row,) = await _rows(db_session)
+        assert (row.status, row.attempts) == ("sent", 3)
+        assert len(fake_bot.messages) == 1
+
+    @pytest.mark.asyncio
+    async def test_digest_keeps_buttons_per_item(
+        self, outbox: TelegramOutbox, fake_bot: FakeBotAPI, monkeypatch
+    ):
+        monkeypatch.setattr(settings, "telegram_digest_window_seconds", 0)
+        notifier = telegram_module.get_telegram_notifier()
+        for i in range(3):
+            await notifier.send_alert_notification(_alert(f"B-{i}", name=f"商品 {i}"))
+
+        assert (await outbox.dispatch())["sent"] == 3
+
+        (message,) = fake_bot.messages
+        assert "通知摘要（3 則）" in message["text"]
+        buttons = [b["text"] for row in message["reply_markup"]["inline_keyboard"] for b in row]
+        assert buttons[:3] == ["#1 📝 創建改價任務", "#1 🔍 查看詳情", "#1 ⏸ 暫時忽略"]
+        assert len(buttons) == 9
@@ -0,0 +1,255 @@
+"""工具執行器：結果快取與數據版本失效、並行讀取使用獨立 session、依賴 DAG"""
+import asyncio
+
+import pytest
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.models.product import Product
+from app.services.agent.tool_executor import ExecutionPlan, ToolExecutor, ToolResultCache
+from app.services.agent.tools.base import BaseTool, ToolResult
+
+
+class _CountProductsTool(BaseTool):
+    name = "count_products"
+    description = "產品數量"
+    cacheable = True
+    reads = ("products",)
+    parameters = {
+        "limit": {"type": "int", "required": False, "default": 3},
+    }
+    calls = []
+
+    async def execute(self, **kwargs) -> ToolResult:
+        type(self).calls.append(kwargs)
+        count = await self.db.scalar(select(func.count(Product.id)))
+        return ToolResult(tool_name=self.name, success=True, data={"count": count})
+
+
+class _SlowReadTool(BaseTool):
+    name = "slow_read"
+    description = "記錄所用 session"
+    cacheable = True
+    reads = ("orders",)
+    parameters = {
+        "tag": {"type": "str", "required": True},
+    }
+    sessions = []
+    running = 0
+    max_running = 0
+
+    async def execute(self, tag: str = None, **kwargs) -> ToolResult:
+        cls = _SlowReadTool
+        cls.sessions.append(self.db)
+        cls.running += 1
+        cls.max_running = max(cls.max_running, cls.running)
+        await asyncio.sleep(0.01)
+        cls.running -= 1
+        return ToolResult(tool_name=self.name, success=True, data={"tag": tag})
+
+
+class _OtherSlowReadTool(_SlowReadTool):
+    name = "other_slow_read"
+
+
+class _SuggestTool(BaseTool):
+    name = "suggest_price_change"
+    description = "建議價格"
+    parameters = {}
+    events = []
+    fail = False
+
+    async def execute(self, **kwargs) -> ToolResult:
+        await asyncio.sleep(0.01)
+        type(self).events.append(self.name)
+        if type(self).fail:
+            return ToolResult(tool_name=self.name, success=False, error="無競品數據")
+        return ToolResult(
+            tool_name=self.name, success=True,
+            data={"product_id": "p-1", "suggested_price": 88.0, "reason": "跟進競品"},
+        )
+
+
+class _ApprovalTool(BaseTool):
+    name = "create_approval_task"
+    description = "創建審批"
+    parameters = {
+        "product_id": {"type": "str", "required": True},
+        "proposed_price": {"type": "float", "required": True},
+        "reason": {"type": "str", "required": False},
+    }
+
+    async def execute(self, **kwargs) -> ToolResult:
+        _SuggestTool.events.append((self.name, kwargs))
+        return ToolResult(tool_name=self.name, success=True, data=kwargs)
+
+
+class _SharedSessionTool(BaseTool):
+    """記錄同時使用共用 session 的工具數"""
+    name = "shared_read"
+    description = "只讀"
+    cacheable = True
+    reads = ("products",)
+    parameters = {}
+    in_use = 0
+    max_in_use = 0
+
+    async def execute(self, **kwargs) -> ToolResult:
+        cls = _SharedSessionTool
+        cls.in_use += 1
+        cls.max_in_use = max(cls.max_in_use, cls.in_use)
+        await asyncio.sleep(0.01)
+        cls.in_use -= 1
+        return ToolResult(tool_name=self.name, success=True, data={})
+
+
+class _SharedSessionWriteTool(_SharedSessionTool):
+    name = "shared_write"
+    cacheable = False
+
+
+def _executor(db: AsyncSession, *tools: type, session_factory=None) -> ToolExecutor:
+    executor = ToolExecutor(db, session_factory=session_factory, cache=ToolResultCache())
+    executor.tools = {tool.name: tool(db) for tool in tools}
+    return executor
+
+
+@pytest.fixture(autouse=True)
+def _reset_tools():
+    _CountProductsTool.calls = []
+    _SlowReadTool.sessions, _SlowReadTool.running, _SlowReadTool.max_running = [], 0, 0
+    _SuggestTool.events, _SuggestTool.fail = [], False
+    _SharedSessionTool.in_use, _SharedSessionTool.max_in_use = 0, 0
+
+
+class TestToolResultCache:
+
+    @pytest.mark.asyncio
+    async def test_repeated_call_hits_cache_until_table_changes(self, db_session: AsyncSession):
+        executor = _executor(db_session, _CountProductsTool)
+        plan = ExecutionPlan(tools=["count_products"])
+
+        first = (await executor.run_plan(plan, {}))["count_products"]
+        second = (await executor.run_plan(plan, {"unrelated": "x"}))["count_products"]
+
+        assert len(_CountProductsTool.calls) == 1
+        assert _CountProductsTool.calls[0] == {"limit": 3}
+        assert second.data == first.data == {"count": 0}
+        assert second.metadata.get("cached") is True and "cached" not in first.metadata
+
+        # ORM 寫入：flush 後未提交仍命中，提交後失效
+        db_session.add(Product(sku="SKU-1", name="和牛"))
+        await db_session.flush()
+        await executor.run_plan(plan, {})
+        assert len(_CountProductsTool.calls) == 1
+        await db_session.commit()
+        assert (await executor.run_plan(plan, {}))["count_products"].data == {"count": 1}
+        assert len(_CountProductsTool.calls) == 2
+
+        # text() DML 同樣使版本遞增
+        await db_session.execute(text("DELETE FROM products"))
+        await db_session.commit()
+        assert (await executor.run_plan(plan, {}))["count_products"].data == {"count": 0}
+        assert len(_CountProductsTool.calls) == 3
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("sql", [
+        "DELETE FROM main.products",
+        "WITH doomed AS (SELECT id FROM products) DELETE FROM products WHERE id IN (SELECT id FROM doomed)",
+    ])
+    async def test_schema_qualified_and_cte_text_dml_bump_version(self, db_session: AsyncSession, sql: str):
+        db_session.add(Product(sku="SKU-1", name="和牛"))
+        await db_session.commit()
+        executor = _executor(db_session, _CountProductsTool)
+        plan = ExecutionPlan(tools=["count_products"])
+        await executor.run_plan(plan, {})
+
+        await db_session.execute(text(sql))
+        await db_session.commit()
+
+        assert (await executor.run_plan(plan, {}))["count_products"].data == {"count": 0}
+        assert len(_CountProductsTool.calls) == 2
+
+    @pytest.mark.asyncio
+    async def test_entries_expire_after_ttl(self, db_session: AsyncSession, monkeypatch):
+        now = [1000.0]
+        executor = _executor(db_session, _CountProductsTool)
+        executor.cache = ToolResultCache(clock=lambda: now[0])
+        monkeypatch.setattr(settings, "agent_tool_cache_ttl", 60)
+        plan = ExecutionPlan(tools=["count_products"])
+
+        await executor.run_plan(plan, {})
+        now[0] += 59
+        await executor.run_plan(plan, {})
+        now[0] += 2
+        await executor.run_plan(plan, {})
+
+        assert len(_CountProductsTool.calls) == 2
+
+        monkeypatch.setattr(settings, "agent_tool_cache_ttl", 0)
+        await executor.run_plan(plan, {})
+        assert len(_CountProductsTool.calls) == 3
+
+
+class TestPlanExecution:
+
+    @pytest.mark.asyncio
+    async def test_parallel_reads_use_separate_sessions(self, db_session: AsyncSession):
+        opened = []
+
+        class _Factory:
+            def __call__(self):
+                session = AsyncSession(bind=db_session.bind)
+                opened.append(session)
+                return session
+
+        executor = _executor(db_session, _SlowReadTool, _OtherSlowReadTool, session_factory=_Factory())
+
+        results = await executor.run_plan(
+            ExecutionPlan(tools=["slow_read", "other_slow_read"]), {"tag": "a"}
+        )
+
+        assert list(results) == ["slow_read", "other_slow_read"]
+        assert all(r.success for r in results.values())
+        assert _SlowReadTool.max_running == 2
+        assert len(opened) == 2
+        assert set(map(id, _SlowReadTool.sessions)) == set(map(id, opened))
+
+    @pytest.mark.asyncio
+    async def test_single_read_and_write_do_not_share_session_concurrently(self, db_session: AsyncSession):
+        executor = _executor(db_session, _SharedSessionTool, _SharedSessionWriteTool)
+
+        results = await executor.run_plan(ExecutionPlan(tools=["shared_read", "shared_write"]), {})
+
+        assert all(r.success for r in results.values())
+        assert _SharedSessionTool.max_in_use == 1
+
+    @pytest.mark.asyncio
+    async def test_dependent_tool_runs_after_upstream_with_bound_params(self, db_session: AsyncSession):
+        executor = _executor(db_session, _ApprovalTool, _SuggestTool)
+        plan = ExecutionPlan(
+            tools=["create_approval_task", "suggest_price_change"],
+            dependencies={"create_approval_task": list(ToolExecutor.TOOL_DEPENDENCIES["create_approval_task"])},
+        )
+
+        results = await executor.run_plan(plan, {"reason": "用戶輸入"})
+
+        assert list(results) == ["create_approval_task", "suggest_price_change"]
+        assert _SuggestTool.events == [
+            "suggest_price_change",
+            ("create_approval_task", {"product_id": "p-1", "proposed_price": 88.0, "reason": "跟進競品"}),
+        ]
+
+        _SuggestTool.events, _SuggestTool.fail = [], True
+        results = await executor.run_plan(plan, {})
+        assert not results["create_approval_task"].success
+        assert _SuggestTool.events == ["suggest_price_change"]
+
+    def test_cyclic_dependencies_are_rejected(self):
+        plan = ExecutionPlan(tools=["a", "b", "c"], dependencies={"a": ["b"], "b": ["a"]})
+
+        with pytest.raises(ValueError):
+            plan.topological_order()
+
+        assert ExecutionPlan(tools=["a", "b", "c"], parallel=False).topological_order() == ["a", "b", "c"]
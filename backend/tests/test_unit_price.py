@@ -0,0 +1,125 @@
+"""單位數量解析：合併正則單次掃描與原逐條 re.search 實現等價（隨機語料），批量接口與緩存"""
+import random
+import re
+from decimal import Decimal
+from typing import Optional
+
+import numpy as np
+import pytest
+
+from app.utils.unit_price import (
+    UnitInfo,
+    UnitPriceCalculator,
+    _parse_quantity,
+    extract_quantities,
+    extract_quantity,
+)
+
+
+def _legacy_extract(text: str) -> Optional[UnitInfo]:
+    """原實現：按優先級逐條 re.search"""
+    if not text:
+        return None
+    multi_patterns = [
+        r'(\d+(?:\.\d+)?)\s*(g|kg|ml|l|克|公斤|毫升|升)\s*[x×*]\s*(\d+)',
+        r'(\d+(?:\.\d+)?)\s*(g|kg|ml|l|克|公斤|毫升|升)\s*[（(](\d+)[入件個包片)）]',
+    ]
+    for pattern in multi_patterns:
+        match = re.search(pattern, text, re.IGNORECASE)
+        if match:
+            value = Decimal(match.group(1)) * int(match.group(3))
+            return UnitPriceCalculator._create_unit_info(value, match.group(2).lower())
+    for pattern in [
+        r'(\d+(?:\.\d+)?)\s*(kg|g|gm|mg|公斤|克|毫克)',
+        r'(\d+(?:\.\d+)?)\s*(l|ml|L|ML|cc|升|公升|毫升)',
+    ]:
+        match = re.search(pattern, text, re.IGNORECASE)
+        if match:
+            return UnitPriceCalculator._create_unit_info(Decimal(match.group(1)), match.group(2).lower())
+    return None
+
+
+# 刻意混入相鄰、重疊、大小寫與全形符號，逼出優先級與最左匹配的邊界
+FRAGMENTS = [
+    "g", "G", "kg", "KG", "Kg", "gm", "mg", "MG", "l", "L", "ml", "mL", "ML", "cc", "CC",
+    "克", "公斤", "毫克", "升", "公升", "毫升", "斤",
+    "x", "X", "×", "*", "(", ")", "（", "）", "入", "件", "個", "包", "片", "盒",
+    " ", "  ", "\t", ".", "..", "-", "/", "+",
+    "日本", "和牛", "薯片", "Calbee", "pack", "特價", "大減價", "oz", "lb",
+]
+
+
+def _number(rng: random.Random) -> str:
+    kind = rng.random()
+    if kind < 0.5:
+        return str(rng.randint(0, 2000))
+    if kind < 0.8:
+        return f"{rng.randint(0, 50)}.{rng.randint(0, 999)}"
+    return "0" * rng.randint(1, 3) + str(rng.randint(1, 9))
+
+
+def _name(rng: random.Random) -> str:
+    parts = []
+    for _ in range(rng.randint(1, 12)):
+        parts.append(_number(rng) if rng.random() < 0.35 else rng.choice(FRAGMENTS))
+    return "".join(parts)
+
+
+class TestExtractQuantity:
+
+    @pytest.mark.parametrize("seed", [3, 17, 2024])
+    def test_parity_with_legacy_search_on_random_corpus(self, seed: int):
+        rng = random.Random(seed)
+        corpus = [_name(rng) for _ in range(20000)]
+
+        matched = 0
+        for name in corpus:
+            expected = _legacy_extract(name)
+            assert extract_quantity(name) == expected, name
+            matched += expected is not None
+        # 語料確實覆蓋了大量命中與未命中
+        assert 0.3 * len(corpus) < matched < 0.95 * len(corpus)
+
+    @pytest.mark.parametrize("name, value, unit, normalized", [
+        ("日清 杯麵 75g x 5", "375", "g", "375"),
+        ("維他檸檬茶 250ML（6包）", "1500", "ml", "1500"),
+        ("1.5kg 裝 另送 200g x 2", "400", "g", "400"),
+        ("Calbee 薯片 55g 另 1L 汽水", "55", "g", "55"),
+        ("牛奶 2公升", "2", "公升", "2000"),
+        ("維他奶 250毫升 (3入)", "750", "毫升", "750"),
+    ])
+    def test_priority_examples(self, name, value, unit, normalized):
+        info = extract_quantity(name)
+        assert info == _legacy_extract(name)
+        assert (info.value, info.unit, info.normalized_value) == (Decimal(value), unit, Decimal(normalized))
+
+    def test_memo_returns_independent_objects(self):
+        _parse_quantity.cache_clear()
+        first = extract_quantity("和牛 500g")
+        first.normalized_value = Decimal("0")
+
+        second = extract_quantity("和牛 500g")
+
+        assert second.normalized_value == Decimal("500")
+        assert _parse_quantity.cache_info().hits == 1
+
+
+class TestExtractQuantities:
+
+    def test_batch_arrays_match_scalar_parse(self):
+        rng = random.Random(99)
+        names = [_name(rng) for _ in range(5000)] + ["", None, "500g x 2", "1.25L"]
+
+        result = extract_quantities(names)
+
+        assert result.grams.dtype == result.ml.dtype == np.float64
+        assert result.grams.shape == result.ml.shape == (len(names),)
+        for i, name in enumerate(names):
+            info = _legacy_extract(name)
+            if info is None:
+                assert np.isnan(result.grams[i]) and np.isnan(result.ml[i])
+            elif info.unit_type == "per_100g":
+                assert result.grams[i] == float(info.normalized_value) and np.isnan(result.ml[i])
+            else:
+                assert result.ml[i] == float(info.normalized_value) and np.isnan(result.grams[i])
+        assert result.grams[-2] == 1000.0 and result.ml[-1] == 1250.0
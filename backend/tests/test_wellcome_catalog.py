@@ -0,0 +1,130 @@
+"""惠康建庫管線：分類 × 頁碼並發發現 + JSON-LD 抓取重疊"""
+import asyncio
+from decimal import Decimal
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.connectors.wellcome_client import WellcomeProduct
+from app.services import cataloger
+from app.services.cataloger import CatalogService, WELLCOME_CATEGORIES, WELLCOME_MAX_PAGES
+
+
+class FakeBrowser:
+    """模擬頁面池：每頁耗時固定，記錄最大並發數"""
+
+    def __init__(self, delay: float = 0.02, pages_per_category: int = 2, pool_size: int = 4):
+        self.delay = delay
+        self.pages_per_category = pages_per_category
+        self.slots = asyncio.Semaphore(pool_size)
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.calls = 0
+
+    async def discover_wellcome_products(self, url: str, max_products: int = 10):
+        self.calls += 1
+        async with self.slots:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            try:
+                await asyncio.sleep(self.delay)
+            finally:
+                self.in_flight -= 1
+
+        # URL 形如 .../category/{cat_id}/{page}.html
+        cat_id, page = url.rsplit("/", 2)[-2:]
+        page_num = int(page.split(".")[0])
+        if page_num > self.pages_per_category:
+            return []
+        return [
+            f"https://www.wellcome.com.hk/en/p/{cat_id}-{page_num}-{i}/i/{100000 + i + page_num * 100}.html?ref=x"
+            for i in range(3)
+        ] + ["https://www.wellcome.com.hk/en/p/shared/i/999999.html"]
+
+
+class FakeHttpClient:
+    """模擬 JSON-LD 批量抓取，記錄首次抓取時瀏覽器是否仍在工作"""
+
+    def __init__(self, browser: FakeBrowser):
+        self.browser = browser
+        self.batches: list[int] = []
+        self.overlapped = False
+
+    async def batch_fetch_products(self, urls):
+        if self.browser.in_flight > 0:
+            self.overlapped = True
+        self.batches.append(len(urls))
+        await asyncio.sleep(0)
+        return [
+            WellcomeProduct(url=u, name=f"商品 {u}", price=Decimal("10.00"), product_id=u[-11:-5])
+            for u in urls
+        ]
+
+    async def close(self):
+        pass
+
+
+@pytest.fixture
+def fake_wellcome(monkeypatch):
+    browser = FakeBrowser()
+    http_client = FakeHttpClient(browser)
+    stored: dict[str, str] = {}
+
+    async def fake_upsert(db, competitor_id, url, name, price, sku, platform, **kwargs):
+        """只記錄 URL → 名稱，管線測試不關心 competitor_products 欄位細節"""
+        if url in stored:
+            return "unchanged"
+        stored[url] = name
+        return "new"
+
+    monkeypatch.setattr(cataloger, "get_agent_browser_connector", lambda: browser)
+    monkeypatch.setattr(cataloger, "get_wellcome_http_client", lambda: http_client)
+    monkeypatch.setattr(CatalogService, "_upsert_competitor_product", staticmethod(fake_upsert))
+    return browser, http_client, stored
+
+
+class TestCatalogWellcomePipeline:
+
+    @pytest.mark.asyncio
+    async def test_pages_discovered_concurrently(self, db_session: AsyncSession, fake_wellcome):
+        browser, http_client, stored = fake_wellcome
+
+        stats = await CatalogService._catalog_wellcome(db_session)
+
+        assert browser.calls == len(WELLCOME_CATEGORIES) * WELLCOME_MAX_PAGES
+        assert browser.max_in_flight > 1
+        assert http_client.overlapped
+
+        # 每分類 2 頁 × 3 個獨有 URL + 1 個跨分類共享 URL
+        expected = len(WELLCOME_CATEGORIES) * 2 * 3 + 1
+        assert stats["total_fetched"] == expected
+        assert stats["new"] == expected
+        assert sum(http_client.batches) == expected
+        # 入庫 URL 已標準化（去掉查詢參數）
+        assert len(stored) == expected
+        assert all("?" not in url for url in stored)
+
+    @pytest.mark.asyncio
+    async def test_rebuild_is_idempotent(self, db_session: AsyncSession, fake_wellcome):
+        await CatalogService._catalog_wellcome(db_session)
+        stats = await CatalogService._catalog_wellcome(db_session)
+
+        assert stats["new"] == 0
+        assert stats["unchanged"] == stats["total_fetched"]
+
+    @pytest.mark.asyncio
+    async def test_failed_page_does_not_abort_build(self, db_session: AsyncSession, fake_wellcome):
+        browser, _, _ = fake_wellcome
+        original = browser.discover_wellcome_products
+
+        async def flaky(url, max_products=10):
+            if "/1.html" in url:
+                raise asyncio.TimeoutError()
+            return await original(url, max_products)
+
+        browser.discover_wellcome_products = flaky
+
+        stats = await CatalogService._catalog_wellcome(db_session)
+
+        # 只剩第 2 頁的 URL
+        assert stats["total_fetched"] == len(WELLCOME_CATEGORIES) * 3 + 1
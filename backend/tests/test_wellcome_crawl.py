@@ -0,0 +1,201 @@
+"""惠康分類爬取：分類並行 + 逐頁提交、水位增量刷新、後台任務進度"""
+import asyncio
+from decimal import Decimal
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.config import settings
+from app.connectors.wellcome_client import WellcomeProduct
+from app.models.competitor import CompetitorProduct
+from app.models.pipeline_task import PipelineTask
+from app.models.system import SystemSetting
+from app.services import wellcome_strategy
+from app.services.wellcome_strategy import ALL_CATEGORIES, WATERMARK_KEY_PREFIX, WellcomeSearchStrategy
+
+
+class FakeBrowser:
+    """模擬分類頁：每個分類固定頁數，每頁 5 個 URL；記錄翻頁與並發"""
+
+    def __init__(self, pages: int = 3, delay: float = 0.02):
+        self.pages = pages
+        self.delay = delay
+        self.extra: dict[str, list[str]] = {}
+        self.fail_pages: set[tuple[str, int]] = set()
+        self.calls: list[tuple[str, int]] = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def discover_wellcome_products(self, url: str, max_products: int = 50):
+        cat_id, page = url.rsplit("/", 2)[-2:]
+        page_num = int(page.split(".")[0])
+        self.calls.append((cat_id, page_num))
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.in_flight -= 1
+        if (cat_id, page_num) in self.fail_pages:
+            raise RuntimeError("page timeout")
+        if page_num > self.pages:
+            return []
+        urls = [
+            f"https://www.wellcome.com.hk/en/p/{cat_id}-{page_num}-{i}/i/{(page_num * 10 + i):09d}.html?ref=cat"
+            for i in range(5)
+        ]
+        return self.extra.get(f"{cat_id}/{page_num}", []) + urls
+
+
+class FakeHttpClient:
+    async def batch_fetch_products(self, urls):
+        return [
+            WellcomeProduct(url=u, name=f"商品 {u.split('/p/')[1].split('/')[0]}", price=Decimal("10"),
+                            product_id=u.split("/i/")[1][:9])
+            for u in urls
+        ]
+
+
+@pytest.fixture
+def browser(monkeypatch) -> FakeBrowser:
+    fake = FakeBrowser()
+    monkeypatch.setattr(wellcome_strategy, "get_agent_browser_connector", lambda: fake)
+    monkeypatch.setattr(wellcome_strategy, "get_wellcome_http_client", lambda: FakeHttpClient())
+    monkeypatch.setattr(settings, "agent_browser_enabled", True)
+    monkeypatch.setattr(settings, "wellcome_crawl_concurrency", 2)
+    return fake
+
+
+@pytest.fixture
+def strategy(browser, db_session: AsyncSession) -> WellcomeSearchStrategy:
+    return WellcomeSearchStrategy(
+        session_factory=async_sessionmaker(bind=db_session.bind, expire_on_commit=False)
+    )
+
+
+async def _count(db: AsyncSession) -> int:
+    return await db.scalar(select(func.count()).select_from(CompetitorProduct))
+
+
+class TestWellcomeCrawl:
+
+    @pytest.mark.asyncio
+    async def test_categories_crawl_in_parallel_and_commit_per_page(
+        self, strategy: WellcomeSearchStrategy, browser: FakeBrowser, db_session: AsyncSession
+    ):
+        first, second = list(ALL_CATEGORIES)[:2]
+        browser.fail_pages.add((second, 2))
+
+        result = await strategy.crawl_categories(ALL_CATEGORIES, max_pages=5)
+
+        assert browser.max_in_flight == 2
+        # 第二個分類第 2 頁失敗：第 1 頁已提交的商品保留
+        assert result["categories"][ALL_CATEGORIES[second]] == {
+            "pages": 1, "new": 5, "updated": 0, "stopped_early": False,
+        }
+        assert result["categories"][ALL_CATEGORIES[first]]["pages"] == 3
+        assert result["new"] == 5 * 3 * (len(ALL_CATEGORIES) - 1) + 5
+        assert await _count(db_session) == result["new"]
+        url = await db_session.scalar(select(CompetitorProduct.url).limit(1))
+        assert "?" not in url
+        # 中途失敗的分類不建立水位（下次仍完整爬取）
+        assert await db_session.get(SystemSetting, WATERMARK_KEY_PREFIX + first) is not None
+        assert await db_session.get(SystemSetting, WATERMARK_KEY_PREFIX + second) is None
+
+    @pytest.mark.asyncio
+    async def test_page_limited_crawl_does_not_set_watermark(
+        self, strategy: WellcomeSearchStrategy, browser: FakeBrowser, db_session: AsyncSession
+    ):
+        cat_id = next(iter(ALL_CATEGORIES))
+        categories = {cat_id: ALL_CATEGORIES[cat_id]}
+
+        # 首次只爬 2 頁（共 3 頁）：未到末頁，不推進水位
+        await strategy.crawl_categories(categories, max_pages=2)
+        assert await db_session.get(SystemSetting, WATERMARK_KEY_PREFIX + cat_id) is None
+
+        # 下一輪不會在已爬過的頁停下，第 3 頁得以補齊
+        browser.calls.clear()
+        result = await strategy.crawl_categories(categories, max_pages=5)
+
+        assert browser.calls == [(cat_id, page) for page in range(1, 5)]
+        assert result["categories"][ALL_CATEGORIES[cat_id]]["new"] == 5
+        assert await _count(db_session) == 15
+        assert await db_session.get(SystemSetting, WATERMARK_KEY_PREFIX + cat_id) is not None
+
+    @pytest.mark.asyncio
+    async def test_product_in_several_categories_counts_as_new_once(
+        self, strategy: WellcomeSearchStrategy, browser: FakeBrowser, db_session: AsyncSession
+    ):
+        first, second = list(ALL_CATEGORIES)[:2]
+        shared = "https://www.wellcome.com.hk/en/p/shared-item/i/900000002.html"
+        browser.pages = 1
+        browser.extra[f"{first}/1"] = [shared]
+        browser.extra[f"{second}/1"] = [shared]
+
+        result = await strategy.crawl_categories({first: "一", second: "二"}, max_pages=2)
+
+        # 兩個分類並行、都未見過該 URL：只有先插入的一方算新增，另一方算更新
+        assert result["new"] == await _count(db_session) == 11
+        assert sorted(stats["updated"] for stats in result["categories"].values()) == [0, 1]
+
+    @pytest.mark.asyncio
+    async def test_refresh_stops_at_first_fully_known_page(
+        self, strategy: WellcomeSearchStrategy, browser: FakeBrowser, db_session: AsyncSession
+    ):
+        cat_id = next(iter(ALL_CATEGORIES))
+        categories = {cat_id: ALL_CATEGORIES[cat_id]}
+        await strategy.crawl_categories(categories, max_pages=5)
+        assert await db_session.get(SystemSetting, WATERMARK_KEY_PREFIX + cat_id) is not None
+
+        # 上架一個新商品：只出現在第 1 頁，第 2 頁全部已知 → 停止翻頁
+        browser.calls.clear()
+        browser.extra[f"{cat_id}/1"] = ["https://www.wellcome.com.hk/en/p/new-item/i/900000001.html"]
+
+        result = await strategy.crawl_categories(categories, max_pages=5)
+
+        assert browser.calls == [(cat_id, 1), (cat_id, 2)]
+        assert result["categories"][ALL_CATEGORIES[cat_id]] == {
+            "pages": 1, "new": 1, "updated": 5, "stopped_early": True,
+        }
+        assert await _count(db_session) == 16
+
+    @pytest.mark.asyncio
+    async def test_ensure_local_index_crawls_in_background_with_progress(
+        self, strategy: WellcomeSearchStrategy, browser: FakeBrowser,
+        db_session: AsyncSession, client: AsyncClient, auth_headers: dict, monkeypatch,
+    ):
+        monkeypatch.setattr(wellcome_strategy, "_crawl_job", None)
+
+        count = await strategy.ensure_local_index(db_session, "牛肉")
+
+        # 不等爬取完成：立即返回當前索引數量
+        assert count == 0
+        task_id, job = wellcome_strategy._crawl_job
+        assert not job.done()
+        assert await strategy.start_crawl_job("牛肉") == task_id
+        await job
+
+        resp = await client.get(f"/api/v1/catalog/wellcome/crawl/{task_id}", headers=auth_headers)
+        assert resp.status_code == 200, resp.text
+        body = resp.json()
+        assert body["status"] == "done"
+        assert body["progress"]["current"] == body["progress"]["total"] == 1
+        assert body["result"]["new"] == 15
+        assert await strategy.ensure_local_index(db_session, "牛肉") == 15
+
+        missing = await client.get("/api/v1/catalog/wellcome/crawl/nope", headers=auth_headers)
+        assert missing.status_code == 404
+
+    @pytest.mark.asyncio
+    async def test_concurrent_starts_share_one_job(
+        self, strategy: WellcomeSearchStrategy, browser: FakeBrowser, db_session: AsyncSession, monkeypatch,
+    ):
+        monkeypatch.setattr(wellcome_strategy, "_crawl_job", None)
+
+        task_ids = await asyncio.gather(*(strategy.start_crawl_job("牛肉") for _ in range(3)))
+
+        assert len(set(task_ids)) == 1
+        await wellcome_strategy._crawl_job[1]
+        assert await db_session.scalar(select(func.count()).select_from(PipelineTask)) == 1
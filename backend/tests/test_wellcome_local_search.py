@@ -0,0 +1,72 @@
+"""惠康本地索引搜索：單次查詢選最精確的命中層級、層內按相關度排序"""
+import pytest
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.competitor import Competitor, CompetitorProduct
+from app.services import wellcome_strategy
+from app.services.wellcome_strategy import WellcomeSearchStrategy
+
+
+@pytest.fixture
+def strategy(monkeypatch) -> WellcomeSearchStrategy:
+    monkeypatch.setattr(wellcome_strategy, "get_wellcome_http_client", lambda: None)
+    monkeypatch.setattr(wellcome_strategy, "get_agent_browser_connector", lambda: None)
+    return WellcomeSearchStrategy()
+
+
+async def _seed(db: AsyncSession, names: list[str], platform: str = "wellcome", active: bool = True) -> None:
+    competitor = Competitor(name=f"{platform} store", platform=platform)
+    db.add(competitor)
+    await db.flush()
+    for i, name in enumerate(names):
+        db.add(CompetitorProduct(
+            competitor=competitor, name=name, is_active=active,
+            url=f"https://www.wellcome.com.hk/en/p/{platform}-{active}-{i}/i/{100000000 + len(name) * 100 + i}.html",
+        ))
+    await db.commit()
+
+
+class TestWellcomeLocalSearch:
+
+    @pytest.mark.asyncio
+    async def test_most_specific_tier_wins_in_one_query(self, db_session: AsyncSession, strategy):
+        await _seed(db_session, ["美國西冷牛扒", "西冷牛", "WAGYU西冷牛扒 (急凍)", "牛腱", "豬扒"])
+        await _seed(db_session, ["Wagyu西冷牛 A5"], active=False)
+        await _seed(db_session, ["Wagyu西冷牛禮盒"], platform="parknshop")
+
+        statements = []
+        listener = lambda conn, cursor, stmt, *args: statements.append(stmt)  # noqa: E731
+        event.listen(db_session.bind.sync_engine, "before_cursor_execute", listener)
+        try:
+            # 「Wagyu西冷牛」有命中：不混入更寬泛的「西冷牛」「牛」
+            results = await strategy.search_local_index(db_session, "宮崎A5 Wagyu西冷牛")
+        finally:
+            event.remove(db_session.bind.sync_engine, "before_cursor_execute", listener)
+
+        assert len(statements) == 1
+        assert [p.name for p in results] == ["WAGYU西冷牛扒 (急凍)"]
+        assert results[0].product_id and results[0].score > 0
+
+    @pytest.mark.asyncio
+    async def test_falls_back_to_broader_tier_ranked_by_score(self, db_session: AsyncSession, strategy):
+        await _seed(db_session, ["美國西冷牛扒 300g", "西冷牛", "西冷牛扒", "牛腱", "豬扒"])
+
+        results = await strategy.search_local_index(db_session, "Wagyu西冷牛")
+
+        # 「Wagyu西冷牛」無命中 → 「西冷牛」層；越貼近關鍵詞排越前
+        assert [p.name for p in results] == ["西冷牛", "西冷牛扒", "美國西冷牛扒 300g"]
+        assert [p.score for p in results] == sorted((p.score for p in results), reverse=True)
+
+        limited = await strategy.search_local_index(db_session, "Wagyu西冷牛", limit=2)
+        assert [p.name for p in limited] == ["西冷牛", "西冷牛扒"]
+
+        # 只剩單字層
+        broad = await strategy.search_local_index(db_session, "Wagyu肥牛")
+        assert {p.name for p in broad} == {"美國西冷牛扒 300g", "西冷牛", "西冷牛扒", "牛腱"}
+
+    @pytest.mark.asyncio
+    async def test_no_hits_returns_empty(self, db_session: AsyncSession, strategy):
+        await _seed(db_session, ["豬扒", "雞翼"])
+
+        assert await strategy.search_local_index(db_session, "松葉蟹肉") == []
@@ -112,6 +112,11 @@ interface Message {
   timestamp: Date
 }
 
+// 串流中的報告草稿（收到最終 report 後替換）
+const REPORT_DRAFT_ID = 'report-draft'
+
+const isTransient = (m: Message) => m.type === 'thinking' || m.id === REPORT_DRAFT_ID
+
 interface Conversation {
   id: string
   title: string
@@ -490,14 +495,42 @@ export default function AgentPage() {
     }
   }
 
+  // Streamed report draft: sections ordered by their final position, AI insight appended
+  const reportDraftRef = useRef<{ sections: Record<number, string>; insight: string }>({ sections: {}, insight: '' })
+
+  const handleStreamEvent = useCallback((event: AgentChatResponse) => {
+    const draft = reportDraftRef.current
+    if (event.type === 'report_section' && event.report && 'index' in event.report) {
+      draft.sections[event.report.index] = event.content
+    } else if (event.type === 'report_delta') {
+      draft.insight += event.content
+    } else {
+      return
+    }
+
+    const content = Object.keys(draft.sections)
+      .map(Number)
+      .sort((a, b) => a - b)
+      .map(index => draft.sections[index])
+      .join('\n\n') + draft.insight
+
+    setMessages(prev => [
+      ...prev.filter(m => !isTransient(m)),
+      { id: REPORT_DRAFT_ID, role: 'assistant', type: 'report', content, timestamp: new Date() },
+    ])
+  }, [])
+
   // Send message
   const chatMutation = useMutation({
-    mutationFn: (content: string) => api.agentChat({
-      content,
-      conversation_id: conversationId || undefined
-    }),
+    mutationFn: (content: string) => {
+      reportDraftRef.current = { sections: {}, insight: '' }
+      return api.agentChatStream({
+        content,
+        conversation_id: conversationId || undefined
+      }, handleStreamEvent)
+    },
     onSuccess: (response) => {
-      setMessages(prev => prev.filter(m => m.type !== 'thinking'))
+      setMessages(prev => prev.filter(m => !isTransient(m)))
       
       if (!conversationId) {
         setConversationId(response.conversation_id)
@@ -528,7 +561,7 @@ export default function AgentPage() {
       }
     },
     onError: (error: Error) => {
-      setMessages(prev => prev.filter(m => m.type !== 'thinking'))
+      setMessages(prev => prev.filter(m => !isTransient(m)))
       toast({
         variant: 'destructive',
         title: t('agent.error_title'),
@@ -539,12 +572,15 @@ export default function AgentPage() {
 
   // Send clarification response
   const clarifyMutation = useMutation({
-    mutationFn: () => api.agentClarify({
-      conversation_id: conversationId!,
-      selections
-    }),
+    mutationFn: () => {
+      reportDraftRef.current = { sections: {}, insight: '' }
+      return api.agentClarifyStream({
+        conversation_id: conversationId!,
+        selections
+      }, handleStreamEvent)
+    },
     onSuccess: (response) => {
-      setMessages(prev => prev.filter(m => m.type !== 'thinking'))
+      setMessages(prev => prev.filter(m => !isTransient(m)))
 
       const newMessage: Message = {
         id: Date.now().toString(),
@@ -570,7 +606,7 @@ export default function AgentPage() {
       }
     },
     onError: (error: Error) => {
-      setMessages(prev => prev.filter(m => m.type !== 'thinking'))
+      setMessages(prev => prev.filter(m => !isTransient(m)))
       toast({
         variant: 'destructive',
         title: t('agent.error_title'),
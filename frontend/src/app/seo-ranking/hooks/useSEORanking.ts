@@ -185,6 +185,7 @@ export function useLeaderboard(params?: {
   sort_by?: "rank_asc" | "rank_desc" | "change_asc" | "change_desc";
   limit?: number;
   include_unranked?: boolean;
+  cursor?: string;
 }) {
   const source = params?.source || "google_hk";
   return useQuery({
@@ -56,6 +56,72 @@ async function fetchAPI<T>(endpoint: string, options?: RequestInit): Promise<T>
   return response.json()
 }
 
+// =============================================
+// Agent SSE 串流：逐個回調事件，resolve 最終響應
+// =============================================
+const AGENT_PARTIAL_TYPES = ['thinking', 'report_section', 'report_delta']
+
+async function streamAgentEvents(
+  endpoint: string,
+  body: unknown,
+  onEvent: (event: AgentChatResponse) => void,
+): Promise<AgentChatResponse> {
+  const token = getToken()
+  const headers: Record<string, string> = {
+    'Content-Type': 'application/json',
+    'Accept-Language': getCurrentLocale(),
+  }
+  if (token) {
+    headers['Authorization'] = `Bearer ${token}`
+  }
+
+  const response = await fetch(`${API_BASE}${endpoint}`, {
+    method: 'POST',
+    headers,
+    body: JSON.stringify(body),
+  })
+  if (!response.ok) {
+    throw new Error(`API Error: ${response.status} ${response.statusText}`)
+  }
+  const reader = response.body?.getReader()
+  if (!reader) throw new Error('Unable to read stream')
+
+  const decoder = new TextDecoder()
+  let buffer = ''
+  let final: AgentChatResponse | null = null
+
+  while (true) {
+    const { done, value } = await reader.read()
+    if (done) break
+
+    buffer += decoder.decode(value, { stream: true })
+    const blocks = buffer.split('\n\n')
+    buffer = blocks.pop() || ''
+
+    for (const block of blocks) {
+      let eventName = ''
+      let data = ''
+      for (const line of block.split('\n')) {
+        if (line.startsWith('event: ')) eventName = line.slice(7).trim()
+        else if (line.startsWith('data: ')) data = line.slice(6)
+      }
+      if (!data) continue
+
+      const payload = JSON.parse(data)
+      if (eventName === 'stream_error') {
+        throw new Error(payload.detail)
+      }
+      onEvent(payload as AgentChatResponse)
+      if (!AGENT_PARTIAL_TYPES.includes(payload.type)) {
+        final = payload as AgentChatResponse
+      }
+    }
+  }
+
+  if (!final) throw new Error('無法處理訊息')
+  return final
+}
+
 // =============================================
 // 類別 API
 // =============================================
@@ -702,6 +768,13 @@ export const api = {
       body: JSON.stringify(response),
     }),
 
+  // 串流版：報告段落完成即回調（report_section / report_delta），resolve 最終響應
+  agentChatStream: (message: AgentChatMessage, onEvent: (event: AgentChatResponse) => void) =>
+    streamAgentEvents('/agent/chat/stream', message, onEvent),
+
+  agentClarifyStream: (response: AgentClarificationResponse, onEvent: (event: AgentChatResponse) => void) =>
+    streamAgentEvents('/agent/clarify/stream', response, onEvent),
+
   // Fetch對話State
   getAgentConversation: (conversationId: string) =>
     fetchAPI<AgentConversationState>(`/agent/conversation/${conversationId}`),
@@ -1214,8 +1287,17 @@ export interface AgentFollowUpSuggestion {
   icon: string
 }
 
+// 串流中的報告段落（report_section 事件），index 為其在最終報告中的位置
+export interface AgentReportSection {
+  section: string
+  index: number
+  markdown: string
+  charts: AgentChartData[]
+  tables: any[]
+}
+
 export interface AgentChatResponse {
-  type: 'thinking' | 'message' | 'clarification' | 'report' | 'error'
+  type: 'thinking' | 'message' | 'clarification' | 'report' | 'report_section' | 'report_delta' | 'error'
   content: string
   conversation_id: string
   options?: AgentSlotOption[]
@@ -1226,7 +1308,7 @@ export interface AgentChatResponse {
     tables: any[]
     summary: string
     generated_at: string
-  }
+  } | AgentReportSection
   charts?: AgentChartData[]
   suggestions?: AgentFollowUpSuggestion[]  // 後續suggestionsbutton
 }
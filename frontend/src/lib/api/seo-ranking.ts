@@ -180,6 +180,7 @@ export interface LeaderboardEntry {
 }
 
 export interface LeaderboardSummary {
+  keyword_type: KeywordType | null;
   total_keywords: number;
   ranked_keywords: number;
   unranked_keywords: number;
@@ -195,6 +196,8 @@ export interface RankingLeaderboardResponse {
   generated_at: string;
   entries: LeaderboardEntry[];
   summary: LeaderboardSummary;
+  type_summaries: LeaderboardSummary[];
+  next_cursor: string | null;
 }
 
 // =============================================
@@ -446,6 +449,7 @@ export async function getLeaderboard(params?: {
   sort_by?: "rank_asc" | "rank_desc" | "change_asc" | "change_desc";
   limit?: number;
   include_unranked?: boolean;
+  cursor?: string;
 }): Promise<RankingLeaderboardResponse> {
   const url = buildUrl(`${BASE_URL}/leaderboard`, params);
   return get<RankingLeaderboardResponse>(url);